@@ -1,90 +1,86 @@
-import json
 import os
 
+from utils.config_store import get_store
+
 CONFIG_FILE = "facot_config.json"
 
+# Ajustes que antes se leían como atributos del módulo (config_facot.X);
+# ahora salen del JSON en memoria, sin E/S de disco por llamada.
+_LEGACY_ATTRS = {
+    "INVOICE_DUE_DAYS": ("invoice_due_days", 0),
+    "INVOICE_FIXED_DUE_DATE": ("invoice_fixed_due_date", ""),
+    "COMPANY_LOGOS": ("company_logos", {}),
+    "DEFAULT_LOGO_PATH": ("default_logo_path", ""),
+}
+
+def __getattr__(name):
+    if name in _LEGACY_ATTRS:
+        key, default = _LEGACY_ATTRS[name]
+        return get_config_store().get(key, default)
+    raise AttributeError(f"module 'config_facot' has no attribute '{name}'")
+
+def get_config_store():
+    """Almacén compartido de facot_config.json (caché + escritura atómica diferida)."""
+    return get_store(CONFIG_FILE)
+
 def load_config():
-    if os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError:
-                return {}
-    return {}
+    return get_config_store().snapshot()
 
 def save_config(data):
-    with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    get_config_store().replace(data)
 
 # --- RUTA DE BASE DE DATOS ---
 def get_db_path():
-    config = load_config()
-    return config.get("db_path", "")
+    return get_config_store().get("db_path", "")
 
 def set_db_path(path):
-    config = load_config()
-    config["db_path"] = path
-    save_config(config)
+    get_config_store().set("db_path", path)
 
 # --- RUTA DE PLANTILLA DE FACTURA ---
 def get_template_path():
-    config = load_config()
-    return config.get("template_path", "")
+    return get_config_store().get("template_path", "")
 
 def set_template_path(path):
-    config = load_config()
-    config["template_path"] = path
-    save_config(config)
+    get_config_store().set("template_path", path)
 
 # --- CARPETA DE SALIDA DE FACTURAS Y COTIZACIONES ---
 def get_output_folder():
-    config = load_config()
-    return config.get("output_folder", "")
+    return get_config_store().get("output_folder", "")
 
 def set_output_folder(path):
-    config = load_config()
-    config["output_folder"] = path
-    save_config(config)
+    get_config_store().set("output_folder", path)
 
 # --- EMPRESA ACTIVA ---
 def get_empresa_activa():
-    config = load_config()
-    return config.get("empresa_activa", "")
+    return get_config_store().get("empresa_activa", "")
 
 def set_empresa_activa(company_id):
-    config = load_config()
-    config["empresa_activa"] = company_id
-    save_config(config)
+    get_config_store().set("empresa_activa", company_id)
 
 # --- CONFIGURACIÓN POR EMPRESA ---
 def get_empresa_config(company_id):
-    config = load_config()
-    empresas = config.get("empresas", {})
+    empresas = get_config_store().get("empresas", {})
     return empresas.get(str(company_id), {})
 
 def set_empresa_config(company_id, empresa_cfg):
-    config = load_config()
-    if "empresas" not in config:
-        config["empresas"] = {}
-    config["empresas"][str(company_id)] = empresa_cfg
-    save_config(config)
+    store = get_config_store()
+    empresas = store.get("empresas", {})
+    empresas[str(company_id)] = empresa_cfg
+    store.set("empresas", empresas)
 
 # --- CARPETA DE DESCARGAS/ORIGEN ---
 def get_downloads_folder_path():
-    config = load_config()
     empresa_id = get_empresa_activa()
     empresa_cfg = get_empresa_config(empresa_id)
     # Prioridad: empresa > global
-    return empresa_cfg.get("carpeta_origen") or config.get("downloads_folder_path", "")
+    return empresa_cfg.get("carpeta_origen") or get_config_store().get("downloads_folder_path", "")
 
 def set_downloads_folder_path(path):
-    config = load_config()
     empresa_id = get_empresa_activa()
     empresa_cfg = get_empresa_config(empresa_id)
     empresa_cfg["carpeta_origen"] = path
-    config["downloads_folder_path"] = path
     set_empresa_config(empresa_id, empresa_cfg)
-    save_config(config)
+    get_config_store().set("downloads_folder_path", path)
 
 # --- MODO DE CONEXIÓN PREFERIDO ---
 def get_connection_mode():
@@ -94,8 +90,7 @@ def get_connection_mode():
     Returns:
         str: "SQLITE", "FIREBASE", o "AUTO" (default)
     """
-    config = load_config()
-    return config.get("connection_mode", "AUTO")
+    return get_config_store().get("connection_mode", "AUTO")
 
 def set_connection_mode(mode):
     """
@@ -104,9 +99,7 @@ def set_connection_mode(mode):
     Args:
         mode: "SQLITE", "FIREBASE", o "AUTO"
     """
-    config = load_config()
-    config["connection_mode"] = mode.upper()
-    save_config(config)
+    get_config_store().set("connection_mode", mode.upper())
 
 # --- CONFIGURACIÓN DE EMAIL (SMTP) ---
 def get_email_config():
@@ -138,8 +131,7 @@ def get_email_config():
         return env_config
     
     # Fallback a configuración guardada (menos seguro)
-    config = load_config()
-    saved_config = config.get('email_config', {})
+    saved_config = get_config_store().get('email_config', {})
     
     return {
         'smtp_host': saved_config.get('smtp_host', ''),
@@ -160,15 +152,14 @@ def set_email_config(email_cfg):
     Args:
         email_cfg: dict con configuración de email
     """
-    config = load_config()
-    config['email_config'] = email_cfg
-    save_config(config)
+    get_config_store().set('email_config', email_cfg)
 
 def clear_email_password():
     """
     Elimina la contraseña guardada de la configuración.
     """
-    config = load_config()
-    if 'email_config' in config and 'smtp_password' in config['email_config']:
-        del config['email_config']['smtp_password']
-        save_config(config)
\ No newline at end of file
+    store = get_config_store()
+    email_cfg = store.get('email_config', {})
+    if 'smtp_password' in email_cfg:
+        del email_cfg['smtp_password']
+        store.set('email_config', email_cfg)
\ No newline at end of file
@@ -8,6 +8,7 @@ permitiendo cambiar entre backends sin modificar la lógica de negocio.
 from .base import DataAccess
 from .sqlite_data_access import SQLiteDataAccess
 from .firebase_data_access import FirebaseDataAccess
+from .deferred_data_access import DeferredDataAccess
 from .factory import (
     get_data_access,
     DataAccessMode,
@@ -19,6 +20,7 @@ __all__ = [
     "DataAccess",
     "SQLiteDataAccess",
     "FirebaseDataAccess",
+    "DeferredDataAccess",
     "get_data_access",
     "DataAccessMode",
     "get_current_mode",
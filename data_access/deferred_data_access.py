@@ -0,0 +1,229 @@
+"""
+DataAccess que no espera a Firebase.
+
+Mientras el cliente Firebase se inicializa en segundo plano (SDK,
+credenciales, autenticación, DNS), las lecturas se atienden con SQLite.
+Cuando el cliente queda listo se crea el backend Firebase y las llamadas
+siguientes van a Firestore. Si Firebase no está disponible se sigue con
+SQLite, igual que el modo AUTO clásico.
+
+Las escrituras y los NCF nunca van a SQLite mientras se decide el backend:
+desde un hilo de trabajo esperan (hasta `write_timeout`) a que Firebase esté
+listo; desde el hilo de la UI no se espera (`ui_write_timeout`, 0 por
+defecto) y fallan enseguida con TimeoutError para que la ventana no se
+congele. Una factura guardada en SQLite no se reconciliaría después con
+Firestore, y un NCF tomado del contador local podría repetirse cuando los
+NCF pasen a salir de los bloques arrendados (NCFLeaseAllocator). Resolver
+el atributo (`hasattr(da, 'add_invoice')`) nunca espera.
+
+Con `wait_timeout` también las lecturas hechas antes de estar listo esperan
+(hasta ese plazo) a la inicialización en lugar de ir a SQLite.
+"""
+
+from __future__ import annotations
+import functools
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+from .base import DataAccess
+
+# Métodos que escriben o consumen NCF: esperan al backend definitivo
+WRITE_METHODS = frozenset({
+    'add_company', 'update_company_fields', 'add_invoice', 'add_quotation', 'update_quotation',
+    'delete_factura', 'delete_quotation', 'add_or_update_third_party', 'get_next_ncf',
+    'void_invoice',
+})
+DEFAULT_WRITE_TIMEOUT = 60.0
+DEFAULT_UI_WRITE_TIMEOUT = 0.0
+
+
+class DeferredDataAccess(DataAccess):
+    """Enruta a SQLite hasta que el backend Firebase está listo."""
+
+    def __init__(
+        self,
+        fallback: DataAccess,
+        firebase_factory: Callable[[], DataAccess],
+        ready: Future,
+        wait_timeout: Optional[float] = None,
+        write_timeout: Optional[float] = DEFAULT_WRITE_TIMEOUT,
+        ui_write_timeout: Optional[float] = DEFAULT_UI_WRITE_TIMEOUT,
+        ui_thread: Optional[threading.Thread] = None
+    ):
+        """
+        Args:
+            fallback: Backend usado mientras Firebase no está listo (SQLite)
+            firebase_factory: Crea el backend Firebase una vez listo el cliente
+            ready: Future que resuelve a True si el cliente Firebase está disponible
+            wait_timeout: Segundos que una lectura espera a Firebase antes de
+                usar el fallback (None = no esperar)
+            write_timeout: Segundos que una escritura espera a que se decida
+                el backend (None = sin límite)
+            ui_write_timeout: Igual que write_timeout para las escrituras
+                hechas desde `ui_thread` (0 = fallar sin esperar)
+            ui_thread: Hilo de la UI (por defecto el hilo principal)
+        """
+        self._fallback = fallback
+        self._factory = firebase_factory
+        self._firebase: Optional[DataAccess] = None
+        self._wait_timeout = wait_timeout
+        self._write_timeout = write_timeout
+        self._ui_write_timeout = ui_write_timeout
+        self._ui_thread = ui_thread or threading.main_thread()
+        self._settled = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[bool], None]] = []
+        ready.add_done_callback(self._on_client_ready)
+
+    def _on_client_ready(self, future: Future) -> None:
+        firebase = None
+        try:
+            if future.result():
+                firebase = self._factory()
+                print("[DATA_ACCESS] AUTO: Firebase listo, cambiando de backend")
+            else:
+                print("[DATA_ACCESS] AUTO: Firebase no disponible, se mantiene SQLite")
+        except Exception as e:
+            print(f"[DATA_ACCESS] AUTO: Firebase no disponible ({e})")
+        with self._lock:
+            self._firebase = firebase
+            self._settled.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            self._notify(callback)
+
+    def _notify(self, callback: Callable[[bool], None]) -> None:
+        try:
+            callback(self._firebase is not None)
+        except Exception as e:
+            print(f"[DATA_ACCESS] Error en callback de Firebase listo: {e}")
+
+    # ----- Estado -----
+
+    def is_ready(self) -> bool:
+        """True cuando terminó la inicialización de Firebase (con o sin éxito)."""
+        return self._settled.is_set()
+
+    @property
+    def active(self) -> DataAccess:
+        """Backend que atiende las llamadas en este momento."""
+        if not self._settled.is_set() and self._wait_timeout:
+            self._settled.wait(self._wait_timeout)
+        return self._firebase if self._firebase is not None else self._fallback
+
+    @property
+    def writer(self) -> DataAccess:
+        """
+        Backend para escrituras: espera a que se decida entre Firebase y SQLite
+        (`write_timeout`, o `ui_write_timeout` en el hilo de la UI).
+
+        Raises:
+            TimeoutError: Si Firebase sigue inicializando pasado el plazo
+        """
+        on_ui = threading.current_thread() is self._ui_thread
+        if not self._settled.wait(self._ui_write_timeout if on_ui else self._write_timeout):
+            raise TimeoutError("Firebase aún se está inicializando; intente guardar de nuevo en unos segundos")
+        return self._firebase if self._firebase is not None else self._fallback
+
+    def add_ready_callback(self, callback: Callable[[bool], None]) -> None:
+        """
+        Llama `callback(usa_firebase)` cuando se decide el backend definitivo.
+
+        Corre en el hilo de inicialización (o en el actual si ya se decidió).
+        """
+        with self._lock:
+            if not self._settled.is_set():
+                self._callbacks.append(callback)
+                return
+        self._notify(callback)
+
+    def __getattr__(self, name: str):
+        # Métodos propios de cada backend (get_invoice_items, set_online, ...)
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name in WRITE_METHODS:
+            if self._settled.is_set():
+                return getattr(self.writer, name)
+            if not hasattr(self._fallback, name):
+                raise AttributeError(name)
+            # Sin esperar: el backend se resuelve (y se espera) al llamar
+            return functools.partial(self._call_writer, name)
+        return getattr(self.active, name)
+
+    def _call_writer(self, name: str, *args, **kwargs):
+        return getattr(self.writer, name)(*args, **kwargs)
+
+    # ===== EMPRESAS (COMPANIES) =====
+
+    def get_all_companies(self) -> List[Dict[str, Any]]:
+        return self.active.get_all_companies()
+
+    def get_company_details(self, company_id: int) -> Optional[Dict[str, Any]]:
+        return self.active.get_company_details(company_id)
+
+    def add_company(self, name: str, rnc: str, address: str = "") -> int:
+        return self.writer.add_company(name, rnc, address)
+
+    def update_company_fields(self, company_id: int, fields: Dict[str, Any]) -> None:
+        return self.writer.update_company_fields(company_id, fields)
+
+    # ===== ÍTEMS =====
+
+    def get_items_like(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        return self.active.get_items_like(query, limit)
+
+    def get_item_by_code(self, code: str) -> Optional[Dict[str, Any]]:
+        return self.active.get_item_by_code(code)
+
+    # ===== TERCEROS (THIRD PARTIES) =====
+
+    def get_third_party_by_rnc(self, rnc: str) -> Optional[Dict[str, Any]]:
+        return self.active.get_third_party_by_rnc(rnc)
+
+    # ===== FACTURAS (INVOICES) =====
+
+    def add_invoice(self, invoice_data: Dict[str, Any], items: List[Dict[str, Any]]) -> int:
+        return self.writer.add_invoice(invoice_data, items)
+
+    def get_invoices(
+        self,
+        company_id: Optional[int] = None,
+        limit: int = 100,
+        offset: int = 0
+    ) -> List[Dict[str, Any]]:
+        return self.active.get_invoices(company_id, limit, offset)
+
+    def get_invoice_by_id(self, invoice_id: int) -> Optional[Dict[str, Any]]:
+        return self.active.get_invoice_by_id(invoice_id)
+
+    # ===== COTIZACIONES (QUOTATIONS) =====
+
+    def add_quotation(self, quotation_data: Dict[str, Any], items: List[Dict[str, Any]]) -> int:
+        return self.writer.add_quotation(quotation_data, items)
+
+    def get_quotations(
+        self,
+        company_id: Optional[int] = None,
+        limit: int = 100,
+        offset: int = 0
+    ) -> List[Dict[str, Any]]:
+        return self.active.get_quotations(company_id, limit, offset)
+
+    def get_quotation_by_id(self, quotation_id: int) -> Optional[Dict[str, Any]]:
+        return self.active.get_quotation_by_id(quotation_id)
+
+    # ===== NCF / SECUENCIAS =====
+
+    def get_next_ncf(self, company_id: int, ncf_type: str) -> str:
+        return self.writer.get_next_ncf(company_id, ncf_type)
+
+    # ===== UTILIDADES =====
+
+    def commit(self) -> None:
+        return self.active.commit()
+
+    def close(self) -> None:
+        """Cierra el backend Firebase (si llegó a crearse); SQLite lo cierra su dueño."""
+        if self._firebase is not None:
+            self._firebase.close()
@@ -11,6 +11,7 @@ from typing import Optional
 from .base import DataAccess
 from .sqlite_data_access import SQLiteDataAccess
 from .firebase_data_access import FirebaseDataAccess
+from .deferred_data_access import DeferredDataAccess
 
 
 class DataAccessMode(Enum):
@@ -44,7 +45,8 @@ def get_current_mode() -> DataAccessMode:
 def get_data_access(
     logic_controller=None,
     user_id: Optional[str] = None,
-    mode: Optional[DataAccessMode] = None
+    mode: Optional[DataAccessMode] = None,
+    wait_for_firebase: bool = False
 ) -> DataAccess:
     """
     Crea una instancia de DataAccess según el modo especificado.
@@ -53,6 +55,10 @@ def get_data_access(
         logic_controller: LogicController para SQLite (requerido si mode=SQLITE)
         user_id: ID de usuario para Firebase
         mode: Modo específico a usar (None = usar modo global)
+        wait_for_firebase: En modo AUTO, esperar la inicialización de
+            Firebase. Por defecto no se espera: si el cliente aún no está
+            listo se retorna un DeferredDataAccess que usa SQLite y cambia
+            a Firebase cuando termina la inicialización de fondo.
     
     Returns:
         Instancia de DataAccess (SQLite o Firebase)
@@ -63,6 +69,9 @@ def get_data_access(
     if mode is None:
         mode = _current_mode
     
+    # La cola offline de Firebase vive en la BD SQLite local
+    outbox_path = getattr(logic_controller, 'db_path', None)
+    
     # Modo SQLITE
     if mode == DataAccessMode.SQLITE:
         if logic_controller is None:
@@ -75,7 +84,7 @@ def get_data_access(
     if mode == DataAccessMode.FIREBASE:
         try:
             print("[DATA_ACCESS] Usando Firebase")
-            return FirebaseDataAccess(user_id)
+            return FirebaseDataAccess(user_id, outbox_path=outbox_path)
         except Exception as e:
             raise RuntimeError(f"No se pudo inicializar Firebase: {e}")
     
@@ -83,11 +92,20 @@ def get_data_access(
     if mode == DataAccessMode.AUTO:
         try:
             from firebase import get_firebase_client
-            client = get_firebase_client()
+            client = get_firebase_client(wait=wait_for_firebase)
+            
+            if not client.is_ready() and logic_controller is not None:
+                # No bloquear en autenticación/DNS: SQLite hasta que Firebase esté listo
+                print("[DATA_ACCESS] AUTO: Firebase inicializando, SQLite mientras tanto")
+                return DeferredDataAccess(
+                    SQLiteDataAccess(logic_controller),
+                    lambda: FirebaseDataAccess(user_id, outbox_path=outbox_path),
+                    client.ready_future,
+                )
             
             if client.is_available():
                 print("[DATA_ACCESS] AUTO: Usando Firebase (disponible)")
-                return FirebaseDataAccess(user_id)
+                return FirebaseDataAccess(user_id, outbox_path=outbox_path)
         except Exception as e:
             print(f"[DATA_ACCESS] AUTO: Firebase no disponible ({e})")
         
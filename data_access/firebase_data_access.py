@@ -6,12 +6,16 @@ con soporte para multi-usuario y company_id scoping.
 """
 
 from __future__ import annotations
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
+import threading
 
 from .base import DataAccess
 from firebase import get_firebase_client
 
+# IDs que se mantienen reservados para crear documentos sin conexión
+OFFLINE_ID_RESERVE = 20
+
 
 class FirebaseDataAccess(DataAccess):
     """
@@ -26,21 +30,198 @@ class FirebaseDataAccess(DataAccess):
     - sequences/{company_id}_ncf/{ncf_type}
     """
     
-    def __init__(self, user_id: Optional[str] = None):
+    def __init__(self, user_id: Optional[str] = None, outbox_path: Optional[str] = None, db=None):
         """
         Inicializa con cliente Firebase.
         
         Args:
             user_id: ID del usuario actual (para created_by/updated_by)
+            outbox_path: BD SQLite para la cola de escrituras offline.
+                Si se indica, las escrituras se encolan localmente y se
+                envían en segundo plano (ver firebase.outbox).
+            db: Cliente Firestore a usar en lugar del global (p. ej.
+                FakeFirestore en pruebas y benchmarks)
         """
-        self.client = get_firebase_client()
-        self.db = self.client.get_firestore()
-        self.storage = self.client.get_storage()
+        if db is not None:
+            self.client = None
+            self.db = db
+            self.storage = None
+        else:
+            self.client = get_firebase_client()
+            self.db = self.client.get_firestore()
+            self.storage = self.client.get_storage()
         self.user_id = user_id or "system"
+        self.ncf_block_size = 50
+        self._ncf_allocator = None
+        self._id_allocator = None
         
         if not self.db:
             raise RuntimeError("Firestore no está disponible. Verificar configuración de Firebase.")
-    
+        
+        # Cola de escrituras offline
+        self.outbox = None
+        self.online = True
+        self._flush_guard = threading.Lock()
+        self._flush_thread: Optional[threading.Thread] = None
+        self._flush_again = False
+        if outbox_path:
+            from firebase.outbox import FirestoreOutbox
+            self.outbox = FirestoreOutbox(outbox_path)
+    
+    def _get_id_allocator(self):
+        """Crea el asignador de IDs por rangos la primera vez que se usa."""
+        if self._id_allocator is None:
+            from firebase.id_allocator import DocumentIdAllocator
+            self._id_allocator = DocumentIdAllocator(self.db)
+        return self._id_allocator
+
+    def _document_with_items_ops(self, path: str, doc: Dict[str, Any], items: List[Dict[str, Any]]) -> list:
+        """Operaciones para escribir un documento y su subcolección `items`."""
+        ops = [('set', path, doc)]
+        for idx, item in enumerate(items):
+            ops.append(('set', f"{path}/items/{idx}", self._add_metadata(dict(item))))
+        return ops
+
+    def _write(self, ops: list) -> None:
+        """
+        Aplica un grupo de escrituras.
+
+        Con outbox se encolan en SQLite (instantáneo, con o sin conexión) y
+        se envían en segundo plano; sin outbox se escriben directamente en
+        batches, sin lecturas previas.
+        """
+        if self.outbox is not None:
+            self.outbox.enqueue(ops)
+            self._schedule_flush()
+        else:
+            from firebase.outbox import write_ops
+            write_ops(self.db, ops)
+
+    def _pending(self, prefix: str):
+        """Escrituras encoladas bajo `prefix` (PendingOverlay) o None si no hay."""
+        if self.outbox is None:
+            return None
+        from firebase.outbox import PendingOverlay
+        overlay = PendingOverlay(self.outbox.pending_ops(prefix))
+        return overlay or None
+
+    def _list_documents(self, collection: str, company_id: Optional[int], limit: int, offset: int) -> List[Dict[str, Any]]:
+        """
+        Documentos de una colección (filtro por empresa y paginado en Firestore)
+        con las escrituras aún encoladas superpuestas; los documentos nuevos
+        encolados van al inicio de la primera página.
+        """
+        remote: Dict[str, Dict[str, Any]] = {}
+        try:
+            ref = self.db.collection(collection)
+            query = ref.where('company_id', '==', company_id) if company_id else ref
+            for doc in query.limit(limit).offset(offset).stream():
+                remote[doc.id] = doc.to_dict()
+        except Exception as e:
+            print(f"[FIREBASE] Error getting {collection}: {e}")
+        overlay = self._pending(collection)
+        docs = overlay.collection(collection, remote) if overlay else remote
+        if overlay:
+            new_ids = [doc_id for doc_id in docs if doc_id not in remote
+                       and (not company_id or docs[doc_id].get('company_id') == company_id)]
+            ordered = (new_ids if offset == 0 else []) + [doc_id for doc_id in docs if doc_id in remote]
+            docs = {doc_id: docs[doc_id] for doc_id in ordered[:limit]}
+        out = []
+        for doc_id, data in docs.items():
+            data['id'] = int(doc_id) if doc_id.isdigit() else doc_id
+            out.append(data)
+        return out
+
+    def _subdocuments(self, path: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """[(id, datos)] de la subcolección `path` con las escrituras encoladas superpuestas."""
+        from firebase.outbox import _collection_ref
+        remote: Dict[str, Dict[str, Any]] = {}
+        try:
+            for doc in _collection_ref(self.db, path).stream():
+                remote[doc.id] = doc.to_dict()
+        except Exception as e:
+            print(f"[FIREBASE] Error getting {path}: {e}")
+        overlay = self._pending(path)
+        return list((overlay.collection(path, remote) if overlay else remote).items())
+
+    def _document_with_items(self, collection: str, doc_id: int) -> Optional[Dict[str, Any]]:
+        """Documento con su subcolección `items`, incluyendo escrituras encoladas."""
+        path = f"{collection}/{doc_id}"
+        data = None
+        try:
+            doc = self.db.collection(collection).document(str(doc_id)).get()
+            data = doc.to_dict() if doc.exists else None
+        except Exception as e:
+            print(f"[FIREBASE] Error getting {path}: {e}")
+        overlay = self._pending(path)
+        if overlay:
+            data = overlay.apply(path, data)
+        if data is None:
+            return None
+        data['id'] = doc_id
+        data['items'] = [item for _id, item in self._subdocuments(f"{path}/items")]
+        return data
+
+    # ===== COLA OFFLINE =====
+
+    def set_online(self, is_online: bool) -> None:
+        """Actualiza el estado de conexión; al volver online se vacía la cola."""
+        self.online = bool(is_online)
+        if self.online:
+            self._schedule_flush()
+
+    def pending_writes(self) -> int:
+        """Escrituras encoladas aún no enviadas a Firestore."""
+        return self.outbox.pending_count() if self.outbox is not None else 0
+
+    def flush_outbox(self) -> Dict[str, int]:
+        """Envía la cola a Firestore (bloqueante). Retorna contadores del envío."""
+        if self.outbox is None:
+            return {'sent': 0, 'writes': 0, 'batches': 0, 'skipped': 0, 'failed': 0, 'dead': 0}
+        stats = self.outbox.flush(self.db)
+        if stats['failed']:
+            self.online = False
+            return stats
+        # Mantener IDs en memoria para poder crear documentos sin conexión
+        try:
+            allocator = self._get_id_allocator()
+            for collection in ('invoices', 'quotations'):
+                allocator.reserve(collection, OFFLINE_ID_RESERVE)
+        except Exception as e:
+            print(f"[FIREBASE] No se pudieron reservar IDs: {e}")
+        return stats
+
+    def _schedule_flush(self) -> None:
+        """Lanza (o re-arma) el envío de la cola en un hilo de fondo."""
+        if self.outbox is None or not self.online:
+            return
+        with self._flush_guard:
+            if self._flush_thread is not None:
+                self._flush_again = True
+                return
+            self._flush_again = False
+            self._flush_thread = threading.Thread(target=self._flush_worker, daemon=True)
+            self._flush_thread.start()
+
+    def _flush_worker(self) -> None:
+        while True:
+            try:
+                stats = self.flush_outbox()
+            except Exception as e:
+                print(f"[FIREBASE] Error vaciando cola: {e}")
+                stats = {'failed': 1}
+            with self._flush_guard:
+                if stats.get('failed') or not self._flush_again:
+                    self._flush_thread = None
+                    return
+                self._flush_again = False
+
+    def wait_for_flush(self, timeout: Optional[float] = None) -> None:
+        """Espera a que termine el envío en segundo plano (si hay uno)."""
+        thread = self._flush_thread
+        if thread is not None:
+            thread.join(timeout)
+
     def _add_metadata(self, data: Dict[str, Any], is_update: bool = False) -> Dict[str, Any]:
         """Agrega metadatos de auditoría a un documento."""
         now = datetime.utcnow().isoformat()
@@ -92,10 +273,7 @@ class FirebaseDataAccess(DataAccess):
     def add_company(self, name: str, rnc: str, address: str = "") -> int:
         """Agrega una nueva empresa. Retorna el ID."""
         try:
-            # Generar ID auto-incrementable
-            # En Firestore, usamos timestamp + random para evitar colisiones
-            import time
-            company_id = int(time.time() * 1000) % 1000000
+            company_id = self._get_id_allocator().next_id('companies')
             
             company_data = {
                 'name': name,
@@ -104,8 +282,7 @@ class FirebaseDataAccess(DataAccess):
             }
             company_data = self._add_metadata(company_data)
             
-            doc_ref = self.db.collection('companies').document(str(company_id))
-            doc_ref.set(company_data)
+            self._write([('set', f"companies/{company_id}", company_data)])
             
             return company_id
         except Exception as e:
@@ -117,8 +294,7 @@ class FirebaseDataAccess(DataAccess):
         try:
             fields = self._add_metadata(fields, is_update=True)
             
-            doc_ref = self.db.collection('companies').document(str(company_id))
-            doc_ref.update(fields)
+            self._write([('update', f"companies/{company_id}", fields)])
         except Exception as e:
             print(f"[FIREBASE] Error updating company {company_id}: {e}")
             raise
@@ -174,7 +350,12 @@ class FirebaseDataAccess(DataAccess):
     # ===== TERCEROS (THIRD PARTIES) =====
     
     def get_third_party_by_rnc(self, rnc: str) -> Optional[Dict[str, Any]]:
-        """Obtiene un tercero por RNC."""
+        """Obtiene un tercero por RNC (también si sólo está en la cola)."""
+        overlay = self._pending('third_parties')
+        if overlay:
+            for path, (kind, data) in overlay.docs.items():
+                if kind == 'set' and (data or {}).get('rnc') == rnc:
+                    return dict(data, id=path.rsplit('/', 1)[1])
         try:
             parties_ref = self.db.collection('third_parties')
             query = parties_ref.where('rnc', '==', rnc).limit(1)
@@ -195,22 +376,14 @@ class FirebaseDataAccess(DataAccess):
     def add_invoice(self, invoice_data: Dict[str, Any], items: List[Dict[str, Any]]) -> int:
         """Agrega una nueva factura con sus ítems. Retorna el ID."""
         try:
-            import time
-            invoice_id = int(time.time() * 1000) % 1000000
+            invoice_id = self._get_id_allocator().next_id('invoices')
             
             # Preparar datos de factura
             invoice_doc = dict(invoice_data)
             invoice_doc = self._add_metadata(invoice_doc)
             
-            # Crear documento de factura
-            invoice_ref = self.db.collection('invoices').document(str(invoice_id))
-            invoice_ref.set(invoice_doc)
-            
-            # Agregar ítems como subcolección
-            items_ref = invoice_ref.collection('items')
-            for idx, item in enumerate(items):
-                item_doc = self._add_metadata(dict(item))
-                items_ref.document(str(idx)).set(item_doc)
+            # Encabezado + ítems (subcolección) en un mismo grupo de escrituras
+            self._write(self._document_with_items_ops(f"invoices/{invoice_id}", invoice_doc, items))
             
             return invoice_id
         except Exception as e:
@@ -223,75 +396,26 @@ class FirebaseDataAccess(DataAccess):
         limit: int = 100,
         offset: int = 0
     ) -> List[Dict[str, Any]]:
-        """Obtiene facturas (opcionalmente filtradas por empresa)."""
-        try:
-            invoices_ref = self.db.collection('invoices')
-            
-            if company_id:
-                query = invoices_ref.where('company_id', '==', company_id)
-            else:
-                query = invoices_ref
-            
-            query = query.limit(limit).offset(offset)
-            
-            invoices = []
-            for doc in query.stream():
-                invoice_data = doc.to_dict()
-                invoice_data['id'] = int(doc.id) if doc.id.isdigit() else doc.id
-                invoices.append(invoice_data)
-            
-            return invoices
-        except Exception as e:
-            print(f"[FIREBASE] Error getting invoices: {e}")
-            return []
+        """Obtiene facturas (opcionalmente filtradas por empresa), incluidas las encoladas."""
+        return self._list_documents('invoices', company_id, limit, offset)
     
     def get_invoice_by_id(self, invoice_id: int) -> Optional[Dict[str, Any]]:
-        """Obtiene una factura específica con sus ítems."""
-        try:
-            invoice_ref = self.db.collection('invoices').document(str(invoice_id))
-            doc = invoice_ref.get()
-            
-            if not doc.exists:
-                return None
-            
-            invoice_data = doc.to_dict()
-            invoice_data['id'] = invoice_id
-            
-            # Obtener ítems de la subcolección
-            items_ref = invoice_ref.collection('items')
-            items = []
-            for item_doc in items_ref.stream():
-                item_data = item_doc.to_dict()
-                items.append(item_data)
-            
-            invoice_data['items'] = items
-            
-            return invoice_data
-        except Exception as e:
-            print(f"[FIREBASE] Error getting invoice {invoice_id}: {e}")
-            return None
+        """Obtiene una factura específica con sus ítems (incluye cambios aún encolados)."""
+        return self._document_with_items('invoices', invoice_id)
     
     # ===== COTIZACIONES (QUOTATIONS) =====
     
     def add_quotation(self, quotation_data: Dict[str, Any], items: List[Dict[str, Any]]) -> int:
         """Agrega una nueva cotización con sus ítems. Retorna el ID."""
         try:
-            import time
-            quotation_id = int(time.time() * 1000) % 1000000
+            quotation_id = self._get_id_allocator().next_id('quotations')
             
             # Preparar datos de cotización
             quotation_doc = dict(quotation_data)
             quotation_doc = self._add_metadata(quotation_doc)
             
-            # Crear documento de cotización
-            quotation_ref = self.db.collection('quotations').document(str(quotation_id))
-            quotation_ref.set(quotation_doc)
-            
-            # Agregar ítems como subcolección
-            items_ref = quotation_ref.collection('items')
-            for idx, item in enumerate(items):
-                item_doc = self._add_metadata(dict(item))
-                items_ref.document(str(idx)).set(item_doc)
+            # Encabezado + ítems (subcolección) en un mismo grupo de escrituras
+            self._write(self._document_with_items_ops(f"quotations/{quotation_id}", quotation_doc, items))
             
             return quotation_id
         except Exception as e:
@@ -304,123 +428,55 @@ class FirebaseDataAccess(DataAccess):
         limit: int = 100,
         offset: int = 0
     ) -> List[Dict[str, Any]]:
-        """Obtiene cotizaciones (opcionalmente filtradas por empresa)."""
-        try:
-            quotations_ref = self.db.collection('quotations')
-            
-            if company_id:
-                query = quotations_ref.where('company_id', '==', company_id)
-            else:
-                query = quotations_ref
-            
-            query = query.limit(limit).offset(offset)
-            
-            quotations = []
-            for doc in query.stream():
-                quotation_data = doc.to_dict()
-                quotation_data['id'] = int(doc.id) if doc.id.isdigit() else doc.id
-                quotations.append(quotation_data)
-            
-            return quotations
-        except Exception as e:
-            print(f"[FIREBASE] Error getting quotations: {e}")
-            return []
+        """Obtiene cotizaciones (opcionalmente filtradas por empresa), incluidas las encoladas."""
+        return self._list_documents('quotations', company_id, limit, offset)
     
     def get_quotation_by_id(self, quotation_id: int) -> Optional[Dict[str, Any]]:
-        """Obtiene una cotización específica con sus ítems."""
-        try:
-            quotation_ref = self.db.collection('quotations').document(str(quotation_id))
-            doc = quotation_ref.get()
-            
-            if not doc.exists:
-                return None
-            
-            quotation_data = doc.to_dict()
-            quotation_data['id'] = quotation_id
-            
-            # Obtener ítems de la subcolección
-            items_ref = quotation_ref.collection('items')
-            items = []
-            for item_doc in items_ref.stream():
-                item_data = item_doc.to_dict()
-                items.append(item_data)
-            
-            quotation_data['items'] = items
-            
-            return quotation_data
-        except Exception as e:
-            print(f"[FIREBASE] Error getting quotation {quotation_id}: {e}")
-            return None
+        """Obtiene una cotización específica con sus ítems (incluye cambios aún encolados)."""
+        return self._document_with_items('quotations', quotation_id)
     
     # ===== NCF / SECUENCIAS =====
     
     def get_next_ncf(self, company_id: int, ncf_type: str) -> str:
-        """Obtiene el siguiente NCF disponible para una empresa y tipo."""
+        """
+        Obtiene el siguiente NCF disponible para una empresa y tipo.
+
+        Los números salen de bloques arrendados por esta estación
+        (ver NCFLeaseAllocator), sin una transacción por NCF.
+        """
+        prefix3 = (ncf_type or "B01").upper()
+        if len(prefix3) == 2 and prefix3.isdigit():
+            prefix3 = f"B{prefix3}"
         try:
-            # Importar firestore ANTES de usarlo en el decorador
-            from google.cloud import firestore
-            
-            # Usar transacción para asegurar atomicidad
-            sequence_ref = self.db.collection('sequences').document(f"{company_id}_ncf_{ncf_type}")
-            
-            @firestore.transactional
-            def increment_sequence(transaction):
-                snapshot = sequence_ref.get(transaction=transaction)
-                
-                if snapshot.exists:
-                    current = snapshot.get('current')
-                else:
-                    current = 0
-                
-                new_value = current + 1
-                transaction.set(sequence_ref, {'current': new_value})
-                
-                return new_value
-            
-            transaction = self.db.transaction()
-            seq_num = increment_sequence(transaction)
-            
-            # Formatear NCF
-            return f"B{ncf_type}{seq_num:08d}"
+            return self._get_ncf_allocator().next_ncf(company_id, prefix3)
         except Exception as e:
             print(f"[FIREBASE] Error getting next NCF: {e}")
-            return f"B{ncf_type}00000001"
+            raise
+
+    def _get_ncf_allocator(self):
+        """Crea el asignador de NCF por bloques la primera vez que se usa."""
+        if self._ncf_allocator is None:
+            from firebase.ncf_lease_allocator import NCFLeaseAllocator
+            self._ncf_allocator = NCFLeaseAllocator(self.db, block_size=self.ncf_block_size)
+        return self._ncf_allocator
     
     # ===== MÉTODOS ADICIONALES PARA COMPATIBILIDAD =====
     
     def get_invoice_items(self, invoice_id: int) -> List[Dict[str, Any]]:
-        """Obtiene los ítems de una factura específica."""
-        try:
-            invoice_ref = self.db.collection('invoices').document(str(invoice_id))
-            items_ref = invoice_ref.collection('items')
-            
-            items = []
-            for doc in items_ref.stream():
-                item_data = doc.to_dict()
-                item_data['id'] = doc.id
-                items.append(item_data)
-            
-            return items
-        except Exception as e:
-            print(f"[FIREBASE] Error getting invoice items for {invoice_id}: {e}")
-            return []
+        """Obtiene los ítems de una factura específica (incluye cambios aún encolados)."""
+        items = []
+        for doc_id, item_data in self._subdocuments(f"invoices/{invoice_id}/items"):
+            item_data['id'] = doc_id
+            items.append(item_data)
+        return items
     
     def get_quotation_items(self, quotation_id: int) -> List[Dict[str, Any]]:
-        """Obtiene los ítems de una cotización específica."""
-        try:
-            quotation_ref = self.db.collection('quotations').document(str(quotation_id))
-            items_ref = quotation_ref.collection('items')
-            
-            items = []
-            for doc in items_ref.stream():
-                item_data = doc.to_dict()
-                item_data['id'] = doc.id
-                items.append(item_data)
-            
-            return items
-        except Exception as e:
-            print(f"[FIREBASE] Error getting quotation items for {quotation_id}: {e}")
-            return []
+        """Obtiene los ítems de una cotización específica (incluye cambios aún encolados)."""
+        items = []
+        for doc_id, item_data in self._subdocuments(f"quotations/{quotation_id}/items"):
+            item_data['id'] = doc_id
+            items.append(item_data)
+        return items
     
     def search_third_parties(self, query: str, search_by: str = 'name') -> List[Dict[str, Any]]:
         """Busca terceros por nombre o RNC."""
@@ -449,25 +505,29 @@ class FirebaseDataAccess(DataAccess):
             return []
     
     def add_or_update_third_party(self, rnc: str, name: str) -> None:
-        """Agrega o actualiza un tercero por RNC."""
+        """Agrega o actualiza un tercero por RNC (la escritura pasa por la cola)."""
         try:
-            parties_ref = self.db.collection('third_parties')
-            query = parties_ref.where('rnc', '==', rnc).limit(1)
-            
-            docs = list(query.stream())
-            
-            party_data = {
-                'rnc': rnc,
-                'name': name,
-            }
-            party_data = self._add_metadata(party_data, is_update=len(docs) > 0)
-            
-            if docs:
-                # Actualizar existente
-                docs[0].reference.update(party_data)
+            path = None
+            overlay = self._pending('third_parties')
+            if overlay:
+                # Tercero guardado antes y aún sin enviar
+                path = next((p for p, (kind, data) in overlay.docs.items()
+                             if kind != 'delete' and (data or {}).get('rnc') == rnc), None)
+            if path is None:
+                try:
+                    docs = list(self.db.collection('third_parties').where('rnc', '==', rnc).limit(1).stream())
+                    if docs:
+                        path = f"third_parties/{docs[0].id}"
+                except Exception as e:
+                    print(f"[FIREBASE] No se pudo consultar el tercero {rnc}: {e}")
+            
+            party_data = self._add_metadata({'rnc': rnc, 'name': name}, is_update=path is not None)
+            if path is not None:
+                self._write([('update', path, party_data)])
             else:
-                # Crear nuevo
-                parties_ref.add(party_data)
+                # Id derivado del RNC: guardar dos veces sin conexión no duplica el tercero
+                doc_id = rnc if rnc and '/' not in rnc else self.db.collection('third_parties').document().id
+                self._write([('set', f"third_parties/{doc_id}", party_data)])
                 
         except Exception as e:
             print(f"[FIREBASE] Error adding/updating third party: {e}")
@@ -496,15 +556,11 @@ class FirebaseDataAccess(DataAccess):
     def delete_factura(self, factura_id: int) -> None:
         """Elimina una factura y sus ítems."""
         try:
-            invoice_ref = self.db.collection('invoices').document(str(factura_id))
-            
-            # Eliminar ítems primero
-            items_ref = invoice_ref.collection('items')
-            for item_doc in items_ref.stream():
-                item_doc.reference.delete()
-            
-            # Eliminar factura
-            invoice_ref.delete()
+            # Eliminar ítems primero y luego la factura
+            self._write([
+                ('purge', f"invoices/{factura_id}/items", None),
+                ('delete', f"invoices/{factura_id}", None),
+            ])
             
         except Exception as e:
             print(f"[FIREBASE] Error deleting invoice {factura_id}: {e}")
@@ -513,15 +569,11 @@ class FirebaseDataAccess(DataAccess):
     def delete_quotation(self, quotation_id: int) -> None:
         """Elimina una cotización y sus ítems."""
         try:
-            quotation_ref = self.db.collection('quotations').document(str(quotation_id))
-            
-            # Eliminar ítems primero
-            items_ref = quotation_ref.collection('items')
-            for item_doc in items_ref.stream():
-                item_doc.reference.delete()
-            
-            # Eliminar cotización
-            quotation_ref.delete()
+            # Eliminar ítems primero y luego la cotización
+            self._write([
+                ('purge', f"quotations/{quotation_id}/items", None),
+                ('delete', f"quotations/{quotation_id}", None),
+            ])
             
         except Exception as e:
             print(f"[FIREBASE] Error deleting quotation {quotation_id}: {e}")
@@ -530,22 +582,16 @@ class FirebaseDataAccess(DataAccess):
     def update_quotation(self, quotation_id: int, quotation_data: Dict[str, Any], items: List[Dict[str, Any]]) -> None:
         """Actualiza una cotización con sus ítems."""
         try:
-            quotation_ref = self.db.collection('quotations').document(str(quotation_id))
+            path = f"quotations/{quotation_id}"
             
             # Actualizar datos de cotización
             quotation_doc = dict(quotation_data)
             quotation_doc = self._add_metadata(quotation_doc, is_update=True)
-            quotation_ref.update(quotation_doc)
             
-            # Eliminar ítems antiguos
-            items_ref = quotation_ref.collection('items')
-            for item_doc in items_ref.stream():
-                item_doc.reference.delete()
-            
-            # Agregar nuevos ítems
-            for idx, item in enumerate(items):
-                item_doc = self._add_metadata(dict(item))
-                items_ref.document(str(idx)).set(item_doc)
+            # Reemplazar ítems: borrar los antiguos y escribir los nuevos
+            ops = [('update', path, quotation_doc), ('purge', f"{path}/items", None)]
+            ops += self._document_with_items_ops(path, quotation_doc, items)[1:]
+            self._write(ops)
                 
         except Exception as e:
             print(f"[FIREBASE] Error updating quotation {quotation_id}: {e}")
@@ -557,6 +603,14 @@ class FirebaseDataAccess(DataAccess):
         """No-op para Firestore (commits automáticos)."""
         pass
     
+    def release_ncf_leases(self) -> None:
+        """Devuelve o anula los bloques de NCF no usados por esta estación."""
+        if self._ncf_allocator is not None:
+            self._ncf_allocator.release_all()
+
     def close(self) -> None:
-        """No-op para Firestore (no necesita cierre explícito)."""
-        pass
+        """Intenta vaciar la cola y libera los bloques de NCF arrendados."""
+        if self.outbox is not None and self.online:
+            self.wait_for_flush(timeout=10)
+            self.flush_outbox()
+        self.release_ncf_leases()
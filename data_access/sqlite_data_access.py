@@ -6,7 +6,7 @@ Mantiene compatibilidad total con el código existente.
 """
 
 from __future__ import annotations
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
 from .base import DataAccess
 
@@ -55,6 +55,18 @@ class SQLiteDataAccess(DataAccess):
     def get_item_by_code(self, code: str) -> Optional[Dict[str, Any]]:
         """Obtiene un ítem por código exacto."""
         return self.logic.get_item_by_code(code)
+
+    def get_items_similar(self, name: str, limit: int = 5, threshold: float = 0.3) -> List[Dict[str, Any]]:
+        """Ítems con nombre parecido (índice de trigramas), más parecidos primero."""
+        return self.logic.get_items_similar(name, limit=limit, threshold=threshold)
+
+    def get_units_for(self, codes: List[str], names: List[str]) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """Unidades por código y por nombre exactos (una consulta por tipo)."""
+        return self.logic.get_units_for(codes, names)
+
+    def get_items_version(self) -> Optional[int]:
+        """Contador de cambios del catálogo de ítems."""
+        return self.logic.get_items_version()
     
     # ===== TERCEROS (THIRD PARTIES) =====
     
@@ -176,10 +188,12 @@ class SQLiteDataAccess(DataAccess):
             # Fallback básico
             return bool(ncf and len(ncf) >= 11)
     
-    def get_facturas(self, company_id: int, only_issued: bool = True) -> List[Dict[str, Any]]:
-        """Alias de get_invoices para compatibilidad."""
+    def get_facturas(self, company_id: int, only_issued: bool = True,
+                     start_date: Optional[str] = None, end_date: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Alias de get_invoices para compatibilidad (con rango incluye años archivados)."""
         try:
-            return self.logic.get_facturas(company_id, only_issued=only_issued)
+            return self.logic.get_facturas(company_id, only_issued=only_issued,
+                                           start_date=start_date, end_date=end_date)
         except AttributeError:
             return self.get_invoices(company_id=company_id)
     
@@ -190,6 +204,10 @@ class SQLiteDataAccess(DataAccess):
         except AttributeError:
             pass
     
+    def void_invoice(self, invoice_id: int, reason: str) -> None:
+        """Anula una factura (sale del 607 y entra al 608)."""
+        self.logic.void_invoice(invoice_id, reason)
+    
     def delete_quotation(self, quotation_id: int) -> None:
         """Elimina una cotización."""
         try:
@@ -14,37 +14,14 @@ from PyQt6.QtWidgets import (
     QPushButton, QWidget, QLabel, QHeaderView, QMessageBox
 )
 from models.items_table_model import ItemsTableModel
+from services.schema_migrations import ensure_schema
 
 def get_db_path() -> str:
     return facot_config.get_db_path() or ""
 
 def ensure_items_schema(db_path: str):
-    if not db_path:
-        return
-    with sqlite3.connect(db_path) as conn:
-        conn.executescript("""
-            PRAGMA foreign_keys = ON;
-
-            CREATE TABLE IF NOT EXISTS categories (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL UNIQUE
-            );
-
-            CREATE TABLE IF NOT EXISTS items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                code TEXT NOT NULL UNIQUE,
-                name TEXT NOT NULL,
-                unit TEXT NOT NULL,
-                cost REAL NOT NULL DEFAULT 0,
-                price REAL NOT NULL DEFAULT 0,
-                category_id INTEGER,
-                description TEXT,
-                FOREIGN KEY (category_id) REFERENCES categories(id)
-            );
-
-            CREATE INDEX IF NOT EXISTS idx_items_code ON items(code);
-            CREATE INDEX IF NOT EXISTS idx_items_category ON items(category_id);
-        """)
+    """Aplica las migraciones pendientes (no-op si el esquema está al día)."""
+    ensure_schema(db_path)
 
 class DetalleItemsWidget(QWidget):
     def __init__(self, parent=None):
@@ -0,0 +1,149 @@
+"""
+Panel de salud de la base de datos.
+
+Muestra tamaño del archivo, páginas libres, modo de auto_vacuum, tamaño por
+tabla e índice (dbstat) y la última ejecución de cada tarea de
+mantenimiento; permite correr las tareas vencidas en segundo plano.
+"""
+
+from PyQt6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem,
+    QPushButton, QLabel, QGroupBox, QHeaderView, QMessageBox
+)
+from PyQt6.QtCore import Qt, QThread, pyqtSignal
+
+from services.maintenance_service import MaintenanceService, TASK_ORDER
+
+
+def _fmt_bytes(value) -> str:
+    value = float(value or 0)
+    for unit in ("B", "KB", "MB", "GB"):
+        if value < 1024 or unit == "GB":
+            return f"{value:,.0f} {unit}" if unit == "B" else f"{value:,.1f} {unit}"
+        value /= 1024
+
+
+class MaintenanceRunThread(QThread):
+    """Ejecuta las tareas de mantenimiento vencidas fuera del hilo de la UI."""
+
+    finished = pyqtSignal(list)
+
+    def __init__(self, service: MaintenanceService, force: bool = False):
+        super().__init__()
+        self.service = service
+        self.force = force
+
+    def run(self):
+        try:
+            if self.force:
+                due = self.service.due_tasks(explicit=True)
+                tasks = [t for t in TASK_ORDER if t != 'enable_incremental' or t in due]
+                self.finished.emit([self.service.run_task(t) for t in tasks])
+            else:
+                self.finished.emit(self.service.run_due(explicit=True))
+        except Exception as e:
+            self.finished.emit([{'task': 'error', 'result': str(e)}])
+
+
+class DatabaseHealthDialog(QDialog):
+    """Salud de la base: tamaños por objeto y registro de mantenimiento."""
+
+    def __init__(self, db_path: str, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Salud de la Base de Datos")
+        self.resize(760, 620)
+        self.service = MaintenanceService(db_path)
+        self._thread = None
+        self._init_ui()
+        self.refresh()
+
+    def _init_ui(self):
+        layout = QVBoxLayout(self)
+
+        self.summary_label = QLabel()
+        self.summary_label.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+        layout.addWidget(self.summary_label)
+
+        objects_group = QGroupBox("Tablas e índices")
+        objects_layout = QVBoxLayout(objects_group)
+        self.objects_table = QTableWidget(0, 5)
+        self.objects_table.setHorizontalHeaderLabels(["Nombre", "Tipo", "Tabla", "Tamaño", "Sin usar"])
+        self.objects_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.objects_table.verticalHeader().setVisible(False)
+        self.objects_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        objects_layout.addWidget(self.objects_table)
+        layout.addWidget(objects_group, 3)
+
+        tasks_group = QGroupBox("Mantenimiento")
+        tasks_layout = QVBoxLayout(tasks_group)
+        self.tasks_table = QTableWidget(0, 5)
+        self.tasks_table.setHorizontalHeaderLabels(["Tarea", "Última ejecución", "Duración", "Tamaño", "Resultado"])
+        self.tasks_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.tasks_table.verticalHeader().setVisible(False)
+        self.tasks_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        tasks_layout.addWidget(self.tasks_table)
+        layout.addWidget(tasks_group, 2)
+
+        buttons = QHBoxLayout()
+        self.btn_run = QPushButton("Ejecutar mantenimiento ahora")
+        self.btn_run.clicked.connect(self._run_maintenance)
+        btn_refresh = QPushButton("Refrescar")
+        btn_refresh.clicked.connect(self.refresh)
+        btn_close = QPushButton("Cerrar")
+        btn_close.clicked.connect(self.accept)
+        buttons.addWidget(self.btn_run)
+        buttons.addStretch()
+        buttons.addWidget(btn_refresh)
+        buttons.addWidget(btn_close)
+        layout.addLayout(buttons)
+
+    def refresh(self):
+        report = self.service.health_report()
+        page_bytes = report['page_size'] * report['page_count']
+        free_pct = (report['free_pages'] / report['page_count'] * 100) if report['page_count'] else 0
+        self.summary_label.setText(
+            f"Archivo: {_fmt_bytes(report['file_bytes'])}   |   Páginas: {report['page_count']:,} "
+            f"× {report['page_size']:,} B = {_fmt_bytes(page_bytes)}   |   Libres: {report['free_pages']:,} "
+            f"({free_pct:.1f}%)   |   auto_vacuum: {report['auto_vacuum']}"
+        )
+
+        self.objects_table.setRowCount(len(report['objects']))
+        for row, obj in enumerate(report['objects']):
+            values = [obj['name'], obj['type'], obj['table'], _fmt_bytes(obj['bytes']), _fmt_bytes(obj['unused_bytes'])]
+            for col, value in enumerate(values):
+                item = QTableWidgetItem(str(value))
+                if col >= 3:
+                    item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                self.objects_table.setItem(row, col, item)
+
+        runs = report['last_runs']
+        self.tasks_table.setRowCount(len(TASK_ORDER))
+        for row, task in enumerate(TASK_ORDER):
+            run = runs.get(task) or {}
+            values = [
+                task,
+                (run.get('started_at') or "—")[:19].replace("T", " "),
+                f"{run['duration_ms']:,} ms" if run else "",
+                f"{_fmt_bytes(run['bytes_before'])} → {_fmt_bytes(run['bytes_after'])}" if run else "",
+                run.get('result') or "",
+            ]
+            for col, value in enumerate(values):
+                self.tasks_table.setItem(row, col, QTableWidgetItem(value))
+
+    def _run_maintenance(self):
+        if self._thread is not None and self._thread.isRunning():
+            return
+        self.btn_run.setEnabled(False)
+        self.btn_run.setText("Ejecutando...")
+        self._thread = MaintenanceRunThread(self.service, force=True)
+        self._thread.finished.connect(self._on_finished)
+        self._thread.start()
+
+    def _on_finished(self, results: list):
+        self.btn_run.setEnabled(True)
+        self.btn_run.setText("Ejecutar mantenimiento ahora")
+        self.refresh()
+        errors = [r for r in results if str(r.get('result', '')).startswith("error") or r.get('task') == 'error']
+        if errors:
+            QMessageBox.warning(self, "Mantenimiento",
+                                "\n".join(f"{r['task']}: {r['result']}" for r in errors))
@@ -15,8 +15,10 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtCore import Qt, QThread, pyqtSignal
 from PyQt6.QtGui import QFont
 import os
-from typing import Dict, Any, Optional
+import shutil
+from typing import Any, Callable, Dict, Optional
 from utils.mail_utils import EmailService, EmailConfig
+from utils.mail_outbox import DEFAULT_MAX_WAIT
 
 
 class EmailSenderThread(QThread):
@@ -48,6 +50,50 @@ class EmailSenderThread(QThread):
             self.finished.emit(False, f"Error al enviar email: {str(e)}")
 
 
+class BulkEmailSenderThread(QThread):
+    """
+    Thread que encola (opcional) y vacía la cola de emails (envío masivo) sin bloquear la UI.
+
+    `prepare` corre en el hilo antes del envío (p. ej. encolar un período
+    generando los PDFs) y su resultado se emite en `queued`. Los reintentos
+    que vencen dentro de `max_wait` segundos se esperan en el hilo; lo que
+    quede pendiente lo retoma otro envío (ver `next_attempt_at` en
+    `finished`). `cleanup_dir` se registra en la cola y se borra cuando sus
+    mensajes llegan a enviado o fallido.
+    """
+    
+    queued = pyqtSignal(dict)    # resultado de prepare
+    finished = pyqtSignal(dict)  # contadores de EmailOutbox.process_until_done
+    
+    def __init__(self, logic, prepare: Optional[Callable[[], Dict[str, Any]]] = None,
+                 cleanup_dir: Optional[str] = None, max_wait: float = DEFAULT_MAX_WAIT):
+        super().__init__()
+        self.logic = logic
+        self.prepare = prepare
+        self.cleanup_dir = cleanup_dir
+        self.max_wait = max_wait
+    
+    def run(self):
+        """Encola (si hay prepare) y envía los emails pendientes de la cola."""
+        try:
+            if self.prepare is not None:
+                self.queued.emit(self.prepare())
+        except Exception as e:
+            if self.cleanup_dir:
+                shutil.rmtree(self.cleanup_dir, ignore_errors=True)
+            self.finished.emit({'sent': 0, 'retry': 0, 'failed': 0, 'error': str(e)})
+            return
+        try:
+            if self.cleanup_dir:
+                # Registrada después de encolar: otro envío en curso no la borra antes de tiempo
+                self.logic.get_email_outbox().register_temp_dir(self.cleanup_dir)
+            self.finished.emit(self.logic.send_queued_emails(
+                max_wait=self.max_wait, should_stop=self.isInterruptionRequested
+            ))
+        except Exception as e:
+            self.finished.emit({'sent': 0, 'retry': 0, 'failed': 0, 'error': str(e)})
+
+
 class EmailDialog(QDialog):
     """
     Diálogo para enviar facturas/cotizaciones por email.
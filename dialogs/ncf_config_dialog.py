@@ -7,9 +7,9 @@ con soporte para cambio de nomenclatura 2026
 from PyQt6.QtWidgets import (
     QDialog, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem,
     QPushButton, QLabel, QComboBox, QMessageBox, QGroupBox, QCheckBox,
-    QHeaderView, QWidget
+    QHeaderView, QWidget, QSpinBox, QDateEdit, QLineEdit
 )
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QDate
 from PyQt6.QtGui import QFont
 
 # Tipos de comprobantes según DGII (prefijo → nombre)
@@ -109,12 +109,45 @@ class NCFConfigDialog(QDialog):
         buttons_layout.addWidget(self.edit_btn)
         self.reset_btn = QPushButton("🔄 Resetear a Cero"); self.reset_btn.clicked.connect(self._reset_sequence)
         buttons_layout.addWidget(self.reset_btn)
+        self.integrity_btn = QPushButton("🔍 Verificar Integridad"); self.integrity_btn.clicked.connect(self._check_integrity)
+        buttons_layout.addWidget(self.integrity_btn)
         buttons_layout.addStretch()
         group1_layout.addLayout(buttons_layout)
 
         group1.setLayout(group1_layout)
         layout.addWidget(group1)
 
+        # Grupo Rangos: rangos autorizados por la DGII (se guardan al agregar/eliminar)
+        group_ranges = QGroupBox("Rangos Autorizados DGII")
+        ranges_layout = QVBoxLayout()
+        self.ranges_table = QTableWidget()
+        self.ranges_table.setColumnCount(7)
+        self.ranges_table.setHorizontalHeaderLabels(["Prefijo", "Desde", "Hasta", "Restantes", "Vence", "Autorización", "Estado"])
+        self.ranges_table.horizontalHeader().setSectionResizeMode(5, QHeaderView.ResizeMode.Stretch)
+        self.ranges_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.ranges_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        ranges_layout.addWidget(self.ranges_table)
+
+        form = QHBoxLayout()
+        self.range_prefix_combo = QComboBox(); self.range_prefix_combo.addItems(sorted(NCF_TYPES.keys()))
+        self.range_start_spin = QSpinBox(); self.range_start_spin.setRange(1, 99999999)
+        self.range_end_spin = QSpinBox(); self.range_end_spin.setRange(1, 99999999)
+        self.range_expiry_edit = QDateEdit(QDate.currentDate().addYears(1)); self.range_expiry_edit.setCalendarPopup(True)
+        self.range_expiry_edit.setDisplayFormat("yyyy-MM-dd")
+        self.range_auth_edit = QLineEdit(); self.range_auth_edit.setPlaceholderText("No. autorización")
+        for label, widget in (("Prefijo:", self.range_prefix_combo), ("Desde:", self.range_start_spin),
+                              ("Hasta:", self.range_end_spin), ("Vence:", self.range_expiry_edit)):
+            form.addWidget(QLabel(label)); form.addWidget(widget)
+        form.addWidget(self.range_auth_edit)
+        add_range_btn = QPushButton("➕ Agregar Rango"); add_range_btn.clicked.connect(self._add_range)
+        form.addWidget(add_range_btn)
+        del_range_btn = QPushButton("🗑️ Eliminar Rango"); del_range_btn.clicked.connect(self._delete_range)
+        form.addWidget(del_range_btn)
+        ranges_layout.addLayout(form)
+
+        group_ranges.setLayout(ranges_layout)
+        layout.addWidget(group_ranges)
+
         # Grupo 2: Cambio 2026 (placeholder visual)
         group2 = QGroupBox("Configuración Cambio de Nomenclatura 2026")
         group2_layout = QVBoxLayout()
@@ -220,6 +253,8 @@ class NCFConfigDialog(QDialog):
             edit_cell_btn.clicked.connect(lambda _c=False, p=prefix: self._edit_specific_sequence(p))
             self.table.setCellWidget(row, 3, edit_cell_btn)
 
+        self._populate_ranges()
+
         # Tabla 2 (placeholder de configuración 2026)
         self.table_2026.setRowCount(0)
         for prefix in sorted(NCF_TYPES.keys()):
@@ -269,6 +304,71 @@ class NCFConfigDialog(QDialog):
             self.ncf_data[prefix]['seq'] = 0
             self._populate_tables()
 
+    def _populate_ranges(self):
+        self.ranges_table.setRowCount(0)
+        if not self.current_company_id or not hasattr(self.logic, "list_ncf_ranges"):
+            return
+        try:
+            ranges = self.logic.list_ncf_ranges(int(self.current_company_id))
+        except Exception as e:
+            print(f"[NCF] Error cargando rangos: {e}"); return
+        for r in ranges:
+            row = self.ranges_table.rowCount(); self.ranges_table.insertRow(row)
+            values = [r['prefix3'], r['start_seq'], r['end_seq'], r['remaining'],
+                      r.get('expires_on') or "", r.get('authorization') or "", r['status']]
+            for col, value in enumerate(values):
+                item = QTableWidgetItem(str(value))
+                if col == 0:
+                    item.setData(Qt.ItemDataRole.UserRole, r['id'])
+                self.ranges_table.setItem(row, col, item)
+
+    def _add_range(self):
+        if not self.current_company_id:
+            QMessageBox.warning(self, "Error", "No hay empresa seleccionada"); return
+        if not hasattr(self.logic, "add_ncf_range"):
+            QMessageBox.information(self, "Rangos NCF", "El backend actual no soporta rangos autorizados."); return
+        ok, msg = self.logic.add_ncf_range(
+            int(self.current_company_id),
+            self.range_prefix_combo.currentText(),
+            self.range_start_spin.value(),
+            self.range_end_spin.value(),
+            self.range_expiry_edit.date().toString("yyyy-MM-dd"),
+            self.range_auth_edit.text().strip(),
+        )
+        if not ok:
+            QMessageBox.warning(self, "Rangos NCF", msg); return
+        self.range_auth_edit.clear()
+        self._populate_ranges()
+
+    def _delete_range(self):
+        row = self.ranges_table.currentRow()
+        item = self.ranges_table.item(row, 0) if row >= 0 else None
+        if item is None:
+            QMessageBox.warning(self, "Advertencia", "Seleccione un rango para eliminar"); return
+        reply = QMessageBox.question(
+            self, "Confirmar",
+            f"¿Eliminar el rango {item.text()} {self.ranges_table.item(row, 1).text()}-{self.ranges_table.item(row, 2).text()}?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+        )
+        if reply == QMessageBox.StandardButton.Yes:
+            self.logic.delete_ncf_range(int(item.data(Qt.ItemDataRole.UserRole)))
+            self._populate_ranges()
+
+    def _check_integrity(self):
+        """Muestra huecos, duplicados, fuera de rango y NCF mal formados de la empresa."""
+        if not self.current_company_id:
+            QMessageBox.warning(self, "Error", "No hay empresa seleccionada"); return
+        if not hasattr(self.logic, "scan_ncf_integrity"):
+            QMessageBox.information(self, "Integridad NCF", "El backend actual no soporta la verificación."); return
+        from services.ncf_integrity_service import NCFIntegrityService
+        try:
+            result = self.logic.scan_ncf_integrity(int(self.current_company_id))
+            report = NCFIntegrityService.format_report(result) or "Sin NCF emitidos."
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Error verificando NCF:\n{str(e)}"); return
+        box = QMessageBox.information if result.get('ok') else QMessageBox.warning
+        box(self, f"Integridad NCF - {self.company_combo.currentText()}", report)
+
     def _save_config(self):
         if not self.current_company_id:
             QMessageBox.warning(self, "Error", "No hay empresa seleccionada"); return
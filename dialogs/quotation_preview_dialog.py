@@ -219,7 +219,8 @@ def _ensure_units(invoice: Dict[str, Any], logic_controller=None) -> None:
         if logic_controller:
             try:
                 from services import UnitResolver
-                resolver = UnitResolver(logic_controller)
+                # El del controlador conserva su caché entre vistas previas
+                resolver = getattr(logic_controller, "unit_resolver", None) or UnitResolver(logic_controller)
                 resolver.resolve_items(items)
                 return
             except Exception as e:
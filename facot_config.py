@@ -32,20 +32,19 @@ except Exception:
             dst.touch()
         return str(dst)
 
+from utils.config_store import get_store
+
 CONFIG_FILE = "facot_config.json"
 
+def get_config_store():
+    """Almacén compartido de facot_config.json (caché + escritura atómica diferida)."""
+    return get_store(CONFIG_FILE)
+
 def load_config():
-    if os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError:
-                return {}
-    return {}
+    return get_config_store().snapshot()
 
 def save_config(data):
-    with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    get_config_store().replace(data)
 
 _DB_PATH: Optional[str] = None
 
@@ -88,66 +87,58 @@ def get_db_path() -> str:
     return _DB_PATH
 
 def set_db_path(path):
-    config = load_config()
-    config["db_path"] = path
-    save_config(config)
+    get_config_store().set("db_path", path)
+
+def _on_config_changed(changed, _data):
+    # Si otra parte de la app (o config_facot) cambia db_path, no servir la ruta vieja
+    global _DB_PATH
+    if "db_path" in changed:
+        _DB_PATH = None
 
 # --- RUTA DE PLANTILLA DE FACTURA ---
 def get_template_path():
-    config = load_config()
-    return config.get("template_path", "")
+    return get_config_store().get("template_path", "")
 
 def set_template_path(path):
-    config = load_config()
-    config["template_path"] = path
-    save_config(config)
+    get_config_store().set("template_path", path)
 
 # --- CARPETA DE SALIDA DE FACTURAS Y COTIZACIONES ---
 def get_output_folder():
-    config = load_config()
-    return config.get("output_folder", "")
+    return get_config_store().get("output_folder", "")
 
 def set_output_folder(path):
-    config = load_config()
-    config["output_folder"] = path
-    save_config(config)
+    get_config_store().set("output_folder", path)
 
 # --- EMPRESA ACTIVA ---
 def get_empresa_activa():
-    config = load_config()
-    return config.get("empresa_activa", "")
+    return get_config_store().get("empresa_activa", "")
 
 def set_empresa_activa(company_id):
-    config = load_config()
-    config["empresa_activa"] = company_id
-    save_config(config)
+    get_config_store().set("empresa_activa", company_id)
 
 # --- CONFIGURACIÓN POR EMPRESA ---
 def get_empresa_config(company_id):
-    config = load_config()
-    empresas = config.get("empresas", {})
+    empresas = get_config_store().get("empresas", {})
     return empresas.get(str(company_id), {})
 
 def set_empresa_config(company_id, empresa_cfg):
-    config = load_config()
-    if "empresas" not in config:
-        config["empresas"] = {}
-    config["empresas"][str(company_id)] = empresa_cfg
-    save_config(config)
+    store = get_config_store()
+    empresas = store.get("empresas", {})
+    empresas[str(company_id)] = empresa_cfg
+    store.set("empresas", empresas)
 
 # --- CARPETA DE DESCARGAS/ORIGEN ---
 def get_downloads_folder_path():
-    config = load_config()
     empresa_id = get_empresa_activa()
     empresa_cfg = get_empresa_config(empresa_id)
     # Prioridad: empresa > global
-    return empresa_cfg.get("carpeta_origen") or config.get("downloads_folder_path", "")
+    return empresa_cfg.get("carpeta_origen") or get_config_store().get("downloads_folder_path", "")
 
 def set_downloads_folder_path(path):
-    config = load_config()
     empresa_id = get_empresa_activa()
     empresa_cfg = get_empresa_config(empresa_id)
     empresa_cfg["carpeta_origen"] = path
-    config["downloads_folder_path"] = path
     set_empresa_config(empresa_id, empresa_cfg)
-    save_config(config)
\ No newline at end of file
+    get_config_store().set("downloads_folder_path", path)
+
+get_config_store().subscribe(_on_config_changed)
@@ -0,0 +1,371 @@
+"""
+Firestore local en memoria para pruebas y benchmarks.
+
+Implementa el subconjunto de la API de google-cloud-firestore que usa FACOT
+(colecciones, subcolecciones, collection_group, where / order_by / limit /
+offset, transacciones, batches y get_all), sin red ni credenciales.
+
+Las transacciones son optimistas: cada lectura registra la versión del
+documento y al confirmar se aborta y reintenta si alguno cambió, igual que
+el cliente real ante contención. `stats` cuenta lecturas, escrituras,
+confirmaciones, reintentos y round-trips (`rpcs`); `latency` simula la
+latencia de red por RPC.
+
+Uso:
+    db = FakeFirestore(latency=0.002)
+
+    @db.transactional
+    def incrementar(transaction, ref):
+        snap = ref.get(transaction=transaction)
+        transaction.set(ref, {'current': (snap.get('current') or 0) + 1})
+
+    incrementar(db.transaction(), db.collection('sequences').document('x'))
+"""
+from __future__ import annotations
+
+import copy
+import random
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class FakeTransactionAborted(Exception):
+    """La transacción leyó documentos que cambiaron antes de confirmarse."""
+
+
+class FakeDocumentSnapshot:
+    """Instantánea inmutable de un documento."""
+
+    def __init__(self, reference: 'FakeDocumentReference', data: Optional[Dict[str, Any]]):
+        self.reference = reference
+        self.id = reference.id
+        self._data = copy.deepcopy(data) if data is not None else None
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field: str) -> Any:
+        return (self._data or {}).get(field)
+
+
+class FakeDocumentReference:
+    """Referencia a `coleccion/doc[/subcoleccion/doc...]`."""
+
+    def __init__(self, db: 'FakeFirestore', path: str):
+        self._db = db
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+
+    @property
+    def parent(self) -> 'FakeCollectionReference':
+        return FakeCollectionReference(self._db, self.path.rsplit('/', 1)[0])
+
+    def collection(self, name: str) -> 'FakeCollectionReference':
+        return FakeCollectionReference(self._db, f"{self.path}/{name}")
+
+    def get(self, transaction: Optional['FakeTransaction'] = None) -> FakeDocumentSnapshot:
+        self._db._rpc()
+        with self._db._lock:
+            data, version = self._db._docs.get(self.path, (None, 0))
+            self._db.stats['reads'] += 1
+            snap = FakeDocumentSnapshot(self, data)
+        if transaction is not None:
+            transaction._record_read(self.path, version)
+        return snap
+
+    def set(self, data: Dict[str, Any], merge: bool = False) -> None:
+        self._db._rpc()
+        self._db._apply([('set', self.path, data, merge)])
+
+    def update(self, data: Dict[str, Any]) -> None:
+        self._db._rpc()
+        self._db._apply([('update', self.path, data, False)])
+
+    def delete(self) -> None:
+        self._db._rpc()
+        self._db._apply([('delete', self.path, None, False)])
+
+
+_MISSING = object()
+
+
+def _field_value(data: Dict[str, Any], field: str) -> Any:
+    """Lee un campo con notación de puntos ('a.b')."""
+    value: Any = data
+    for part in field.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _matches(value: Any, op: str, target: Any) -> bool:
+    if value is _MISSING:
+        # Firestore nunca devuelve documentos sin el campo filtrado
+        return False
+    try:
+        if op == '==':
+            return value == target
+        if op == '!=':
+            return value != target
+        if op == '<':
+            return value < target
+        if op == '<=':
+            return value <= target
+        if op == '>':
+            return value > target
+        if op == '>=':
+            return value >= target
+        if op == 'in':
+            return value in target
+        if op == 'not-in':
+            return value not in target
+        if op == 'array_contains':
+            return isinstance(value, list) and target in value
+        if op == 'array_contains_any':
+            return isinstance(value, list) and any(t in value for t in target)
+    except TypeError:
+        # Firestore no compara tipos distintos: el documento no coincide
+        return False
+    raise ValueError(f"Operador no soportado: {op}")
+
+
+class FakeQuery:
+    """Consulta con where / order_by / limit / offset, evaluada en memoria."""
+
+    ASCENDING = 'ASCENDING'
+    DESCENDING = 'DESCENDING'
+
+    def __init__(self, db: 'FakeFirestore', parent_match: Callable[[str], bool],
+                 filters=(), orders=(), limit_n: Optional[int] = None, offset_n: int = 0):
+        self._db = db
+        self._parent_match = parent_match
+        self._filters: List[Tuple[str, str, Any]] = list(filters)
+        self._orders: List[Tuple[str, str]] = list(orders)
+        self._limit = limit_n
+        self._offset = offset_n
+
+    def _copy(self, **changes) -> 'FakeQuery':
+        args = {
+            'filters': self._filters, 'orders': self._orders,
+            'limit_n': self._limit, 'offset_n': self._offset,
+        }
+        args.update(changes)
+        return FakeQuery(self._db, self._parent_match, **args)
+
+    def where(self, field_path: Optional[str] = None, op_string: Optional[str] = None,
+              value: Any = None, filter: Any = None) -> 'FakeQuery':
+        if filter is not None:  # FieldFilter(field_path, op_string, value)
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + [(field_path, op_string, value)])
+
+    def order_by(self, field_path: str, direction: str = ASCENDING) -> 'FakeQuery':
+        return self._copy(orders=self._orders + [(field_path, direction)])
+
+    def limit(self, count: int) -> 'FakeQuery':
+        return self._copy(limit_n=int(count))
+
+    def offset(self, num_to_skip: int) -> 'FakeQuery':
+        return self._copy(offset_n=int(num_to_skip))
+
+    def _run(self) -> List[Tuple[str, Dict[str, Any], int]]:
+        with self._db._lock:
+            rows = [
+                (path, data, version) for path, (data, version) in self._db._docs.items()
+                if data is not None and self._parent_match(path.rsplit('/', 1)[0])
+            ]
+        rows.sort(key=lambda r: r[0])
+        for field, op, target in self._filters:
+            rows = [r for r in rows if _matches(_field_value(r[1], field), op, target)]
+        # Como en Firestore, ordenar por un campo excluye docs que no lo tienen
+        for field, direction in reversed(self._orders):
+            rows = [r for r in rows if _field_value(r[1], field) is not _MISSING]
+            rows.sort(key=lambda r: _field_value(r[1], field), reverse=(direction == self.DESCENDING))
+        rows = rows[self._offset:]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        return rows
+
+    def stream(self, transaction: Optional['FakeTransaction'] = None):
+        self._db._rpc()
+        rows = self._run()
+        with self._db._lock:
+            # Firestore cobra también los documentos saltados por offset
+            self._db.stats['reads'] += len(rows) + self._offset
+        for path, data, version in rows:
+            if transaction is not None:
+                transaction._record_read(path, version)
+            yield FakeDocumentSnapshot(FakeDocumentReference(self._db, path), data)
+
+    def get(self, transaction: Optional['FakeTransaction'] = None) -> List[FakeDocumentSnapshot]:
+        return list(self.stream(transaction=transaction))
+
+
+class FakeCollectionReference(FakeQuery):
+    """Referencia a una colección o subcolección."""
+
+    def __init__(self, db: 'FakeFirestore', path: str):
+        super().__init__(db, lambda parent: parent == path)
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+
+    @property
+    def parent(self) -> Optional[FakeDocumentReference]:
+        if '/' not in self.path:
+            return None
+        return FakeDocumentReference(self._db, self.path.rsplit('/', 1)[0])
+
+    def document(self, doc_id: Optional[str] = None) -> FakeDocumentReference:
+        return FakeDocumentReference(self._db, f"{self.path}/{doc_id or uuid.uuid4().hex[:20]}")
+
+    def add(self, data: Dict[str, Any]) -> Tuple[float, FakeDocumentReference]:
+        ref = self.document()
+        ref.set(data)
+        return time.time(), ref
+
+
+class FakeWriteBatch:
+    """Escrituras agrupadas que se aplican atómicamente en `commit()`."""
+
+    def __init__(self, db: 'FakeFirestore'):
+        self._db = db
+        self._ops: List[Tuple[str, str, Any, bool]] = []
+
+    def set(self, ref: FakeDocumentReference, data: Dict[str, Any], merge: bool = False) -> None:
+        self._ops.append(('set', ref.path, data, merge))
+
+    def update(self, ref: FakeDocumentReference, data: Dict[str, Any]) -> None:
+        self._ops.append(('update', ref.path, data, False))
+
+    def delete(self, ref: FakeDocumentReference) -> None:
+        self._ops.append(('delete', ref.path, None, False))
+
+    def commit(self) -> None:
+        self._db._rpc()
+        self._db._apply(self._ops)
+        self._ops = []
+
+
+class FakeTransaction(FakeWriteBatch):
+    """Transacción optimista: valida versiones leídas al confirmar."""
+
+    def __init__(self, db: 'FakeFirestore', max_attempts: int = 5):
+        super().__init__(db)
+        self.max_attempts = max_attempts
+        self._reads: Dict[str, int] = {}
+
+    def _begin(self) -> None:
+        self._ops = []
+        self._reads = {}
+
+    def _record_read(self, path: str, version: int) -> None:
+        self._reads.setdefault(path, version)
+
+    def _commit(self) -> None:
+        self._db._rpc()
+        self._db._apply(self._ops, expected=self._reads)
+        self._ops = []
+
+
+class FakeFirestore:
+    """Base de datos Firestore en memoria, segura entre hilos."""
+
+    def __init__(self, latency: float = 0.0):
+        """
+        Args:
+            latency: Segundos de espera simulados por cada RPC
+        """
+        self.latency = latency
+        self._lock = threading.RLock()
+        # path → (datos o None si se borró, versión)
+        self._docs: Dict[str, Tuple[Optional[Dict[str, Any]], int]] = {}
+        self.stats: Dict[str, int] = {}
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self.stats = {
+            'rpcs': 0, 'reads': 0, 'writes': 0, 'commits': 0,
+            'transactions': 0, 'transaction_retries': 0,
+        }
+
+    def _rpc(self) -> None:
+        with self._lock:
+            self.stats['rpcs'] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _apply(self, ops, expected: Optional[Dict[str, int]] = None) -> None:
+        with self._lock:
+            if expected:
+                for path, version in expected.items():
+                    if self._docs.get(path, (None, 0))[1] != version:
+                        raise FakeTransactionAborted(path)
+            for kind, path, data, merge in ops:
+                current, version = self._docs.get(path, (None, 0))
+                if kind == 'delete':
+                    # Se conserva la versión para que las lecturas previas detecten el borrado
+                    self._docs[path] = (None, version + 1)
+                    self.stats['writes'] += 1
+                    continue
+                if kind == 'update' and current is None:
+                    raise KeyError(f"No existe el documento: {path}")
+                if kind == 'set' and not merge:
+                    new = copy.deepcopy(data)
+                else:
+                    new = copy.deepcopy(current or {})
+                    new.update(copy.deepcopy(data))
+                self._docs[path] = (new, version + 1)
+                self.stats['writes'] += 1
+            self.stats['commits'] += 1
+
+    # --- API pública ---
+    def collection(self, name: str) -> FakeCollectionReference:
+        return FakeCollectionReference(self, name)
+
+    def document(self, path: str) -> FakeDocumentReference:
+        return FakeDocumentReference(self, path)
+
+    def collection_group(self, collection_id: str) -> FakeQuery:
+        """Consulta sobre todas las colecciones/subcolecciones con ese nombre."""
+        return FakeQuery(self, lambda parent: parent.rsplit('/', 1)[-1] == collection_id)
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch(self)
+
+    def transaction(self, max_attempts: int = 5) -> FakeTransaction:
+        return FakeTransaction(self, max_attempts=max_attempts)
+
+    def get_all(self, refs) -> List[FakeDocumentSnapshot]:
+        self._rpc()
+        with self._lock:
+            snaps = [FakeDocumentSnapshot(r, self._docs.get(r.path, (None, 0))[0]) for r in refs]
+            self.stats['reads'] += len(snaps)
+        return snaps
+
+    def transactional(self, func: Callable) -> Callable:
+        """Equivalente a `google.cloud.firestore.transactional` para este cliente."""
+        def wrapper(transaction: FakeTransaction, *args, **kwargs):
+            attempts = 0
+            while True:
+                attempts += 1
+                transaction._begin()
+                with self._lock:
+                    self.stats['transactions'] += 1
+                result = func(transaction, *args, **kwargs)
+                try:
+                    transaction._commit()
+                    return result
+                except FakeTransactionAborted:
+                    with self._lock:
+                        self.stats['transaction_retries'] += 1
+                    if attempts >= transaction.max_attempts:
+                        raise
+                    # Backoff aleatorio como el cliente real
+                    time.sleep(random.uniform(0, self.latency * attempts))
+        return wrapper
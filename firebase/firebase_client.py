@@ -8,21 +8,40 @@ Uso:
     db = client.get_firestore()
     storage = client.get_storage()
     auth = client.get_auth()
+
+La inicialización (importar el SDK, leer credenciales, abrir Firestore)
+corre en un hilo de fondo. Para no bloquear el arranque:
+
+    client = get_firebase_client(wait=False)
+    client.add_ready_callback(lambda ok: ...)   # o client.ready_future
 """
 
 from __future__ import annotations
 import os
 import json
-from typing import Optional, Dict, Any
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Optional, Dict, Any, Callable
 
-# Firebase Admin SDK
-try:
-    import firebase_admin
-    from firebase_admin import credentials, firestore, storage, auth
-    FIREBASE_AVAILABLE = True
-except ImportError:
-    FIREBASE_AVAILABLE = False
-    print("[FIREBASE] Firebase Admin SDK no disponible. Instalar con: pip install firebase-admin")
+# Firebase Admin SDK: se importa al crear el cliente (arrastra grpc y
+# google-cloud, que cuestan segundos en el arranque del ejecutable)
+firebase_admin = None
+credentials = firestore = storage = auth = None
+FIREBASE_AVAILABLE: Optional[bool] = None
+
+
+def _load_sdk() -> bool:
+    """Importa firebase_admin la primera vez que se necesita."""
+    global firebase_admin, credentials, firestore, storage, auth, FIREBASE_AVAILABLE
+    if FIREBASE_AVAILABLE is None:
+        try:
+            import firebase_admin
+            from firebase_admin import credentials, firestore, storage, auth
+            FIREBASE_AVAILABLE = True
+        except ImportError:
+            FIREBASE_AVAILABLE = False
+            print("[FIREBASE] Firebase Admin SDK no disponible. Instalar con: pip install firebase-admin")
+    return FIREBASE_AVAILABLE
 
 
 class FirebaseClient:
@@ -39,18 +58,77 @@ class FirebaseClient:
     
     _instance: Optional[FirebaseClient] = None
     _initialized: bool = False
+    _ready: Optional[Future] = None
+    _start_lock = threading.Lock()
     
-    def __new__(cls):
+    def __new__(cls, wait: bool = True):
         """Singleton pattern - una sola instancia del cliente."""
         if cls._instance is None:
             cls._instance = super().__new__(cls)
         return cls._instance
     
-    def __init__(self):
-        """Inicializa Firebase si no está ya inicializado."""
-        if not self._initialized and FIREBASE_AVAILABLE:
-            self._initialize_firebase()
-            FirebaseClient._initialized = True
+    def __init__(self, wait: bool = True):
+        """
+        Lanza la inicialización en segundo plano (una sola vez).
+
+        Args:
+            wait: Esperar a que termine (comportamiento clásico). Con False
+                retorna de inmediato; usar ready_future / add_ready_callback.
+        """
+        self.start()
+        if wait:
+            self.wait_until_ready()
+
+    # ----- Inicialización en segundo plano -----
+
+    def start(self) -> Future:
+        """Inicia la inicialización en un hilo de fondo si no se ha iniciado."""
+        with FirebaseClient._start_lock:
+            if FirebaseClient._ready is None:
+                FirebaseClient._ready = Future()
+                threading.Thread(target=self._init_worker, name="firebase-init", daemon=True).start()
+        return FirebaseClient._ready
+
+    def _init_worker(self) -> None:
+        future = FirebaseClient._ready
+        try:
+            if _load_sdk():
+                self._initialize_firebase()
+                FirebaseClient._initialized = True
+            available = self._app_exists()
+            if available:
+                # Abrir el cliente Firestore aquí: firebase_admin lo cachea
+                # por app, así la primera consulta de la UI no lo construye
+                firestore.client()
+            future.set_result(available)
+        except Exception as e:
+            print(f"[FIREBASE] ✗ Error en inicialización de fondo: {e}")
+            future.set_result(False)
+
+    @property
+    def ready_future(self) -> Future:
+        """Future que resuelve a True si Firebase quedó disponible, False si no."""
+        return self.start()
+
+    def is_ready(self) -> bool:
+        """True cuando la inicialización terminó (con o sin éxito)."""
+        return self.ready_future.done()
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Espera la inicialización. Retorna disponibilidad (False si vence el plazo)."""
+        try:
+            return bool(self.ready_future.result(timeout))
+        except FutureTimeoutError:
+            return False
+
+    def add_ready_callback(self, callback: Callable[[bool], None]) -> None:
+        """
+        Llama `callback(disponible)` al terminar la inicialización.
+
+        Corre en el hilo de inicialización (o en el actual si ya terminó);
+        desde Qt, reenviar con una señal al hilo de la UI.
+        """
+        self.ready_future.add_done_callback(lambda f: callback(bool(f.result())))
     
     def _initialize_firebase(self):
         """
@@ -139,8 +217,19 @@ class FirebaseClient:
             return "facot-app.appspot.com"
     
     def is_available(self) -> bool:
-        """Verifica si Firebase está disponible y correctamente inicializado."""
-        if not FIREBASE_AVAILABLE:
+        """
+        Verifica si Firebase está disponible y correctamente inicializado.
+
+        No bloquea: mientras la inicialización de fondo está en curso
+        retorna False.
+        """
+        ready = FirebaseClient._ready
+        if ready is not None and not ready.done():
+            return False
+        return self._app_exists()
+
+    def _app_exists(self) -> bool:
+        if not _load_sdk():
             return False
         
         try:
@@ -217,14 +306,20 @@ class FirebaseClient:
 _firebase_client = None
 
 
-def get_firebase_client() -> FirebaseClient:
+def get_firebase_client(wait: bool = True) -> FirebaseClient:
     """
     Obtiene la instancia global del FirebaseClient.
     
+    Args:
+        wait: Esperar a que termine la inicialización. El arranque de la
+            UI usa False para no depender de la autenticación ni del DNS.
+    
     Returns:
         FirebaseClient instance
     """
     global _firebase_client
     if _firebase_client is None:
-        _firebase_client = FirebaseClient()
+        _firebase_client = FirebaseClient(wait=False)
+    if wait:
+        _firebase_client.wait_until_ready()
     return _firebase_client
@@ -0,0 +1,220 @@
+"""
+Asignación de NCF en Firestore mediante arrendamiento (lease) de bloques.
+
+Con una transacción por NCF todas las estaciones compiten por el mismo
+documento `sequences/{company_id}_ncf_{prefijo}` y Firestore reintenta las
+transacciones en conflicto. Con este asignador cada estación reserva, en una
+sola transacción, un bloque de N secuencias y las entrega localmente sin
+volver a tocar el documento compartido hasta agotar el bloque.
+
+Cada bloque queda registrado en `ncf_leases/{lease_id}` para auditoría. Al
+cerrar, los números no usados se devuelven a la secuencia si nadie reservó
+después (la cabeza sigue en el final del bloque); de lo contrario el rango
+se marca como anulado (`void`) para reportarlo.
+"""
+from __future__ import annotations
+
+import socket
+import threading
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+SEQUENCES_COLLECTION = 'sequences'
+LEASES_COLLECTION = 'ncf_leases'
+DEFAULT_BLOCK_SIZE = 50
+# Las reservas son poco frecuentes; se toleran más reintentos que el default (5)
+CLAIM_MAX_ATTEMPTS = 20
+
+
+def pad_len_for_prefix(prefix3: str) -> int:
+    """e-CF (E) usa 11 dígitos de secuencia; el resto 8."""
+    return 11 if prefix3[:1].upper() == 'E' else 8
+
+
+def format_ncf(prefix3: str, seq: int) -> str:
+    """Formatea un NCF: prefijo de 3 caracteres + secuencia con ceros."""
+    return f"{prefix3.upper()}{seq:0{pad_len_for_prefix(prefix3)}d}"
+
+
+@dataclass
+class NCFLease:
+    """Bloque de secuencias reservado por esta estación."""
+    lease_id: str
+    company_id: int
+    prefix3: str
+    start: int
+    end: int
+    next_seq: int
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.end - self.next_seq + 1)
+
+
+class NCFLeaseAllocator:
+    """Entrega NCF desde bloques arrendados, seguro entre hilos."""
+
+    def __init__(
+        self,
+        db,
+        station_id: Optional[str] = None,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        transactional: Optional[Callable] = None
+    ):
+        """
+        Args:
+            db: Cliente Firestore (real o FakeFirestore)
+            station_id: Identificador de la estación (default: hostname)
+            block_size: Secuencias reservadas por transacción
+            transactional: Decorador de transacciones (default: el del cliente)
+        """
+        if block_size < 1:
+            raise ValueError("block_size debe ser mayor que 0")
+        self.db = db
+        self.station_id = station_id or socket.gethostname()
+        self.block_size = int(block_size)
+        self._transactional = transactional
+        self._leases: Dict[Tuple[int, str], NCFLease] = {}
+        self._lock = threading.Lock()
+
+    def _get_transactional(self) -> Callable:
+        if self._transactional is None:
+            fn = getattr(self.db, 'transactional', None)
+            if callable(fn):
+                self._transactional = fn
+            else:
+                from google.cloud import firestore
+                self._transactional = firestore.transactional
+        return self._transactional
+
+    def _head_ref(self, company_id: int, prefix3: str):
+        return self.db.collection(SEQUENCES_COLLECTION).document(f"{company_id}_ncf_{prefix3}")
+
+    # -------------------------
+    # Asignación
+    # -------------------------
+    def next_ncf(self, company_id: int, prefix3: str) -> str:
+        """Devuelve el siguiente NCF, reservando un bloque nuevo si hace falta."""
+        prefix3 = (prefix3 or 'B01').upper()
+        key = (int(company_id), prefix3)
+        with self._lock:
+            lease = self._leases.get(key)
+            if lease is None or lease.remaining == 0:
+                if lease is not None:
+                    self._finish_lease(lease, 'consumed')
+                lease = self._claim_block(int(company_id), prefix3)
+                self._leases[key] = lease
+            seq = lease.next_seq
+            lease.next_seq += 1
+        return format_ncf(prefix3, seq)
+
+    def remaining(self, company_id: int, prefix3: str) -> int:
+        """Números disponibles localmente en el bloque actual."""
+        lease = self._leases.get((int(company_id), (prefix3 or 'B01').upper()))
+        return lease.remaining if lease else 0
+
+    def _claim_block(self, company_id: int, prefix3: str) -> NCFLease:
+        head_ref = self._head_ref(company_id, prefix3)
+        lease_id = uuid.uuid4().hex
+        lease_ref = self.db.collection(LEASES_COLLECTION).document(lease_id)
+        max_seq = 10 ** pad_len_for_prefix(prefix3) - 1
+        size = self.block_size
+
+        @self._get_transactional()
+        def claim(transaction):
+            snap = head_ref.get(transaction=transaction)
+            current = int((snap.get('current') if snap.exists else 0) or 0)
+            if current >= max_seq:
+                raise ValueError(f"Secuencia NCF agotada para {prefix3}")
+            end = min(current + size, max_seq)
+            now = datetime.utcnow().isoformat()
+            transaction.set(head_ref, {
+                'current': end,
+                'updated_at': now,
+                'updated_by': self.station_id,
+            })
+            transaction.set(lease_ref, {
+                'company_id': company_id,
+                'prefix3': prefix3,
+                'start': current + 1,
+                'end': end,
+                'station_id': self.station_id,
+                'status': 'active',
+                'claimed_at': now,
+            })
+            return current + 1, end
+
+        start, end = claim(self.db.transaction(max_attempts=CLAIM_MAX_ATTEMPTS))
+        print(f"[NCF_LEASE] {self.station_id} reservó {prefix3} {start}-{end} (empresa {company_id})")
+        return NCFLease(lease_id, company_id, prefix3, start, end, start)
+
+    # -------------------------
+    # Liberación
+    # -------------------------
+    def release_all(self) -> List[Dict[str, object]]:
+        """
+        Devuelve o anula los rangos no usados de todos los bloques activos.
+
+        Returns:
+            Lista con el resultado por bloque: lease_id, status, from, to
+        """
+        with self._lock:
+            leases = list(self._leases.values())
+            self._leases.clear()
+        results = []
+        for lease in leases:
+            try:
+                results.append(self._release(lease))
+            except Exception as e:
+                print(f"[NCF_LEASE] Error liberando bloque {lease.lease_id}: {e}")
+        return results
+
+    def _release(self, lease: NCFLease) -> Dict[str, object]:
+        if lease.remaining == 0:
+            self._finish_lease(lease, 'consumed')
+            return {'lease_id': lease.lease_id, 'status': 'consumed', 'from': None, 'to': None}
+
+        head_ref = self._head_ref(lease.company_id, lease.prefix3)
+        lease_ref = self.db.collection(LEASES_COLLECTION).document(lease.lease_id)
+        unused_from, unused_to = lease.next_seq, lease.end
+
+        @self._get_transactional()
+        def release(transaction):
+            snap = head_ref.get(transaction=transaction)
+            current = int((snap.get('current') if snap.exists else 0) or 0)
+            now = datetime.utcnow().isoformat()
+            if current == lease.end:
+                # Nadie reservó después: la secuencia retrocede al último usado
+                transaction.set(head_ref, {
+                    'current': unused_from - 1,
+                    'updated_at': now,
+                    'updated_by': self.station_id,
+                })
+                status = 'returned'
+            else:
+                status = 'void'
+            transaction.update(lease_ref, {
+                'status': status,
+                'used_until': unused_from - 1,
+                'unused_from': unused_from,
+                'unused_to': unused_to,
+                'released_at': now,
+            })
+            return status
+
+        status = release(self.db.transaction(max_attempts=CLAIM_MAX_ATTEMPTS))
+        print(f"[NCF_LEASE] Bloque {lease.prefix3} {unused_from}-{unused_to}: {status}")
+        return {'lease_id': lease.lease_id, 'status': status, 'from': unused_from, 'to': unused_to}
+
+    def _finish_lease(self, lease: NCFLease, status: str) -> None:
+        try:
+            self.db.collection(LEASES_COLLECTION).document(lease.lease_id).update({
+                'status': status,
+                'used_until': lease.end,
+                'released_at': datetime.utcnow().isoformat(),
+            })
+        except Exception as e:
+            print(f"[NCF_LEASE] No se pudo cerrar bloque {lease.lease_id}: {e}")
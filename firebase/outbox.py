@@ -0,0 +1,431 @@
+"""
+Cola de escrituras local (outbox) para el modo Firebase.
+
+Las escrituras se guardan primero en la tabla SQLite `firebase_outbox`, lo
+que es instantáneo con o sin conexión, y se envían después a Firestore en
+orden de llegada, agrupadas en batches.
+
+- Cada operación tiene una clave de idempotencia única: volver a encolar la
+  misma escritura no la duplica.
+- Dentro de cada tramo las operaciones sobre un mismo documento se
+  compactan (la última gana; `update` se fusiona sobre un `set` previo).
+- Cada tramo escribe además un marcador `outbox_markers/{clave de la primera
+  fila}`; si la app se cierra tras confirmar en Firestore pero antes de
+  marcar las filas como enviadas, el siguiente envío detecta el marcador y
+  no repite el tramo. Si al compactar (o al expandir un 'purge') el tramo
+  pasa del límite de Firestore se parte en varios batches y el marcador va
+  en el último; repetir un tramo a medias es inocuo porque queda una sola
+  operación por documento.
+- Un error de red deja la cola como está para el siguiente intento. Si el
+  error es de la operación (p. ej. `update` de un documento que no existe),
+  las filas del tramo se reenvían de a una para aislar la culpable, y tras
+  MAX_ATTEMPTS intentos fallidos pasa a `firebase_outbox_dead` (dead letter)
+  para no bloquear el resto de la cola.
+
+Operaciones soportadas: 'set', 'update', 'delete' y 'purge' (borra todos
+los documentos de una subcolección, p. ej. los ítems de una factura).
+
+Mientras una escritura no se envía, las lecturas la ven igual: `pending_ops`
+devuelve lo encolado bajo una ruta y `PendingOverlay` lo superpone a lo
+leído de Firestore (una factura guardada sin conexión sigue en el historial).
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+
+MARKERS_COLLECTION = 'outbox_markers'
+# Límite de batch de Firestore es 500; se reserva espacio para el marcador
+FLUSH_CHUNK = 449
+# Intentos con error de la operación antes de pasarla al dead letter
+MAX_ATTEMPTS = 5
+
+# Errores de google.api_core que indican un problema de red o de servicio, no de la operación
+_TRANSIENT_ERRORS = frozenset({
+    'ServiceUnavailable', 'DeadlineExceeded', 'InternalServerError', 'GatewayTimeout',
+    'TooManyRequests', 'ResourceExhausted', 'Aborted', 'RetryError',
+})
+
+VALID_OPS = ('set', 'update', 'delete', 'purge')
+
+# (operación, ruta, datos)
+OutboxOp = Tuple[str, str, Optional[Dict[str, Any]]]
+
+
+def _doc_ref(db, path: str):
+    """Convierte 'col/doc/sub/doc' en una referencia de documento."""
+    parts = path.split('/')
+    ref = db.collection(parts[0]).document(parts[1])
+    for i in range(2, len(parts), 2):
+        ref = ref.collection(parts[i]).document(parts[i + 1])
+    return ref
+
+
+def _collection_ref(db, path: str):
+    """Convierte 'col/doc/sub' en una referencia de colección."""
+    parts = path.split('/')
+    ref = db.collection(parts[0])
+    for i in range(1, len(parts), 2):
+        ref = ref.document(parts[i]).collection(parts[i + 1])
+    return ref
+
+
+def coalesce_ops(db, ops: Iterable[OutboxOp]) -> List[OutboxOp]:
+    """
+    Compacta operaciones sobre un mismo documento preservando el orden de
+    su primera aparición. Las operaciones 'purge' se expanden a borrados
+    de los documentos existentes en la subcolección.
+    """
+    merged: Dict[str, List[Any]] = {}
+    order: List[str] = []
+
+    def put(op, path, data):
+        if path not in merged:
+            order.append(path)
+            merged[path] = [op, path, data]
+            return
+        prev = merged[path]
+        if op == 'update' and prev[0] in ('set', 'update'):
+            prev[2] = {**(prev[2] or {}), **(data or {})}
+        else:
+            prev[0], prev[2] = op, data
+
+    for op, path, data in ops:
+        if op == 'purge':
+            # Documentos escritos antes en este mismo tramo (aún no enviados)
+            for pending in [p for p in order if p.startswith(f"{path}/") and p.count('/') == path.count('/') + 1]:
+                put('delete', pending, None)
+            for snap in _collection_ref(db, path).stream():
+                put('delete', f"{path}/{snap.id}", None)
+        else:
+            put(op, path, data)
+    return [tuple(merged[p]) for p in order]
+
+
+def _parent_path(path: str) -> str:
+    return path.rsplit('/', 1)[0]
+
+
+class PendingOverlay:
+    """Escrituras encoladas aún no enviadas, para superponerlas a lo leído de Firestore."""
+
+    def __init__(self, ops: Iterable[OutboxOp]):
+        """
+        Args:
+            ops: Operaciones pendientes en orden de encolado
+        """
+        # ruta → ('set' | 'update' | 'delete', datos)
+        self.docs: Dict[str, Tuple[str, Optional[Dict[str, Any]]]] = {}
+        # subcolecciones vaciadas con 'purge': sus documentos remotos ya no cuentan
+        self.purged: Set[str] = set()
+        for op, path, data in ops:
+            if op == 'purge':
+                self.purged.add(path)
+                for pending in [p for p in self.docs if _parent_path(p) == path]:
+                    self.docs[pending] = ('delete', None)
+            elif op == 'update' and self.docs.get(path, ('delete',))[0] in ('set', 'update'):
+                kind, prev = self.docs[path]
+                self.docs[path] = (kind, {**(prev or {}), **(data or {})})
+            else:
+                self.docs[path] = (op, data)
+
+    def __bool__(self) -> bool:
+        return bool(self.docs or self.purged)
+
+    def apply(self, path: str, remote: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Documento tal como quedará al enviar la cola (None = no existe)."""
+        if path not in self.docs:
+            return None if _parent_path(path) in self.purged else remote
+        kind, data = self.docs[path]
+        if kind == 'delete':
+            return None
+        if kind == 'set':
+            return dict(data or {})
+        # 'update' sobre un documento inexistente falla también en Firestore
+        return {**remote, **(data or {})} if remote is not None else None
+
+    def collection(self, path: str, remote: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """{id: datos} de la colección `path`: lo remoto más lo encolado (los nuevos al final)."""
+        ids = list(remote) + [p.rsplit('/', 1)[1] for p in self.docs
+                              if _parent_path(p) == path and p.rsplit('/', 1)[1] not in remote]
+        out = {}
+        for doc_id in ids:
+            data = self.apply(f"{path}/{doc_id}", remote.get(doc_id))
+            if data is not None:
+                out[doc_id] = data
+        return out
+
+
+def _is_transient(error: Exception) -> bool:
+    """True si el envío falló por conexión/servicio y la operación puede salir tal cual más tarde."""
+    if isinstance(error, (ConnectionError, TimeoutError, OSError)):
+        return True
+    return type(error).__name__ in _TRANSIENT_ERRORS
+
+
+def _add_to_batch(db, batch, op: str, path: str, data) -> None:
+    ref = _doc_ref(db, path)
+    if op == 'set':
+        batch.set(ref, data)
+    elif op == 'update':
+        batch.update(ref, data)
+    else:
+        batch.delete(ref)
+
+
+def write_ops(db, ops: Iterable[OutboxOp]) -> int:
+    """
+    Aplica operaciones directamente (sin outbox), compactadas y en batches
+    de hasta 450 escrituras.
+
+    Returns:
+        Número de escrituras realizadas
+    """
+    compacted = coalesce_ops(db, ops)
+    for start in range(0, len(compacted), FLUSH_CHUNK):
+        batch = db.batch()
+        for op, path, data in compacted[start:start + FLUSH_CHUNK]:
+            _add_to_batch(db, batch, op, path, data)
+        batch.commit()
+    return len(compacted)
+
+
+class FirestoreOutbox:
+    """Outbox persistente en SQLite para escrituras a Firestore."""
+
+    def __init__(self, db_path: str, max_attempts: int = MAX_ATTEMPTS):
+        """
+        Args:
+            db_path: Ruta a la base de datos SQLite donde vive la cola
+            max_attempts: Intentos con error de la operación antes del dead letter
+        """
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self._flush_lock = threading.Lock()
+        self._ensure_outbox_table()
+
+    def _ensure_outbox_table(self):
+        """Crea la tabla firebase_outbox si no existe."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS firebase_outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    idempotency_key TEXT NOT NULL UNIQUE,
+                    op TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    payload TEXT,
+                    created_at TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    sent_at TEXT
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_firebase_outbox_pending
+                ON firebase_outbox(sent_at, id)
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS firebase_outbox_dead (
+                    id INTEGER PRIMARY KEY,
+                    idempotency_key TEXT NOT NULL UNIQUE,
+                    op TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    payload TEXT,
+                    created_at TEXT NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    last_error TEXT,
+                    dead_at TEXT NOT NULL
+                )
+            """)
+            conn.commit()
+
+    # -------------------------
+    # Encolar
+    # -------------------------
+    def enqueue(self, ops: Iterable[OutboxOp], key: Optional[str] = None) -> str:
+        """
+        Encola un grupo de operaciones en una sola transacción local.
+
+        Args:
+            ops: Operaciones (op, ruta, datos) en orden de aplicación
+            key: Clave de idempotencia del grupo (default: UUID nuevo)
+
+        Returns:
+            Clave del grupo
+        """
+        key = key or uuid.uuid4().hex
+        now = datetime.now().isoformat()
+        rows = []
+        for idx, (op, path, data) in enumerate(ops):
+            if op not in VALID_OPS:
+                raise ValueError(f"Operación de outbox inválida: {op}")
+            payload = json.dumps(data, ensure_ascii=False, default=str) if data is not None else None
+            rows.append((f"{key}:{idx}", op, path, payload, now))
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany("""
+                INSERT OR IGNORE INTO firebase_outbox
+                (idempotency_key, op, path, payload, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, rows)
+            conn.commit()
+        return key
+
+    def pending_count(self) -> int:
+        """Número de operaciones aún no enviadas."""
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute("SELECT COUNT(*) FROM firebase_outbox WHERE sent_at IS NULL").fetchone()
+            return int(row[0])
+
+    def pending_ops(self, prefix: str) -> List[OutboxOp]:
+        """Operaciones no enviadas sobre `prefix` o rutas debajo de él, en orden."""
+        with sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute("""
+                SELECT op, path, payload FROM firebase_outbox
+                WHERE sent_at IS NULL AND (path = ? OR (path >= ? AND path < ?))
+                ORDER BY id
+            """, (prefix, f"{prefix}/", f"{prefix}0")).fetchall()
+        return [(op, path, json.loads(payload) if payload else None) for op, path, payload in rows]
+
+    def dead_letters(self) -> List[Dict[str, Any]]:
+        """Operaciones descartadas tras MAX_ATTEMPTS errores, con su último error."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            return [dict(r) for r in conn.execute("SELECT * FROM firebase_outbox_dead ORDER BY id")]
+
+    def retry_dead_letters(self) -> int:
+        """Vuelve a encolar las operaciones del dead letter (al final de la cola)."""
+        with sqlite3.connect(self.db_path) as conn:
+            cur = conn.execute("""
+                INSERT OR IGNORE INTO firebase_outbox (idempotency_key, op, path, payload, created_at)
+                SELECT idempotency_key, op, path, payload, created_at FROM firebase_outbox_dead ORDER BY id
+            """)
+            conn.execute("DELETE FROM firebase_outbox_dead")
+            conn.commit()
+            return cur.rowcount
+
+    def purge_sent(self) -> int:
+        """Elimina las operaciones ya enviadas."""
+        with sqlite3.connect(self.db_path) as conn:
+            cur = conn.execute("DELETE FROM firebase_outbox WHERE sent_at IS NOT NULL")
+            conn.commit()
+            return cur.rowcount
+
+    # -------------------------
+    # Enviar
+    # -------------------------
+    def flush(self, firestore_db, max_chunks: Optional[int] = None) -> Dict[str, int]:
+        """
+        Envía las operaciones pendientes en orden, un tramo a la vez.
+
+        Se detiene en el primer error de red (p. ej. sin conexión) y deja el
+        resto pendiente para el siguiente intento. Un error de la operación
+        aísla las filas del tramo (se reenvían de a una); la que sigue
+        fallando se reintenta en los próximos envíos y tras `max_attempts`
+        pasa al dead letter.
+
+        Returns:
+            Dict con contadores: sent, writes, batches, skipped, failed, dead
+        """
+        stats = {'sent': 0, 'writes': 0, 'batches': 0, 'skipped': 0, 'failed': 0, 'dead': 0}
+        if not self._flush_lock.acquire(blocking=False):
+            return stats  # Ya hay un envío en curso
+        try:
+            chunks = 0
+            isolate = 0  # filas que quedan por enviar de a una
+            while max_chunks is None or chunks < max_chunks:
+                with sqlite3.connect(self.db_path) as conn:
+                    rows = conn.execute("""
+                        SELECT id, idempotency_key, op, path, payload, attempts FROM firebase_outbox
+                        WHERE sent_at IS NULL ORDER BY id LIMIT ?
+                    """, (1 if isolate else FLUSH_CHUNK,)).fetchall()
+                if not rows:
+                    break
+                chunks += 1
+                isolate = max(isolate - 1, 0)
+                try:
+                    self._send_chunk(firestore_db, rows, stats)
+                except Exception as e:
+                    print(f"[OUTBOX] Error enviando {len(rows)} operaciones: {e}")
+                    stats['failed'] += len(rows)
+                    if _is_transient(e):
+                        self._mark_failed([r[0] for r in rows], str(e))
+                        break
+                    if len(rows) > 1:
+                        # Error de alguna operación del tramo: reenviarlas de a una
+                        self._mark_failed([r[0] for r in rows], str(e), count_attempt=False)
+                        isolate = len(rows)
+                        continue
+                    if rows[0][5] + 1 < self.max_attempts:
+                        self._mark_failed([rows[0][0]], str(e))
+                        break  # se conserva el orden hasta agotar los intentos
+                    self._move_to_dead_letter(rows[0][0], str(e))
+                    stats['dead'] += 1
+        finally:
+            self._flush_lock.release()
+        if stats['sent'] or stats['failed']:
+            print(f"[OUTBOX] Flush: {stats}")
+        return stats
+
+    def _send_chunk(self, firestore_db, rows: List[tuple], stats: Dict[str, int]) -> None:
+        """Aplica un tramo (o lo salta si su marcador ya existe) y marca sus filas como enviadas."""
+        ids = [r[0] for r in rows]
+        marker_ref = firestore_db.collection(MARKERS_COLLECTION).document(rows[0][1])
+        marker = marker_ref.get()
+        if marker.exists:
+            # Tramo ya aplicado en un intento anterior
+            ids = ids[:int(marker.get('rows') or 0)]
+            stats['skipped'] += len(ids)
+            self._mark_sent(ids)
+            return
+        ops = coalesce_ops(firestore_db, [
+            (op, path, json.loads(payload) if payload else None)
+            for _id, _key, op, path, payload, _attempts in rows
+        ])
+        # Partir después de compactar y expandir los 'purge'; el marcador va en el último batch
+        starts = list(range(0, len(ops), FLUSH_CHUNK)) or [0]
+        for start in starts:
+            batch = firestore_db.batch()
+            for op, path, data in ops[start:start + FLUSH_CHUNK]:
+                _add_to_batch(firestore_db, batch, op, path, data)
+            if start == starts[-1]:
+                batch.set(marker_ref, {
+                    'rows': len(rows),
+                    'last_key': rows[-1][1],
+                    'sent_at': datetime.utcnow().isoformat(),
+                })
+            batch.commit()
+            stats['batches'] += 1
+        stats['writes'] += len(ops)
+        stats['sent'] += len(rows)
+        self._mark_sent(ids)
+
+    def _mark_sent(self, ids: List[int]) -> None:
+        now = datetime.now().isoformat()
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany("UPDATE firebase_outbox SET sent_at = ? WHERE id = ?",
+                             [(now, i) for i in ids])
+            conn.commit()
+
+    def _mark_failed(self, ids: List[int], error: str, count_attempt: bool = True) -> None:
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany("""
+                UPDATE firebase_outbox SET attempts = attempts + ?, last_error = ? WHERE id = ?
+            """, [(int(count_attempt), error[:500], i) for i in ids])
+            conn.commit()
+
+    def _move_to_dead_letter(self, row_id: int, error: str) -> None:
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO firebase_outbox_dead
+                (id, idempotency_key, op, path, payload, created_at, attempts, last_error, dead_at)
+                SELECT id, idempotency_key, op, path, payload, created_at, attempts + 1, ?, ?
+                  FROM firebase_outbox WHERE id = ?
+            """, (error[:500], datetime.now().isoformat(), row_id))
+            conn.execute("DELETE FROM firebase_outbox WHERE id = ?", (row_id,))
+            conn.commit()
+        print(f"[OUTBOX] Operación {row_id} descartada tras {self.max_attempts} intentos: {error}")
@@ -22,6 +22,11 @@ except Exception:
     DataValidation = None
 
 import facot_config  # Ruta de BD desde la app
+from services.schema_migrations import (
+    ensure_schema,
+    slug_letters as _slug_letters,
+    backfill_category_meta as _backfill_category_meta,
+)
 
 CODE_PAD = 4  # ABC0001
 
@@ -34,87 +39,8 @@ def _column_exists(conn: sqlite3.Connection, table: str, column: str) -> bool:
     return any(row[1] == column for row in cur.fetchall())
 
 def ensure_items_schema(db_path: str):
-    if not db_path:
-        return
-    with sqlite3.connect(db_path) as conn:
-        conn.execute("PRAGMA foreign_keys = ON;")
-        # Tablas base
-        conn.executescript("""
-            CREATE TABLE IF NOT EXISTS categories (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL UNIQUE
-            );
-            CREATE TABLE IF NOT EXISTS items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                code TEXT NOT NULL UNIQUE,
-                name TEXT NOT NULL,
-                unit TEXT NOT NULL,
-                cost REAL NOT NULL DEFAULT 0,
-                price REAL NOT NULL DEFAULT 0,
-                category_id INTEGER,
-                description TEXT,
-                FOREIGN KEY (category_id) REFERENCES categories(id)
-            );
-            CREATE INDEX IF NOT EXISTS idx_items_code ON items(code);
-            CREATE INDEX IF NOT EXISTS idx_items_category ON items(category_id);
-        """)
-        # Migraciones: agregar code_prefix, next_seq, description a categories
-        if not _column_exists(conn, "categories", "code_prefix"):
-            conn.execute("ALTER TABLE categories ADD COLUMN code_prefix TEXT;")
-        if not _column_exists(conn, "categories", "next_seq"):
-            conn.execute("ALTER TABLE categories ADD COLUMN next_seq INTEGER NOT NULL DEFAULT 1;")
-        if not _column_exists(conn, "categories", "description"):
-            conn.execute("ALTER TABLE categories ADD COLUMN description TEXT;")
-        try:
-            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_categories_code_prefix ON categories(code_prefix);")
-        except Exception:
-            pass
-        _backfill_category_meta(conn)
-
-def _slug_letters(text: str, n: int = 3) -> str:
-    letters = re.findall(r"[A-Za-z]", text)
-    if not letters:
-        return "CAT"
-    return "".join(letters[:n]).upper().ljust(n, "X")
-
-def _max_seq_for_prefix(conn: sqlite3.Connection, prefix: str) -> int:
-    if not prefix:
-        return 0
-    cur = conn.execute(
-        "SELECT MAX(CAST(SUBSTR(code, ?) AS INTEGER)) FROM items WHERE code LIKE ?",
-        (len(prefix) + 1, f"{prefix}%"),
-    )
-    row = cur.fetchone()
-    try:
-        return int(row[0]) if row and row[0] is not None else 0
-    except Exception:
-        return 0
-
-def _backfill_category_meta(conn: sqlite3.Connection):
-    cur = conn.execute("SELECT id, name, code_prefix, next_seq FROM categories")
-    for cid, name, prefix, next_seq in cur.fetchall():
-        updated = False
-        if not prefix:
-            base = _slug_letters(name)
-            candidate = base
-            i = 1
-            while True:
-                row = conn.execute("SELECT id FROM categories WHERE code_prefix = ? AND id != ?", (candidate, cid)).fetchone()
-                if not row:
-                    break
-                i += 1
-                candidate = f"{base[:-1]}{i%10}"
-            prefix = candidate
-            conn.execute("UPDATE categories SET code_prefix=? WHERE id=?", (prefix, cid))
-            updated = True
-        if not next_seq or next_seq < 1:
-            next_seq = 1
-        max_seq = _max_seq_for_prefix(conn, prefix)
-        if max_seq >= next_seq:
-            conn.execute("UPDATE categories SET next_seq=? WHERE id=?", (max_seq + 1, cid))
-            updated = True
-        if updated:
-            conn.commit()
+    """Aplica las migraciones pendientes (no-op si el esquema está al día)."""
+    ensure_schema(db_path)
 
 def get_next_code(db_path: str, category_id: int) -> Optional[str]:
     if not db_path or not category_id:
@@ -627,6 +553,9 @@ class ExcelImportDialog(QDialog):
                     step += 1
                     progress.setValue(step)
 
+        # Categorías importadas sin prefijo / con secuencia atrasada
+        with sqlite3.connect(db) as conn:
+            _backfill_category_meta(conn)
         progress.setValue(total_rows)
 
         summary = (
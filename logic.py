@@ -3,6 +3,7 @@ import os
 import json
 import datetime
 import re
+from contextlib import contextmanager
 
 import config_facot
 from typing import Any, Dict, List, Optional, Tuple
@@ -10,6 +11,19 @@ from typing import Any, Dict, List, Optional, Tuple
 # Importar servicios de auditoría y NCF
 from services.audit_service import AuditService
 from services.ncf_service import NCFService
+from services.sales_summary_service import SalesSummaryService
+from services.ncf_integrity_service import NCFIntegrityService
+from services.ncf_range_service import NCFRangeService, range_status, take_from_ranges
+from services.line_analytics_service import LineAnalyticsService
+from services.archive_service import ArchiveService, years_in_range
+from services.doc_search_service import DocSearchService, flush_pending_lines
+from services.item_trigram_service import ItemTrigramIndex
+from services.unit_resolver import UnitResolver, fetch_units
+from services.dgii_report_service import DGIIReportService, validate_rnc, validate_void_reason
+from services.rnc_registry_service import STATUS_ACTIVE, RncRegistryService, normalize_rnc
+from services.schema_migrations import migrate
+from utils.line_diff import LINE_FIELDS, diff_lines
+from utils.dates import day_number, normalize_date
 
 # NCF válido:
 # - Estándar (no E): 1 letra distinta de E + 10 dígitos
@@ -34,8 +48,17 @@ class LogicController:
         self._initialize_db()
         
         # Inicializar servicios de auditoría y NCF
-        self.audit_service = AuditService(db_path)
-        self.ncf_service = NCFService(db_path)
+        self.audit_service = AuditService(db_path, ensure_schema=False)
+        self.ncf_service = NCFService(db_path, ensure_schema=False)
+        self.summary_service = SalesSummaryService(db_path)
+        self.ncf_range_service = NCFRangeService(db_path)
+        self.line_analytics = LineAnalyticsService(db_path)
+        self.archive_service = ArchiveService(db_path)
+        self.dgii_reports = DGIIReportService(db_path)
+        self.doc_search = DocSearchService(db_path)
+        self.rnc_registry = RncRegistryService(db_path)
+        self.item_index = ItemTrigramIndex(db_path)
+        self.unit_resolver = UnitResolver(self)
 
     # -------------------------
     # Bootstrap / DB
@@ -45,150 +68,45 @@ class LogicController:
         self.conn.row_factory = sqlite3.Row
 
     def _initialize_db(self):
-        cur = self.conn.cursor()
-
-        # --- Empresas ---
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS companies (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL,
-                rnc TEXT UNIQUE NOT NULL,
-                address TEXT,
-                invoice_template_path TEXT,
-                invoice_output_base_path TEXT,
-                itbis_adelantado REAL DEFAULT 0.0,
-                legacy_filename TEXT
-            )
-        """)
-        self._ensure_company_extra_columns()
-
-        # --- Facturas ---
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS invoices (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                company_id INTEGER NOT NULL,
-                invoice_type TEXT,
-                invoice_date TEXT NOT NULL,
-                imputation_date TEXT,
-                invoice_number TEXT NOT NULL,
-                invoice_category TEXT,
-                rnc TEXT,
-                third_party_name TEXT,
-                client_name TEXT,
-                client_rnc TEXT,
-                currency TEXT NOT NULL,
-                itbis REAL DEFAULT 0.0,
-                total_amount REAL NOT NULL DEFAULT 0.0,
-                exchange_rate REAL NOT NULL DEFAULT 1.0,
-                total_amount_rd REAL NOT NULL DEFAULT 0.0,
-                excel_path TEXT,
-                pdf_path TEXT,
-                attachment_path TEXT,
-                due_date TEXT,
-                FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE
-            )
-        """)
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS invoice_items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                invoice_id INTEGER NOT NULL,
-                description TEXT NOT NULL,
-                quantity REAL NOT NULL DEFAULT 0.0,
-                unit_price REAL NOT NULL DEFAULT 0.0,
-                item_code TEXT,
-                unit TEXT,
-                FOREIGN KEY (invoice_id) REFERENCES invoices(id) ON DELETE CASCADE
-            )
-        """)
+        # Esquema versionado (PRAGMA user_version): sin DDL si ya está al día
+        migrate(self.conn)
 
-        # --- Cotizaciones ---
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS quotations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                company_id INTEGER NOT NULL,
-                quotation_date TEXT NOT NULL,
-                client_name TEXT NOT NULL,
-                client_rnc TEXT,
-                notes TEXT,
-                currency TEXT NOT NULL,
-                total_amount REAL NOT NULL DEFAULT 0.0,
-                excel_path TEXT,
-                pdf_path TEXT,
-                due_date TEXT,
-                FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE
-            )
-        """)
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS quotation_items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                quotation_id INTEGER NOT NULL,
-                description TEXT NOT NULL,
-                quantity REAL NOT NULL DEFAULT 0.0,
-                unit_price REAL NOT NULL DEFAULT 0.0,
-                item_code TEXT,
-                unit TEXT,
-                FOREIGN KEY (quotation_id) REFERENCES quotations(id) ON DELETE CASCADE
-            )
-        """)
-
-        # --- Terceros ---
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS third_parties (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                rnc TEXT UNIQUE NOT NULL,
-                name TEXT NOT NULL
-            )
-        """)
+    @contextmanager
+    def _invoice_reader(self, start_date: str = None, end_date: str = None, all_years: bool = False):
+        """
+        Conexión para leer invoices/invoice_items: self.conn si no hace falta
+        ningún año archivado; si no, una con los archivos adjuntos (ArchiveService.connect).
+        """
+        years = [r[0] for r in self.conn.execute("SELECT year FROM fiscal_archives")]
+        if not all_years:
+            years = years_in_range(years, start_date, end_date) if (start_date or end_date) else []
+        if not years:
+            yield self.conn
+            return
+        conn = self.archive_service.connect(start_date, end_date, all_years=all_years)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
 
-        # NUEVO: Tabla de secuencias NCF persistentes
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS ncf_sequences (
-                company_id INTEGER NOT NULL,
-                prefix3 TEXT NOT NULL,
-                last_seq INTEGER NOT NULL DEFAULT 0,
-                updated_at TEXT NOT NULL,
-                PRIMARY KEY (company_id, prefix3),
-                FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE
+    def _archived_invoice_year(self, invoice_id: int) -> Optional[int]:
+        """Año cerrado al que pertenece la factura si solo existe en un archivo (None si no)."""
+        if self.conn.execute("SELECT 1 FROM invoices WHERE id = ?", (invoice_id,)).fetchone():
+            return None
+        with self._invoice_reader(all_years=True) as conn:
+            if conn is self.conn:
+                return None
+            row = conn.execute("SELECT invoice_date FROM invoices WHERE id = ?", (invoice_id,)).fetchone()
+        return int(str(row[0])[:4]) if row and row[0] else None
+
+    def _reject_archived_invoice(self, invoice_id: int) -> None:
+        """Las facturas de un año cerrado son de solo lectura: ValueError si se intenta escribirlas."""
+        year = self._archived_invoice_year(invoice_id)
+        if year is not None:
+            raise ValueError(
+                f"La factura {invoice_id} pertenece al año cerrado {year} (archivado); no se puede modificar"
             )
-        """)
-
-        # Columnas adicionales/vencimientos
-        self._ensure_line_item_columns()
-        self._ensure_due_date_columns()
-        self.conn.commit()
-
-    def _ensure_company_extra_columns(self):
-        cur = self.conn.cursor()
-        cur.execute("PRAGMA table_info(companies)")
-        existing = {row["name"] for row in cur.fetchall()}
-        needed = [
-            ("address_line1", "TEXT", "''"),
-            ("address_line2", "TEXT", "''"),
-            ("phone", "TEXT", "''"),
-            ("email", "TEXT", "''"),
-            ("signature_name", "TEXT", "''"),
-            ("logo_path", "TEXT", "''"),
-            ("address", "TEXT", "''"),
-            ("invoice_template_path", "TEXT", "''"),
-            ("invoice_output_base_path", "TEXT", "''"),
-            ("invoice_due_date", "TEXT", "''"),
-        ]
-        for col, typ, default in needed:
-            if col not in existing:
-                print(f"[DEBUG-LOGIC] Añadiendo columna {col} a companies.")
-                cur.execute(f"ALTER TABLE companies ADD COLUMN {col} {typ} DEFAULT {default}")
-        self.conn.commit()
-
-    def _ensure_line_item_columns(self):
-        cur = self.conn.cursor()
-        for table in ("invoice_items", "quotation_items"):
-            cur.execute(f"PRAGMA table_info({table})")
-            existing = {row["name"] for row in cur.fetchall()}
-            if "item_code" not in existing:
-                cur.execute(f"ALTER TABLE {table} ADD COLUMN item_code TEXT")
-            if "unit" not in existing:
-                cur.execute(f"ALTER TABLE {table} ADD COLUMN unit TEXT")
-        self.conn.commit()
 
     # -------------------------
     # Maestro de Ítems
@@ -230,6 +148,19 @@ class LogicController:
     def search_items_by_code_or_name(self, query: str, limit: int = 20):
         return self.get_items_like(query, limit)
 
+    def get_items_similar(self, name: str, limit: int = 5, threshold: float = 0.3):
+        """Ítems con nombre parecido (trigramas; tolera errores de tipeo y acentos), más parecidos primero."""
+        return self.item_index.similar(name, limit=limit, threshold=threshold)
+
+    def get_units_for(self, codes, names) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """Unidades del catálogo por código y por nombre exactos: una consulta IN por tipo."""
+        return fetch_units(self.conn, codes, names)
+
+    def get_items_version(self) -> Optional[int]:
+        """Contador de cambios del catálogo (triggers sobre items); invalida el caché de unidades."""
+        row = self.conn.execute("SELECT version FROM items_version WHERE id = 1").fetchone()
+        return row[0] if row else None
+
     # -------------------------
     # Empresas
     # -------------------------
@@ -341,25 +272,27 @@ class LogicController:
         if not prefix3 or len(prefix3) != 3:
             return 0
         exp_len = 1 + 2 + self._pad_len_for_letter(prefix3[0])
-        cur = self.conn.cursor()
-        if issued_only:
-            cur.execute("""
-                SELECT invoice_number FROM invoices
-                WHERE company_id = ?
-                  AND invoice_type = 'emitida'
-                  AND invoice_number LIKE ?
-                  AND LENGTH(invoice_number) = ?
-            """, (company_id, f"{prefix3.upper()}%", exp_len))
-        else:
-            cur.execute("""
-                SELECT invoice_number FROM invoices
-                WHERE company_id = ?
-                  AND invoice_number LIKE ?
-                  AND LENGTH(invoice_number) = ?
-            """, (company_id, f"{prefix3.upper()}%", exp_len))
+        with self._invoice_reader(all_years=True) as conn:
+            cur = conn.cursor()
+            if issued_only:
+                cur.execute("""
+                    SELECT invoice_number FROM invoices
+                    WHERE company_id = ?
+                      AND invoice_type = 'emitida'
+                      AND invoice_number LIKE ?
+                      AND LENGTH(invoice_number) = ?
+                """, (company_id, f"{prefix3.upper()}%", exp_len))
+            else:
+                cur.execute("""
+                    SELECT invoice_number FROM invoices
+                    WHERE company_id = ?
+                      AND invoice_number LIKE ?
+                      AND LENGTH(invoice_number) = ?
+                """, (company_id, f"{prefix3.upper()}%", exp_len))
+            numbers = cur.fetchall()
 
         mx = 0
-        for (inv,) in cur.fetchall():
+        for (inv,) in numbers:
             inv = (inv or "").upper()
             if not inv.startswith(prefix3.upper()):
                 continue
@@ -391,23 +324,8 @@ class LogicController:
         row = cur.fetchone()
         if row:
             return int(row["last_seq"])
-        # sembrar con máximo histórico
-        pad = self._pad_len_for_letter(prefix3[0])
-        exp_len = 1 + 2 + pad
-        cur.execute("""
-            SELECT invoice_number FROM invoices
-             WHERE company_id=? AND invoice_type='emitida'
-               AND invoice_number LIKE ? AND LENGTH(invoice_number)=?
-        """, (company_id, f"{prefix3}%", exp_len))
-        mx = 0
-        for (inv,) in cur.fetchall():
-            inv = (inv or "").upper()
-            if inv.startswith(prefix3) and len(inv) == exp_len:
-                try:
-                    val = int(inv[3:])
-                    if val > mx: mx = val
-                except Exception:
-                    pass
+        # sembrar con máximo histórico (incluye años archivados)
+        mx = self._max_seq_for_prefix(company_id, prefix3, issued_only=True)
         cur.execute("""
             INSERT INTO ncf_sequences(company_id,prefix3,last_seq,updated_at)
             VALUES (?,?,?,datetime('now'))
@@ -432,15 +350,24 @@ class LogicController:
         prefix3 = (prefix3 or "B01").upper()
         last_seq = self.ensure_ncf_sequence_row(company_id, prefix3)
         pad = self._pad_len_for_letter(prefix3[0])
-        return f"{prefix3}{(last_seq + 1):0{pad}d}"
+        range_seq = take_from_ranges(self.conn, company_id, prefix3, last_seq, consume=False)
+        next_seq = range_seq if range_seq is not None else last_seq + 1
+        return f"{prefix3}{next_seq:0{pad}d}"
 
     def allocate_next_ncf(self, company_id: int, prefix3: str) -> str:
         """
         Consume/asigna el siguiente NCF: incrementa last_seq y retorna el NCF listo.
+        Si la empresa tiene rangos autorizados para el prefijo, el número sale
+        del rango vigente (ValueError si están agotados o vencidos).
         """
         prefix3 = (prefix3 or "B01").upper()
         last_seq = self.ensure_ncf_sequence_row(company_id, prefix3)
-        new_seq = last_seq + 1
+        try:
+            range_seq = take_from_ranges(self.conn, company_id, prefix3, last_seq)
+        except ValueError:
+            self.conn.commit()  # persistir rangos marcados como agotados/vencidos
+            raise
+        new_seq = range_seq if range_seq is not None else last_seq + 1
         pad = self._pad_len_for_letter(prefix3[0])
         ncf = f"{prefix3}{new_seq:0{pad}d}"
         cur = self.conn.cursor()
@@ -451,16 +378,48 @@ class LogicController:
         self.conn.commit()
         return ncf
 
+    # Rangos autorizados (ver services/ncf_range_service.py)
+    def get_ncf_range_status(self, company_id: int, prefix3: str) -> Optional[Dict[str, Any]]:
+        """Restantes / vencimiento / alerta del rango vigente (None si no hay rangos)."""
+        prefix3 = (prefix3 or "B01").upper()
+        last_seq = self.ensure_ncf_sequence_row(company_id, prefix3)
+        return range_status(self.conn, company_id, prefix3, last_seq)
+
+    def list_ncf_ranges(self, company_id: int, prefix3: str = None) -> List[Dict[str, Any]]:
+        return self.ncf_range_service.list_ranges(company_id, prefix3)
+
+    def add_ncf_range(self, company_id: int, prefix3: str, start_seq: int, end_seq: int,
+                      expires_on: str = None, authorization: str = "") -> Tuple[bool, str]:
+        return self.ncf_range_service.add_range(company_id, prefix3, start_seq, end_seq,
+                                                expires_on, authorization)
+
+    def delete_ncf_range(self, range_id: int) -> bool:
+        return self.ncf_range_service.delete_range(range_id)
+
     def find_next_free_ncf(self, company_id: int, prefix3: str, start_seq: int) -> str:
-        cur = self.conn.cursor()
+        """
+        Primer NCF libre desde start_seq: recorre en orden las secuencias usadas
+        (índice sobre invoices.ncf_seq) hasta encontrar un hueco.
+        """
         p3 = (prefix3 or "B01").upper()
         pad = self._pad_len_for_letter(p3[0])
-        for step in range(0, 10000):
-            cand = f"{p3}{(start_seq + step):0{pad}d}"
-            cur.execute("SELECT 1 FROM invoices WHERE company_id=? AND invoice_number=? LIMIT 1", (company_id, cand))
-            if cur.fetchone() is None and self.validate_ncf(cand):
-                return cand
-        return f"{p3}{start_seq:0{pad}d}"
+        candidate = max(int(start_seq), 1)
+        with self._invoice_reader(all_years=True) as conn:
+            cur = conn.execute("""
+                SELECT DISTINCT ncf_seq FROM invoices
+                 WHERE company_id=? AND ncf_prefix=? AND ncf_seq >= ?
+                 ORDER BY ncf_seq
+            """, (company_id, p3, candidate))
+            for (seq,) in cur:
+                if seq != candidate:
+                    break
+                candidate += 1
+        cand = f"{p3}{candidate:0{pad}d}"
+        return cand if self.validate_ncf(cand) else f"{p3}{start_seq:0{pad}d}"
+
+    def scan_ncf_integrity(self, company_id: int = None, prefix3: str = None) -> Dict[str, Any]:
+        """Huecos, duplicados, fuera de rango y mal formados (ver NCFIntegrityService.scan)."""
+        return NCFIntegrityService(self.db_path).scan(company_id, prefix3)
 
     def update_invoice_number(self, invoice_id: int, company_id: int, rnc: str, new_ncf: str):
         """
@@ -482,8 +441,9 @@ class LogicController:
         except Exception:
             old_ncf = None
         
-        cur.execute("SELECT id FROM invoices WHERE company_id=? AND invoice_number=? LIMIT 1", (company_id, n))
-        row = cur.fetchone()
+        with self._invoice_reader(all_years=True) as conn:
+            row = conn.execute("SELECT id FROM invoices WHERE company_id=? AND invoice_number=? LIMIT 1",
+                               (company_id, n)).fetchone()
         if row and row["id"] != invoice_id:
             prefix3 = n[:3]
             try:
@@ -552,6 +512,7 @@ class LogicController:
         y AuditService para registrar la creación.
         """
         cur = self.conn.cursor()
+        invoice_data = self._with_iso_dates(invoice_data, ('invoice_date', 'imputation_date'))
         inv_type = (invoice_data.get('invoice_type') or 'emitida')
         company_id = int(invoice_data.get('company_id'))
 
@@ -559,6 +520,7 @@ class LogicController:
         due_date = (invoice_data.get('due_date') or "").strip()
         if not due_date:
             due_date = self.get_company_invoice_due_date(company_id) or ""
+        due_date = self._iso_date(due_date)
 
         # NUEVO: Reservar NCF de forma segura si es factura emitida y no tiene NCF asignado
         invoice_number = invoice_data.get('invoice_number', '').strip()
@@ -606,17 +568,7 @@ class LogicController:
         invoice_id = cur.lastrowid
 
         # Detalle (unidad desde items.unit)
-        for it in items or []:
-            code = (it.get('code') or it.get('item_code') or '').strip()
-            desc = (it.get('description') or '').strip()
-            qty = float(it.get('quantity', 0.0) or 0.0)
-            up  = float(it.get('unit_price', 0.0) or 0.0)
-            unit_from_master = self._get_unit_from_items(code, desc) or None
-
-            cur.execute("""
-                INSERT INTO invoice_items (invoice_id, item_code, description, quantity, unit_price, unit)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (invoice_id, code, desc, qty, up, unit_from_master))
+        self._sync_lines(cur, 'invoice_items', 'invoice_id', invoice_id, self._invoice_lines(items))
 
         self.conn.commit()
         
@@ -647,6 +599,7 @@ class LogicController:
         
         INTEGRACIÓN: Registra los cambios en auditoría antes de actualizar.
         """
+        self._reject_archived_invoice(invoice_id)
         cur = self.conn.cursor()
         
         # NUEVO: Obtener datos anteriores para auditoría
@@ -658,14 +611,18 @@ class LogicController:
                 payload_before = dict(row)
         except Exception as e:
             print(f"[DEBUG-LOGIC] Error al obtener invoice anterior: {e}")
+        if payload_before is None:
+            raise ValueError(f"Factura {invoice_id} no encontrada")
         
         # Resolver due_date
+        invoice_data = self._with_iso_dates(invoice_data, ('invoice_date', 'imputation_date'))
         company_id = int(invoice_data.get('company_id', payload_before.get('company_id', 0)))
         due_date = (invoice_data.get('due_date') or "").strip()
         if not due_date and payload_before:
             due_date = payload_before.get('due_date', '')
         if not due_date:
             due_date = self.get_company_invoice_due_date(company_id) or ""
+        due_date = self._iso_date(due_date)
         
         # Actualizar cabecera de factura
         cur.execute("""
@@ -713,29 +670,20 @@ class LogicController:
             invoice_id
         ))
         
-        # Eliminar items anteriores y crear nuevos
-        cur.execute("DELETE FROM invoice_items WHERE invoice_id = ?", (invoice_id,))
-        
-        for it in items or []:
-            code = (it.get('code') or it.get('item_code') or '').strip()
-            desc = (it.get('description') or '').strip()
-            qty = float(it.get('quantity', 0.0) or 0.0)
-            up = float(it.get('unit_price', 0.0) or 0.0)
-            unit_from_master = self._get_unit_from_items(code, desc) or None
-            
-            cur.execute("""
-                INSERT INTO invoice_items (invoice_id, item_code, description, quantity, unit_price, unit)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (invoice_id, code, desc, qty, up, unit_from_master))
+        # Sólo los INSERT/UPDATE/DELETE de líneas que cambiaron
+        line_diff = self._sync_lines(cur, 'invoice_items', 'invoice_id', invoice_id, self._invoice_lines(items))
         
         self.conn.commit()
         
         # NUEVO: Registrar en auditoría
         try:
+            payload_after = dict(invoice_data)
+            if line_diff.changed:
+                payload_after['lines'] = line_diff.audit
             self.audit_service.log_invoice_update(
                 invoice_id,
                 payload_before or {},
-                invoice_data,
+                payload_after,
                 user=os.getenv('USER', 'system')
             )
         except Exception as e:
@@ -743,34 +691,50 @@ class LogicController:
         
         return invoice_id
 
-    def get_facturas(self, company_id, only_issued: bool = True):
-        cur = self.conn.cursor()
-        if only_issued:
-            cur.execute("""
-                SELECT * FROM invoices
-                 WHERE company_id = ? AND invoice_type = 'emitida'
-                 ORDER BY invoice_date DESC
-            """, (company_id,))
-        else:
-            cur.execute("""
+    def get_facturas(self, company_id, only_issued: bool = True, start_date: str = None, end_date: str = None,
+                     invoice_type: str = None):
+        """
+        Facturas de la empresa, más recientes primero.
+
+        Sin rango se listan las de la base (años abiertos); con `start_date`/`end_date`
+        (inclusivos, cualquier formato de fecha) se filtra por `invoice_day` con el índice
+        (company_id, invoice_type, invoice_day) e incluye los años archivados del rango.
+        `invoice_type` ('emitida'/'recibida') tiene prioridad sobre `only_issued`.
+        """
+        start_date, end_date = normalize_date(start_date), normalize_date(end_date)
+        where, params = ["company_id = ?"], [company_id]
+        if invoice_type or only_issued:
+            where.append("invoice_type = ?")
+            params.append(invoice_type or 'emitida')
+        if start_date:
+            where.append("invoice_day >= ?")
+            params.append(day_number(start_date))
+        if end_date:
+            where.append("invoice_day <= ?")
+            params.append(day_number(end_date))
+        with self._invoice_reader(start_date, end_date) as conn:
+            rows = conn.execute(f"""
                 SELECT * FROM invoices
-                 WHERE company_id = ?
-                 ORDER BY invoice_date DESC
-            """, (company_id,))
-        return [dict(row) for row in cur.fetchall()]
+                 WHERE {' AND '.join(where)}
+                 ORDER BY invoice_day DESC, id DESC
+            """, params).fetchall()
+        return [dict(row) for row in rows]
 
     def get_invoice_items(self, invoice_id):
-        cur = self.conn.cursor()
-        cur.execute("""
+        sql = """
             SELECT id, invoice_id, item_code, description, quantity, unit_price, unit
               FROM invoice_items WHERE invoice_id = ?
-            ORDER BY id ASC
-        """, (invoice_id,))
-        rows = [dict(r) for r in cur.fetchall()]
+            ORDER BY line_no, id
+        """
+        rows = [dict(r) for r in self.conn.execute(sql, (invoice_id,)).fetchall()]
+        if not rows:
+            # Factura de un año archivado (los ids no se reusan)
+            with self._invoice_reader(all_years=True) as conn:
+                rows = [dict(r) for r in conn.execute(sql, (invoice_id,)).fetchall()]
+        units = self.unit_resolver.lookup_units([(r.get('item_code'), r.get('description')) for r in rows])
         out = []
-        for r in rows:
+        for r, unit in zip(rows, units):
             code = r.get('item_code') or ''
-            unit = self._get_unit_from_items(code, r.get('description', '')) or ''
             out.append({
                 "id": r.get("id"),
                 "invoice_id": r.get("invoice_id"),
@@ -788,6 +752,7 @@ class LogicController:
         
         INTEGRACIÓN: Registra la eliminación en auditoría antes de borrar.
         """
+        self._reject_archived_invoice(factura_id)
         cur = self.conn.cursor()
         
         # NUEVO: Obtener datos de la factura antes de eliminar para auditoría
@@ -810,12 +775,88 @@ class LogicController:
         cur.execute("DELETE FROM invoices WHERE id = ?", (factura_id,))
         self.conn.commit()
 
+    def void_invoice(self, invoice_id: int, reason: str = "") -> None:
+        """
+        Marca la factura como anulada (se reporta en el 608 y sale del 607).
+
+        Args:
+            invoice_id: ID de la factura
+            reason: Código DGII de tipo de anulación ('01'..'10'), obligatorio en el 608
+        """
+        reason = (reason or "").strip()
+        if not validate_void_reason(reason):
+            raise ValueError(f"Tipo de anulación inválido: {reason!r} (debe ser un código DGII 01-10)")
+        self._reject_archived_invoice(invoice_id)
+        cur = self.conn.cursor()
+        cur.execute("SELECT * FROM invoices WHERE id = ?", (invoice_id,))
+        row = cur.fetchone()
+        if not row:
+            raise ValueError(f"Factura {invoice_id} no encontrada")
+        before = dict(row)
+        cur.execute("UPDATE invoices SET status = 'anulada', void_reason = ? WHERE id = ?", (reason, invoice_id))
+        self.conn.commit()
+        try:
+            self.audit_service.log_action(
+                'invoice', invoice_id, 'void',
+                payload_before=before,
+                payload_after={'status': 'anulada', 'void_reason': reason},
+                user=os.getenv('USER', 'system')
+            )
+        except Exception as e:
+            print(f"[DEBUG-LOGIC] Error al registrar auditoría de anulación: {e}")
+
+    def generate_dgii_report(self, report: str, company_id: int, period: str,
+                             txt_path: str = None, xlsx_path: str = None) -> Tuple[bool, Any]:
+        """Formato DGII 606/607/608 del período (ver DGIIReportService.generate)."""
+        return self.dgii_reports.generate(report, company_id, period, txt_path=txt_path, xlsx_path=xlsx_path)
+
+    def search_documents(self, text: str, company_id: int = None, doc_type: str = None,
+                         limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """Búsqueda por tercero, RNC, NCF y líneas (ver DocSearchService.search)."""
+        return self.doc_search.search(text, company_id=company_id, doc_type=doc_type, limit=limit, offset=offset)
+
+    def get_closable_years(self) -> List[int]:
+        """Años anteriores al actual con facturas todavía en la base."""
+        return self.archive_service.closable_years()
+
+    def archive_fiscal_year(self, year: int) -> Tuple[bool, str]:
+        """Cierra un año fiscal: mueve sus facturas a su archivo (ver ArchiveService)."""
+        ok, message = self.archive_service.archive_year(year)
+        if ok:
+            try:
+                self.audit_service.log_action(
+                    entity_type='fiscal_year',
+                    entity_id=int(year),
+                    action='archive',
+                    payload_after={'message': message},
+                    user=os.getenv('USER', 'system')
+                )
+            except Exception as e:
+                print(f"[DEBUG-LOGIC] Error al registrar auditoría de archivo: {e}")
+        return ok, message
+
+    def get_monthly_summary(self, company_id: int, start_period: str = None, end_period: str = None,
+                            invoice_type: str = None) -> List[Dict[str, Any]]:
+        """
+        Totales mensuales (facturas, subtotal, ITBIS, total, total RD$) desde el
+        resumen materializado `sales_summary`; períodos en formato 'YYYY-MM'.
+        """
+        return self.summary_service.get_monthly_summary(company_id, start_period, end_period, invoice_type)
+
+    def get_line_aggregates(self, company_id: int, by: str = 'item_code', start_date: str = None,
+                            end_date: str = None, invoice_type: str = 'emitida') -> List[Dict[str, Any]]:
+        """
+        Ventas de las líneas agrupadas por 'item_code', 'client' o 'month'
+        (cantidad, ingreso, costo según items.cost y margen); fechas [inicio, fin).
+        """
+        return self.line_analytics.aggregate(by, company_id, start_date, end_date, invoice_type)
+
     # -------------------------
     # Cotizaciones
     # -------------------------
     def add_quotation(self, quotation_data, items):
         cur = self.conn.cursor()
-        qdate = quotation_data.get('quotation_date')
+        qdate = self._iso_date(quotation_data.get('quotation_date'))
         due_date = self.compute_quotation_due_date(qdate)
         cur.execute("""
             INSERT INTO quotations (company_id, quotation_date, client_name, client_rnc, notes, currency, total_amount, excel_path, pdf_path, due_date)
@@ -828,24 +869,25 @@ class LogicController:
         ))
         quotation_id = cur.lastrowid
 
-        for it in items or []:
-            code = (it.get('code') or it.get('item_code') or '').strip()
-            desc = (it.get('description') or '').strip()
-            qty = float(it.get('quantity', 0.0) or 0.0)
-            up  = float(it.get('unit_price', 0.0) or 0.0)
-            unit_from_master = self._get_unit_from_items(code, desc) or None
-
-            cur.execute("""
-                INSERT INTO quotation_items (quotation_id, item_code, description, quantity, unit_price, unit)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (quotation_id, code, desc, qty, up, unit_from_master))
+        self._sync_lines(cur, 'quotation_items', 'quotation_id', quotation_id, self._invoice_lines(items))
 
         self.conn.commit()
         return quotation_id
 
-    def get_quotations(self, company_id):
+    def get_quotations(self, company_id, start_date: str = None, end_date: str = None):
+        """Cotizaciones de la empresa, más recientes primero (rango inclusivo por `quotation_day`)."""
+        where, params = ["company_id = ?"], [company_id]
+        if normalize_date(start_date):
+            where.append("quotation_day >= ?")
+            params.append(day_number(start_date))
+        if normalize_date(end_date):
+            where.append("quotation_day <= ?")
+            params.append(day_number(end_date))
         cur = self.conn.cursor()
-        cur.execute("SELECT * FROM quotations WHERE company_id = ? ORDER BY quotation_date DESC", (company_id,))
+        cur.execute(f"""
+            SELECT * FROM quotations WHERE {' AND '.join(where)}
+             ORDER BY quotation_day DESC, id DESC
+        """, params)
         return [dict(row) for row in cur.fetchall()]
 
     def get_quotation_items(self, quotation_id):
@@ -853,13 +895,13 @@ class LogicController:
         cur.execute("""
             SELECT id, quotation_id, item_code, description, quantity, unit_price, unit
               FROM quotation_items WHERE quotation_id = ?
-            ORDER BY id ASC
+            ORDER BY line_no, id
         """, (quotation_id,))
         rows = [dict(r) for r in cur.fetchall()]
+        units = self.unit_resolver.lookup_units([(r.get('item_code'), r.get('description')) for r in rows])
         out = []
-        for r in rows:
+        for r, unit in zip(rows, units):
             code = r.get('item_code') or ''
-            unit = self._get_unit_from_items(code, r.get('description', '')) or ''
             out.append({
                 "id": r.get("id"),
                 "quotation_id": r.get("quotation_id"),
@@ -877,102 +919,217 @@ class LogicController:
             UPDATE quotations SET quotation_date=?, client_name=?, client_rnc=?, notes=?, currency=?, total_amount=?, excel_path=?, pdf_path=?
              WHERE id=?
         """, (
-            quotation_data['quotation_date'], quotation_data['client_name'], quotation_data['client_rnc'],
+            self._iso_date(quotation_data['quotation_date']), quotation_data['client_name'], quotation_data['client_rnc'],
             quotation_data.get('notes', ''), quotation_data['currency'], quotation_data['total_amount'],
             quotation_data.get('excel_path', ''), quotation_data.get('pdf_path', ''), quotation_id
         ))
-        cur.execute("DELETE FROM quotation_items WHERE quotation_id=?", (quotation_id,))
+        lines = []
         for it in items or []:
             code = it.get('code') or it.get('item_code') or ''
             unit = it.get('unit') or ''
             if (not unit) and code:
                 master = self._lookup_item_by_code(code)
                 unit = (master or {}).get('unit', '') or unit
-            cur.execute("""
-                INSERT INTO quotation_items (quotation_id, item_code, description, quantity, unit_price, unit)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (
-                quotation_id, code, it.get('description', ''), float(it.get('quantity', 0.0) or 0.0),
-                float(it.get('unit_price', 0.0) or 0.0), unit or None
-            ))
+            lines.append({
+                'id': it.get('id'), 'item_code': code, 'description': it.get('description', ''),
+                'quantity': float(it.get('quantity', 0.0) or 0.0),
+                'unit_price': float(it.get('unit_price', 0.0) or 0.0), 'unit': unit or None,
+            })
+        line_diff = self._sync_lines(cur, 'quotation_items', 'quotation_id', quotation_id, lines)
         self.conn.commit()
 
+        if line_diff.changed:
+            try:
+                self.audit_service.log_action(
+                    entity_type='quotation',
+                    entity_id=quotation_id,
+                    action='update',
+                    payload_after={'lines': line_diff.audit},
+                    user=os.getenv('USER', 'system')
+                )
+            except Exception as e:
+                print(f"[DEBUG-LOGIC] Error al registrar auditoría de cotización: {e}")
+
     def delete_quotation(self, quotation_id):
         cur = self.conn.cursor()
         cur.execute("DELETE FROM quotation_items WHERE quotation_id=?", (quotation_id,))
         cur.execute("DELETE FROM quotations WHERE id=?", (quotation_id,))
         self.conn.commit()
 
+    # -------------------------
+    # Líneas de detalle
+    # -------------------------
+    def _invoice_lines(self, items) -> List[Dict[str, Any]]:
+        """Líneas normalizadas de factura/cotización (unidad desde items.unit)."""
+        items = list(items or [])
+        pairs = [(it.get('code') or it.get('item_code'), it.get('description')) for it in items]
+        lines = []
+        for it, unit in zip(items, self.unit_resolver.lookup_units(pairs)):
+            code = (it.get('code') or it.get('item_code') or '').strip()
+            desc = (it.get('description') or '').strip()
+            lines.append({
+                'id': it.get('id'),
+                'item_code': code,
+                'description': desc,
+                'quantity': float(it.get('quantity', 0.0) or 0.0),
+                'unit_price': float(it.get('unit_price', 0.0) or 0.0),
+                'unit': unit or None,
+            })
+        return lines
+
+    def _sync_lines(self, cur, table: str, parent_col: str, parent_id: int, lines: List[Dict[str, Any]]):
+        """
+        Lleva el detalle guardado a `lines` con los INSERT/UPDATE/DELETE mínimos
+        (ver utils/line_diff.py). No hace commit.
+
+        Returns:
+            LineDiff aplicado
+        """
+        fields = ", ".join(LINE_FIELDS)
+        existing = [dict(r) for r in cur.execute(
+            f"SELECT id, line_no, {fields} FROM {table} WHERE {parent_col} = ? ORDER BY line_no, id",
+            (parent_id,)
+        ).fetchall()]
+        diff = diff_lines(existing, lines)
+        if diff.deletes:
+            cur.executemany(f"DELETE FROM {table} WHERE id = ?", [(i,) for i in diff.deletes])
+        if diff.updates:
+            assignments = ", ".join(f"{f} = ?" for f in LINE_FIELDS)
+            cur.executemany(
+                f"UPDATE {table} SET {assignments}, line_no = ? WHERE id = ?",
+                [tuple(line[f] for f in LINE_FIELDS) + (line['line_no'], row_id) for row_id, line in diff.updates]
+            )
+        if diff.inserts:
+            placeholders = ", ".join("?" * (len(LINE_FIELDS) + 2))
+            cur.executemany(
+                f"INSERT INTO {table} ({parent_col}, {fields}, line_no) VALUES ({placeholders})",
+                [(parent_id,) + tuple(line[f] for f in LINE_FIELDS) + (line['line_no'],) for line in diff.inserts]
+            )
+        if diff.deletes or diff.updates or diff.inserts:
+            # Índice de búsqueda: las líneas del documento se reindexan una sola vez
+            flush_pending_lines(cur)
+        return diff
+
     # -------------------------
     # Terceros
     # -------------------------
     def search_third_parties(self, query, search_by='name'):
+        """Terceros ya facturados primero; se completa con el padrón de RNC de la DGII."""
         if not self.conn or len(query) < 2:
             return []
         cur = self.conn.cursor()
         column = 'name' if search_by == 'name' else 'rnc'
         sql_query = f"SELECT rnc, name FROM third_parties WHERE {column} LIKE ? LIMIT 10"
         cur.execute(sql_query, (f"{query}%",))
-        return [dict(row) for row in cur.fetchall()]
+        results = [dict(row) for row in cur.fetchall()]
+        if len(results) < 10:
+            known = {normalize_rnc(r['rnc']) for r in results}
+            for row in self.rnc_registry.search(query, by='name' if search_by == 'name' else 'rnc',
+                                                limit=10 - len(results)):
+                if row['rnc'] not in known:
+                    results.append({'rnc': row['rnc'], 'name': row['name'] or row['trade_name']})
+        return results
+
+    def lookup_rnc(self, rnc: str) -> Optional[Dict[str, Any]]:
+        """Contribuyente del padrón de la DGII (None si no figura o no se importó)."""
+        return self.rnc_registry.lookup(rnc)
+
+    def validate_client_rnc(self, rnc: str) -> Tuple[bool, str]:
+        """
+        Valida el RNC/Cédula del cliente antes de guardar.
 
-    def add_or_update_third_party(self, rnc, name):
+        Returns:
+            Tuple de (válido, motivo): dígito verificador y, si el padrón está
+            importado, que figure y esté activo.
+        """
+        if not validate_rnc(rnc):
+            return False, f"El RNC/Cédula '{rnc}' no es válido (dígito verificador)."
+        if not self.rnc_registry.is_loaded():
+            return True, ""
+        entry = self.rnc_registry.lookup(rnc)
+        if entry is None:
+            # Las cédulas de personas físicas no contribuyentes no figuran en el padrón
+            if len(normalize_rnc(rnc)) == 11:
+                return True, ""
+            return False, f"El RNC {normalize_rnc(rnc)} no figura en el padrón de la DGII."
+        if entry['status'] and entry['status'] != STATUS_ACTIVE:
+            return False, f"{entry['name']} ({entry['rnc']}) figura como {entry['status']} en la DGII."
+        return True, ""
+
+    def import_rnc_registry(self, path: str, progress=None) -> Tuple[bool, str]:
+        """Importa o actualiza el padrón de RNC de la DGII (TXT o .zip)."""
+        return self.rnc_registry.import_file(path, progress=progress)
+
+    def add_or_update_third_party(self, rnc, name, email=None):
         if not self.conn or not rnc or not name:
             return
         cur = self.conn.cursor()
         cur.execute("""
-            INSERT INTO third_parties (rnc, name) VALUES (?, ?)
-            ON CONFLICT(rnc) DO UPDATE SET name=excluded.name
-        """, (rnc.strip(), name.strip()))
+            INSERT INTO third_parties (rnc, name, email) VALUES (?, ?, COALESCE(?, ''))
+            ON CONFLICT(rnc) DO UPDATE SET name=excluded.name,
+                email=CASE WHEN ? IS NULL THEN third_parties.email ELSE excluded.email END
+        """, (rnc.strip(), name.strip(), email.strip() if email is not None else None,
+              email))
         self.conn.commit()
 
+    # -------------------------
+    # Envío masivo de facturas por email
+    # -------------------------
+    def get_email_outbox(self, **options):
+        """Outbox de emails (se crea al primer uso con la configuración SMTP del entorno)."""
+        if getattr(self, "_email_outbox", None) is None or options:
+            from utils.mail_outbox import EmailOutbox
+            self._email_outbox = EmailOutbox(self.db_path, **options)
+        return self._email_outbox
+
+    def queue_period_invoice_emails(self, company_id: int, start_date: str, end_date: str,
+                                    **kwargs) -> Dict[str, Any]:
+        """
+        Encola el email de todas las facturas emitidas del período [inicio, fin).
+        Ver EmailOutbox.enqueue_period_invoices (plantillas, destinatarios, adjuntos).
+        """
+        return self.get_email_outbox().enqueue_period_invoices(company_id, start_date, end_date, **kwargs)
+
+    def send_queued_emails(self, max_messages: Optional[int] = None, max_wait: float = 0,
+                           should_stop=None) -> Dict[str, Any]:
+        """
+        Envía los emails pendientes de la cola (pool SMTP, reintentos).
+        Con `max_wait` espera además los reintentos que vencen en ese plazo
+        (EmailOutbox.process_until_done).
+        """
+        outbox = self.get_email_outbox()
+        if max_wait:
+            return outbox.process_until_done(max_wait, should_stop=should_stop)
+        return outbox.process(max_messages)
+
     # -------------------------
     # Utilidades
     # -------------------------
     def close(self):
+        self.rnc_registry.close()
+        self.item_index.close()
         if self.conn:
             self.conn.close()
 
     def _get_unit_from_items(self, code: str = "", name: str = "") -> str:
+        """Unidad del catálogo por código o nombre exactos ('' si no está); ver UnitResolver.lookup_units."""
         try:
-            if code:
-                m = self._lookup_item_by_code(code)
-                u = (m or {}).get('unit', '') or ''
-                if u:
-                    return u.strip()
-            if name:
-                try:
-                    cur = self.conn.cursor()
-                    cur.execute("SELECT unit FROM items WHERE name = ? LIMIT 1", (name.strip(),))
-                    row = cur.fetchone()
-                    if row and (row["unit"] or "").strip():
-                        return row["unit"].strip()
-                except Exception as e:
-                    print(f"[DEBUG-LOGIC] Error lookup unit by name='{name}': {e}")
+            return self.unit_resolver.lookup_units([(code, name)])[0]
         except Exception as e:
             print(f"[DEBUG-LOGIC] _get_unit_from_items error: {e}")
         return ""
 
-    def _ensure_due_date_columns(self):
-        cur = self.conn.cursor()
-        # companies.invoice_due_date
-        cur.execute("PRAGMA table_info(companies)")
-        cols = {r["name"] for r in cur.fetchall()}
-        if "invoice_due_date" not in cols:
-            cur.execute("ALTER TABLE companies ADD COLUMN invoice_due_date TEXT DEFAULT ''")
-
-        # invoices.due_date
-        cur.execute("PRAGMA table_info(invoices)")
-        cols = {r["name"] for r in cur.fetchall()}
-        if "due_date" not in cols:
-            cur.execute("ALTER TABLE invoices ADD COLUMN due_date TEXT")
-
-        # quotations.due_date
-        cur.execute("PRAGMA table_info(quotations)")
-        cols = {r["name"] for r in cur.fetchall()}
-        if "due_date" not in cols:
-            cur.execute("ALTER TABLE quotations ADD COLUMN due_date TEXT")
-
-        self.conn.commit()
+    @staticmethod
+    def _iso_date(value):
+        """Fecha en 'AAAA-MM-DD'; si no se reconoce como fecha se deja como vino."""
+        return normalize_date(value) or value
+
+    def _with_iso_dates(self, data: Dict[str, Any], keys) -> Dict[str, Any]:
+        data = dict(data)
+        for key in keys:
+            if data.get(key):
+                data[key] = self._iso_date(data[key])
+        return data
 
     def compute_quotation_due_date(self, quotation_date: str | None) -> str:
         if not quotation_date:
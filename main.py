@@ -9,11 +9,9 @@ os.environ.setdefault("QTWEBENGINE_DISABLE_SANDBOX", "1")
 from PyQt6.QtCore import Qt, QCoreApplication
 QCoreApplication.setAttribute(Qt.ApplicationAttribute.AA_ShareOpenGLContexts, True)
 
-# (Opcional) Import temprano del WebEngine
-try:
-    from PyQt6 import QtWebEngineWidgets, QtWebEngineCore  # noqa: F401
-except Exception:
-    pass
+# El WebEngine (vista previa / PDF) se importa al abrir la primera vista
+# previa: con AA_ShareOpenGLContexts fijado no hace falta importarlo antes
+# de crear QApplication, y cargarlo aquí añadía segundos al arranque.
 
 from PyQt6.QtWidgets import QApplication, QFileDialog, QMessageBox
 
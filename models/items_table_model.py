@@ -6,6 +6,8 @@ from typing import Any, List, Dict, Optional
 from PyQt6.QtCore import QAbstractTableModel, Qt, QModelIndex, pyqtSignal
 from PyQt6.QtGui import QFont
 
+from utils.money import format_cents, from_cents, line_total_cents
+
 
 class ItemsTableModel(QAbstractTableModel):
     """
@@ -47,6 +49,9 @@ class ItemsTableModel(QAbstractTableModel):
     def __init__(self, parent=None):
         super().__init__(parent)
         self._items: List[Dict[str, Any]] = []
+        # Importe por fila y total en centavos, mantenidos al editar (sin recorrer filas)
+        self._line_cents: List[int] = []
+        self._total_cents = 0
         
     def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
         """Retorna el número de filas."""
@@ -91,8 +96,7 @@ class ItemsTableModel(QAbstractTableModel):
                 discount = item.get('discount_percent', 0)
                 return f"{discount:.2f}" if role == Qt.ItemDataRole.DisplayRole else discount
             elif col == self.COL_SUBTOTAL:
-                subtotal = self._calculate_subtotal(item)
-                return f"{subtotal:,.2f}"
+                return format_cents(self._line_cents[row])
         
         # Alineación de texto
         elif role == Qt.ItemDataRole.TextAlignmentRole:
@@ -149,6 +153,9 @@ class ItemsTableModel(QAbstractTableModel):
                     return False  # Descuento entre 0 y 100%
                 item['discount_percent'] = discount
             
+            if col in [self.COL_QTY, self.COL_PRICE, self.COL_DISCOUNT]:
+                self._refresh_line(row)
+
             # Emitir señal de cambio para recalcular subtotales
             self.dataChanged.emit(index, index, [role])
             self.dataChangedSignal.emit()
@@ -201,6 +208,7 @@ class ItemsTableModel(QAbstractTableModel):
                 'discount_percent': 0.0
             }
             self._items.insert(row + i, new_item)
+            self._line_cents.insert(row + i, 0)
         
         self.endInsertRows()
         self.dataChangedSignal.emit()
@@ -215,6 +223,7 @@ class ItemsTableModel(QAbstractTableModel):
         
         for i in range(count):
             del self._items[row]
+            self._total_cents -= self._line_cents.pop(row)
         
         self.endRemoveRows()
         self.dataChangedSignal.emit()
@@ -244,7 +253,10 @@ class ItemsTableModel(QAbstractTableModel):
             return False
         
         item_copy = self._items[row].copy()
+        item_copy.pop('id', None)  # la copia es una línea nueva
         self._items.insert(row + 1, item_copy)
+        self._line_cents.insert(row + 1, self._line_cents[row])
+        self._total_cents += self._line_cents[row]
         
         self.beginInsertRows(QModelIndex(), row + 1, row + 1)
         self.endInsertRows()
@@ -254,9 +266,9 @@ class ItemsTableModel(QAbstractTableModel):
     def getItems(self) -> List[Dict[str, Any]]:
         """Retorna todos los items con subtotales calculados."""
         items_with_subtotal = []
-        for item in self._items:
+        for item, cents in zip(self._items, self._line_cents):
             item_copy = item.copy()
-            item_copy['subtotal'] = self._calculate_subtotal(item)
+            item_copy['subtotal'] = from_cents(cents)
             items_with_subtotal.append(item_copy)
         return items_with_subtotal
     
@@ -265,14 +277,20 @@ class ItemsTableModel(QAbstractTableModel):
         self.beginResetModel()
         self._items = []
         for item in items:
-            self._items.append({
+            line = {
                 'code': item.get('code', ''),
                 'description': item.get('description', ''),
                 'quantity': float(item.get('quantity', 1.0)),
                 'unit': item.get('unit', 'UND'),
                 'unit_price': float(item.get('unit_price', 0.0)),
                 'discount_percent': float(item.get('discount_percent', 0.0))
-            })
+            }
+            if item.get('id') is not None:
+                # id de la línea guardada: update_invoice/update_quotation la actualizan en su lugar
+                line['id'] = item['id']
+            self._items.append(line)
+        self._line_cents = [self._line_total_cents(item) for item in self._items]
+        self._total_cents = sum(self._line_cents)
         self.endResetModel()
         self.dataChangedSignal.emit()
     
@@ -280,19 +298,29 @@ class ItemsTableModel(QAbstractTableModel):
         """Limpia todos los items."""
         self.beginResetModel()
         self._items = []
+        self._line_cents = []
+        self._total_cents = 0
         self.endResetModel()
         self.dataChangedSignal.emit()
     
     def getTotalAmount(self) -> float:
-        """Calcula el monto total de todos los items."""
-        return sum(self._calculate_subtotal(item) for item in self._items)
-    
+        """Monto total de todos los items (total acumulado, sin recorrer filas)."""
+        return from_cents(self._total_cents)
+
+    def getTotalCents(self) -> int:
+        """Monto total en centavos."""
+        return self._total_cents
+
+    def _refresh_line(self, row: int) -> None:
+        """Recalcula el importe de una fila y ajusta el total acumulado."""
+        cents = self._line_total_cents(self._items[row])
+        self._total_cents += cents - self._line_cents[row]
+        self._line_cents[row] = cents
+
+    def _line_total_cents(self, item: Dict[str, Any]) -> int:
+        return line_total_cents(item.get('quantity', 0.0), item.get('unit_price', 0.0),
+                                item.get('discount_percent', 0.0))
+
     def _calculate_subtotal(self, item: Dict[str, Any]) -> float:
         """Calcula el subtotal de un item con descuento."""
-        quantity = item.get('quantity', 0.0)
-        unit_price = item.get('unit_price', 0.0)
-        discount_percent = item.get('discount_percent', 0.0)
-        
-        subtotal = quantity * unit_price
-        discount_amount = subtotal * (discount_percent / 100.0)
-        return subtotal - discount_amount
+        return from_cents(self._line_total_cents(item))
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark de DocSearchService (índice FTS5 `doc_search`).
+
+Genera una base temporal con N líneas de factura (1 millón por defecto) con
+descripciones de ferretería, deja que los triggers llenen el índice y mide
+búsquedas típicas: palabra común, cabecera + línea, código, NCF, RNC con
+guiones, prefijo corto y sin resultados (mejor de varias repeticiones).
+
+Uso:
+    python scripts/benchmark_doc_search.py
+    python scripts/benchmark_doc_search.py --lines 200000 --per-invoice 10
+    python scripts/benchmark_doc_search.py --json
+"""
+
+import sys
+import os
+import argparse
+import contextlib
+import io
+import json
+import random
+import sqlite3
+import tempfile
+import time
+from typing import Any, Dict, List
+
+# Agregar el directorio raíz al path para imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.doc_search_service import DocSearchService
+from services.schema_migrations import migrate
+
+WORDS = ("cemento arena varilla block tubo pintura cable breaker clavo madera plywood yeso cerámica "
+         "inodoro lavamanos llave codo tee adaptador malla alambre").split()
+
+QUERIES = ["cemento", "cemento ferreteria", "MAT00042", "B0100001234", "100-00001-7",
+           "cliente 17 varilla", "ce", "zzz"]
+
+
+def build_dataset(db_path: str, lines: int, per_invoice: int, items: int, clients: int) -> None:
+    """Carga empresa, líneas y facturas sintéticas (el índice lo llenan los triggers)."""
+    rnd = random.Random(42)
+    conn = sqlite3.connect(db_path)
+    migrate(conn)
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA journal_mode = MEMORY")
+    conn.execute("INSERT INTO companies (name, rnc) VALUES ('Empresa', '101010101')")
+    invoices = lines // per_invoice
+    # Líneas antes que cabeceras: el trigger de la factura indexa el documento completo una sola vez
+    conn.executemany(
+        "INSERT INTO invoice_items (invoice_id, item_code, description, quantity, unit_price)"
+        " VALUES (?, ?, ?, 1, 1)",
+        ((k // per_invoice + 1, f"MAT{rnd.randrange(items):05d}",
+          f"{rnd.choice(WORDS)} {rnd.choice(WORDS)} {rnd.randrange(1000)}") for k in range(invoices * per_invoice))
+    )
+    conn.executemany(
+        "INSERT INTO invoices (id, company_id, invoice_type, invoice_date, invoice_number, third_party_name,"
+        " rnc, currency, total_amount) VALUES (?, 1, 'emitida', '2025-01-15', ?, ?, ?, 'RD$', 0)",
+        ((n, f"B01{n:08d}", f"Cliente {n % clients} Ferretería {rnd.choice(WORDS)}",
+          f"{100000000 + n % clients}") for n in range(1, invoices + 1))
+    )
+    conn.commit()
+    conn.close()
+
+
+def run_benchmarks(db_path: str, repeat: int) -> List[Dict[str, Any]]:
+    svc = DocSearchService(db_path)
+    results = []
+    for query in QUERIES:
+        svc.search(query, 1, 'invoice')  # calentar caché de páginas
+        best, result = None, None
+        for _ in range(repeat):
+            result = svc.search(query, 1, 'invoice')
+            best = result['elapsed'] if best is None else min(best, result['elapsed'])
+        results.append({'query': query, 'total': result['total'], 'ranked': result['ranked'], 'seconds': best})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de búsqueda de documentos (FTS5)")
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--per-invoice", type=int, default=10, help="Líneas por factura")
+    parser.add_argument("--items", type=int, default=5000, help="Códigos distintos")
+    parser.add_argument("--clients", type=int, default=2000, help="Clientes distintos")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones por consulta")
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args()
+
+    fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            build_dataset(db_path, args.lines, args.per_invoice, args.items, args.clients)
+            build_s = time.perf_counter() - t0
+        results = run_benchmarks(db_path, args.repeat)
+    finally:
+        os.unlink(db_path)
+
+    if args.json:
+        print(json.dumps({'lines': args.lines, 'build_seconds': build_s, 'results': results}, indent=2))
+    else:
+        print(f"⏱️  {args.lines:,} líneas sintéticas indexadas (en {build_s:.1f} s)\n")
+        print(f"{'Búsqueda':<24} {'resultados':>12} {'ms':>8}")
+        print("-" * 46)
+        for r in results:
+            total = f"{r['total']}" if r['ranked'] else f">{r['total'] - 1}"
+            print(f"{r['query']:<24} {total:>12} {r['seconds'] * 1000:>8.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Benchmark de FirebaseDataAccess contra el Firestore local en memoria.
+
+Mide, por método de DataAccess, el tiempo por llamada y los round-trips
+(RPCs) y lecturas de documentos que genera, con latencia de red simulada.
+No requiere red ni credenciales.
+
+Uso:
+    python scripts/benchmark_firebase.py
+    python scripts/benchmark_firebase.py --latency-ms 40 --invoices 2000 --repeat 20
+    python scripts/benchmark_firebase.py --json
+"""
+
+import sys
+import os
+import argparse
+import json
+import sqlite3
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+# Agregar el directorio raíz al path para imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from firebase.fake_firestore import FakeFirestore
+from firebase.outbox import write_ops
+from data_access.firebase_data_access import FirebaseDataAccess
+
+
+def build_dataset(db: FakeFirestore, companies: int, invoices: int, items_per_invoice: int) -> None:
+    """Carga datos sintéticos (sin latencia) en el Firestore local."""
+    ops = []
+    for c in range(1, companies + 1):
+        ops.append(('set', f"companies/{c}", {'name': f"Empresa {c}", 'rnc': f"{c:09d}"}))
+    for i in range(1, 201):
+        ops.append(('set', f"items/{i}", {'code': f"MAT{i:04d}", 'name': f"Material {i}", 'unit': 'UND'}))
+        ops.append(('set', f"third_parties/{i}", {'rnc': f"{100000000 + i}", 'name': f"Cliente {i}"}))
+    for n in range(1, invoices + 1):
+        ops.append(('set', f"invoices/{n}", {
+            'company_id': (n % companies) + 1,
+            'invoice_number': f"B01{n:08d}",
+            'invoice_date': f"2025-{(n % 12) + 1:02d}-15",
+            'total_amount': 1000.0 + n,
+        }))
+        for k in range(items_per_invoice):
+            ops.append(('set', f"invoices/{n}/items/{k}", {
+                'description': f"Línea {k}", 'quantity': 1, 'unit_price': 100.0,
+            }))
+    latency, db.latency = db.latency, 0.0
+    write_ops(db, ops)
+    db.latency = latency
+
+
+def _measure(db: FakeFirestore, name: str, fn: Callable[[int], Any], repeat: int) -> Dict[str, Any]:
+    db.reset_stats()
+    start = time.perf_counter()
+    for i in range(repeat):
+        fn(i)
+    elapsed = time.perf_counter() - start
+    return {
+        'method': name,
+        'calls': repeat,
+        'ms_per_call': round(elapsed * 1000 / repeat, 3),
+        'rpcs_per_call': round(db.stats['rpcs'] / repeat, 2),
+        'reads_per_call': round(db.stats['reads'] / repeat, 2),
+        'writes_per_call': round(db.stats['writes'] / repeat, 2),
+    }
+
+
+def _bench_migration(db: FakeFirestore, invoices: int, items_per_invoice: int) -> Dict[str, Any]:
+    """Mide migrate_invoices (v2) desde una BD SQLite temporal."""
+    import migrate_sqlite_to_firebase_v2 as migration
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        with sqlite3.connect(path) as conn:
+            conn.executescript("""
+                CREATE TABLE invoices (id INTEGER PRIMARY KEY, company_id INTEGER, invoice_number TEXT,
+                                       invoice_date TEXT, invoice_type TEXT, rnc TEXT,
+                                       third_party_name TEXT, total_amount REAL);
+                CREATE TABLE invoice_items (id INTEGER PRIMARY KEY, invoice_id INTEGER, description TEXT,
+                                            quantity REAL, unit_price REAL, item_code TEXT, unit TEXT);
+            """)
+            conn.executemany("INSERT INTO invoices VALUES (?, 1, ?, '2025-01-01', 'emitida', '', '', 10)",
+                             [(n, f"B01{n:08d}") for n in range(1, invoices + 1)])
+            conn.executemany("INSERT INTO invoice_items (invoice_id, description, quantity, unit_price) "
+                             "VALUES (?, 'x', 1, 1)",
+                             [(n,) for n in range(1, invoices + 1) for _ in range(items_per_invoice)])
+            conn.commit()
+            db.reset_stats()
+            start = time.perf_counter()
+            import contextlib, io
+            with contextlib.redirect_stdout(io.StringIO()):
+                migration.migrate_invoices(conn, db)
+            elapsed = time.perf_counter() - start
+        return {
+            'method': f"migrate_invoices ({invoices} facturas)",
+            'calls': 1,
+            'ms_per_call': round(elapsed * 1000, 3),
+            'rpcs_per_call': db.stats['rpcs'],
+            'reads_per_call': db.stats['reads'],
+            'writes_per_call': db.stats['writes'],
+        }
+    finally:
+        os.unlink(path)
+
+
+def run_benchmarks(
+    latency_ms: float = 5.0,
+    companies: int = 5,
+    invoices: int = 500,
+    items_per_invoice: int = 5,
+    repeat: int = 10,
+    include_migration: bool = True
+) -> List[Dict[str, Any]]:
+    """
+    Ejecuta el benchmark completo y devuelve una fila de resultados por método.
+    """
+    db = FakeFirestore(latency=latency_ms / 1000.0)
+    build_dataset(db, companies, invoices, items_per_invoice)
+    da = FirebaseDataAccess(user_id='bench', db=db)
+
+    sample_items = [{'description': 'Cemento', 'quantity': 2, 'unit_price': 500.0}] * items_per_invoice
+    invoice = {'company_id': 1, 'invoice_type': 'emitida', 'invoice_date': '2025-06-01', 'total_amount': 1180.0}
+
+    cases = [
+        ('get_all_companies', lambda i: da.get_all_companies()),
+        ('get_company_details', lambda i: da.get_company_details(1)),
+        ('get_invoices(limit=50)', lambda i: da.get_invoices(company_id=1, limit=50)),
+        ('get_invoices(offset=200)', lambda i: da.get_invoices(company_id=1, limit=50, offset=200)),
+        ('get_invoice_by_id', lambda i: da.get_invoice_by_id(i + 1)),
+        ('get_invoice_items', lambda i: da.get_invoice_items(i + 1)),
+        ('get_items_like', lambda i: da.get_items_like('material 1', limit=10)),
+        ('get_item_by_code', lambda i: da.get_item_by_code('MAT0007')),
+        ('get_third_party_by_rnc', lambda i: da.get_third_party_by_rnc('100000007')),
+        ('search_third_parties', lambda i: da.search_third_parties('Cliente 1')),
+        ('get_next_ncf', lambda i: da.get_next_ncf(1, 'B01')),
+        ('add_invoice', lambda i: da.add_invoice(dict(invoice), sample_items)),
+        ('add_quotation', lambda i: da.add_quotation(dict(invoice), sample_items)),
+    ]
+    results = [_measure(db, name, fn, repeat) for name, fn in cases]
+
+    # Escritura vía outbox (encolar localmente; el envío va en segundo plano)
+    fd, outbox_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        da_outbox = FirebaseDataAccess(user_id='bench', db=db, outbox_path=outbox_path)
+        da_outbox.set_online(False)
+        da_outbox._get_id_allocator().reserve('invoices', repeat)
+        row = _measure(db, 'add_invoice (outbox)', lambda i: da_outbox.add_invoice(dict(invoice), sample_items), repeat)
+        results.append(row)
+    finally:
+        os.unlink(outbox_path)
+
+    if include_migration:
+        results.append(_bench_migration(FakeFirestore(latency=latency_ms / 1000.0),
+                                        min(invoices, 100), items_per_invoice))
+    return results
+
+
+def print_table(results: List[Dict[str, Any]]) -> None:
+    print(f"{'Método':<36} {'ms/llamada':>11} {'RPCs':>8} {'lecturas':>9} {'escrituras':>11}")
+    print("-" * 79)
+    for r in results:
+        print(f"{r['method']:<36} {r['ms_per_call']:>11.2f} {r['rpcs_per_call']:>8} "
+              f"{r['reads_per_call']:>9} {r['writes_per_call']:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de FirebaseDataAccess (Firestore local)")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Latencia simulada por RPC")
+    parser.add_argument("--companies", type=int, default=5)
+    parser.add_argument("--invoices", type=int, default=500)
+    parser.add_argument("--items", type=int, default=5, help="Ítems por factura")
+    parser.add_argument("--repeat", type=int, default=10, help="Llamadas por método")
+    parser.add_argument("--no-migration", action="store_true")
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args()
+
+    import contextlib, io
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        results = run_benchmarks(args.latency_ms, args.companies, args.invoices, args.items,
+                                 args.repeat, not args.no_migration)
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+    else:
+        print(f"⏱️  Latencia simulada: {args.latency_ms} ms/RPC — {args.invoices} facturas\n")
+        print_table(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
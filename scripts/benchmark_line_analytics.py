@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark de LineAnalyticsService sobre líneas de factura sintéticas.
+
+Genera una base temporal con N líneas (5 millones por defecto) y mide el
+ranking por ítem, por cliente, por mes y la auditoría de ITBIS con cada
+motor (NumPy por bloques y GROUP BY de SQLite), contra el recorrido en
+Python de dicts al estilo `get_invoice_items`, más una consulta repetida
+servida desde la caché.
+
+Uso:
+    python scripts/benchmark_line_analytics.py
+    python scripts/benchmark_line_analytics.py --lines 1000000 --per-invoice 10
+    python scripts/benchmark_line_analytics.py --json
+"""
+
+import sys
+import os
+import argparse
+import contextlib
+import io
+import json
+import random
+import sqlite3
+import tempfile
+import time
+from typing import Any, Dict, List
+
+# Agregar el directorio raíz al path para imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.line_analytics_service import LineAnalyticsService, _load_numpy
+from services.schema_migrations import migrate
+
+
+def build_dataset(db_path: str, lines: int, per_invoice: int, items: int, clients: int) -> None:
+    """Carga empresas, catálogo, facturas y líneas sintéticas."""
+    rnd = random.Random(42)
+    conn = sqlite3.connect(db_path)
+    migrate(conn)
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA journal_mode = MEMORY")
+    conn.execute("INSERT INTO companies (name, rnc) VALUES ('Empresa', '101010101')")
+    conn.executemany(
+        "INSERT INTO items (code, name, unit, cost, price) VALUES (?, ?, 'UND', ?, ?)",
+        [(f"MAT{i:05d}", f"Material {i}", round(rnd.uniform(1, 500), 2), 0) for i in range(items)]
+    )
+    invoices = lines // per_invoice
+    conn.executemany(
+        "INSERT INTO invoices (id, company_id, invoice_type, invoice_date, invoice_number, rnc, currency,"
+        " itbis, total_amount, total_amount_rd) VALUES (?, 1, 'emitida', ?, ?, ?, 'RD$', ?, 0, 0)",
+        ((n, f"202{n % 5}-{n % 12 + 1:02d}-15", f"B01{n:08d}", f"{100000000 + n % clients}",
+          round(rnd.uniform(10, 5000), 2)) for n in range(1, invoices + 1))
+    )
+    conn.executemany(
+        "INSERT INTO invoice_items (invoice_id, item_code, description, quantity, unit_price)"
+        " VALUES (?, ?, 'x', ?, ?)",
+        ((k // per_invoice + 1, f"MAT{rnd.randrange(items):05d}", rnd.randint(1, 20),
+          round(rnd.uniform(1, 900), 2)) for k in range(invoices * per_invoice))
+    )
+    conn.commit()
+    conn.close()
+
+
+def python_loop(db_path: str) -> int:
+    """Referencia: dicts por línea agrupados en Python (como se haría con get_invoice_items)."""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    costs = {r['code']: r['cost'] for r in conn.execute("SELECT code, cost FROM items")}
+    totals: Dict[str, List[float]] = {}
+    for r in conn.execute("SELECT li.item_code, li.quantity, li.unit_price FROM invoice_items li"
+                          " JOIN invoices i ON i.id = li.invoice_id WHERE i.invoice_type = 'emitida'"):
+        row = dict(r)
+        acc = totals.setdefault(row['item_code'], [0.0, 0.0])
+        acc[0] += row['quantity'] * row['unit_price']
+        acc[1] += row['quantity'] * costs.get(row['item_code'], 0)
+    conn.close()
+    return len(totals)
+
+
+def _timed(fn) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def run_benchmarks(db_path: str) -> List[Dict[str, Any]]:
+    results = [{'case': 'python dicts (item_code)', 'seconds': _timed(lambda: python_loop(db_path))}]
+    engines = [('sql', False)] + ([('numpy', True)] if _load_numpy() else [])
+    for name, use_numpy in engines:
+        svc = LineAnalyticsService(db_path, use_numpy=use_numpy)
+        for by in ('item_code', 'client', 'month'):
+            results.append({'case': f"{name} aggregate({by})",
+                            'seconds': _timed(lambda: svc.aggregate(by, 1))})
+        results.append({'case': f"{name} itbis_audit", 'seconds': _timed(lambda: svc.itbis_audit(1))})
+        results.append({'case': f"{name} aggregate(item_code) en caché",
+                        'seconds': _timed(lambda: svc.aggregate('item_code', 1))})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de agregación de líneas de factura")
+    parser.add_argument("--lines", type=int, default=5_000_000)
+    parser.add_argument("--per-invoice", type=int, default=8, help="Líneas por factura")
+    parser.add_argument("--items", type=int, default=5000, help="Ítems distintos")
+    parser.add_argument("--clients", type=int, default=2000, help="Clientes distintos")
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args()
+
+    fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            build_dataset(db_path, args.lines, args.per_invoice, args.items, args.clients)
+            build_s = time.perf_counter() - t0
+        results = run_benchmarks(db_path)
+    finally:
+        os.unlink(db_path)
+
+    if args.json:
+        print(json.dumps({'lines': args.lines, 'build_seconds': build_s, 'results': results}, indent=2))
+    else:
+        print(f"⏱️  {args.lines:,} líneas sintéticas (generadas en {build_s:.1f} s)\n")
+        print(f"{'Caso':<40} {'segundos':>10}")
+        print("-" * 51)
+        for r in results:
+            print(f"{r['case']:<40} {r['seconds']:>10.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
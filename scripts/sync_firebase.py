@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Sincronización incremental SQLite ⇄ Firebase.
+
+Envía sólo las filas registradas en `change_log` desde la última ejecución
+y trae los documentos remotos modificados desde el último pull.
+
+Uso:
+    python scripts/sync_firebase.py [ruta_bd]            # push + pull
+    python scripts/sync_firebase.py [ruta_bd] --push     # sólo subir
+    python scripts/sync_firebase.py [ruta_bd] --pull     # sólo bajar
+    python scripts/sync_firebase.py [ruta_bd] --seed     # primera vez (marca todo como pendiente)
+"""
+
+import sys
+import os
+import argparse
+
+# Agregar el directorio raíz al path para imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.sync_service import SyncService, CONFLICT_POLICIES
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sincronización incremental SQLite ⇄ Firebase")
+    parser.add_argument("db_path", nargs="?", default="facturas_cotizaciones.db")
+    parser.add_argument("--push", action="store_true", help="Sólo enviar cambios locales")
+    parser.add_argument("--pull", action="store_true", help="Sólo traer cambios remotos")
+    parser.add_argument("--seed", action="store_true", help="Marcar todas las filas como pendientes")
+    parser.add_argument("--policy", choices=CONFLICT_POLICIES, default="newer_wins")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db_path):
+        print(f"❌ Error: La base de datos no existe: {args.db_path}")
+        return 1
+
+    from firebase import get_firebase_client
+    client = get_firebase_client()
+    if not client.is_available():
+        print("❌ Firebase no está disponible (revisa credenciales)")
+        return 1
+
+    sync = SyncService(args.db_path, client.get_firestore(), conflict_policy=args.policy)
+
+    if args.seed:
+        print(f"🌱 Filas marcadas como pendientes: {sync.seed_full()}")
+
+    print(f"📋 Cambios pendientes: {sync.pending_changes()}")
+    do_push = args.push or not args.pull
+    do_pull = args.pull or not args.push
+
+    if do_push:
+        stats = sync.push()
+        print(f"⬆️  Push: {stats['written']} escritos, {stats['deleted']} eliminados, "
+              f"{stats['conflicts']} conflictos")
+    if do_pull:
+        stats = sync.pull()
+        print(f"⬇️  Pull: {stats['applied']} aplicados, {stats['conflicts']} conflictos")
+
+    sync.compact_log()
+    print("✅ Sincronización completada")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,286 @@
+"""
+Archivo de años fiscales cerrados en bases SQLite por año.
+
+El cierre de un año (`archive_year`) mueve sus facturas e ítems de
+`invoices`/`invoice_items` a un archivo propio (`archivo/<base>_<año>.db`
+junto a la base) y lo anota en `fiscal_archives`. La base "caliente" queda
+con los años abiertos: consultas, respaldos y mantenimiento no cargan con la
+historia.
+
+Para leer, `connect()` abre una conexión a la base con los archivos que
+pide el rango de fechas adjuntos en sólo lectura (`ATTACH 'file:...?mode=ro'`)
+y vistas TEMP `invoices`/`invoice_items` que unen (UNION ALL) la tabla de
+`main` con las de cada archivo. Como las vistas TEMP tapan a las tablas del
+mismo nombre, las consultas existentes (reportes DGII, chequeos de NCF,
+get_facturas) abarcan los archivos sin cambiar su SQL; SQLite empuja los
+filtros a cada parte de la unión y usa sus índices.
+
+El cierre es en dos pasos: se copia y se confirma en el archivo, y recién
+después se borra de la base y se registra el año en `fiscal_archives`. Si se
+corta en el medio, el año no figura como archivado (no se adjunta) y
+repetir el cierre reemplaza las filas ya copiadas. Las bajas no quedan en
+`change_log` (no son borrados para la sincronización) ni en `sales_summary`:
+las filas del resumen del año se reponen en la misma transacción, así el
+tablero mensual sigue mostrando los años archivados.
+
+Uso:
+    svc = ArchiveService(db_path)
+    svc.closable_years()                        # [2022, 2023]
+    ok, msg = svc.archive_year(2023)
+    with svc.connect("2023-03-01", "2023-04-01") as conn:
+        conn.execute("SELECT ... FROM invoices WHERE ...")
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.request import pathname2url
+
+ARCHIVE_TABLES = ('invoices', 'invoice_items')
+
+
+def install_fiscal_archives(conn: sqlite3.Connection) -> None:
+    """Crea el registro de años archivados (idempotente; migración 14)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS fiscal_archives (
+            year INTEGER PRIMARY KEY,
+            file_name TEXT NOT NULL,
+            invoice_count INTEGER NOT NULL DEFAULT 0,
+            item_count INTEGER NOT NULL DEFAULT 0,
+            archived_at TEXT NOT NULL
+        )
+    """)
+
+
+def _uri(path: str, mode: str) -> str:
+    return f"file:{pathname2url(os.path.abspath(path))}?mode={mode}"
+
+
+def _columns(conn: sqlite3.Connection, schema: str, table: str) -> List[Tuple[str, bool]]:
+    """(columna, generada) en orden; vacío si la tabla no existe."""
+    return [(r[1], r[6] in (2, 3)) for r in conn.execute(f"PRAGMA {schema}.table_xinfo({table})") if r[6] != 1]
+
+
+def years_in_range(years, start_date: Optional[str] = None, end_date: Optional[str] = None) -> List[int]:
+    """Años de `years` que se cruzan con el rango de fechas ('AAAA-MM-DD'; None = abierto)."""
+    first = int(str(start_date)[:4]) if start_date else None
+    last = int(str(end_date)[:4]) if end_date else None
+    return [y for y in years if (first is None or y >= first) and (last is None or y <= last)]
+
+
+class ArchiveConnection(sqlite3.Connection):
+    """Conexión de lectura con años archivados adjuntos (`archive_years`)."""
+
+    archive_years: List[int] = []
+
+
+class ArchiveService:
+    """Cierre de años fiscales y lectura transparente de los archivos."""
+
+    def __init__(self, db_path: str, archive_dir: Optional[str] = None):
+        """
+        Args:
+            db_path: Ruta a la base de datos
+            archive_dir: Carpeta de los archivos por año (default: "archivo" junto a la base)
+        """
+        self.db_path = db_path
+        self.archive_dir = archive_dir or os.path.join(os.path.dirname(os.path.abspath(db_path)), "archivo")
+
+    def archive_path(self, year: int) -> str:
+        stem = os.path.splitext(os.path.basename(self.db_path))[0]
+        return os.path.join(self.archive_dir, f"{stem}_{int(year)}.db")
+
+    # -------------------------
+    # Registro
+    # -------------------------
+    def list_archives(self) -> List[Dict[str, Any]]:
+        """Años archivados con su archivo y cantidades."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                rows = conn.execute("SELECT * FROM fiscal_archives ORDER BY year").fetchall()
+        except sqlite3.OperationalError:
+            return []  # base sin la migración 14
+        return [dict(r) for r in rows]
+
+    def archived_years(self) -> List[int]:
+        return [a['year'] for a in self.list_archives()]
+
+    def years_for_range(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> List[int]:
+        """Años archivados que se cruzan con el rango de fechas."""
+        return years_in_range(self.archived_years(), start_date, end_date)
+
+    def closable_years(self, today: Optional[date] = None) -> List[int]:
+        """Años anteriores al actual que todavía tienen facturas en la base."""
+        current = (today or date.today()).year
+        with sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute("""
+                SELECT DISTINCT CAST(substr(invoice_date, 1, 4) AS INTEGER) FROM invoices
+                 WHERE invoice_date < ? ORDER BY 1
+            """, (f"{current:04d}-01-01",)).fetchall()
+        return [r[0] for r in rows if r[0]]
+
+    # -------------------------
+    # Cierre
+    # -------------------------
+    def _ensure_archive_schema(self, path: str) -> None:
+        """Crea en el archivo las tablas e índices de invoices/invoice_items con el DDL de la base."""
+        with sqlite3.connect(self.db_path) as src:
+            ddl = src.execute(f"""
+                SELECT type, name, sql FROM sqlite_master
+                 WHERE tbl_name IN ({', '.join('?' * len(ARCHIVE_TABLES))}) AND sql IS NOT NULL
+                   AND type IN ('table', 'index')
+                 ORDER BY type = 'index'
+            """, ARCHIVE_TABLES).fetchall()
+        conn = sqlite3.connect(path)
+        try:
+            existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master")}
+            for _type, name, sql in ddl:
+                if name not in existing:
+                    conn.execute(sql)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def archive_year(self, year: int, today: Optional[date] = None) -> Tuple[bool, str]:
+        """
+        Mueve las facturas (e ítems) de un año cerrado a su archivo.
+
+        Args:
+            year: Año fiscal a cerrar (anterior al actual)
+            today: Fecha de referencia (tests)
+
+        Returns:
+            Tuple de (success, mensaje)
+        """
+        year = int(year)
+        if year >= (today or date.today()).year:
+            return False, f"El año {year} todavía no está cerrado"
+        start, end = f"{year:04d}-01-01", f"{year + 1:04d}-01-01"
+        path = self.archive_path(year)
+        try:
+            os.makedirs(self.archive_dir, exist_ok=True)
+            self._ensure_archive_schema(path)
+
+            conn = sqlite3.connect(_uri(self.db_path, "rw"), uri=True, isolation_level=None, timeout=30)
+            try:
+                invoice_ids = "SELECT id FROM main.invoices WHERE invoice_date >= ? AND invoice_date < ?"
+                count = conn.execute(f"SELECT COUNT(*) FROM ({invoice_ids})", (start, end)).fetchone()[0]
+                if not count:
+                    return False, f"No hay facturas de {year} en la base"
+                conn.execute("ATTACH DATABASE ? AS arch", (_uri(path, "rw"),))
+
+                # 1) Copia al archivo (columnas comunes no generadas)
+                conn.execute("BEGIN IMMEDIATE")
+                copied = {}
+                for table in ARCHIVE_TABLES:
+                    target = {c for c, generated in _columns(conn, "arch", table) if not generated}
+                    cols = ", ".join(c for c, generated in _columns(conn, "main", table)
+                                     if not generated and c in target)
+                    where = "invoice_id IN (" + invoice_ids + ")" if table == 'invoice_items' else \
+                        "invoice_date >= ? AND invoice_date < ?"
+                    copied[table] = conn.execute(
+                        f"INSERT OR REPLACE INTO arch.{table} ({cols}) SELECT {cols} FROM main.{table} WHERE {where}",
+                        (start, end)
+                    ).rowcount
+                conn.execute("COMMIT")
+                if copied['invoices'] != count:
+                    return False, f"Copia incompleta: {copied['invoices']} de {count} facturas"
+
+                # 2) Baja en la base caliente y registro del año
+                conn.execute("BEGIN IMMEDIATE")
+                last_change = conn.execute("SELECT COALESCE(MAX(id), 0) FROM main.change_log").fetchone()[0]
+                periods = (f"{year:04d}-01", f"{year + 1:04d}-01")
+                has_summary = bool(_columns(conn, "main", "sales_summary"))
+                if has_summary:
+                    conn.execute("DROP TABLE IF EXISTS temp._summary_keep")
+                    conn.execute("CREATE TEMP TABLE _summary_keep AS SELECT * FROM main.sales_summary"
+                                 " WHERE period >= ? AND period < ?", periods)
+                conn.execute(f"DELETE FROM main.invoice_items WHERE invoice_id IN ({invoice_ids})", (start, end))
+                conn.execute("DELETE FROM main.invoices WHERE invoice_date >= ? AND invoice_date < ?", (start, end))
+                # Archivar no es borrar: que la sincronización no lo propague
+                conn.execute("DELETE FROM main.change_log WHERE id > ?", (last_change,))
+                if has_summary:
+                    # ...ni el resumen mensual (trg_invoices_summary_del descontó el año)
+                    conn.execute("DELETE FROM main.sales_summary WHERE period >= ? AND period < ?", periods)
+                    conn.execute("INSERT INTO main.sales_summary SELECT * FROM temp._summary_keep")
+                    conn.execute("DROP TABLE temp._summary_keep")
+                conn.execute("""
+                    INSERT INTO main.fiscal_archives (year, file_name, invoice_count, item_count, archived_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(year) DO UPDATE SET
+                        file_name = excluded.file_name,
+                        invoice_count = invoice_count + excluded.invoice_count,
+                        item_count = item_count + excluded.item_count,
+                        archived_at = excluded.archived_at
+                """, (year, os.path.basename(path), copied['invoices'], copied['invoice_items'],
+                      datetime.now().isoformat(timespec='seconds')))
+                conn.execute("COMMIT")
+            except Exception:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.close()
+        except (sqlite3.Error, OSError) as e:
+            print(f"[ARCHIVE] Error al archivar {year}: {e}")
+            return False, f"Error al archivar {year}: {e}"
+
+        message = f"Año {year} archivado: {copied['invoices']} facturas, {copied['invoice_items']} ítems -> {path}"
+        print(f"[ARCHIVE] {message}")
+        return True, message
+
+    # -------------------------
+    # Lectura
+    # -------------------------
+    def connect(
+        self,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        all_years: bool = False,
+        timeout: float = 5.0
+    ) -> ArchiveConnection:
+        """
+        Conexión a la base donde `invoices`/`invoice_items` incluyen los años archivados necesarios.
+
+        Args:
+            start_date, end_date: Rango consultado; se adjuntan los años que lo cruzan
+            all_years: Adjuntar todos los años archivados (chequeos de NCF)
+
+        Returns:
+            ArchiveConnection (`archive_years` = años adjuntos; sin archivos es una conexión común)
+        """
+        if all_years:
+            years = self.archived_years()
+        elif start_date or end_date:
+            years = self.years_for_range(start_date, end_date)
+        else:
+            years = []
+        conn = sqlite3.connect(_uri(self.db_path, "rwc"), uri=True, timeout=timeout, factory=ArchiveConnection)
+        limit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+        if len(years) > limit:
+            print(f"[ARCHIVE] Sólo se adjuntan los últimos {limit} de {len(years)} años archivados")
+            years = years[-limit:]
+
+        attached = []
+        for year in years:
+            path = self.archive_path(year)
+            if not os.path.exists(path):
+                print(f"[ARCHIVE] Falta el archivo del año {year}: {path}")
+                continue
+            conn.execute("ATTACH DATABASE ? AS ?", (_uri(path, "ro"), f"arch_{year}"))
+            attached.append(year)
+
+        if attached:
+            for table in ARCHIVE_TABLES:
+                columns = [c for c, _generated in _columns(conn, "main", table)]
+                parts = [f"SELECT {', '.join(columns)} FROM main.{table}"]
+                for year in attached:
+                    present = {c for c, _generated in _columns(conn, f"arch_{year}", table)}
+                    select = ", ".join(c if c in present else f"NULL AS {c}" for c in columns)
+                    parts.append(f"SELECT {select} FROM arch_{year}.{table}")
+                conn.execute(f"CREATE TEMP VIEW {table} AS " + " UNION ALL ".join(parts))
+        conn.archive_years = attached
+        return conn
@@ -12,49 +12,57 @@ from typing import Optional, Dict, Any, List
 class AuditService:
     """Servicio centralizado de auditoría."""
     
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, ensure_schema: bool = True):
         """
         Inicializa el servicio de auditoría.
         
         Args:
             db_path: Ruta a la base de datos
+            ensure_schema: Crear la tabla si no existe (False cuando el
+                esquema ya lo aplicó services.schema_migrations)
         """
         self.db_path = db_path
-        self._ensure_audit_log_table()
+        if ensure_schema:
+            self._ensure_audit_log_table()
     
     def _ensure_audit_log_table(self):
         """Crea la tabla audit_log si no existe."""
         with sqlite3.connect(self.db_path) as conn:
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS audit_log (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    entity_type TEXT NOT NULL,
-                    entity_id INTEGER NOT NULL,
-                    action TEXT NOT NULL,
-                    user TEXT,
-                    timestamp TEXT NOT NULL,
-                    payload_before TEXT,
-                    payload_after TEXT,
-                    ip_address TEXT,
-                    user_agent TEXT
-                )
-            """)
-            
-            # Índices para optimización
-            conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_audit_entity 
-                ON audit_log(entity_type, entity_id)
-            """)
-            
-            conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_audit_timestamp 
-                ON audit_log(timestamp DESC)
-            """)
-            
-            conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_audit_action 
-                ON audit_log(action)
-            """)
+            self.create_schema(conn)
+
+    @staticmethod
+    def create_schema(conn: sqlite3.Connection):
+        """Crea la tabla audit_log y sus índices en la conexión dada."""
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS audit_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                entity_type TEXT NOT NULL,
+                entity_id INTEGER NOT NULL,
+                action TEXT NOT NULL,
+                user TEXT,
+                timestamp TEXT NOT NULL,
+                payload_before TEXT,
+                payload_after TEXT,
+                ip_address TEXT,
+                user_agent TEXT
+            )
+        """)
+        
+        # Índices para optimización
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_audit_entity 
+            ON audit_log(entity_type, entity_id)
+        """)
+        
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_audit_timestamp 
+            ON audit_log(timestamp DESC)
+        """)
+        
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_audit_action 
+            ON audit_log(action)
+        """)
     
     def log_action(
         self,
@@ -0,0 +1,463 @@
+"""
+Respaldos en caliente de la base de datos con la API de backup de SQLite.
+
+En lugar de copiar el archivo `.db` (que puede quedar a medias si hay una
+escritura en curso), se usa `sqlite3.Connection.backup` por tramos de
+páginas: entre tramo y tramo se suelta el bloqueo de lectura, así la app
+puede seguir facturando mientras se respalda. Si otra conexión escribe
+durante el respaldo, SQLite reinicia la copia y el resultado siempre es
+una instantánea consistente.
+
+- La copia se comprime en streaming (gzip, o zstd si está instalado
+  `zstandard`) y se acompaña de un manifiesto JSON con la versión del
+  esquema, las filas por tabla y el SHA-256 del archivo comprimido.
+- Retención generacional: se conserva el último respaldo de cada uno de los
+  últimos N días y de cada una de las últimas M semanas; el resto se borra.
+- `verify_backup` descomprime a un temporal y comprueba
+  `PRAGMA integrity_check`, el SHA-256 y las filas por tabla del manifiesto.
+- Los años fiscales cerrados (ArchiveService) viven sólo en sus archivos
+  `archivo/<base>_<año>.db`: cada respaldo los incluye en su manifiesto
+  ('archives'). La copia comprimida se guarda una vez por contenido en
+  `<respaldos>/archivo/` y la comparten todos los respaldos que la
+  referencian; la retención borra las que ya nadie usa. Verificar y
+  restaurar también cubren los archivos.
+
+Uso:
+    svc = BackupService(db_path)
+    ok, path = svc.create_backup(progress=lambda frac: ...)
+    svc.verify_backup(path)          # (True, "Backup verificado: ...")
+    svc.start_background(done=...)   # en un hilo
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from services.archive_service import ArchiveService
+
+zstandard = None  # se carga al primer uso (dependencia opcional)
+
+BACKUP_PREFIX = "facot_"
+_NAME_RE = re.compile(rf"^{BACKUP_PREFIX}(\d{{8}}_\d{{6}})\.db(\.gz|\.zst)?$")
+_STAMP_FORMAT = "%Y%m%d_%H%M%S"
+_COPY_CHUNK = 1024 * 1024
+ARCHIVE_SUBDIR = "archivo"
+
+
+def _load_zstandard() -> bool:
+    global zstandard
+    if zstandard is not None:
+        return True
+    try:
+        import zstandard as _zstd
+        zstandard = _zstd
+        return True
+    except ImportError:
+        return False
+
+
+def _open_compressed(path: str, mode: str, name: Optional[str] = None):
+    """Abre un archivo .gz/.zst/.db (según `name` o la ruta) para leer o escribir en streaming."""
+    name = name or path
+    if name.endswith(".gz"):
+        return gzip.open(path, mode, compresslevel=6) if "w" in mode else gzip.open(path, mode)
+    if name.endswith(".zst"):
+        if not _load_zstandard():
+            raise RuntimeError("zstandard no está instalado (pip install zstandard)")
+        raw = open(path, mode)
+        if "w" in mode:
+            return zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=True)
+        return zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+    return open(path, mode)
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_COPY_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def table_counts(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Filas por tabla de usuario (sin las internas de SQLite)."""
+    tables = [r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )]
+    return {t: conn.execute(f'SELECT COUNT(*) FROM "{t}"').fetchone()[0] for t in tables}
+
+
+class BackupService:
+    """Respaldos consistentes, comprimidos y con retención de la base SQLite."""
+
+    def __init__(
+        self,
+        db_path: str,
+        backup_dir: Optional[str] = None,
+        compression: Optional[str] = "gzip",
+        pages_per_step: int = 256,
+        step_sleep: float = 0.005,
+        keep_daily: int = 7,
+        keep_weekly: int = 4
+    ):
+        """
+        Args:
+            db_path: Ruta a la base de datos a respaldar
+            backup_dir: Carpeta de respaldos (default: "backups" junto a la base)
+            compression: 'gzip', 'zstd' o None (sin comprimir)
+            pages_per_step: Páginas copiadas por tramo (entre tramos se libera el bloqueo)
+            step_sleep: Pausa en segundos entre tramos
+            keep_daily / keep_weekly: Días y semanas con respaldo que se conservan
+        """
+        if compression not in ("gzip", "zstd", None):
+            raise ValueError(f"Compresión no soportada: {compression}")
+        self.db_path = db_path
+        self.backup_dir = backup_dir or os.path.join(os.path.dirname(os.path.abspath(db_path)), "backups")
+        self.compression = compression
+        self.pages_per_step = pages_per_step
+        self.step_sleep = step_sleep
+        self.keep_daily = keep_daily
+        self.keep_weekly = keep_weekly
+        self.archives = ArchiveService(db_path)
+        self._lock = threading.Lock()
+
+    # -------------------------
+    # Crear
+    # -------------------------
+    def _extension(self) -> str:
+        if self.compression == "zstd" and _load_zstandard():
+            return ".db.zst"
+        return ".db.gz" if self.compression else ".db"
+
+    def create_backup(
+        self,
+        progress: Optional[Callable[[float], None]] = None,
+        now: Optional[datetime] = None
+    ) -> Tuple[bool, str]:
+        """
+        Crea un respaldo y aplica la retención.
+
+        Args:
+            progress: Recibe la fracción copiada (0.0 a 1.0)
+            now: Fecha del respaldo (para el nombre; default: ahora)
+
+        Returns:
+            (True, ruta del respaldo) o (False, mensaje de error)
+        """
+        if not self._lock.acquire(blocking=False):
+            return False, "Ya hay un backup en curso"
+        try:
+            os.makedirs(self.backup_dir, exist_ok=True)
+            stamp = (now or datetime.now()).strftime(_STAMP_FORMAT)
+            final_path = os.path.join(self.backup_dir, f"{BACKUP_PREFIX}{stamp}{self._extension()}")
+            fd, raw_path = tempfile.mkstemp(suffix=".db", dir=self.backup_dir)
+            os.close(fd)
+            try:
+                manifest = self._snapshot(raw_path, progress)
+                part_path = final_path + ".part"
+                self._compress(raw_path, part_path, final_path)
+                manifest['archives'] = self._backup_archives(raw_path)
+                manifest.update({
+                    'file': os.path.basename(final_path),
+                    'created_at': datetime.now().isoformat(),
+                    'raw_bytes': os.path.getsize(raw_path),
+                    'bytes': os.path.getsize(part_path),
+                    'sha256': _sha256(part_path),
+                })
+                os.replace(part_path, final_path)
+                with open(self._manifest_path(final_path), "w", encoding="utf-8") as f:
+                    json.dump(manifest, f, indent=2, ensure_ascii=False)
+            finally:
+                for leftover in (raw_path, final_path + ".part"):
+                    if os.path.exists(leftover):
+                        os.unlink(leftover)
+            removed = self.apply_retention(now)
+            print(f"[BACKUP] {os.path.basename(final_path)}: {manifest['raw_bytes']:,} -> "
+                  f"{manifest['bytes']:,} bytes; {len(removed)} respaldos antiguos eliminados")
+            return True, final_path
+        except Exception as e:
+            print(f"[BACKUP] Error creando backup: {e}")
+            return False, f"Error creando backup: {e}"
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def _compress(raw_path: str, part_path: str, final_name: str) -> None:
+        with open(raw_path, "rb") as src, _open_compressed(part_path, "wb", final_name) as dst:
+            shutil.copyfileobj(src, dst, _COPY_CHUNK)
+
+    def _snapshot(self, raw_path: str, progress: Optional[Callable[[float], None]],
+                  source: Optional[str] = None) -> Dict[str, Any]:
+        """Copia la base (o `source`) por tramos de páginas a `raw_path`; devuelve el manifiesto base."""
+        def on_step(_status, remaining, total):
+            if progress and total:
+                progress((total - remaining) / total)
+
+        src = sqlite3.connect(source or self.db_path)
+        dst = sqlite3.connect(raw_path)
+        try:
+            src.backup(dst, pages=self.pages_per_step, progress=on_step, sleep=self.step_sleep)
+            manifest = {
+                'schema_version': dst.execute("PRAGMA user_version").fetchone()[0],
+                'tables': table_counts(dst),
+            }
+        finally:
+            dst.close()
+            src.close()
+        if progress:
+            progress(1.0)
+        return manifest
+
+    def _backup_archives(self, snapshot_path: str) -> List[Dict[str, Any]]:
+        """
+        Copia comprimida de cada año archivado que registra la instantánea
+        (`fiscal_archives`), una vez por contenido en <respaldos>/archivo/.
+
+        Returns:
+            Entradas del manifiesto: year, file (relativo a la carpeta de respaldos), sha256, tables
+        """
+        conn = sqlite3.connect(snapshot_path)
+        try:
+            years = [r[0] for r in conn.execute("SELECT year FROM fiscal_archives ORDER BY year")]
+        except sqlite3.OperationalError:
+            years = []  # base sin la migración 14
+        finally:
+            conn.close()
+        entries = []
+        for year in years:
+            source = self.archives.archive_path(year)
+            if not os.path.exists(source):
+                raise FileNotFoundError(f"Falta el archivo del año {year}: {source}")
+            fd, raw_path = tempfile.mkstemp(suffix=".db", dir=self.backup_dir)
+            os.close(fd)
+            part_path = None
+            try:
+                info = self._snapshot(raw_path, None, source=source)
+                stem = os.path.splitext(os.path.basename(source))[0]
+                rel = os.path.join(ARCHIVE_SUBDIR, f"{stem}_{_sha256(raw_path)[:16]}{self._extension()}")
+                path = os.path.join(self.backup_dir, rel)
+                if not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    part_path = path + ".part"
+                    self._compress(raw_path, part_path, path)
+                    os.replace(part_path, path)
+            finally:
+                for leftover in (raw_path, part_path):
+                    if leftover and os.path.exists(leftover):
+                        os.unlink(leftover)
+            entries.append({'year': year, 'file': rel, 'sha256': _sha256(path), 'tables': info['tables']})
+        return entries
+
+    def _read_manifest(self, backup_path: str) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self._manifest_path(backup_path)):
+            return None
+        with open(self._manifest_path(backup_path), encoding="utf-8") as f:
+            return json.load(f)
+
+    def start_background(
+        self,
+        progress: Optional[Callable[[float], None]] = None,
+        done: Optional[Callable[[bool, str], None]] = None
+    ) -> threading.Thread:
+        """Ejecuta create_backup en un hilo; `done(ok, mensaje)` al terminar."""
+        def run():
+            result = self.create_backup(progress)
+            if done:
+                done(*result)
+
+        thread = threading.Thread(target=run, name="facot-backup", daemon=True)
+        thread.start()
+        return thread
+
+    def backup_if_due(self, max_age_hours: float = 24, **kwargs) -> Optional[Tuple[bool, str]]:
+        """Crea un respaldo si el último tiene más de `max_age_hours` (None si no hacía falta)."""
+        backups = self.list_backups()
+        if backups and datetime.now() - backups[0]['created'] < timedelta(hours=max_age_hours):
+            return None
+        return self.create_backup(**kwargs)
+
+    # -------------------------
+    # Listar / retención
+    # -------------------------
+    @staticmethod
+    def _manifest_path(backup_path: str) -> str:
+        return backup_path + ".json"
+
+    def list_backups(self) -> List[Dict[str, Any]]:
+        """Respaldos de la carpeta, del más reciente al más antiguo."""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        out = []
+        for name in os.listdir(self.backup_dir):
+            match = _NAME_RE.match(name)
+            if match:
+                path = os.path.join(self.backup_dir, name)
+                out.append({
+                    'path': path,
+                    'created': datetime.strptime(match.group(1), _STAMP_FORMAT),
+                    'bytes': os.path.getsize(path),
+                })
+        out.sort(key=lambda b: b['created'], reverse=True)
+        return out
+
+    def apply_retention(self, now: Optional[datetime] = None) -> List[str]:
+        """
+        Borra los respaldos fuera de la retención.
+
+        Se conserva el más reciente de cada uno de los últimos `keep_daily`
+        días y de cada una de las últimas `keep_weekly` semanas ISO (y
+        siempre el más reciente de todos).
+
+        Returns:
+            Rutas eliminadas
+        """
+        backups = self.list_backups()
+        if not backups:
+            return []
+        today = (now or datetime.now()).date()
+        this_week = today - timedelta(days=today.weekday())
+        keep = {backups[0]['path']}
+        days, weeks = set(), set()
+        for b in backups:  # del más reciente al más antiguo: el primero de cada grupo gana
+            day = b['created'].date()
+            week = day - timedelta(days=day.weekday())
+            if (today - day).days < self.keep_daily and day not in days:
+                days.add(day)
+                keep.add(b['path'])
+            if (this_week - week).days // 7 < self.keep_weekly and week not in weeks:
+                weeks.add(week)
+                keep.add(b['path'])
+        removed = []
+        for b in backups:
+            if b['path'] not in keep:
+                for path in (b['path'], self._manifest_path(b['path'])):
+                    if os.path.exists(path):
+                        os.unlink(path)
+                removed.append(b['path'])
+        self._prune_archive_copies(keep)
+        return removed
+
+    def _prune_archive_copies(self, kept_backups) -> None:
+        """Borra las copias de años archivados que ya no referencia ningún respaldo conservado."""
+        folder = os.path.join(self.backup_dir, ARCHIVE_SUBDIR)
+        if not os.path.isdir(folder):
+            return
+        used = set()
+        for path in kept_backups:
+            manifest = self._read_manifest(path) or {}
+            used.update(os.path.normpath(a['file']) for a in manifest.get('archives', []))
+        for name in os.listdir(folder):
+            if os.path.normpath(os.path.join(ARCHIVE_SUBDIR, name)) not in used:
+                os.unlink(os.path.join(folder, name))
+
+    # -------------------------
+    # Verificar / restaurar
+    # -------------------------
+    def _expand(self, backup_path: str) -> str:
+        """Descomprime un respaldo a un archivo temporal (hay que borrarlo)."""
+        fd, raw_path = tempfile.mkstemp(suffix=".db")
+        with os.fdopen(fd, "wb") as dst, _open_compressed(backup_path, "rb") as src:
+            shutil.copyfileobj(src, dst, _COPY_CHUNK)
+        return raw_path
+
+    def verify_backup(self, backup_path: str) -> Tuple[bool, str]:
+        """
+        Verifica que un respaldo se pueda restaurar.
+
+        Comprueba el SHA-256 y las filas por tabla del manifiesto (si existe)
+        y `PRAGMA integrity_check` de la base descomprimida; lo mismo para
+        la copia de cada año archivado del manifiesto.
+
+        Returns:
+            (ok, mensaje con el detalle)
+        """
+        if not os.path.exists(backup_path):
+            return False, f"No existe el backup: {backup_path}"
+        manifest = self._read_manifest(backup_path)
+        ok, message, counts = self._verify_file(backup_path, manifest)
+        if not ok:
+            return False, message
+        archives = (manifest or {}).get('archives', [])
+        for entry in archives:
+            path = os.path.join(self.backup_dir, entry['file'])
+            if not os.path.exists(path):
+                return False, f"Año {entry['year']}: falta la copia del archivo ({entry['file']})"
+            ok, message, _counts = self._verify_file(path, entry)
+            if not ok:
+                return False, f"Año {entry['year']}: {message}"
+        detail = f", {len(archives)} años archivados" if archives else ""
+        return True, f"Backup verificado: {len(counts)} tablas, {sum(counts.values()):,} filas{detail}"
+
+    def _verify_file(self, path: str, manifest: Optional[Dict[str, Any]]) -> Tuple[bool, str, Dict[str, int]]:
+        """SHA-256, integrity_check y filas por tabla de una copia comprimida contra su manifiesto."""
+        if manifest and manifest.get('sha256') and manifest['sha256'] != _sha256(path):
+            return False, "El archivo no coincide con el SHA-256 del manifiesto", {}
+        try:
+            raw_path = self._expand(path)
+        except Exception as e:
+            return False, f"No se pudo descomprimir el backup: {e}", {}
+        try:
+            conn = sqlite3.connect(raw_path)
+            try:
+                result = [r[0] for r in conn.execute("PRAGMA integrity_check")]
+                if result != ["ok"]:
+                    return False, f"integrity_check: {'; '.join(result[:5])}", {}
+                counts = table_counts(conn)
+            finally:
+                conn.close()
+        except sqlite3.DatabaseError as e:
+            return False, f"El backup no es una base SQLite válida: {e}", {}
+        finally:
+            os.unlink(raw_path)
+        if manifest:
+            diffs = [f"{t}: {manifest['tables'].get(t)} != {counts.get(t)}"
+                     for t in sorted(set(manifest['tables']) | set(counts))
+                     if manifest['tables'].get(t) != counts.get(t)]
+            if diffs:
+                return False, "Filas distintas al manifiesto: " + ", ".join(diffs[:10]), counts
+        return True, "", counts
+
+    def restore_backup(self, backup_path: str, target_path: Optional[str] = None) -> Tuple[bool, str]:
+        """
+        Restaura un respaldo verificado sobre `target_path` (default: la base actual),
+        con los archivos de sus años cerrados en la carpeta `archivo` de esa base.
+
+        La escritura también usa la API de backup, así las conexiones abiertas
+        ven la base restaurada completa y no un archivo a medio copiar.
+        """
+        ok, message = self.verify_backup(backup_path)
+        if not ok:
+            return False, message
+        target = target_path or self.db_path
+        target_archives = ArchiveService(target)
+        copies = [(backup_path, target)] + [
+            (os.path.join(self.backup_dir, a['file']), target_archives.archive_path(a['year']))
+            for a in (self._read_manifest(backup_path) or {}).get('archives', [])
+        ]
+        for source, destination in copies:
+            raw_path = self._expand(source)
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+                src = sqlite3.connect(raw_path)
+                dst = sqlite3.connect(destination)
+                try:
+                    src.backup(dst)
+                finally:
+                    dst.close()
+                    src.close()
+            except sqlite3.DatabaseError as e:
+                return False, f"Error restaurando backup: {e}"
+            finally:
+                os.unlink(raw_path)
+        print(f"[BACKUP] Restaurado {os.path.basename(backup_path)} en {target} "
+              f"({len(copies) - 1} años archivados)")
+        return True, message
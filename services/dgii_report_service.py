@@ -0,0 +1,315 @@
+"""
+Generador de los formatos DGII 606 (compras), 607 (ventas) y 608 (NCF anulados).
+
+Las filas se leen de `invoices` con una consulta por período que usa el
+índice (company_id, invoice_type, invoice_date) y se escriben a medida que
+llegan al TXT de ancho delimitado por `|` y/o a un Excel en modo
+write-only, así la memoria usada no depende de la cantidad de facturas.
+Si el período cae en un año fiscal archivado, la consulta lee su archivo
+(ArchiveService.connect).
+Cada fila se valida (NCF, RNC/Cédula y en el 608 el tipo de anulación) y
+al final se devuelve un resumen
+con cantidades, totales y errores.
+
+Uso:
+    svc = DGIIReportService(db_path)
+    ok, summary = svc.generate('607', company_id, '2025-01', txt_path='607.txt')
+"""
+from __future__ import annotations
+
+import re
+import sqlite3
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from services.archive_service import ArchiveService
+
+# Carga perezosa de openpyxl (sólo si se pide el Excel)
+Workbook = None
+
+
+def _load_openpyxl() -> bool:
+    global Workbook
+    if Workbook is not None:
+        return True
+    try:
+        from openpyxl import Workbook
+    except Exception:
+        return False
+    return True
+
+
+REPORT_TYPES = ('606', '607', '608')
+
+# Tipos de anulación del 608 (código DGII -> descripción)
+VOID_REASONS = {
+    '01': "Deterioro de factura pre-impresa",
+    '02': "Errores de impresión (factura pre-impresa)",
+    '03': "Impresión defectuosa",
+    '04': "Corrección de la información",
+    '05': "Cambio de productos",
+    '06': "Devolución de productos",
+    '07': "Omisión de productos",
+    '08': "Errores en secuencia de NCF",
+    '09': "Por cese de operaciones",
+    '10': "Pérdida o hurto de talonarios",
+}
+VOID_REASON_CODES = tuple(VOID_REASONS)
+
+# Filas leídas por viaje al cursor
+FETCH_SIZE = 2000
+# Errores detallados que se conservan en el resumen (el conteo es completo)
+MAX_ERRORS = 500
+
+# e-CF: E + tipo + 10 dígitos (DGII) u 11 (formato usado por LogicController)
+NCF_PATTERN = re.compile(r'^(?:[A-DF-Z]\d{2}\d{8}|E\d{2}\d{10,11})$')
+
+COLUMNS_606 = (
+    'RNC o Cédula', 'Tipo Id', 'Tipo Bienes y Servicios Comprados', 'NCF', 'NCF Modificado',
+    'Fecha Comprobante', 'Fecha Pago', 'Monto Facturado en Servicios', 'Monto Facturado en Bienes',
+    'Total Monto Facturado', 'ITBIS Facturado', 'ITBIS Retenido', 'ITBIS sujeto a Proporcionalidad',
+    'ITBIS llevado al Costo', 'ITBIS por Adelantar', 'ITBIS percibido en compras',
+    'Tipo de Retención en ISR', 'Monto Retención Renta', 'ISR Percibido en compras',
+    'Impuesto Selectivo al Consumo', 'Otros Impuestos/Tasas', 'Monto Propina Legal', 'Forma de Pago',
+)
+COLUMNS_607 = (
+    'RNC/Cédula', 'Tipo Identificación', 'NCF', 'NCF Modificado', 'Tipo de Ingreso',
+    'Fecha Comprobante', 'Fecha de Retención', 'Monto Facturado', 'ITBIS Facturado',
+    'ITBIS Retenido por Terceros', 'ITBIS Percibido', 'Retención Renta por Terceros',
+    'ISR Percibido', 'Impuesto Selectivo al Consumo', 'Otros Impuestos/Tasas',
+    'Monto Propina Legal', 'Efectivo', 'Cheque/Transferencia/Depósito', 'Tarjeta Débito/Crédito',
+    'Venta a Crédito', 'Bonos o Certificados de Regalo', 'Permuta', 'Otras Formas de Ventas',
+)
+COLUMNS_608 = ('NCF', 'Fecha Comprobante', 'Tipo de Anulación')
+
+# Tipo de ingreso 607 por defecto: 01 = ingresos por operaciones
+DEFAULT_INCOME_TYPE = '01'
+
+
+# -------------------------
+# Validaciones
+# -------------------------
+def validate_ncf(ncf: str) -> bool:
+    """NCF tradicional (B01 + 8 dígitos) o e-CF (E31 + 10/11 dígitos)."""
+    return bool(NCF_PATTERN.match((ncf or '').strip().upper()))
+
+
+def validate_rnc(value: str) -> bool:
+    """RNC (9 dígitos) o Cédula (11 dígitos) con dígito verificador válido."""
+    digits = re.sub(r'\D', '', value or '')
+    if len(digits) == 9:
+        weights = (7, 9, 8, 6, 5, 4, 3, 2)
+        rem = sum(int(d) * w for d, w in zip(digits[:8], weights)) % 11
+        check = 2 if rem == 0 else 1 if rem == 1 else 11 - rem
+        return check == int(digits[8])
+    if len(digits) == 11:
+        total = 0
+        for i, d in enumerate(digits[:10]):
+            prod = int(d) * (1 if i % 2 == 0 else 2)
+            total += prod - 9 if prod > 9 else prod
+        return (10 - total % 10) % 10 == int(digits[10])
+    return False
+
+
+def validate_void_reason(reason: Any) -> bool:
+    """Tipo de anulación del 608: código DGII '01'..'10'."""
+    return str(reason or '').strip() in VOID_REASON_CODES
+
+
+def _id_type(value: str) -> str:
+    """Tipo de identificación DGII: 1 = RNC, 2 = Cédula, 3 = otro."""
+    n = len(re.sub(r'\D', '', value or ''))
+    return '1' if n == 9 else '2' if n == 11 else '3'
+
+
+def _normalize_period(period: str) -> Tuple[str, str, str]:
+    """'2025-01' o '202501' → ('202501', '2025-01-01', '2025-02-01')."""
+    digits = re.sub(r'\D', '', period or '')
+    if len(digits) != 6:
+        raise ValueError(f"Período inválido (se espera AAAAMM): {period}")
+    year, month = int(digits[:4]), int(digits[4:])
+    if not 1 <= month <= 12:
+        raise ValueError(f"Mes inválido: {period}")
+    nxt_year, nxt_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return digits, f"{year:04d}-{month:02d}-01", f"{nxt_year:04d}-{nxt_month:02d}-01"
+
+
+def _fmt_date(value: str) -> str:
+    return re.sub(r'\D', '', value or '')[:8]
+
+
+def _fmt_amount(value: float) -> str:
+    return f"{value:.2f}"
+
+
+class DGIIReportService:
+    """Reportes 606/607/608 en streaming desde `invoices`."""
+
+    def __init__(self, db_path: str, fetch_size: int = FETCH_SIZE):
+        """
+        Args:
+            db_path: Ruta a la base de datos
+            fetch_size: Filas leídas por lote del cursor
+        """
+        self.db_path = db_path
+        self.fetch_size = max(1, int(fetch_size))
+        self.archives = ArchiveService(db_path)
+
+    # ----- Consulta -----
+
+    def _query(self, report: str) -> str:
+        if report == '608':
+            where = "invoice_type = 'emitida' AND status = 'anulada'"
+        elif report == '607':
+            where = "invoice_type = 'emitida' AND COALESCE(status, 'activa') != 'anulada'"
+        else:
+            where = "invoice_type = 'recibida' AND COALESCE(status, 'activa') != 'anulada'"
+        return f"""
+            SELECT invoice_number, invoice_date, COALESCE(NULLIF(rnc, ''), client_rnc, '') AS rnc,
+                   COALESCE(itbis, 0) * COALESCE(exchange_rate, 1) AS itbis_rd,
+                   COALESCE(total_amount_rd, 0) AS total_rd, COALESCE(void_reason, '') AS void_reason
+              FROM invoices
+             WHERE company_id = ? AND {where} AND invoice_date >= ? AND invoice_date < ?
+             ORDER BY invoice_date, id
+        """
+
+    def _iter_raw(self, conn: sqlite3.Connection, report: str, company_id: int,
+                  start: str, end: str) -> Iterator[tuple]:
+        cur = conn.execute(self._query(report), (company_id, start, end))
+        while True:
+            rows = cur.fetchmany(self.fetch_size)
+            if not rows:
+                break
+            yield from rows
+
+    def _count(self, conn: sqlite3.Connection, report: str, company_id: int, start: str, end: str) -> int:
+        sql = f"SELECT COUNT(*) FROM ({self._query(report)})"
+        return conn.execute(sql, (company_id, start, end)).fetchone()[0]
+
+    # ----- Filas por formato -----
+
+    def _build_row(self, report: str, raw: tuple) -> Tuple[List[Any], float, float]:
+        """Convierte una factura en la fila del formato; retorna (fila, monto, itbis)."""
+        ncf, date, rnc, itbis_rd, total_rd, void_reason = raw
+        ncf = (ncf or '').strip().upper()
+        itbis_rd = round(itbis_rd, 2)
+        monto = round(total_rd - itbis_rd, 2)
+        if report == '608':
+            return [ncf, _fmt_date(date), void_reason], 0.0, 0.0
+        if report == '607':
+            row = [rnc, _id_type(rnc), ncf, '', DEFAULT_INCOME_TYPE, _fmt_date(date), '',
+                   monto, itbis_rd] + [''] * 14
+            return row, monto, itbis_rd
+        # 606: sin desglose bienes/servicios en la factura; se reporta como bienes
+        row = [rnc, _id_type(rnc), '', ncf, '', _fmt_date(date), '',
+               '', monto, monto, itbis_rd, '', '', '', itbis_rd] + [''] * 8
+        return row, monto, itbis_rd
+
+    def _row_errors(self, report: str, raw: tuple) -> List[str]:
+        ncf, rnc, void_reason = raw[0], raw[2], raw[5]
+        errors = []
+        if not validate_ncf(ncf):
+            errors.append(f"NCF inválido: {ncf!r}")
+        if report == '608':
+            if not validate_void_reason(void_reason):
+                errors.append(f"Tipo de anulación inválido: {void_reason!r} (debe ser 01-10)")
+        elif not validate_rnc(rnc):
+            errors.append(f"RNC/Cédula inválido: {rnc!r}")
+        return errors
+
+    # ----- API -----
+
+    def iter_rows(self, report: str, company_id: int, period: str) -> Iterator[List[Any]]:
+        """Itera las filas del formato (sin encabezado) para el período."""
+        if report not in REPORT_TYPES:
+            raise ValueError(f"Formato DGII desconocido: {report}")
+        _p, start, end = _normalize_period(period)
+        with self.archives.connect(start, end) as conn:
+            for raw in self._iter_raw(conn, report, company_id, start, end):
+                yield self._build_row(report, raw)[0]
+
+    def generate(
+        self,
+        report: str,
+        company_id: int,
+        period: str,
+        txt_path: Optional[str] = None,
+        xlsx_path: Optional[str] = None
+    ) -> Tuple[bool, Dict[str, Any] | str]:
+        """
+        Genera el formato para el período escribiendo en streaming.
+
+        Args:
+            report: '606', '607' o '608'
+            company_id: ID de la empresa que reporta
+            period: 'AAAAMM' o 'AAAA-MM'
+            txt_path: Ruta del TXT para la Oficina Virtual (opcional)
+            xlsx_path: Ruta del Excel (opcional, requiere openpyxl)
+
+        Returns:
+            Tuple de (success, resumen o mensaje de error). El resumen tiene
+            'count', 'monto_facturado', 'itbis_facturado', 'error_count',
+            'errors' (primeros MAX_ERRORS) y 'elapsed'.
+        """
+        if report not in REPORT_TYPES:
+            return False, f"Formato DGII desconocido: {report}"
+        try:
+            period_digits, start, end = _normalize_period(period)
+        except ValueError as e:
+            return False, str(e)
+        if xlsx_path and not _load_openpyxl():
+            return False, "openpyxl no está instalado. Instala con: pip install openpyxl"
+
+        t0 = time.perf_counter()
+        txt = wb = ws = None
+        summary: Dict[str, Any] = {
+            'report': report, 'period': period_digits, 'count': 0,
+            'monto_facturado': 0.0, 'itbis_facturado': 0.0,
+            'error_count': 0, 'errors': [], 'txt_path': txt_path, 'xlsx_path': xlsx_path,
+        }
+        try:
+            with self.archives.connect(start, end) as conn:
+                row = conn.execute("SELECT rnc FROM companies WHERE id = ?", (company_id,)).fetchone()
+                if not row:
+                    return False, f"Empresa {company_id} no encontrada"
+                company_rnc = re.sub(r'\D', '', row[0] or '')
+                summary['rnc'] = company_rnc
+                count = self._count(conn, report, company_id, start, end)
+
+                if txt_path:
+                    txt = open(txt_path, 'w', encoding='utf-8', newline='\r\n')
+                    txt.write(f"{report}|{company_rnc}|{period_digits}|{count}\n")
+                if xlsx_path:
+                    wb = Workbook(write_only=True)
+                    ws = wb.create_sheet(f"DGII {report}")
+                    ws.append(list({'606': COLUMNS_606, '607': COLUMNS_607, '608': COLUMNS_608}[report]))
+
+                for index, raw in enumerate(self._iter_raw(conn, report, company_id, start, end), 1):
+                    fields, monto, itbis = self._build_row(report, raw)
+                    for message in self._row_errors(report, raw):
+                        summary['error_count'] += 1
+                        if len(summary['errors']) < MAX_ERRORS:
+                            summary['errors'].append({'row': index, 'ncf': raw[0], 'error': message})
+                    summary['count'] += 1
+                    summary['monto_facturado'] += monto
+                    summary['itbis_facturado'] += itbis
+                    if txt is not None:
+                        txt.write("|".join(
+                            _fmt_amount(v) if isinstance(v, float) else str(v) for v in fields
+                        ) + "\n")
+                    if ws is not None:
+                        ws.append(fields)
+            if wb is not None:
+                wb.save(xlsx_path)
+        except (OSError, sqlite3.Error) as e:
+            return False, f"Error generando {report}: {e}"
+        finally:
+            if txt is not None:
+                txt.close()
+
+        summary['monto_facturado'] = round(summary['monto_facturado'], 2)
+        summary['itbis_facturado'] = round(summary['itbis_facturado'], 2)
+        summary['elapsed'] = time.perf_counter() - t0
+        print(f"[DGII] {report} {period_digits}: {summary['count']} filas, "
+              f"{summary['error_count']} errores en {summary['elapsed']:.2f}s")
+        return True, summary
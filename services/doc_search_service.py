@@ -0,0 +1,262 @@
+"""
+Búsqueda global de documentos (facturas y cotizaciones) con FTS5.
+
+La tabla virtual `doc_search` guarda una fila por documento con las
+columnas de texto que se buscan: tercero/cliente, RNC, NCF y las líneas
+(código + descripción de cada ítem, concatenadas). Así una consulta como
+"cemento ferreteria" encuentra la factura donde se vendió cemento a la
+Ferretería aunque las palabras estén en la cabecera y en el detalle.
+
+- rowid = id * 2 para facturas e id * 2 + 1 para cotizaciones.
+- Triggers sobre invoices/quotations mantienen la fila al día con cualquier
+  escritura de cabecera (add/update/delete, sincronización). Los años
+  archivados (ArchiveService) salen del índice junto con sus facturas.
+- Recalcular `lines` cuesta todas las líneas del documento, así que los
+  triggers de invoice_items/quotation_items sólo anotan el documento en
+  `doc_search_pending`; `flush_pending_lines` lo recalcula una vez por
+  documento (al final de cada guardado en LogicController y antes de cada
+  búsqueda, para las escrituras de otros caminos). Guardar n líneas cuesta
+  O(n), no O(n²).
+- Tokenizador unicode61 sin acentos ("camion" encuentra "camión") e índices
+  de prefijo para búsqueda mientras se escribe; los RNC se guardan sin
+  guiones.
+- La columna `scope` ("c<empresa> invoice|quotation") filtra por empresa y
+  tipo dentro del índice, sin leer el contenido de cada coincidencia.
+- Orden por bm25 con pesos por columna (NCF > RNC > tercero > líneas),
+  paginado con LIMIT/OFFSET. Calcular bm25 cuesta por coincidencia: con más
+  de RANK_MAX_MATCHES (búsquedas de una palabra muy común) se ordena por
+  documento más reciente, que sale del índice sin recorrer todo.
+
+Uso:
+    install_doc_search(conn)                      # idempotente (migraciones 16 y 20)
+    flush_pending_lines(conn)                     # tras escribir líneas
+    svc = DocSearchService(db_path)
+    svc.search("cemento ferreteria", company_id=1, doc_type='invoice', limit=20)
+"""
+from __future__ import annotations
+
+import re
+import sqlite3
+import time
+from typing import Any, Dict, Optional
+
+DOC_TYPES = {'invoice': 0, 'quotation': 1}
+# Pesos bm25 por columna: scope, party, rnc, ncf, lines
+RANK_WEIGHTS = "bm25(0.0, 5.0, 8.0, 10.0, 1.0)"
+RANK_MAX_MATCHES = 5000
+MAX_TERMS = 12
+
+# (tabla, tabla de líneas, columna padre, paridad del rowid, tercero, rnc, ncf)
+_SOURCES = {
+    'invoice': ("invoices", "invoice_items", "invoice_id", 0,
+                "trim(COALESCE(d.third_party_name, '') || ' ' || COALESCE(d.client_name, ''))",
+                "trim(COALESCE(d.rnc, '') || ' ' || COALESCE(d.client_rnc, ''))",
+                "COALESCE(d.invoice_number, '')"),
+    'quotation': ("quotations", "quotation_items", "quotation_id", 1,
+                  "COALESCE(d.client_name, '')",
+                  "COALESCE(d.client_rnc, '')",
+                  "''"),
+}
+
+
+def _lines_sql(items: str, parent_col: str, parent: str) -> str:
+    return f"""(SELECT COALESCE(group_concat(COALESCE(li.item_code, '') || ' ' || COALESCE(li.description, ''), ' '), '')
+                  FROM {items} li WHERE li.{parent_col} = {parent})"""
+
+
+def _doc_insert_sql(doc_type: str, where: str = "") -> str:
+    """INSERT de las filas de `doc_search` para los documentos que cumplen `where`."""
+    table, items, parent_col, parity, party, rnc, ncf = _SOURCES[doc_type]
+    return f"""
+        INSERT INTO doc_search (rowid, scope, party, rnc, ncf, lines)
+        SELECT d.id * 2 + {parity}, 'c' || d.company_id || ' {doc_type}', {party}, replace({rnc}, '-', ''), {ncf},
+               {_lines_sql(items, parent_col, 'd.id')}
+          FROM {table} d {('WHERE ' + where) if where else ''};
+    """
+
+
+def _triggers_sql(doc_type: str) -> str:
+    table, items, parent_col, parity, _party, _rnc, _ncf = _SOURCES[doc_type]
+    header_cols = {
+        'invoice': "company_id, third_party_name, client_name, rnc, client_rnc, invoice_number",
+        'quotation': "company_id, client_name, client_rnc",
+    }[doc_type]
+    mark_pending = f"""
+            INSERT OR IGNORE INTO doc_search_pending (doc_rowid) VALUES ({{row}}.{parent_col} * 2 + {parity});"""
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_search_ins AFTER INSERT ON {table}
+        BEGIN
+            {_doc_insert_sql(doc_type, 'd.id = NEW.id')}
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_search_upd AFTER UPDATE OF {header_cols} ON {table}
+        BEGIN
+            DELETE FROM doc_search WHERE rowid = OLD.id * 2 + {parity};
+            {_doc_insert_sql(doc_type, 'd.id = NEW.id')}
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_search_del AFTER DELETE ON {table}
+        BEGIN
+            DELETE FROM doc_search WHERE rowid = OLD.id * 2 + {parity};
+        END;
+        DROP TRIGGER IF EXISTS trg_{items}_search_ins;
+        DROP TRIGGER IF EXISTS trg_{items}_search_upd;
+        DROP TRIGGER IF EXISTS trg_{items}_search_del;
+        CREATE TRIGGER trg_{items}_search_ins AFTER INSERT ON {items}
+        BEGIN{mark_pending.format(row='NEW')}
+        END;
+        CREATE TRIGGER trg_{items}_search_upd AFTER UPDATE OF item_code, description, {parent_col} ON {items}
+        WHEN OLD.item_code IS NOT NEW.item_code OR OLD.description IS NOT NEW.description
+          OR OLD.{parent_col} IS NOT NEW.{parent_col}
+        BEGIN{mark_pending.format(row='OLD')}{mark_pending.format(row='NEW')}
+        END;
+        CREATE TRIGGER trg_{items}_search_del AFTER DELETE ON {items}
+        BEGIN{mark_pending.format(row='OLD')}
+        END;
+    """
+
+
+def install_doc_search(conn: sqlite3.Connection) -> None:
+    """Crea la tabla FTS5, la de documentos pendientes, sus triggers y la llena (idempotente)."""
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'doc_search'").fetchone()
+    conn.executescript(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS doc_search USING fts5(
+            scope, party, rnc, ncf, lines,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        );
+        CREATE TABLE IF NOT EXISTS doc_search_pending (doc_rowid INTEGER PRIMARY KEY);
+        INSERT INTO doc_search (doc_search, rank) VALUES ('rank', '{RANK_WEIGHTS}');
+        {_triggers_sql('invoice')}
+        {_triggers_sql('quotation')}
+    """)
+    if not exists:
+        rebuild_doc_search(conn)
+
+
+def rebuild_doc_search(conn: sqlite3.Connection) -> int:
+    """Vacía y vuelve a llenar el índice desde las tablas; retorna los documentos indexados."""
+    conn.execute("DELETE FROM doc_search")
+    conn.execute("DELETE FROM doc_search_pending")
+    for doc_type in _SOURCES:
+        conn.execute(_doc_insert_sql(doc_type))
+    return conn.execute("SELECT COUNT(*) FROM doc_search").fetchone()[0]
+
+
+def flush_pending_lines(conn: sqlite3.Connection) -> int:
+    """
+    Recalcula la columna `lines` de los documentos anotados en doc_search_pending
+    (una vez cada uno) y vacía la lista. No hace commit.
+
+    Returns:
+        Documentos pendientes procesados (incluye los que ya no existen)
+    """
+    pending = conn.execute("SELECT COUNT(*) FROM doc_search_pending").fetchone()[0]
+    if not pending:
+        return 0
+    for _table, items, parent_col, parity, _party, _rnc, _ncf in _SOURCES.values():
+        conn.execute(f"""
+            UPDATE doc_search SET lines = {_lines_sql(items, parent_col, 'doc_search.rowid / 2')}
+             WHERE rowid IN (SELECT doc_rowid FROM doc_search_pending WHERE doc_rowid % 2 = {parity})
+        """)
+    conn.execute("DELETE FROM doc_search_pending")
+    return pending
+
+
+def build_match_query(text: str, company_id: Optional[int] = None, doc_type: Optional[str] = None) -> str:
+    """
+    Expresión MATCH segura a partir de lo que escribe el usuario.
+
+    Cada palabra se busca como prefijo y todas deben aparecer (AND); los
+    guiones entre dígitos se quitan para que "131-24679-6" encuentre el RNC.
+    Retorna '' si no hay palabras.
+    """
+    text = re.sub(r'(?<=\d)-(?=\d)', '', text or '')
+    terms = re.findall(r'\w+', text, flags=re.UNICODE)[:MAX_TERMS]
+    if not terms:
+        return ''
+    match = "{party rnc ncf lines} : (" + " ".join(f'"{term}"*' for term in terms) + ")"
+    scope = ([f'"c{int(company_id)}"'] if company_id is not None else []) + \
+        ([f'"{doc_type}"'] if doc_type is not None else [])
+    if scope:
+        match = "scope : (" + " AND ".join(scope) + ") AND " + match
+    return match
+
+
+class DocSearchService:
+    """Búsqueda ordenada y paginada sobre `doc_search`."""
+
+    def __init__(self, db_path: str):
+        """
+        Args:
+            db_path: Ruta a la base de datos (con la migración 16 aplicada)
+        """
+        self.db_path = db_path
+
+    def search(
+        self,
+        text: str,
+        company_id: Optional[int] = None,
+        doc_type: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0
+    ) -> Dict[str, Any]:
+        """
+        Busca documentos por tercero, RNC, NCF, códigos y descripciones de líneas.
+
+        Args:
+            text: Texto libre (palabras en cualquier orden; prefijos admitidos)
+            company_id: Empresa (None = todas)
+            doc_type: 'invoice', 'quotation' o None (ambos)
+            limit, offset: Página de resultados
+
+        Returns:
+            {'total': int, 'ranked': bool, 'elapsed': float,
+             'results': [{doc_type, doc_id, company_id, snippet, rank, record}]}
+            con `record` = fila de invoices/quotations. Con más de RANK_MAX_MATCHES
+            coincidencias `total` queda en RANK_MAX_MATCHES + 1 ("más de ...") y
+            `ranked` es False: la página sale por documento más reciente.
+        """
+        if doc_type is not None and doc_type not in DOC_TYPES:
+            raise ValueError(f"Tipo de documento desconocido: {doc_type}")
+        match = build_match_query(text, company_id, doc_type)
+        out: Dict[str, Any] = {'total': 0, 'ranked': True, 'elapsed': 0.0, 'results': []}
+        if not match:
+            return out
+
+        with sqlite3.connect(self.db_path) as conn:
+            # Líneas escritas fuera de LogicController (sincronización, SQL directo)
+            flush_pending_lines(conn)
+            conn.commit()
+            t0 = time.perf_counter()
+            conn.row_factory = sqlite3.Row
+            # Conteo hasta el tope: FTS5 recorre las coincidencias en orden de rowid y se detiene
+            out['total'] = conn.execute(
+                "SELECT COUNT(*) FROM (SELECT 1 FROM doc_search WHERE doc_search MATCH ? LIMIT ?)",
+                (match, RANK_MAX_MATCHES + 1)).fetchone()[0]
+            out['ranked'] = out['total'] <= RANK_MAX_MATCHES
+            hits = conn.execute(f"""
+                SELECT rowid, rank, snippet(doc_search, 4, '[', ']', '…', 10) AS snippet
+                  FROM doc_search WHERE doc_search MATCH ?
+                 ORDER BY {'rank' if out['ranked'] else 'rowid DESC'} LIMIT ? OFFSET ?
+            """, (match, max(1, int(limit)), max(0, int(offset)))).fetchall()
+
+            # Cabeceras de la página en una consulta por tipo
+            records: Dict[tuple, Dict[str, Any]] = {}
+            for name, parity in DOC_TYPES.items():
+                ids = [h['rowid'] // 2 for h in hits if h['rowid'] % 2 == parity]
+                if ids:
+                    table = _SOURCES[name][0]
+                    for row in conn.execute(
+                        f"SELECT * FROM {table} WHERE id IN ({', '.join('?' * len(ids))})", ids
+                    ):
+                        records[(name, row['id'])] = dict(row)
+
+        for h in hits:
+            name = 'quotation' if h['rowid'] % 2 else 'invoice'
+            doc_id = h['rowid'] // 2
+            record = records.get((name, doc_id), {})
+            out['results'].append({
+                'doc_type': name, 'doc_id': doc_id, 'company_id': record.get('company_id'),
+                'snippet': h['snippet'], 'rank': h['rank'], 'record': record,
+            })
+        out['elapsed'] = time.perf_counter() - t0
+        return out
@@ -0,0 +1,237 @@
+"""
+Índice de trigramas sobre los nombres del catálogo de ítems.
+
+Las líneas pegadas o importadas traen descripciones con errores de tipeo,
+acentos o abreviaturas distintas ("Cemnto gris portlan" vs "Cemento Gris
+Portland"): LIKE no las encuentra. Cada ítem guarda los trigramas de su
+nombre normalizado (`utils.text_keys.trigrams`) en `item_trigrams`
+(gram, item_id) y la similitud es la de Jaccard sobre los conjuntos, como
+pg_trgm:
+
+    similitud = comunes / (trigramas consulta + trigramas ítem - comunes)
+
+`similar()` no recorre las listas de los trigramas más frecuentes
+("MOD", " DE", "  1"... presentes en medio catálogo): con n trigramas en la
+consulta y un umbral t, un ítem similar comparte al menos m = ceil(t * n),
+así que basta buscar candidatos con los n - m + 1 trigramas más raros
+(`item_gram_df` guarda la frecuencia de cada trigrama). Los candidatos se
+filtran por largo, se ordenan por una cota superior de su similitud y se
+verifican exactos en Python hasta que la cota no alcanza al k-ésimo mejor.
+
+El índice se mantiene solo: triggers sobre `items` anotan los ids
+insertados, renombrados o borrados en `item_trigram_queue` (SQL puro, vale
+para cualquier conexión que escriba ítems) y la cola se procesa en Python
+antes de cada consulta, sólo para esos ids.
+
+Uso:
+    install_item_trigrams(conn); refresh_item_trigrams(conn)   # migración 18
+    index = ItemTrigramIndex(db_path)
+    index.similar("cemnto gris", limit=5)      # [{'code', 'name', 'unit', ..., 'similarity': 0.62}]
+"""
+from __future__ import annotations
+
+import sqlite3
+from math import ceil
+from typing import Any, Dict, List, Optional
+
+from utils.text_keys import fold_key, trigrams
+
+DEFAULT_THRESHOLD = 0.3
+MATCH_THRESHOLD = 0.45      # mínimo para tomar un ítem como "el mismo" (unidad, precio)
+DEFAULT_LIMIT = 5
+SEARCH_LEVELS = (0.8, 0.6)
+
+
+def install_item_trigrams(conn: sqlite3.Connection) -> None:
+    """Crea las tablas, los triggers de cola y encola todo el catálogo (idempotente; migración 18)."""
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS item_trigrams (
+            gram TEXT NOT NULL,
+            item_id INTEGER NOT NULL,
+            PRIMARY KEY (gram, item_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS item_gram_df (
+            gram TEXT PRIMARY KEY,
+            df INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS item_name_keys (
+            item_id INTEGER PRIMARY KEY,
+            name_key TEXT NOT NULL,
+            gram_count INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS item_trigram_queue (
+            item_id INTEGER PRIMARY KEY
+        );
+        CREATE TRIGGER IF NOT EXISTS trg_items_trigram_ins AFTER INSERT ON items
+        BEGIN
+            INSERT OR IGNORE INTO item_trigram_queue (item_id) VALUES (NEW.id);
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_items_trigram_upd AFTER UPDATE OF id, name ON items
+        BEGIN
+            INSERT OR IGNORE INTO item_trigram_queue (item_id) VALUES (OLD.id);
+            INSERT OR IGNORE INTO item_trigram_queue (item_id) VALUES (NEW.id);
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_items_trigram_del AFTER DELETE ON items
+        BEGIN
+            INSERT OR IGNORE INTO item_trigram_queue (item_id) VALUES (OLD.id);
+        END;
+        INSERT OR IGNORE INTO item_trigram_queue (item_id)
+            SELECT id FROM items WHERE id NOT IN (SELECT item_id FROM item_name_keys);
+    """)
+
+
+def refresh_item_trigrams(conn: sqlite3.Connection) -> int:
+    """
+    Reindexa los ítems de la cola en la transacción en curso.
+
+    Returns:
+        Cantidad de ítems procesados
+    """
+    queued = [r[0] for r in conn.execute("SELECT item_id FROM item_trigram_queue")]
+    if not queued:
+        return 0
+    for start in range(0, len(queued), 500):
+        ids = queued[start:start + 500]
+        marks = ', '.join('?' * len(ids))
+        old = conn.execute(f"SELECT item_id, name_key FROM item_name_keys WHERE item_id IN ({marks})", ids).fetchall()
+        # Borrado por la clave primaria (gram, item_id) con los trigramas de la clave anterior
+        removed = [(g, item_id) for item_id, key in old for g in trigrams(key)]
+        conn.executemany("DELETE FROM item_trigrams WHERE gram = ? AND item_id = ?", removed)
+        conn.executemany("UPDATE item_gram_df SET df = df - 1 WHERE gram = ?", [(g,) for g, _id in removed])
+        conn.execute(f"DELETE FROM item_name_keys WHERE item_id IN ({marks})", ids)
+
+        current = conn.execute(f"SELECT id, name FROM items WHERE id IN ({marks})", ids).fetchall()
+        rows = [(item_id, fold_key(name), trigrams(name)) for item_id, name in current]
+        conn.executemany("INSERT INTO item_name_keys (item_id, name_key, gram_count) VALUES (?, ?, ?)",
+                         [(item_id, key, len(grams)) for item_id, key, grams in rows])
+        added = [(g, item_id) for item_id, _key, grams in rows for g in grams]
+        conn.executemany("INSERT OR IGNORE INTO item_trigrams (gram, item_id) VALUES (?, ?)", added)
+        conn.executemany("INSERT INTO item_gram_df (gram, df) VALUES (?, 1) "
+                         "ON CONFLICT(gram) DO UPDATE SET df = df + 1", [(g,) for g, _id in added])
+        conn.execute(f"DELETE FROM item_trigram_queue WHERE item_id IN ({marks})", ids)
+    return len(queued)
+
+
+def _matches_at(conn: sqlite3.Connection, by_rarity: List[str], level: float, limit: int) -> Dict[int, float]:
+    """
+    {item_id: similitud} de los mejores `limit` (más empates) con similitud >= level.
+
+    `by_rarity` son los trigramas de la consulta del menos al más frecuente.
+    """
+    n = len(by_rarity)
+    need = max(1, ceil(level * n))
+    probe, skipped = by_rarity[:n - need + 1], set(by_rarity[n - need + 1:])
+    e = len(skipped)
+    # Cota: los trigramas omitidos suman a lo sumo e comunes (y nunca más que el largo del ítem)
+    candidates = conn.execute(f"""
+        SELECT k.item_id, k.name_key, k.gram_count, s.shared,
+               MIN(s.shared + ?, k.gram_count) * 1.0 / (? + k.gram_count - MIN(s.shared + ?, k.gram_count)) AS bound
+          FROM (SELECT item_id, COUNT(*) AS shared FROM item_trigrams
+                 WHERE gram IN ({', '.join('?' * len(probe))}) GROUP BY item_id) s
+          JOIN item_name_keys k ON k.item_id = s.item_id
+         WHERE k.gram_count BETWEEN ? AND ?
+         ORDER BY bound DESC
+    """, [e, n, e] + probe + [need, int(n / level) if level > 0 else 1 << 30])
+
+    found: Dict[int, float] = {}
+    kth = level                 # similitud del k-ésimo mejor hasta ahora
+    for item_id, key, gram_count, shared, bound in candidates:
+        if bound < kth:
+            break
+        if skipped:
+            shared += len(skipped & trigrams(key))
+        similarity = round(shared / (n + gram_count - shared), 4)
+        if similarity >= kth:
+            found[item_id] = similarity
+            if len(found) >= limit:
+                kth = max(kth, sorted(found.values(), reverse=True)[limit - 1])
+    return {item_id: sim for item_id, sim in found.items() if sim >= kth}
+
+
+class ItemTrigramIndex:
+    """Búsqueda de ítems por similitud de nombre (tolerante a errores de tipeo)."""
+
+    def __init__(self, db_path: str):
+        """
+        Args:
+            db_path: Ruta a la base de datos (con la migración 18 aplicada)
+        """
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """Conexión reutilizada: las consultas por línea pegada son muchas y cortas."""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=5)
+            self._conn.row_factory = sqlite3.Row
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def refresh(self) -> int:
+        """Procesa la cola de ítems cambiados; retorna cuántos se reindexaron."""
+        conn = self._connection()
+        if conn.execute("SELECT 1 FROM item_trigram_queue LIMIT 1").fetchone() is None:
+            return 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            count = refresh_item_trigrams(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return count
+
+    def similar(
+        self,
+        text: str,
+        limit: int = DEFAULT_LIMIT,
+        threshold: float = DEFAULT_THRESHOLD
+    ) -> List[Dict[str, Any]]:
+        """
+        Ítems cuyo nombre se parece a `text`, más parecidos primero.
+
+        Args:
+            text: Nombre o descripción (sin importar acentos ni mayúsculas)
+            limit: Máximo de resultados (top-k)
+            threshold: Similitud mínima (0.0 - 1.0)
+
+        Returns:
+            Lista de {code, name, unit, price, cost, description, similarity}
+        """
+        query = trigrams(text)
+        if not query:
+            return []
+        try:
+            self.refresh()
+            conn = self._connection()
+            df = dict(conn.execute(f"SELECT gram, df FROM item_gram_df WHERE gram IN ({', '.join('?' * len(query))})",
+                                   list(query)).fetchall())
+            by_rarity = sorted(query, key=lambda g: (df.get(g, 0), g))
+            # Umbrales de mayor a menor: el ítem buscado suele ser muy parecido y sale con pocas listas
+            for level in sorted({lvl for lvl in SEARCH_LEVELS if lvl > threshold} | {threshold}, reverse=True):
+                similarity_of = _matches_at(conn, by_rarity, level, limit)
+                if len(similarity_of) >= limit:
+                    break
+            if not similarity_of:
+                return []
+            rows = conn.execute(f"""
+                SELECT id, code, name, unit, price, cost, description FROM items
+                 WHERE id IN ({', '.join('?' * len(similarity_of))})
+            """, list(similarity_of)).fetchall()
+        except sqlite3.OperationalError as e:
+            print(f"[ITEMS] Índice de trigramas no disponible: {e}")
+            return []
+        out = [dict(r, similarity=similarity_of[r['id']]) for r in rows]
+        out.sort(key=lambda r: (-r['similarity'], r['code']))
+        for r in out:
+            del r['id']
+        return out[:limit]
+
+    def best_match(self, text: str, threshold: float = MATCH_THRESHOLD) -> Optional[Dict[str, Any]]:
+        """El ítem más parecido si supera `threshold`; None si no hay uno claro."""
+        matches = self.similar(text, limit=1, threshold=threshold)
+        return matches[0] if matches else None
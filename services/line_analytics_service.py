@@ -0,0 +1,403 @@
+"""
+Agregaciones sobre las líneas de factura (invoice_items).
+
+Ranking de ventas por ítem, margen contra `items.cost`, ventas por cliente o
+por mes y recálculo de ITBIS para auditoría, sin recorrer diccionarios de
+`get_invoice_items` en Python:
+
+- Con NumPy, las columnas de invoices e invoice_items se leen una vez del
+  cursor por bloques (`fetchmany`) a arreglos, con las claves de texto
+  (ítem, cliente, mes) convertidas a enteros. Cada reporte es entonces una
+  máscara + `np.bincount` en memoria: cambiar de agrupación, empresa o
+  rango de fechas no vuelve a leer la base.
+- Sin NumPy, la misma agregación la hace SQLite con GROUP BY (mismo
+  resultado, mismo redondeo por línea a centavos).
+
+Los arreglos y los resultados se guardan en caché por la posición del
+change-log (`sqlite_sequence` de change_log + `pull_watermark` de la
+sincronización): se recargan sólo cuando cambió alguna tabla.
+
+Uso:
+    svc = LineAnalyticsService(db_path)
+    svc.aggregate('item_code', company_id=1, start_date='2025-01-01', end_date='2026-01-01')
+    svc.itbis_audit(company_id=1)
+"""
+from __future__ import annotations
+
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from constants import ITBIS_RATE
+from utils.money import itbis_cents
+
+np = None  # se carga al primer uso (dependencia opcional)
+
+DEFAULT_CHUNK_SIZE = 100_000
+DEFAULT_CACHE_SIZE = 32
+
+# Clave de agrupación → expresión SQL (li = invoice_items, i = invoices)
+_ITEM_KEY_SQL = "COALESCE(NULLIF(li.item_code, ''), li.description, '')"
+_CLIENT_KEY_SQL = "COALESCE(NULLIF(i.rnc, ''), NULLIF(i.client_rnc, ''), i.third_party_name, '')"
+_MONTH_KEY_SQL = "substr(COALESCE(i.invoice_date, ''), 1, 7)"
+GROUP_KEYS = {'item_code': _ITEM_KEY_SQL, 'client': _CLIENT_KEY_SQL, 'month': _MONTH_KEY_SQL}
+
+# Redondeo por línea a centavos (mitad lejos de cero, igual que round() de SQLite)
+_REVENUE_CENTS_SQL = "round(li.quantity * li.unit_price * 100)"
+_COST_CENTS_SQL = "round(li.quantity * COALESCE(it.cost, 0) * 100)"
+_ITEMS_JOIN_SQL = f"LEFT JOIN items it ON it.code = {_ITEM_KEY_SQL}"
+
+_INVOICE_TYPES = {'emitida': 0, 'recibida': 1}
+
+
+def _load_numpy() -> bool:
+    global np
+    if np is not None:
+        return True
+    try:
+        import numpy
+        np = numpy
+        return True
+    except ImportError:
+        return False
+
+
+def _round_half_away(values):
+    return np.sign(values) * np.floor(np.abs(values) + 0.5)
+
+
+def _date_int(value: str) -> int:
+    """'YYYY-MM-DD' → YYYYMMDD (mismo orden que la comparación de texto)."""
+    return int((value or "")[:10].replace("-", "") or 0)
+
+
+class LineAnalyticsService:
+    """Agregaciones vectorizadas (o en SQL) sobre invoice_items con caché por change-log."""
+
+    def __init__(
+        self,
+        db_path: str,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        use_numpy: Optional[bool] = None
+    ):
+        """
+        Args:
+            db_path: Ruta a la base de datos
+            chunk_size: Filas por bloque leído del cursor
+            cache_size: Resultados guardados en caché
+            use_numpy: Forzar (True/False) el motor; None = NumPy si está instalado
+        """
+        self.db_path = db_path
+        self.chunk_size = chunk_size
+        self.cache_size = cache_size
+        self.use_numpy = _load_numpy() if use_numpy is None else (use_numpy and _load_numpy())
+        self.stats = {'hits': 0, 'misses': 0, 'loads': 0}
+        self._cache: "OrderedDict[tuple, Any]" = OrderedDict()
+        self._frame: Optional[Tuple[Any, Dict[str, Any]]] = None
+        self._lock = threading.Lock()
+
+    # ----- Caché -----
+
+    @staticmethod
+    def _data_version(conn: sqlite3.Connection) -> Optional[tuple]:
+        """Posición del change-log; None si la base no lo tiene (sin caché)."""
+        try:
+            seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+            mark = conn.execute("SELECT value FROM sync_state WHERE key = 'pull_watermark'").fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return (seq[0] if seq else 0, mark[0] if mark else None)
+
+    def _cached(self, key: tuple, compute):
+        with sqlite3.connect(self.db_path) as conn:
+            version = self._data_version(conn)
+            full_key = key + (version,)
+            if version is not None:
+                with self._lock:
+                    if full_key in self._cache:
+                        self._cache.move_to_end(full_key)
+                        self.stats['hits'] += 1
+                        return self._cache[full_key]
+            self.stats['misses'] += 1
+            result = compute(conn, version)
+        if version is not None:
+            with self._lock:
+                self._cache[full_key] = result
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return result
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self._frame = None
+
+    # ----- Consultas -----
+
+    @staticmethod
+    def _filters(
+        company_id: Optional[int],
+        start_date: Optional[str],
+        end_date: Optional[str],
+        invoice_type: str
+    ) -> Tuple[str, List[Any]]:
+        where = ["i.invoice_type = ?", "COALESCE(i.status, 'activa') != 'anulada'"]
+        params: List[Any] = [invoice_type]
+        if company_id is not None:
+            where.append("i.company_id = ?")
+            params.append(int(company_id))
+        if start_date:
+            where.append("i.invoice_date >= ?")
+            params.append(start_date)
+        if end_date:
+            where.append("i.invoice_date < ?")
+            params.append(end_date)
+        return " AND ".join(where), params
+
+    def _iter_chunks(self, conn: sqlite3.Connection, sql: str, params: List[Any] = ()) -> Iterator[list]:
+        cur = conn.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(self.chunk_size)
+            if not rows:
+                return
+            yield rows
+
+    def aggregate(
+        self,
+        by: str = 'item_code',
+        company_id: Optional[int] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        invoice_type: str = 'emitida'
+    ) -> List[Dict[str, Any]]:
+        """
+        Totales de las líneas agrupados por ítem, cliente o mes.
+
+        Args:
+            by: 'item_code', 'client' o 'month'
+            start_date / end_date: Rango de invoice_date [inicio, fin)
+            invoice_type: 'emitida' (ventas) o 'recibida' (compras)
+
+        Returns:
+            Lista ordenada por ingreso descendente de
+            {key, lines, quantity, revenue, cost, margin} (montos en pesos)
+        """
+        if by not in GROUP_KEYS:
+            raise ValueError(f"Agrupación no soportada: {by} (use {', '.join(GROUP_KEYS)})")
+        args = (company_id, start_date, end_date, invoice_type)
+        if self.use_numpy:
+            compute = lambda conn, version: self._aggregate_numpy(self._get_frame(conn, version), by, *args)
+        else:
+            compute = lambda conn, version: self._aggregate_sql(conn, GROUP_KEYS[by], *self._filters(*args))
+        return self._cached(('aggregate', by) + args, compute)
+
+    def top_items(self, company_id: Optional[int] = None, limit: int = 20, **filters) -> List[Dict[str, Any]]:
+        """Ítems más vendidos por ingreso."""
+        return self.aggregate('item_code', company_id, **filters)[:limit]
+
+    def itbis_audit(
+        self,
+        company_id: Optional[int] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        rate: float = ITBIS_RATE,
+        tolerance: float = 0.01,
+        invoice_type: str = 'emitida'
+    ) -> List[Dict[str, Any]]:
+        """
+        Facturas con ITBIS cuyo monto no coincide con la tasa aplicada a sus líneas.
+
+        Las facturas sin ITBIS (exentas) no se reportan.
+
+        Returns:
+            [{invoice_id, invoice_number, itbis, expected, diff}] por diferencia descendente
+        """
+        args = (company_id, start_date, end_date, invoice_type)
+        if self.use_numpy:
+            compute = lambda conn, version: self._itbis_numpy(
+                conn, self._get_frame(conn, version), *args, rate, tolerance)
+        else:
+            compute = lambda conn, version: self._itbis_sql(conn, *self._filters(*args), rate, tolerance)
+        return self._cached(('itbis_audit', rate, tolerance) + args, compute)
+
+    # ----- Motor SQL -----
+
+    @staticmethod
+    def _rows_to_result(keys, lines, qty, revenue_c, cost_c) -> List[Dict[str, Any]]:
+        out = [
+            {
+                'key': k, 'lines': int(n), 'quantity': float(q),
+                'revenue': int(r) / 100, 'cost': int(c) / 100, 'margin': (int(r) - int(c)) / 100,
+            }
+            for k, n, q, r, c in zip(keys, lines, qty, revenue_c, cost_c)
+        ]
+        out.sort(key=lambda r: (-r['revenue'], str(r['key'])))
+        return out
+
+    def _aggregate_sql(self, conn, key_expr: str, where: str, params: List[Any]) -> List[Dict[str, Any]]:
+        rows = conn.execute(f"""
+            SELECT {key_expr}, COUNT(*), SUM(li.quantity), SUM({_REVENUE_CENTS_SQL}), SUM({_COST_CENTS_SQL})
+              FROM invoice_items li
+              JOIN invoices i ON i.id = li.invoice_id
+              {_ITEMS_JOIN_SQL}
+             WHERE {where}
+             GROUP BY 1
+        """, params).fetchall()
+        if not rows:
+            return []
+        return self._rows_to_result(*zip(*rows))
+
+    @staticmethod
+    def _itbis_result(ids, numbers, stored_c, subtotal_c, rate: float, tolerance: float):
+        out = []
+        tol_c = round(tolerance * 100)
+        for inv_id, number, itbis_c, sub_c in zip(ids, numbers, stored_c, subtotal_c):
+            expected_c = itbis_cents(int(sub_c or 0), rate)
+            if itbis_c and abs(int(itbis_c) - expected_c) > tol_c:
+                out.append({
+                    'invoice_id': int(inv_id), 'invoice_number': number, 'itbis': int(itbis_c) / 100,
+                    'expected': expected_c / 100, 'diff': (int(itbis_c) - expected_c) / 100,
+                })
+        out.sort(key=lambda r: (-abs(r['diff']), r['invoice_id']))
+        return out
+
+    def _itbis_sql(self, conn, where: str, params: List[Any], rate: float, tolerance: float):
+        rows = conn.execute(f"""
+            SELECT i.id, i.invoice_number, round(COALESCE(i.itbis, 0) * 100), COALESCE(SUM({_REVENUE_CENTS_SQL}), 0)
+              FROM invoices i
+              LEFT JOIN invoice_items li ON li.invoice_id = i.id
+             WHERE {where} AND COALESCE(i.itbis, 0) != 0
+             GROUP BY i.id
+        """, params).fetchall()
+        if not rows:
+            return []
+        return self._itbis_result(*zip(*rows), rate, tolerance)
+
+    # ----- Motor NumPy -----
+
+    def _get_frame(self, conn: sqlite3.Connection, version: Optional[tuple]) -> Dict[str, Any]:
+        """Arreglos de facturas y líneas para `version` (se recargan si cambió)."""
+        with self._lock:
+            if version is not None and self._frame is not None and self._frame[0] == version:
+                return self._frame[1]
+        frame = self._load_frame(conn)
+        self.stats['loads'] += 1
+        if version is not None:
+            with self._lock:
+                self._frame = (version, frame)
+        return frame
+
+    @staticmethod
+    def _encode(labels_index: Dict[Any, int], keys) -> Any:
+        """Claves de texto → ids enteros estables (np.unique por bloque + dict de distintos)."""
+        labels, inverse = np.unique(np.array(keys, dtype=object), return_inverse=True)
+        ids = np.fromiter((labels_index.setdefault(label, len(labels_index)) for label in labels),
+                          dtype=np.int32, count=len(labels))
+        return ids[inverse.ravel()]
+
+    def _load_frame(self, conn: sqlite3.Connection) -> Dict[str, Any]:
+        size = (conn.execute("SELECT MAX(id) FROM invoices").fetchone()[0] or 0) + 1
+        inv = {
+            'company': np.full(size, -1, dtype=np.int64),
+            'type': np.full(size, -1, dtype=np.int8),
+            'active': np.zeros(size, dtype=bool),
+            'date': np.zeros(size, dtype=np.int64),
+            'month': np.zeros(size, dtype=np.int32),
+            'client': np.zeros(size, dtype=np.int32),
+            'itbis': np.zeros(size),
+        }
+        months: Dict[Any, int] = {}
+        clients: Dict[Any, int] = {}
+        for rows in self._iter_chunks(conn, f"""
+            SELECT i.id, i.company_id,
+                   CASE i.invoice_type WHEN 'emitida' THEN 0 WHEN 'recibida' THEN 1 ELSE 2 END,
+                   COALESCE(i.status, 'activa') != 'anulada',
+                   CAST(replace(substr(COALESCE(i.invoice_date, ''), 1, 10), '-', '') AS INTEGER),
+                   {_MONTH_KEY_SQL}, {_CLIENT_KEY_SQL}, round(COALESCE(i.itbis, 0) * 100)
+              FROM invoices i
+        """):
+            ids, company, kind, active, date, month, client, itbis = zip(*rows)
+            ids = np.asarray(ids, dtype=np.int64)
+            inv['company'][ids] = company
+            inv['type'][ids] = kind
+            inv['active'][ids] = active
+            inv['date'][ids] = date
+            inv['month'][ids] = self._encode(months, month)
+            inv['client'][ids] = self._encode(clients, client)
+            inv['itbis'][ids] = itbis
+
+        items: Dict[Any, int] = {}
+        parts: Dict[str, list] = {'invoice': [], 'item': [], 'qty': [], 'revenue': []}
+        for rows in self._iter_chunks(conn, f"""
+            SELECT li.invoice_id, {_ITEM_KEY_SQL}, li.quantity, li.unit_price FROM invoice_items li
+        """):
+            invoice_id, key, qty, price = zip(*rows)
+            invoice_id = np.asarray(invoice_id, dtype=np.int64)
+            qty = np.asarray(qty, dtype=np.float64)
+            # Líneas huérfanas (factura inexistente) apuntan al id 0, que nunca pasa los filtros
+            invoice_id[(invoice_id < 0) | (invoice_id >= size)] = 0
+            parts['invoice'].append(invoice_id)
+            parts['item'].append(self._encode(items, key))
+            parts['qty'].append(qty)
+            parts['revenue'].append(_round_half_away(qty * np.asarray(price, dtype=np.float64) * 100))
+        lines = {k: (np.concatenate(v) if v else np.zeros(0, dtype=np.int64 if k in ('invoice', 'item') else float))
+                 for k, v in parts.items()}
+
+        item_labels = list(items)
+        costs = dict(conn.execute("SELECT code, cost FROM items"))
+        unit_cost = np.fromiter((costs.get(label) or 0.0 for label in item_labels), dtype=np.float64,
+                                count=len(item_labels))
+        lines['cost'] = (_round_half_away(lines['qty'] * unit_cost[lines['item']] * 100)
+                         if len(item_labels) else np.zeros(0))
+        inv['subtotal'] = np.bincount(lines['invoice'], weights=lines['revenue'], minlength=size)
+        return {
+            'inv': inv, 'lines': lines,
+            'labels': {'item_code': item_labels, 'client': list(clients), 'month': list(months)},
+        }
+
+    @staticmethod
+    def _invoice_mask(frame, company_id, start_date, end_date, invoice_type):
+        inv = frame['inv']
+        kind = _INVOICE_TYPES.get(invoice_type, 2)
+        mask = (inv['type'] == kind) & inv['active']
+        if company_id is not None:
+            mask &= inv['company'] == int(company_id)
+        if start_date:
+            mask &= inv['date'] >= _date_int(start_date)
+        if end_date:
+            mask &= inv['date'] < _date_int(end_date)
+        return mask
+
+    def _aggregate_numpy(self, frame, by, company_id, start_date, end_date, invoice_type):
+        lines = frame['lines']
+        selected = self._invoice_mask(frame, company_id, start_date, end_date, invoice_type)[lines['invoice']]
+        if by == 'item_code':
+            groups = lines['item'][selected]
+        else:
+            groups = frame['inv'][by][lines['invoice'][selected]]
+        labels = frame['labels'][by]
+        n = len(labels)
+        count = np.bincount(groups, minlength=n)
+        sums = [np.bincount(groups, weights=lines[col][selected], minlength=n) for col in ('qty', 'revenue', 'cost')]
+        used = np.nonzero(count)[0]
+        return self._rows_to_result([labels[g] for g in used], count[used], *(s[used] for s in sums))
+
+    def _itbis_numpy(self, conn, frame, company_id, start_date, end_date, invoice_type, rate, tolerance):
+        inv = frame['inv']
+        mask = self._invoice_mask(frame, company_id, start_date, end_date, invoice_type) & (inv['itbis'] != 0)
+        # Descarte vectorizado con un centavo de holgura; el cálculo exacto va sobre los candidatos
+        gap = np.abs(inv['itbis'] - inv['subtotal'] * rate)
+        candidates = np.nonzero(mask & (gap > round(tolerance * 100) - 1))[0]
+        if not len(candidates):
+            return []
+        numbers: Dict[int, str] = {}
+        ids = [int(c) for c in candidates]
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            numbers.update(conn.execute(
+                f"SELECT id, invoice_number FROM invoices WHERE id IN ({','.join('?' * len(chunk))})", chunk
+            ))
+        return self._itbis_result(ids, [numbers.get(i) for i in ids], inv['itbis'][candidates],
+                                  inv['subtotal'][candidates], rate, tolerance)
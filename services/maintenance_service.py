@@ -0,0 +1,316 @@
+"""
+Mantenimiento periódico de la base SQLite.
+
+Tareas (cada una con su intervalo mínimo entre ejecuciones):
+
+- 'optimize'            PRAGMA optimize (estadísticas sólo de lo que cambió)
+- 'analyze'             ANALYZE completo (sqlite_stat1 para el planificador)
+- 'prune_change_log'    Recorta el change_log de sincronización (lo ya
+                        enviado, o todo si la base nunca sincronizó; ver
+                        sync_service.prune_change_log)
+- 'incremental_vacuum'  Devuelve al sistema las páginas libres que dejan
+                        los borrados (facturas, líneas, change_log), en
+                        tramos acotados
+- 'integrity'           PRAGMA integrity_check
+- 'enable_incremental'  Una sola vez por base: auto_vacuum = INCREMENTAL +
+                        VACUUM (las bases nuevas ya nacen así, ver migrate).
+                        Reescribe el archivo entero: en reposo sólo corre en
+                        bases de hasta ENABLE_INCREMENTAL_MAX_BYTES; las más
+                        grandes, a pedido desde el panel de salud
+
+Cada ejecución queda en `maintenance_log` (duración, tamaño y páginas libres
+antes/después, resultado). `MaintenanceScheduler` corre las tareas vencidas
+en un hilo sólo cuando la app lleva un rato sin actividad del usuario.
+`health_report` arma el panel de "salud de la base" con los tamaños por
+tabla e índice de la tabla virtual `dbstat`.
+
+Uso:
+    svc = MaintenanceService(db_path)
+    svc.run_due()                         # tareas vencidas
+    svc.health_report()
+    MaintenanceScheduler(svc).start()     # en segundo plano, en reposo
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+# Tarea -> intervalo mínimo entre ejecuciones
+TASK_INTERVALS = {
+    'enable_incremental': timedelta(0),
+    'optimize': timedelta(hours=6),
+    'prune_change_log': timedelta(days=1),
+    'incremental_vacuum': timedelta(days=1),
+    'analyze': timedelta(days=7),
+    'integrity': timedelta(days=7),
+}
+TASK_ORDER = ('enable_incremental', 'optimize', 'prune_change_log', 'incremental_vacuum', 'analyze', 'integrity')
+
+AUTO_VACUUM_INCREMENTAL = 2
+# Fracción de páginas libres desde la que vale la pena el incremental_vacuum
+FREELIST_THRESHOLD = 0.05
+VACUUM_PAGES_PER_RUN = 5000
+# Tamaño máximo para convertir a INCREMENTAL (VACUUM completo) sin que lo pida el usuario
+ENABLE_INCREMENTAL_MAX_BYTES = 32 * 1024 * 1024
+
+
+def install_maintenance_log(conn: sqlite3.Connection) -> None:
+    """Crea la tabla maintenance_log (idempotente; migración 12)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS maintenance_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task TEXT NOT NULL,
+            started_at TEXT NOT NULL,
+            duration_ms INTEGER NOT NULL,
+            bytes_before INTEGER,
+            bytes_after INTEGER,
+            free_pages_before INTEGER,
+            free_pages_after INTEGER,
+            result TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_maintenance_log_task ON maintenance_log(task, started_at)")
+
+
+class MaintenanceService:
+    """ANALYZE/optimize/vacuum incremental/integrity con registro de tiempos y tamaños."""
+
+    def __init__(self, db_path: str, intervals: Optional[Dict[str, timedelta]] = None, busy_timeout: float = 30.0):
+        """
+        Args:
+            db_path: Ruta a la base de datos
+            intervals: Intervalos por tarea (default: TASK_INTERVALS)
+            busy_timeout: Segundos de espera si otra conexión tiene la base bloqueada
+        """
+        self.db_path = db_path
+        self.intervals = {**TASK_INTERVALS, **(intervals or {})}
+        self.busy_timeout = busy_timeout
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # autocommit: VACUUM e incremental_vacuum no pueden ir dentro de una transacción
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, isolation_level=None)
+        install_maintenance_log(conn)
+        return conn
+
+    @staticmethod
+    def _pragma(conn: sqlite3.Connection, name: str) -> int:
+        return int(conn.execute(f"PRAGMA {name}").fetchone()[0])
+
+    def _sizes(self, conn: sqlite3.Connection) -> Dict[str, int]:
+        return {
+            'bytes': self._pragma(conn, "page_count") * self._pragma(conn, "page_size"),
+            'free_pages': self._pragma(conn, "freelist_count"),
+        }
+
+    # -------------------------
+    # Tareas
+    # -------------------------
+    def last_runs(self) -> Dict[str, Dict[str, Any]]:
+        """Última ejecución de cada tarea."""
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute("""
+                SELECT m.* FROM maintenance_log m
+                JOIN (SELECT task, MAX(id) AS id FROM maintenance_log GROUP BY task) last ON last.id = m.id
+            """).fetchall()
+        return {r['task']: dict(r) for r in rows}
+
+    def due_tasks(self, now: Optional[datetime] = None, explicit: bool = False) -> List[str]:
+        """
+        Tareas cuyo intervalo ya venció (y que tienen algo que hacer).
+
+        Args:
+            explicit: True si lo pidió el usuario; si no, 'enable_incremental'
+                se omite en bases de más de ENABLE_INCREMENTAL_MAX_BYTES
+        """
+        now = now or datetime.now()
+        last = self.last_runs()
+        with self._connect() as conn:
+            incremental = self._pragma(conn, "auto_vacuum") == AUTO_VACUUM_INCREMENTAL
+            pages = max(self._pragma(conn, "page_count"), 1)
+            free = self._pragma(conn, "freelist_count")
+            size = pages * self._pragma(conn, "page_size")
+            try:
+                has_log = conn.execute("SELECT EXISTS (SELECT 1 FROM change_log)").fetchone()[0]
+            except sqlite3.OperationalError:
+                has_log = False  # base sin la migración del change_log
+        due = []
+        for task in TASK_ORDER:
+            if task == 'enable_incremental' and (incremental or (not explicit and size > ENABLE_INCREMENTAL_MAX_BYTES)):
+                continue
+            if task == 'prune_change_log' and not has_log:
+                continue
+            if task == 'incremental_vacuum' and (not incremental or free / pages < FREELIST_THRESHOLD):
+                continue
+            previous = last.get(task)
+            if previous and now - datetime.fromisoformat(previous['started_at']) < self.intervals[task]:
+                continue
+            due.append(task)
+        return due
+
+    def run_task(self, task: str) -> Dict[str, Any]:
+        """
+        Ejecuta una tarea y la registra en maintenance_log.
+
+        Returns:
+            {task, duration_ms, bytes_before, bytes_after, free_pages_before, free_pages_after, result}
+        """
+        if task not in TASK_INTERVALS:
+            raise ValueError(f"Tarea de mantenimiento desconocida: {task}")
+        with self._lock, self._connect() as conn:
+            before = self._sizes(conn)
+            started = datetime.now()
+            t0 = time.perf_counter()
+            try:
+                result = getattr(self, f"_task_{task}")(conn)
+            except sqlite3.Error as e:
+                result = f"error: {e}"
+            duration_ms = int((time.perf_counter() - t0) * 1000)
+            after = self._sizes(conn)
+            entry = {
+                'task': task, 'started_at': started.isoformat(), 'duration_ms': duration_ms,
+                'bytes_before': before['bytes'], 'bytes_after': after['bytes'],
+                'free_pages_before': before['free_pages'], 'free_pages_after': after['free_pages'],
+                'result': result,
+            }
+            conn.execute("""
+                INSERT INTO maintenance_log (task, started_at, duration_ms, bytes_before, bytes_after,
+                                             free_pages_before, free_pages_after, result)
+                VALUES (:task, :started_at, :duration_ms, :bytes_before, :bytes_after,
+                        :free_pages_before, :free_pages_after, :result)
+            """, entry)
+        print(f"[MAINTENANCE] {task}: {duration_ms} ms, {before['bytes']:,} -> {after['bytes']:,} bytes ({result})")
+        return entry
+
+    def run_due(self, now: Optional[datetime] = None, should_stop=None, explicit: bool = False) -> List[Dict[str, Any]]:
+        """
+        Ejecuta las tareas vencidas en orden.
+
+        Args:
+            should_stop: Función que devuelve True para cortar entre tareas (p. ej. volvió el usuario)
+            explicit: Pedido por el usuario (ver due_tasks)
+        """
+        results = []
+        for task in self.due_tasks(now, explicit=explicit):
+            if should_stop and should_stop():
+                break
+            results.append(self.run_task(task))
+        return results
+
+    def _task_enable_incremental(self, conn: sqlite3.Connection) -> str:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        return "ok" if self._pragma(conn, "auto_vacuum") == AUTO_VACUUM_INCREMENTAL else "sin cambio"
+
+    def _task_optimize(self, conn: sqlite3.Connection) -> str:
+        conn.execute("PRAGMA optimize")
+        return "ok"
+
+    def _task_analyze(self, conn: sqlite3.Connection) -> str:
+        conn.execute("ANALYZE")
+        return "ok"
+
+    def _task_prune_change_log(self, conn: sqlite3.Connection) -> str:
+        from services.sync_service import prune_change_log
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            deleted = prune_change_log(conn)
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        return f"{deleted} entradas borradas"
+
+    def _task_incremental_vacuum(self, conn: sqlite3.Connection) -> str:
+        freed = self._pragma(conn, "freelist_count")
+        conn.execute(f"PRAGMA incremental_vacuum({int(VACUUM_PAGES_PER_RUN)})").fetchall()
+        return f"{freed - self._pragma(conn, 'freelist_count')} páginas liberadas"
+
+    def _task_integrity(self, conn: sqlite3.Connection) -> str:
+        problems = [r[0] for r in conn.execute("PRAGMA integrity_check")]
+        return "ok" if problems == ["ok"] else "; ".join(problems[:10])
+
+    # -------------------------
+    # Salud
+    # -------------------------
+    def health_report(self) -> Dict[str, Any]:
+        """
+        Resumen para el panel de salud de la base.
+
+        Returns:
+            {file_bytes, page_size, page_count, free_pages, auto_vacuum,
+             objects: [{name, type, table, pages, bytes, unused_bytes}] por tamaño,
+             last_runs: {tarea: última ejecución}}
+        """
+        with self._connect() as conn:
+            report = {
+                'file_bytes': os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0,
+                'page_size': self._pragma(conn, "page_size"),
+                'page_count': self._pragma(conn, "page_count"),
+                'free_pages': self._pragma(conn, "freelist_count"),
+                'auto_vacuum': {0: 'NONE', 1: 'FULL', 2: 'INCREMENTAL'}.get(self._pragma(conn, "auto_vacuum")),
+                'objects': [],
+            }
+            try:
+                rows = conn.execute("""
+                    SELECT d.name, COALESCE(m.type, 'table'), COALESCE(m.tbl_name, d.name),
+                           COUNT(*), SUM(d.pgsize), SUM(d.unused)
+                      FROM dbstat d
+                      LEFT JOIN sqlite_master m ON m.name = d.name
+                     GROUP BY d.name
+                     ORDER BY SUM(d.pgsize) DESC
+                """).fetchall()
+                report['objects'] = [
+                    {'name': n, 'type': t, 'table': tbl, 'pages': p, 'bytes': b, 'unused_bytes': u}
+                    for n, t, tbl, p, b, u in rows
+                ]
+            except sqlite3.OperationalError as e:
+                # SQLite compilado sin SQLITE_ENABLE_DBSTAT_VTAB
+                print(f"[MAINTENANCE] dbstat no disponible: {e}")
+        report['last_runs'] = self.last_runs()
+        return report
+
+
+class MaintenanceScheduler:
+    """Corre las tareas vencidas en un hilo cuando la app lleva `idle_after` segundos en reposo."""
+
+    def __init__(self, service: MaintenanceService, idle_after: float = 120.0, check_every: float = 60.0):
+        self.service = service
+        self.idle_after = idle_after
+        self.check_every = check_every
+        self._last_activity = time.monotonic()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def touch(self) -> None:
+        """Registra actividad del usuario (pospone el mantenimiento)."""
+        self._last_activity = time.monotonic()
+
+    def is_idle(self) -> bool:
+        return time.monotonic() - self._last_activity >= self.idle_after
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="facot-maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.check_every):
+            if not self.is_idle():
+                continue
+            try:
+                self.service.run_due(should_stop=lambda: self._stop.is_set() or not self.is_idle())
+            except Exception as e:
+                print(f"[MAINTENANCE] Error en mantenimiento: {e}")
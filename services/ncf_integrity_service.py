@@ -0,0 +1,251 @@
+"""
+Verificación de integridad de NCF emitidos.
+
+Las columnas generadas `invoices.ncf_prefix` / `invoices.ncf_seq` (migración
+7) exponen el prefijo y la secuencia numérica de cada NCF con formato
+válido, indexadas por (company_id, ncf_prefix, ncf_seq). Con eso una sola
+pasada ordenada sobre el índice por cada secuencia encuentra, por empresa
+y prefijo:
+
+- huecos: secuencias sin factura entre dos emitidas (y entre la última
+  emitida y el contador `ncf_sequences.last_seq`);
+- duplicados: la misma secuencia en más de una factura;
+- fuera de rango: secuencias mayores al contador o menores que 1;
+- mal formados: facturas emitidas cuyo número no es un NCF válido.
+
+Los años fiscales archivados entran en el análisis (ArchiveService.connect).
+
+Uso:
+    svc = NCFIntegrityService(db_path)
+    result = svc.scan(company_id)
+    print(svc.format_report(result))
+"""
+from __future__ import annotations
+
+import sqlite3
+from typing import Any, Dict, Optional
+
+from services.archive_service import ArchiveService
+
+# Huecos/duplicados listados por prefijo (los totales siempre son completos)
+MAX_ITEMS = 1000
+# Números leídos por viaje al cursor en el análisis de cada secuencia
+SCAN_FETCH_SIZE = 50_000
+
+_NCF = "trim(invoice_number)"
+
+# Mismas reglas que LogicController.NCF_REGEX_STD / NCF_REGEX_E:
+# letra (no E) + 10 dígitos, o E + 13 dígitos
+NCF_PREFIX_EXPR = f"upper(substr({_NCF}, 1, 3))"
+NCF_SEQ_EXPR = f"""CASE
+    WHEN substr({_NCF}, 2) NOT GLOB '*[^0-9]*' AND (
+         (length({_NCF}) = 11 AND upper(substr({_NCF}, 1, 1)) GLOB '[A-DF-Z]')
+      OR (length({_NCF}) = 14 AND upper(substr({_NCF}, 1, 1)) = 'E'))
+    THEN CAST(substr({_NCF}, 4) AS INTEGER)
+END"""
+
+
+# Prefijos distintos de una empresa saltando por el índice (sin recorrer todas las filas)
+_PREFIXES_SQL = """
+    WITH RECURSIVE p(prefix) AS (
+        SELECT (SELECT MIN(ncf_prefix) FROM invoices WHERE company_id = ?)
+        UNION ALL
+        SELECT (SELECT MIN(ncf_prefix) FROM invoices WHERE company_id = ? AND ncf_prefix > p.prefix)
+          FROM p WHERE p.prefix IS NOT NULL
+    )
+    SELECT prefix FROM p WHERE prefix IS NOT NULL
+"""
+
+
+def install_ncf_columns(conn: sqlite3.Connection) -> None:
+    """Agrega las columnas generadas y su índice (idempotente)."""
+    existing = {r[1] for r in conn.execute("PRAGMA table_xinfo(invoices)")}
+    if "ncf_prefix" not in existing:
+        conn.execute(f"ALTER TABLE invoices ADD COLUMN ncf_prefix TEXT "
+                     f"GENERATED ALWAYS AS ({NCF_PREFIX_EXPR}) VIRTUAL")
+    if "ncf_seq" not in existing:
+        conn.execute(f"ALTER TABLE invoices ADD COLUMN ncf_seq INTEGER "
+                     f"GENERATED ALWAYS AS ({NCF_SEQ_EXPR}) VIRTUAL")
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_invoices_ncf
+        ON invoices(company_id, ncf_prefix, ncf_seq, invoice_type)
+    """)
+    # Sólo las filas con número no válido: la búsqueda de mal formados no recorre la tabla
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_invoices_ncf_invalid
+        ON invoices(company_id) WHERE ncf_seq IS NULL
+    """)
+
+
+class NCFIntegrityService:
+    """Detección de huecos, duplicados y NCF inválidos en una pasada por conjunto."""
+
+    def __init__(self, db_path: str):
+        """
+        Args:
+            db_path: Ruta a la base de datos (con la migración 7 aplicada)
+        """
+        self.db_path = db_path
+        self.archives = ArchiveService(db_path)
+
+    def scan(self, company_id: Optional[int] = None, prefix3: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Analiza los NCF emitidos.
+
+        Args:
+            company_id: Empresa a analizar (None = todas)
+            prefix3: Prefijo a analizar, p. ej. 'B01' (None = todos)
+
+        Returns:
+            {'sequences': [{company_id, prefix, count, min_seq, max_seq, last_seq,
+                            gaps: [(desde, hasta)], missing, duplicates: [(seq, veces)],
+                            duplicate_count, out_of_range: [seq]}],
+             'malformed': [{id, company_id, invoice_number}],
+             'ok': bool}
+        """
+        base, base_params = "invoice_type = 'emitida'", []
+        if company_id is not None:
+            base += " AND company_id = ?"
+            base_params.append(int(company_id))
+
+        sequences: Dict[tuple, Dict[str, Any]] = {}
+
+        def bucket(cid: int, prefix: str) -> Dict[str, Any]:
+            key = (cid, prefix)
+            if key not in sequences:
+                sequences[key] = {
+                    'company_id': cid, 'prefix': prefix, 'count': 0, 'min_seq': None,
+                    'max_seq': None, 'last_seq': None, 'gaps': [], 'missing': 0,
+                    'duplicates': [], 'duplicate_count': 0, 'out_of_range': [],
+                }
+            return sequences[key]
+
+        with self.archives.connect(all_years=True) as conn:
+            if company_id is not None:
+                company_ids = [int(company_id)]
+            else:
+                company_ids = [r[0] for r in conn.execute("SELECT id FROM companies ORDER BY id")]
+            for cid in company_ids:
+                prefixes = [prefix3.upper()] if prefix3 else [r[0] for r in conn.execute(_PREFIXES_SQL, (cid, cid))]
+                for prefix in prefixes:
+                    self._scan_sequence(conn, cid, prefix, bucket)
+
+            # Contador persistido: fuera de rango y hueco final (números consumidos sin factura)
+            seq_filters, seq_params = [], []
+            if company_id is not None:
+                seq_filters.append("company_id = ?")
+                seq_params.append(int(company_id))
+            if prefix3:
+                seq_filters.append("prefix3 = ?")
+                seq_params.append(prefix3.upper())
+            seq_where = ("WHERE " + " AND ".join(seq_filters)) if seq_filters else ""
+            for cid, prefix, last_seq in conn.execute(
+                f"SELECT company_id, prefix3, last_seq FROM ncf_sequences {seq_where}", seq_params
+            ).fetchall():
+                last_seq = int(last_seq or 0)
+                if (cid, prefix) not in sequences and last_seq == 0:
+                    continue
+                b = bucket(cid, prefix)
+                b['last_seq'] = last_seq
+                b['out_of_range'] = [r[0] for r in conn.execute("""
+                    SELECT ncf_seq FROM invoices
+                     WHERE company_id = ? AND ncf_prefix = ? AND invoice_type = 'emitida' AND ncf_seq > ?
+                     ORDER BY ncf_seq LIMIT ?
+                """, (cid, prefix, last_seq, MAX_ITEMS))]
+                top = b['max_seq']
+                if top is not None and last_seq > top:
+                    b['missing'] += last_seq - top
+                    b['gaps'].append((top + 1, last_seq))
+
+            for b in sequences.values():
+                if b['min_seq'] is not None and b['min_seq'] < 1:
+                    b['out_of_range'].insert(0, b['min_seq'])
+
+            # Con años archivados `invoices` es una vista (sin INDEXED BY)
+            indexed = "" if conn.archive_years else "INDEXED BY idx_invoices_ncf_invalid"
+            malformed = [
+                {'id': r[0], 'company_id': r[1], 'invoice_number': r[2]}
+                for r in conn.execute(f"""
+                    SELECT id, company_id, invoice_number FROM invoices {indexed}
+                     WHERE {base} AND ncf_seq IS NULL
+                     ORDER BY company_id, id LIMIT {MAX_ITEMS}
+                """, base_params)
+            ]
+
+        result = sorted(sequences.values(), key=lambda b: (b['company_id'], b['prefix']))
+        ok = not malformed and all(
+            not b['missing'] and not b['duplicate_count'] and not b['out_of_range'] for b in result
+        )
+        return {'sequences': result, 'malformed': malformed, 'ok': ok}
+
+    @staticmethod
+    def _scan_sequence(conn: sqlite3.Connection, cid: int, prefix: str, bucket) -> None:
+        """
+        Huecos y duplicados de una secuencia en una pasada ordenada por el índice.
+
+        Lee sólo `ncf_seq` de idx_invoices_ncf (índice cubridor, ya ordenado)
+        y compara cada número con el anterior en Python: más rápido que LAG()
+        en SQL, que arma una fila por factura en la ventana.
+        """
+        cur = conn.execute("""
+            SELECT ncf_seq FROM invoices
+             WHERE company_id = ? AND ncf_prefix = ? AND invoice_type = 'emitida'
+               AND ncf_seq IS NOT NULL
+             ORDER BY ncf_seq
+        """, (cid, prefix))
+        prev = None
+        count = 0
+        b = None
+        while True:
+            chunk = cur.fetchmany(SCAN_FETCH_SIZE)
+            if not chunk:
+                break
+            if b is None:
+                b = bucket(cid, prefix)
+                b['min_seq'] = chunk[0][0]
+                prev = b['min_seq'] - 1
+            count += len(chunk)
+            for (seq,) in chunk:
+                diff = seq - prev
+                if diff != 1:
+                    if diff == 0:
+                        b['duplicate_count'] += 1
+                        dups = b['duplicates']
+                        if dups and dups[-1][0] == seq:
+                            dups[-1] = (seq, dups[-1][1] + 1)
+                        elif len(dups) < MAX_ITEMS:
+                            dups.append((seq, 2))
+                    else:
+                        b['missing'] += diff - 1
+                        if len(b['gaps']) < MAX_ITEMS:
+                            b['gaps'].append((prev + 1, seq - 1))
+                prev = seq
+        if b is None:
+            return
+        b['max_seq'] = prev
+        b['count'] = count
+
+    @staticmethod
+    def format_report(result: Dict[str, Any]) -> str:
+        """Texto legible del resultado de `scan`."""
+        lines = []
+        for b in result['sequences']:
+            lines.append(
+                f"Empresa {b['company_id']} {b['prefix']}: {b['count']} emitidos "
+                f"({b['min_seq']}..{b['max_seq']}), contador {b['last_seq']}"
+            )
+            if b['gaps']:
+                ranges = ", ".join(f"{a}" if a == z else f"{a}-{z}" for a, z in b['gaps'][:20])
+                lines.append(f"  Huecos ({b['missing']} números): {ranges}")
+            if b['duplicates']:
+                dups = ", ".join(f"{s} x{n}" for s, n in b['duplicates'][:20])
+                lines.append(f"  Duplicados ({b['duplicate_count']}): {dups}")
+            if b['out_of_range']:
+                lines.append(f"  Fuera de rango: {', '.join(map(str, b['out_of_range'][:20]))}")
+        if result['malformed']:
+            lines.append(f"NCF mal formados: {len(result['malformed'])}")
+            for m in result['malformed'][:20]:
+                lines.append(f"  Factura {m['id']} (empresa {m['company_id']}): {m['invoice_number']!r}")
+        if result['ok']:
+            lines.append("Sin inconsistencias.")
+        return "\n".join(lines)
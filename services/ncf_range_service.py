@@ -0,0 +1,237 @@
+"""
+Rangos de NCF autorizados por la DGII.
+
+Cada empresa/prefijo puede tener uno o más rangos autorizados (desde, hasta,
+fecha de vencimiento). Los asignadores (NCFService.reserve_ncf y
+LogicController.allocate_next_ncf) toman el siguiente número del rango
+vigente y pasan solos al siguiente rango cuando uno se agota o vence. Si la
+empresa no tiene rangos cargados para el prefijo se mantiene el contador
+libre de `ncf_sequences` (compatibilidad).
+
+Cada rango guarda `next_seq`, así "quedan N / vence el ..." se calcula con
+las pocas filas de rangos, sin recorrer facturas.
+"""
+from __future__ import annotations
+
+import sqlite3
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+# Umbrales de alerta por defecto
+LOW_REMAINING_THRESHOLD = 50
+EXPIRY_WARNING_DAYS = 30
+
+STATUS_ACTIVE = 'activa'
+STATUS_EXHAUSTED = 'agotada'
+STATUS_EXPIRED = 'vencida'
+
+
+def create_ncf_ranges_table(conn: sqlite3.Connection) -> None:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ncf_ranges (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            company_id INTEGER NOT NULL,
+            prefix3 TEXT NOT NULL,
+            start_seq INTEGER NOT NULL,
+            end_seq INTEGER NOT NULL,
+            next_seq INTEGER NOT NULL,
+            expires_on TEXT,
+            authorization TEXT,
+            status TEXT NOT NULL DEFAULT 'activa',
+            created_at TEXT NOT NULL DEFAULT (datetime('now')),
+            CHECK (end_seq >= start_seq),
+            FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE
+        )
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_ncf_ranges_lookup
+        ON ncf_ranges(company_id, prefix3, status, start_seq)
+    """)
+
+
+def _today(today: Optional[str]) -> str:
+    return today or date.today().isoformat()
+
+
+def take_from_ranges(
+    conn: sqlite3.Connection,
+    company_id: int,
+    prefix3: str,
+    last_seq: int,
+    consume: bool = True,
+    today: Optional[str] = None
+) -> Optional[int]:
+    """
+    Siguiente secuencia dentro de los rangos autorizados.
+
+    Debe llamarse dentro de la transacción del asignador. Con consume=True
+    avanza `next_seq` y marca los rangos agotados o vencidos.
+
+    Args:
+        last_seq: Última secuencia usada según ncf_sequences
+        consume: False para sólo consultar (preview)
+
+    Returns:
+        La secuencia, o None si no hay rangos cargados para el prefijo
+
+    Raises:
+        ValueError: Si hay rangos pero ninguno vigente con números libres
+    """
+    prefix3 = prefix3.upper()
+    today = _today(today)
+    rows = conn.execute("""
+        SELECT id, start_seq, end_seq, next_seq, expires_on FROM ncf_ranges
+         WHERE company_id = ? AND prefix3 = ? AND status = ?
+         ORDER BY start_seq
+    """, (company_id, prefix3, STATUS_ACTIVE)).fetchall()
+    if not rows:
+        any_range = conn.execute(
+            "SELECT 1 FROM ncf_ranges WHERE company_id = ? AND prefix3 = ? LIMIT 1", (company_id, prefix3)
+        ).fetchone()
+        if any_range is None:
+            return None
+    for range_id, start_seq, end_seq, next_seq, expires_on in rows:
+        if expires_on and expires_on < today:
+            if consume:
+                conn.execute("UPDATE ncf_ranges SET status = ? WHERE id = ?", (STATUS_EXPIRED, range_id))
+            continue
+        seq = max(int(next_seq), int(start_seq), int(last_seq) + 1)
+        if seq > end_seq:
+            if consume:
+                conn.execute("UPDATE ncf_ranges SET status = ?, next_seq = ? WHERE id = ?",
+                             (STATUS_EXHAUSTED, end_seq + 1, range_id))
+            continue
+        if consume:
+            conn.execute("UPDATE ncf_ranges SET next_seq = ?, status = ? WHERE id = ?",
+                         (seq + 1, STATUS_EXHAUSTED if seq == end_seq else STATUS_ACTIVE, range_id))
+        return seq
+    raise ValueError(f"No hay rangos NCF autorizados vigentes para {prefix3} (agotados o vencidos)")
+
+
+def range_status(
+    conn: sqlite3.Connection,
+    company_id: int,
+    prefix3: str,
+    last_seq: int,
+    today: Optional[str] = None,
+    low_threshold: int = LOW_REMAINING_THRESHOLD,
+    expiry_days: int = EXPIRY_WARNING_DAYS
+) -> Optional[Dict[str, Any]]:
+    """
+    Números restantes y vencimiento del rango vigente.
+
+    Returns:
+        None si no hay rangos cargados; si no, dict con 'remaining' (todos
+        los rangos vigentes), 'current_remaining', 'expires_on' (del rango en
+        uso), 'range' (desde, hasta) y 'alert': None, 'low', 'expiring' o
+        'exhausted'
+    """
+    prefix3 = prefix3.upper()
+    today = _today(today)
+    rows = conn.execute("""
+        SELECT start_seq, end_seq, next_seq, expires_on FROM ncf_ranges
+         WHERE company_id = ? AND prefix3 = ? AND status = ?
+         ORDER BY start_seq
+    """, (company_id, prefix3, STATUS_ACTIVE)).fetchall()
+    if not rows and conn.execute(
+        "SELECT 1 FROM ncf_ranges WHERE company_id = ? AND prefix3 = ? LIMIT 1", (company_id, prefix3)
+    ).fetchone() is None:
+        return None
+
+    current = None
+    remaining = 0
+    for start_seq, end_seq, next_seq, expires_on in rows:
+        if expires_on and expires_on < today:
+            continue
+        left = end_seq - max(next_seq, start_seq, last_seq + 1) + 1
+        if left <= 0:
+            continue
+        remaining += left
+        if current is None:
+            current = {'range': (start_seq, end_seq), 'current_remaining': left, 'expires_on': expires_on}
+
+    status: Dict[str, Any] = {'remaining': remaining, 'current_remaining': 0, 'expires_on': None,
+                              'range': None, 'alert': None}
+    if current is None:
+        status['alert'] = 'exhausted'
+        return status
+    status.update(current)
+    warn_date = (date.fromisoformat(today) + timedelta(days=expiry_days)).isoformat()
+    if remaining <= low_threshold:
+        status['alert'] = 'low'
+    elif current['expires_on'] and current['expires_on'] <= warn_date:
+        status['alert'] = 'expiring'
+    return status
+
+
+class NCFRangeService:
+    """Alta, baja y consulta de rangos autorizados."""
+
+    def __init__(self, db_path: str):
+        """
+        Args:
+            db_path: Ruta a la base de datos (con la migración 8 aplicada)
+        """
+        self.db_path = db_path
+
+    def add_range(
+        self,
+        company_id: int,
+        prefix3: str,
+        start_seq: int,
+        end_seq: int,
+        expires_on: Optional[str] = None,
+        authorization: str = ""
+    ) -> Tuple[bool, str]:
+        """
+        Registra un rango autorizado.
+
+        Returns:
+            Tuple de (success, mensaje o id del rango como texto)
+        """
+        prefix3 = (prefix3 or "").strip().upper()
+        if len(prefix3) != 3:
+            return False, f"Prefijo inválido: {prefix3}"
+        try:
+            start_seq, end_seq = int(start_seq), int(end_seq)
+        except (TypeError, ValueError):
+            return False, "Desde/Hasta deben ser números"
+        if start_seq < 1 or end_seq < start_seq:
+            return False, "Rango inválido: 'Hasta' debe ser mayor o igual que 'Desde' (mínimo 1)"
+        if expires_on:
+            try:
+                expires_on = date.fromisoformat(expires_on).isoformat()
+            except ValueError:
+                return False, f"Fecha de vencimiento inválida: {expires_on} (AAAA-MM-DD)"
+        with sqlite3.connect(self.db_path) as conn:
+            overlap = conn.execute("""
+                SELECT start_seq, end_seq FROM ncf_ranges
+                 WHERE company_id = ? AND prefix3 = ? AND start_seq <= ? AND end_seq >= ?
+                 LIMIT 1
+            """, (company_id, prefix3, end_seq, start_seq)).fetchone()
+            if overlap:
+                return False, f"El rango se solapa con {overlap[0]}-{overlap[1]}"
+            cur = conn.execute("""
+                INSERT INTO ncf_ranges (company_id, prefix3, start_seq, end_seq, next_seq, expires_on, authorization)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (company_id, prefix3, start_seq, end_seq, start_seq, expires_on or None, authorization or None))
+            return True, str(cur.lastrowid)
+
+    def delete_range(self, range_id: int) -> bool:
+        with sqlite3.connect(self.db_path) as conn:
+            return conn.execute("DELETE FROM ncf_ranges WHERE id = ?", (range_id,)).rowcount > 0
+
+    def list_ranges(self, company_id: int, prefix3: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Rangos de la empresa con sus números restantes."""
+        query = "SELECT * FROM ncf_ranges WHERE company_id = ?"
+        params: List[Any] = [company_id]
+        if prefix3:
+            query += " AND prefix3 = ?"
+            params.append(prefix3.upper())
+        query += " ORDER BY prefix3, start_seq"
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            rows = [dict(r) for r in conn.execute(query, params)]
+        for r in rows:
+            r['remaining'] = max(0, r['end_seq'] - max(r['next_seq'], r['start_seq']) + 1)
+        return rows
@@ -6,6 +6,9 @@ import sqlite3
 from typing import Tuple, Optional
 import re
 
+from services.ncf_range_service import create_ncf_ranges_table, take_from_ranges
+from services.archive_service import ArchiveService
+
 
 class NCFService:
     """Servicio de gestión de NCF con transacciones."""
@@ -16,15 +19,19 @@ class NCFService:
     # Formato: Prefijo (B01) + 8 dígitos
     NCF_PATTERN = re.compile(r'^(B\d{2})(\d{8})$')
     
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, ensure_schema: bool = True):
         """
         Inicializa el servicio de NCF.
         
         Args:
             db_path: Ruta a la base de datos
+            ensure_schema: Crear la tabla si no existe (False cuando el
+                esquema ya lo aplicó services.schema_migrations)
         """
         self.db_path = db_path
-        self._ensure_ncf_sequences_table()
+        self.archives = ArchiveService(db_path)
+        if ensure_schema:
+            self._ensure_ncf_sequences_table()
     
     def _ensure_ncf_sequences_table(self):
         """Crea la tabla ncf_sequences si no existe."""
@@ -38,6 +45,7 @@ class NCFService:
                     PRIMARY KEY (company_id, prefix3)
                 )
             """)
+            create_ncf_ranges_table(conn)
     
     def reserve_ncf(
         self,
@@ -116,8 +124,9 @@ class NCFService:
                         VALUES (?, ?, ?, datetime('now'))
                     """, (company_id, ncf_type, last_seq))
                 
-                # Calcular siguiente NCF
-                next_seq = last_seq + 1
+                # Calcular siguiente NCF (dentro de los rangos autorizados, si hay)
+                range_seq = take_from_ranges(conn, company_id, ncf_type, last_seq)
+                next_seq = range_seq if range_seq is not None else last_seq + 1
                 
                 if next_seq > 99999999:
                     raise ValueError(f"Se agotaron los números de NCF para {ncf_type}")
@@ -229,9 +238,9 @@ class NCFService:
             ncf: NCF a verificar
         
         Returns:
-            True si el NCF existe, False si no
+            True si el NCF existe, False si no (incluye años archivados)
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with self.archives.connect(all_years=True) as conn:
             cursor = conn.execute("""
                 SELECT COUNT(*) 
                 FROM invoices 
@@ -252,7 +261,7 @@ class NCFService:
         Returns:
             Dict con información de la secuencia
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with self.archives.connect(all_years=True) as conn:
             # Último NCF
             cursor = conn.execute("""
                 SELECT invoice_number 
@@ -0,0 +1,299 @@
+"""
+Padrón de RNC de la DGII en una tabla local.
+
+La DGII publica el registro de contribuyentes (DGII_RNC.zip con un TXT
+separado por '|', en latin-1, cientos de miles de filas):
+
+    RNC|RAZÓN SOCIAL|NOMBRE COMERCIAL|ACTIVIDAD|...|FECHA|ESTADO|RÉGIMEN
+
+`import_file()` lo lee en streaming (sin cargarlo en memoria, también desde
+el .zip) y lo vuelca en `rnc_registry` en transacciones por bloques de
+CHUNK_ROWS filas. Cada fila guarda un hash de su contenido: al reimportar un
+padrón nuevo, el UPSERT sólo escribe las filas que cambiaron y al final se
+borran los RNC que ya no figuran, así una actualización mensual toca unas
+pocas miles de filas en vez de reescribir la tabla.
+
+Búsquedas (sub-milisegundo, por índice):
+- RNC exacto o por prefijo: rango sobre la clave primaria.
+- Nombre por prefijo: razón social o nombre comercial normalizados
+  (mayúsculas, sin acentos) con índice propio.
+
+Uso:
+    svc = RncRegistryService(db_path)
+    ok, msg = svc.import_file("DGII_RNC.zip")
+    svc.lookup("131-24679-6")               # {'rnc': '131246796', 'name': ..., 'status': 'ACTIVO', ...}
+    svc.search("ferret", by='name')
+"""
+from __future__ import annotations
+
+import io
+import os
+import re
+import sqlite3
+import time
+import zipfile
+import zlib
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from utils.text_keys import fold_key
+
+CHUNK_ROWS = 20000
+SEARCH_LIMIT = 10
+REGISTRY_ENCODING = "latin-1"
+STATUS_ACTIVE = "ACTIVO"
+
+_FIELDS = ('rnc', 'name', 'trade_name', 'activity', 'status', 'regime')
+
+
+def install_rnc_registry(conn: sqlite3.Connection) -> None:
+    """Crea la tabla del padrón y sus índices de nombre (idempotente; migración 17)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS rnc_registry (
+            rnc TEXT PRIMARY KEY,
+            name TEXT NOT NULL DEFAULT '',
+            trade_name TEXT NOT NULL DEFAULT '',
+            activity TEXT NOT NULL DEFAULT '',
+            status TEXT NOT NULL DEFAULT '',
+            regime TEXT NOT NULL DEFAULT '',
+            name_key TEXT NOT NULL DEFAULT '',
+            trade_key TEXT NOT NULL DEFAULT '',
+            row_hash INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rnc_registry_name ON rnc_registry(name_key)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rnc_registry_trade ON rnc_registry(trade_key)")
+
+
+def normalize_rnc(value: Any) -> str:
+    """Sólo los dígitos del RNC/Cédula ('131-24679-6' -> '131246796')."""
+    return re.sub(r'\D', '', str(value or ''))
+
+
+def parse_registry_line(line: str) -> Optional[Tuple[str, str, str, str, str, str]]:
+    """(rnc, razón social, nombre comercial, actividad, estado, régimen) o None si no es una fila válida."""
+    parts = [p.strip() for p in line.rstrip('\r\n').split('|')]
+    rnc = normalize_rnc(parts[0]) if parts else ''
+    if len(rnc) not in (9, 11) or len(parts) < 2:
+        return None
+    status, regime = (parts[-2], parts[-1]) if len(parts) >= 6 else ('', '')
+    padded = parts + [''] * 4
+    return rnc, ' '.join(padded[1].split()), ' '.join(padded[2].split()), padded[3], status.upper(), regime.upper()
+
+
+@contextmanager
+def _open_registry(path: str) -> Iterator[Tuple[io.BufferedIOBase, int]]:
+    """(flujo binario, tamaño sin comprimir) del TXT, directo o dentro del .zip de la DGII."""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            members = [m for m in archive.infolist() if not m.is_dir()]
+            if not members:
+                raise ValueError("El archivo .zip está vacío")
+            member = max(members, key=lambda m: m.file_size)
+            with archive.open(member) as stream:
+                yield stream, member.file_size
+    else:
+        with open(path, 'rb') as stream:
+            yield stream, os.path.getsize(path)
+
+
+class RncRegistryService:
+    """Importación del padrón de la DGII y consultas por RNC o nombre."""
+
+    def __init__(self, db_path: str):
+        """
+        Args:
+            db_path: Ruta a la base de datos (con la migración 17 aplicada)
+        """
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+
+    # -------------------------
+    # Consultas
+    # -------------------------
+    def _reader(self) -> sqlite3.Connection:
+        """Conexión de lectura reutilizada: abrir una por búsqueda costaría más que la consulta."""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, isolation_level=None)
+            self._conn.row_factory = sqlite3.Row
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def count(self) -> int:
+        try:
+            return self._reader().execute("SELECT COUNT(*) FROM rnc_registry").fetchone()[0]
+        except sqlite3.OperationalError:
+            return 0  # base sin la migración 17
+
+    def is_loaded(self) -> bool:
+        try:
+            return self._reader().execute("SELECT 1 FROM rnc_registry LIMIT 1").fetchone() is not None
+        except sqlite3.OperationalError:
+            return False
+
+    def lookup(self, rnc: str) -> Optional[Dict[str, Any]]:
+        """Contribuyente con ese RNC/Cédula (con o sin guiones); None si no figura."""
+        digits = normalize_rnc(rnc)
+        if not digits:
+            return None
+        try:
+            row = self._reader().execute(
+                "SELECT rnc, name, trade_name, activity, status, regime FROM rnc_registry WHERE rnc = ?",
+                (digits,)).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return dict(row) if row else None
+
+    def search(self, query: str, by: str = 'rnc', limit: int = SEARCH_LIMIT) -> List[Dict[str, Any]]:
+        """
+        Contribuyentes cuyo RNC o nombre empieza con `query`.
+
+        Args:
+            query: Prefijo (RNC con o sin guiones, o nombre sin importar acentos)
+            by: 'rnc' o 'name' (razón social y nombre comercial)
+            limit: Máximo de resultados
+
+        Returns:
+            Lista de {'rnc', 'name', 'trade_name', 'status'}
+        """
+        cols = "rnc, name, trade_name, status"
+        if by == 'rnc':
+            prefix = normalize_rnc(query)
+            if len(prefix) < 2:
+                return []
+            # ':' es el carácter siguiente a '9': rango de la clave primaria
+            sql = f"SELECT {cols} FROM rnc_registry WHERE rnc >= ? AND rnc < ? ORDER BY rnc LIMIT ?"
+            params: Tuple = (prefix, prefix + ':', limit)
+        else:
+            prefix = fold_key(query)
+            if len(prefix) < 2:
+                return []
+            upper = prefix + '\uffff'
+            sql = f"""
+                SELECT {cols} FROM (
+                    SELECT * FROM (SELECT {cols}, name_key AS k FROM rnc_registry
+                                    WHERE name_key >= ? AND name_key < ? ORDER BY name_key LIMIT ?)
+                    UNION
+                    SELECT * FROM (SELECT {cols}, trade_key AS k FROM rnc_registry
+                                    WHERE trade_key >= ? AND trade_key < ? ORDER BY trade_key LIMIT ?)
+                ) ORDER BY k LIMIT ?
+            """
+            params = (prefix, upper, limit, prefix, upper, limit, limit)
+        try:
+            rows = self._reader().execute(sql, params).fetchall()
+        except sqlite3.OperationalError:
+            return []
+        seen, out = set(), []
+        for row in rows:
+            if row['rnc'] not in seen:
+                seen.add(row['rnc'])
+                out.append(dict(row))
+        return out
+
+    # -------------------------
+    # Importación
+    # -------------------------
+    def import_file(
+        self,
+        path: str,
+        encoding: str = REGISTRY_ENCODING,
+        progress: Optional[Callable[[float], None]] = None,
+        chunk_rows: int = CHUNK_ROWS
+    ) -> Tuple[bool, str]:
+        """
+        Importa (o actualiza) el padrón desde el TXT o el .zip de la DGII.
+
+        Args:
+            path: Archivo DGII_RNC.TXT o DGII_RNC.zip
+            encoding: Codificación del TXT (la DGII lo publica en latin-1)
+            progress: Callback con la fracción leída (0.0 - 1.0)
+            chunk_rows: Filas por transacción
+
+        Returns:
+            Tuple de (success, mensaje con filas nuevas/cambiadas/bajas)
+        """
+        t0 = time.perf_counter()
+        stats = {'read': 0, 'skipped': 0, 'inserted': 0, 'updated': 0, 'deleted': 0}
+        conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=30)
+        try:
+            install_rnc_registry(conn)
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS rnc_seen (rnc TEXT PRIMARY KEY) WITHOUT ROWID")
+            conn.execute("DELETE FROM temp.rnc_seen")
+            before = conn.execute("SELECT COUNT(*) FROM rnc_registry").fetchone()[0]
+            changed = 0
+
+            with _open_registry(path) as (stream, total_bytes):
+                done_bytes = 0
+                chunk: List[Tuple] = []
+                for raw in stream:
+                    done_bytes += len(raw)
+                    row = parse_registry_line(raw.decode(encoding, errors='replace'))
+                    if row is None:
+                        stats['skipped'] += 1
+                        continue
+                    chunk.append(row + (fold_key(row[1]), fold_key(row[2]),
+                                        zlib.crc32('|'.join(row).encode('utf-8'))))
+                    if len(chunk) >= chunk_rows:
+                        changed += self._write_chunk(conn, chunk)
+                        stats['read'] += len(chunk)
+                        chunk = []
+                        if progress:
+                            progress(min(1.0, done_bytes / total_bytes) if total_bytes else 0.0)
+                if chunk:
+                    changed += self._write_chunk(conn, chunk)
+                    stats['read'] += len(chunk)
+
+            if not stats['read']:
+                return False, "El archivo no tiene filas de RNC válidas (¿es el padrón de la DGII?)"
+
+            # Bajas: RNC que ya no figuran en el padrón importado
+            conn.execute("BEGIN IMMEDIATE")
+            stats['deleted'] = conn.execute(
+                "DELETE FROM rnc_registry WHERE rnc NOT IN (SELECT rnc FROM temp.rnc_seen)").rowcount
+            conn.execute("COMMIT")
+            after = conn.execute("SELECT COUNT(*) FROM rnc_registry").fetchone()[0]
+            stats['inserted'] = after - before + stats['deleted']
+            stats['updated'] = changed - stats['inserted']
+            conn.execute("DROP TABLE temp.rnc_seen")
+            if progress:
+                progress(1.0)
+        except (sqlite3.Error, OSError, ValueError, zipfile.BadZipFile) as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            print(f"[RNC] Error al importar el padrón: {e}")
+            return False, f"Error al importar el padrón: {e}"
+        finally:
+            conn.close()
+
+        elapsed = time.perf_counter() - t0
+        message = (f"Padrón RNC: {stats['read']:,} filas ({stats['inserted']:,} nuevas, "
+                   f"{stats['updated']:,} cambiadas, {stats['deleted']:,} bajas) en {elapsed:.1f} s")
+        print(f"[RNC] {message}")
+        return True, message
+
+    @staticmethod
+    def _write_chunk(conn: sqlite3.Connection, chunk: List[Tuple]) -> int:
+        """UPSERT de un bloque en su propia transacción; retorna las filas escritas (nuevas o cambiadas)."""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("INSERT OR IGNORE INTO temp.rnc_seen (rnc) VALUES (?)", ((r[0],) for r in chunk))
+            start = conn.total_changes
+            conn.executemany(f"""
+                INSERT INTO rnc_registry ({', '.join(_FIELDS)}, name_key, trade_key, row_hash)
+                VALUES ({', '.join('?' * (len(_FIELDS) + 3))})
+                ON CONFLICT(rnc) DO UPDATE SET
+                    name = excluded.name, trade_name = excluded.trade_name, activity = excluded.activity,
+                    status = excluded.status, regime = excluded.regime, name_key = excluded.name_key,
+                    trade_key = excluded.trade_key, row_hash = excluded.row_hash
+                WHERE rnc_registry.row_hash <> excluded.row_hash
+            """, chunk)
+            written = conn.total_changes - start
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return written
@@ -0,0 +1,283 @@
+"""
+Resumen mensual materializado de facturas (ventas/compras e ITBIS).
+
+La tabla `sales_summary` guarda una fila por empresa, mes, tipo de factura,
+categoría NCF y moneda con la cantidad de facturas, subtotal, ITBIS, total
+y total en RD$. Los triggers sobre `invoices` la mantienen al día en cada
+INSERT/UPDATE/DELETE (add_invoice, update_invoice, delete_factura o
+cualquier otra escritura), así un tablero de un período lee unas pocas
+filas en lugar de recorrer años de facturas. Las facturas anuladas
+(status = 'anulada', LogicController.void_invoice) no cuentan, igual que en
+el 607 y en el análisis de líneas. Los años archivados
+(ArchiveService) conservan sus filas; reconstruir y verificar leen también
+los archivos.
+
+Uso:
+    install_sales_summary(conn)                 # idempotente (migraciones 5 y 21)
+    svc = SalesSummaryService(db_path)
+    svc.get_monthly_summary(company_id, "2025-01", "2025-12")
+    svc.check_consistency()                     # [] si coincide con invoices
+    svc.rebuild()                               # recalcula desde cero
+"""
+from __future__ import annotations
+
+import sqlite3
+from typing import Any, Dict, List, Optional
+
+from services.archive_service import ArchiveService
+
+SUMMARY_KEY = ('company_id', 'period', 'invoice_type', 'invoice_category', 'currency')
+SUMMARY_AMOUNTS = ('invoice_count', 'subtotal', 'itbis', 'total_amount', 'total_amount_rd')
+
+# Diferencia tolerada al comparar sumas REAL acumuladas contra un recálculo
+AMOUNT_TOLERANCE = 0.005
+
+# Expresiones de la clave a partir de una fila de invoices (NEW/OLD o tabla)
+_KEY_EXPR = (
+    "{r}.company_id",
+    "substr(COALESCE({r}.invoice_date, ''), 1, 7)",
+    "COALESCE({r}.invoice_type, 'emitida')",
+    "COALESCE({r}.invoice_category, '')",
+    "COALESCE({r}.currency, '')",
+)
+_AMOUNT_EXPR = (
+    "COALESCE({r}.total_amount, 0) - COALESCE({r}.itbis, 0)",
+    "COALESCE({r}.itbis, 0)",
+    "COALESCE({r}.total_amount, 0)",
+    "COALESCE({r}.total_amount_rd, 0)",
+)
+_TRACKED_COLUMNS = ("company_id", "invoice_date", "invoice_type", "invoice_category", "currency",
+                    "itbis", "total_amount", "total_amount_rd")
+_TRIGGERS = ("trg_invoices_summary_ins", "trg_invoices_summary_del",
+             "trg_invoices_summary_upd", "trg_invoices_summary_upd_old")
+
+
+def _has_status(conn: sqlite3.Connection) -> bool:
+    """La columna status llega con la migración 6; antes no hay facturas anuladas."""
+    return any(r[1] == 'status' for r in conn.execute("PRAGMA table_info(invoices)"))
+
+
+def _active(row: str, has_status: bool) -> str:
+    return f"COALESCE({row}.status, 'activa') != 'anulada'" if has_status else "1"
+
+
+def _keys(row: str) -> List[str]:
+    return [e.format(r=row) for e in _KEY_EXPR]
+
+
+def _amounts(row: str) -> List[str]:
+    return [e.format(r=row) for e in _AMOUNT_EXPR]
+
+
+def _add_sql(row: str) -> str:
+    keys = ", ".join(_keys(row))
+    sub, itbis, total, total_rd = _amounts(row)
+    return f"""
+        INSERT INTO sales_summary ({', '.join(SUMMARY_KEY)}, {', '.join(SUMMARY_AMOUNTS)})
+        VALUES ({keys}, 1, {sub}, {itbis}, {total}, {total_rd})
+        ON CONFLICT ({', '.join(SUMMARY_KEY)}) DO UPDATE SET
+            invoice_count = invoice_count + 1,
+            subtotal = subtotal + excluded.subtotal,
+            itbis = itbis + excluded.itbis,
+            total_amount = total_amount + excluded.total_amount,
+            total_amount_rd = total_amount_rd + excluded.total_amount_rd;
+    """
+
+
+def _remove_sql(row: str) -> str:
+    where = " AND ".join(f"{col} = {expr}" for col, expr in zip(SUMMARY_KEY, _keys(row)))
+    sub, itbis, total, total_rd = _amounts(row)
+    return f"""
+        UPDATE sales_summary SET
+            invoice_count = invoice_count - 1,
+            subtotal = subtotal - ({sub}),
+            itbis = itbis - ({itbis}),
+            total_amount = total_amount - ({total}),
+            total_amount_rd = total_amount_rd - ({total_rd})
+        WHERE {where};
+        DELETE FROM sales_summary WHERE invoice_count <= 0 AND {where};
+    """
+
+
+def install_sales_summary(conn: sqlite3.Connection) -> None:
+    """Crea la tabla de resumen, (re)crea los triggers sobre invoices y la llena (idempotente)."""
+    has_status = _has_status(conn)
+    tracked = _TRACKED_COLUMNS + (("status",) if has_status else ())
+    for name in _TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.executescript(f"""
+        CREATE TABLE IF NOT EXISTS sales_summary (
+            company_id INTEGER NOT NULL,
+            period TEXT NOT NULL,
+            invoice_type TEXT NOT NULL,
+            invoice_category TEXT NOT NULL,
+            currency TEXT NOT NULL,
+            invoice_count INTEGER NOT NULL DEFAULT 0,
+            subtotal REAL NOT NULL DEFAULT 0,
+            itbis REAL NOT NULL DEFAULT 0,
+            total_amount REAL NOT NULL DEFAULT 0,
+            total_amount_rd REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY ({', '.join(SUMMARY_KEY)})
+        ) WITHOUT ROWID;
+
+        CREATE TRIGGER trg_invoices_summary_ins AFTER INSERT ON invoices
+        WHEN {_active('NEW', has_status)}
+        BEGIN
+            {_add_sql('NEW')}
+        END;
+        CREATE TRIGGER trg_invoices_summary_del AFTER DELETE ON invoices
+        WHEN {_active('OLD', has_status)}
+        BEGIN
+            {_remove_sql('OLD')}
+        END;
+        -- Una edición saca la fila vieja y suma la nueva; anular sólo la saca
+        CREATE TRIGGER trg_invoices_summary_upd_old
+        AFTER UPDATE OF {', '.join(tracked)} ON invoices
+        WHEN {_active('OLD', has_status)}
+        BEGIN
+            {_remove_sql('OLD')}
+        END;
+        CREATE TRIGGER trg_invoices_summary_upd
+        AFTER UPDATE OF {', '.join(tracked)} ON invoices
+        WHEN {_active('NEW', has_status)}
+        BEGIN
+            {_add_sql('NEW')}
+        END;
+    """)
+    rebuild_sales_summary(conn)
+
+
+def _aggregate_sql(conn: sqlite3.Connection) -> str:
+    keys = ", ".join(_keys("i"))
+    sub, itbis, total, total_rd = _amounts("i")
+    return f"""
+        SELECT {keys}, COUNT(*), SUM({sub}), SUM({itbis}), SUM({total}), SUM({total_rd})
+          FROM invoices i
+         WHERE {_active('i', _has_status(conn))}
+         GROUP BY 1, 2, 3, 4, 5
+    """
+
+
+def rebuild_sales_summary(conn: sqlite3.Connection) -> int:
+    """Recalcula todo el resumen desde invoices. Retorna las filas generadas."""
+    conn.execute("DELETE FROM sales_summary")
+    conn.execute(
+        f"INSERT INTO sales_summary ({', '.join(SUMMARY_KEY)}, {', '.join(SUMMARY_AMOUNTS)}) "
+        + _aggregate_sql(conn)
+    )
+    conn.commit()
+    return conn.execute("SELECT COUNT(*) FROM sales_summary").fetchone()[0]
+
+
+def find_summary_mismatches(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+    """
+    Compara el resumen con un recálculo desde invoices (sin las anuladas).
+
+    Returns:
+        Lista de diferencias: {clave..., 'expected': {...}, 'actual': {...}}
+        (vacía si el resumen es consistente)
+    """
+    width = len(SUMMARY_KEY)
+    expected = {tuple(r[:width]): tuple(r[width:]) for r in conn.execute(_aggregate_sql(conn))}
+    actual = {
+        tuple(r[:width]): tuple(r[width:])
+        for r in conn.execute(
+            f"SELECT {', '.join(SUMMARY_KEY)}, {', '.join(SUMMARY_AMOUNTS)} FROM sales_summary"
+        )
+    }
+    zero = (0,) * len(SUMMARY_AMOUNTS)
+    mismatches = []
+    for key in sorted(set(expected) | set(actual), key=lambda k: tuple(str(v) for v in k)):
+        exp = expected.get(key, zero)
+        act = actual.get(key, zero)
+        if exp[0] == act[0] and all(abs((e or 0) - (a or 0)) <= AMOUNT_TOLERANCE
+                                    for e, a in zip(exp[1:], act[1:])):
+            continue
+        entry = dict(zip(SUMMARY_KEY, key))
+        entry['expected'] = dict(zip(SUMMARY_AMOUNTS, exp))
+        entry['actual'] = dict(zip(SUMMARY_AMOUNTS, act))
+        mismatches.append(entry)
+    return mismatches
+
+
+class SalesSummaryService:
+    """Consultas, reconstrucción y verificación del resumen mensual."""
+
+    def __init__(self, db_path: str):
+        """
+        Args:
+            db_path: Ruta a la base de datos (con la migración 5 aplicada)
+        """
+        self.db_path = db_path
+        self.archives = ArchiveService(db_path)
+
+    def rebuild(self) -> int:
+        """Recalcula el resumen completo (años archivados incluidos). Retorna la cantidad de filas."""
+        with self.archives.connect(all_years=True) as conn:
+            rows = rebuild_sales_summary(conn)
+        print(f"[SUMMARY] Resumen reconstruido: {rows} filas")
+        return rows
+
+    def check_consistency(self) -> List[Dict[str, Any]]:
+        """Diferencias entre el resumen y las facturas, archivadas incluidas ([] si todo cuadra)."""
+        with self.archives.connect(all_years=True) as conn:
+            mismatches = find_summary_mismatches(conn)
+        if mismatches:
+            print(f"[SUMMARY] {len(mismatches)} filas del resumen no cuadran con invoices")
+        return mismatches
+
+    def get_monthly_summary(
+        self,
+        company_id: int,
+        start_period: Optional[str] = None,
+        end_period: Optional[str] = None,
+        invoice_type: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Filas del resumen de una empresa.
+
+        Args:
+            company_id: ID de la empresa
+            start_period: Mes inicial 'YYYY-MM' (inclusive)
+            end_period: Mes final 'YYYY-MM' (inclusive)
+            invoice_type: 'emitida', 'recibida' o None para ambos
+
+        Returns:
+            Lista de dicts ordenada por período
+        """
+        query = "SELECT * FROM sales_summary WHERE company_id = ?"
+        params: List[Any] = [company_id]
+        if start_period:
+            query += " AND period >= ?"
+            params.append(start_period)
+        if end_period:
+            query += " AND period <= ?"
+            params.append(end_period)
+        if invoice_type:
+            query += " AND invoice_type = ?"
+            params.append(invoice_type)
+        query += " ORDER BY period, invoice_type, invoice_category, currency"
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            return [dict(r) for r in conn.execute(query, params)]
+
+    def get_period_totals(
+        self,
+        company_id: int,
+        start_period: Optional[str] = None,
+        end_period: Optional[str] = None
+    ) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """
+        Totales del período por tipo de factura y moneda.
+
+        Returns:
+            {'emitida': {'RD$': {'invoice_count', 'subtotal', 'itbis',
+                                 'total_amount', 'total_amount_rd'}}, ...}
+        """
+        totals: Dict[str, Dict[str, Dict[str, float]]] = {}
+        for row in self.get_monthly_summary(company_id, start_period, end_period):
+            by_currency = totals.setdefault(row['invoice_type'], {})
+            bucket = by_currency.setdefault(row['currency'], dict.fromkeys(SUMMARY_AMOUNTS, 0))
+            for field in SUMMARY_AMOUNTS:
+                bucket[field] += row[field]
+        return totals
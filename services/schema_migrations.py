@@ -0,0 +1,472 @@
+"""
+Migraciones de esquema versionadas con PRAGMA user_version.
+
+Cada paso del esquema se registra una sola vez con un número de versión.
+Al abrir la base se compara `PRAGMA user_version` con la última versión
+registrada: si está al día no se ejecuta ningún DDL (una sola lectura del
+PRAGMA); si no, se aplican en orden sólo los pasos pendientes.
+
+Los pasos deben ser idempotentes (CREATE ... IF NOT EXISTS, ALTER sólo si
+falta la columna) porque las bases anteriores a este registro tienen
+user_version = 0 pero ya contienen parte del esquema.
+
+Para agregar un cambio de esquema:
+
+    @migration(7, "Descripción corta")
+    def _m007_algo(conn):
+        conn.execute("ALTER TABLE ...")
+"""
+from __future__ import annotations
+
+import re
+import sqlite3
+from typing import Callable, List, Tuple
+
+
+MigrationFn = Callable[[sqlite3.Connection], None]
+_MIGRATIONS: List[Tuple[int, str, MigrationFn]] = []
+
+
+def migration(version: int, description: str):
+    """Decorador que registra un paso de migración."""
+    def decorator(fn: MigrationFn) -> MigrationFn:
+        if any(v == version for v, _d, _f in _MIGRATIONS):
+            raise ValueError(f"Versión de migración duplicada: {version}")
+        _MIGRATIONS.append((version, description, fn))
+        _MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return decorator
+
+
+def latest_version() -> int:
+    """Última versión de esquema registrada."""
+    return _MIGRATIONS[-1][0] if _MIGRATIONS else 0
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return int(conn.execute("PRAGMA user_version").fetchone()[0])
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Aplica las migraciones pendientes.
+
+    Returns:
+        Número de pasos aplicados (0 si el esquema ya estaba al día)
+    """
+    current = get_schema_version(conn)
+    if current >= latest_version():
+        return 0
+    if current == 0 and not conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone():
+        # Base nueva: auto_vacuum sólo se fija sin VACUUM antes de crear la primera tabla
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    applied = 0
+    for version, description, fn in _MIGRATIONS:
+        if version <= current:
+            continue
+        print(f"[SCHEMA] Aplicando migración {version}: {description}")
+        fn(conn)
+        # PRAGMA no admite parámetros; version es siempre int
+        conn.execute(f"PRAGMA user_version = {int(version)}")
+        conn.commit()
+        applied += 1
+    return applied
+
+
+def ensure_schema(db_path: str) -> int:
+    """Abre la base, aplica migraciones pendientes y la cierra."""
+    if not db_path:
+        return 0
+    with sqlite3.connect(db_path) as conn:
+        return migrate(conn)
+
+
+# -------------------------
+# Helpers
+# -------------------------
+def _table_exists(conn: sqlite3.Connection, table: str) -> bool:
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone()
+    return row is not None
+
+
+def _add_missing_columns(conn: sqlite3.Connection, table: str, columns: List[Tuple[str, str]]) -> None:
+    existing = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+    for name, decl in columns:
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+
+def slug_letters(text: str, n: int = 3) -> str:
+    letters = re.findall(r"[A-Za-z]", text)
+    if not letters:
+        return "CAT"
+    return "".join(letters[:n]).upper().ljust(n, "X")
+
+
+def max_seq_for_prefix(conn: sqlite3.Connection, prefix: str) -> int:
+    if not prefix:
+        return 0
+    cur = conn.execute(
+        "SELECT MAX(CAST(SUBSTR(code, ?) AS INTEGER)) FROM items WHERE code LIKE ?",
+        (len(prefix) + 1, f"{prefix}%"),
+    )
+    row = cur.fetchone()
+    try:
+        return int(row[0]) if row and row[0] is not None else 0
+    except Exception:
+        return 0
+
+
+def backfill_category_meta(conn: sqlite3.Connection):
+    """Completa code_prefix/next_seq de categorías (tras migrar o importar)."""
+    cur = conn.execute("SELECT id, name, code_prefix, next_seq FROM categories")
+    for cid, name, prefix, next_seq in cur.fetchall():
+        updated = False
+        if not prefix:
+            base = slug_letters(name)
+            candidate = base
+            i = 1
+            while True:
+                row = conn.execute("SELECT id FROM categories WHERE code_prefix = ? AND id != ?", (candidate, cid)).fetchone()
+                if not row:
+                    break
+                i += 1
+                candidate = f"{base[:-1]}{i%10}"
+            prefix = candidate
+            conn.execute("UPDATE categories SET code_prefix=? WHERE id=?", (prefix, cid))
+            updated = True
+        if not next_seq or next_seq < 1:
+            next_seq = 1
+        max_seq = max_seq_for_prefix(conn, prefix)
+        if max_seq >= next_seq:
+            conn.execute("UPDATE categories SET next_seq=? WHERE id=?", (max_seq + 1, cid))
+            updated = True
+        if updated:
+            conn.commit()
+
+
+# -------------------------
+# Migraciones
+# -------------------------
+@migration(1, "Tablas base: empresas, facturas, cotizaciones, terceros y secuencias NCF")
+def _m001_core_tables(conn: sqlite3.Connection) -> None:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS companies (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            rnc TEXT UNIQUE NOT NULL,
+            address TEXT,
+            invoice_template_path TEXT,
+            invoice_output_base_path TEXT,
+            itbis_adelantado REAL DEFAULT 0.0,
+            legacy_filename TEXT
+        )
+    """)
+    _add_missing_columns(conn, "companies", [
+        ("address_line1", "TEXT DEFAULT ''"),
+        ("address_line2", "TEXT DEFAULT ''"),
+        ("phone", "TEXT DEFAULT ''"),
+        ("email", "TEXT DEFAULT ''"),
+        ("signature_name", "TEXT DEFAULT ''"),
+        ("logo_path", "TEXT DEFAULT ''"),
+        ("address", "TEXT DEFAULT ''"),
+        ("invoice_template_path", "TEXT DEFAULT ''"),
+        ("invoice_output_base_path", "TEXT DEFAULT ''"),
+        ("invoice_due_date", "TEXT DEFAULT ''"),
+    ])
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS invoices (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            company_id INTEGER NOT NULL,
+            invoice_type TEXT,
+            invoice_date TEXT NOT NULL,
+            imputation_date TEXT,
+            invoice_number TEXT NOT NULL,
+            invoice_category TEXT,
+            rnc TEXT,
+            third_party_name TEXT,
+            client_name TEXT,
+            client_rnc TEXT,
+            currency TEXT NOT NULL,
+            itbis REAL DEFAULT 0.0,
+            total_amount REAL NOT NULL DEFAULT 0.0,
+            exchange_rate REAL NOT NULL DEFAULT 1.0,
+            total_amount_rd REAL NOT NULL DEFAULT 0.0,
+            excel_path TEXT,
+            pdf_path TEXT,
+            attachment_path TEXT,
+            due_date TEXT,
+            FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS invoice_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            invoice_id INTEGER NOT NULL,
+            description TEXT NOT NULL,
+            quantity REAL NOT NULL DEFAULT 0.0,
+            unit_price REAL NOT NULL DEFAULT 0.0,
+            item_code TEXT,
+            unit TEXT,
+            FOREIGN KEY (invoice_id) REFERENCES invoices(id) ON DELETE CASCADE
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS quotations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            company_id INTEGER NOT NULL,
+            quotation_date TEXT NOT NULL,
+            client_name TEXT NOT NULL,
+            client_rnc TEXT,
+            notes TEXT,
+            currency TEXT NOT NULL,
+            total_amount REAL NOT NULL DEFAULT 0.0,
+            excel_path TEXT,
+            pdf_path TEXT,
+            due_date TEXT,
+            FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS quotation_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            quotation_id INTEGER NOT NULL,
+            description TEXT NOT NULL,
+            quantity REAL NOT NULL DEFAULT 0.0,
+            unit_price REAL NOT NULL DEFAULT 0.0,
+            item_code TEXT,
+            unit TEXT,
+            FOREIGN KEY (quotation_id) REFERENCES quotations(id) ON DELETE CASCADE
+        )
+    """)
+    # Bases antiguas: columnas agregadas después de la versión inicial
+    for table in ("invoice_items", "quotation_items"):
+        _add_missing_columns(conn, table, [("item_code", "TEXT"), ("unit", "TEXT")])
+    _add_missing_columns(conn, "invoices", [("due_date", "TEXT")])
+    _add_missing_columns(conn, "quotations", [("due_date", "TEXT")])
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS third_parties (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            rnc TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ncf_sequences (
+            company_id INTEGER NOT NULL,
+            prefix3 TEXT NOT NULL,
+            last_seq INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (company_id, prefix3),
+            FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE
+        )
+    """)
+
+
+@migration(2, "Tabla audit_log e índices")
+def _m002_audit_log(conn: sqlite3.Connection) -> None:
+    from services.audit_service import AuditService
+    AuditService.create_schema(conn)
+
+
+@migration(3, "Catálogo de ítems y categorías")
+def _m003_items_catalog(conn: sqlite3.Connection) -> None:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            code TEXT NOT NULL UNIQUE,
+            name TEXT NOT NULL,
+            unit TEXT NOT NULL,
+            cost REAL NOT NULL DEFAULT 0,
+            price REAL NOT NULL DEFAULT 0,
+            category_id INTEGER,
+            description TEXT,
+            FOREIGN KEY (category_id) REFERENCES categories(id)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_items_code ON items(code)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_items_category ON items(category_id)")
+    _add_missing_columns(conn, "categories", [
+        ("code_prefix", "TEXT"),
+        ("next_seq", "INTEGER NOT NULL DEFAULT 1"),
+        ("description", "TEXT"),
+    ])
+    try:
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_categories_code_prefix ON categories(code_prefix)")
+    except sqlite3.DatabaseError:
+        pass
+    backfill_category_meta(conn)
+
+
+@migration(4, "Change-log para sincronización incremental")
+def _m004_change_log(conn: sqlite3.Connection) -> None:
+    from services.sync_service import install_change_log
+    install_change_log(conn)
+
+
+@migration(5, "Resumen mensual materializado de facturas (sales_summary)")
+def _m005_sales_summary(conn: sqlite3.Connection) -> None:
+    from services.sales_summary_service import install_sales_summary
+    install_sales_summary(conn)
+
+
+@migration(6, "Estado de anulación e índice por período para reportes DGII")
+def _m006_invoice_status(conn: sqlite3.Connection) -> None:
+    _add_missing_columns(conn, "invoices", [
+        ("status", "TEXT NOT NULL DEFAULT 'activa'"),
+        ("void_reason", "TEXT"),
+    ])
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_invoices_period
+        ON invoices(company_id, invoice_type, invoice_date)
+    """)
+
+
+@migration(7, "Columnas generadas ncf_prefix/ncf_seq e índice para integridad de NCF")
+def _m007_ncf_columns(conn: sqlite3.Connection) -> None:
+    from services.ncf_integrity_service import install_ncf_columns
+    install_ncf_columns(conn)
+
+
+@migration(8, "Rangos de NCF autorizados por la DGII")
+def _m008_ncf_ranges(conn: sqlite3.Connection) -> None:
+    from services.ncf_range_service import create_ncf_ranges_table
+    create_ncf_ranges_table(conn)
+
+
+@migration(9, "Columnas de montos en centavos enteros (invoices, invoice_items)")
+def _m009_money_cents(conn: sqlite3.Connection) -> None:
+    # Generadas desde las columnas REAL: siempre coinciden, sin importar quién escribe
+    cents = "CAST(round(COALESCE({col}, 0) * 100) AS INTEGER)"
+    for table, columns in (
+        ("invoices", ("itbis", "total_amount", "total_amount_rd")),
+        ("invoice_items", ("unit_price",)),
+    ):
+        existing = {r[1] for r in conn.execute(f"PRAGMA table_xinfo({table})")}
+        for col in columns:
+            if f"{col}_cents" not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {col}_cents INTEGER "
+                             f"GENERATED ALWAYS AS ({cents.format(col=col)}) VIRTUAL")
+
+
+@migration(10, "Índice de invoice_items por factura")
+def _m010_invoice_items_index(conn: sqlite3.Connection) -> None:
+    # Sin él, cada join/consulta de líneas por factura recorre toda la tabla
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_invoice_items_invoice ON invoice_items(invoice_id)")
+
+
+@migration(11, "Email de terceros para envío masivo de facturas")
+def _m011_third_party_email(conn: sqlite3.Connection) -> None:
+    _add_missing_columns(conn, "third_parties", [("email", "TEXT DEFAULT ''")])
+
+
+@migration(12, "Registro de tareas de mantenimiento (maintenance_log)")
+def _m012_maintenance_log(conn: sqlite3.Connection) -> None:
+    from services.maintenance_service import install_maintenance_log
+    install_maintenance_log(conn)
+
+
+@migration(13, "Posición de línea (line_no) en invoice_items y quotation_items")
+def _m013_line_no(conn: sqlite3.Connection) -> None:
+    # Las ediciones reusan filas (diff de líneas); el orden ya no sale del id
+    for table, parent_col in (("invoice_items", "invoice_id"), ("quotation_items", "quotation_id")):
+        _add_missing_columns(conn, table, [("line_no", "INTEGER")])
+        # Líneas existentes: posición 1..n por documento en el orden de inserción (id)
+        conn.execute("DROP TABLE IF EXISTS temp._line_no")
+        conn.execute(f"""
+            CREATE TEMP TABLE _line_no AS
+            SELECT id, ROW_NUMBER() OVER (PARTITION BY {parent_col} ORDER BY id) AS line_no
+              FROM {table} WHERE line_no IS NULL
+        """)
+        conn.execute("CREATE UNIQUE INDEX temp._line_no_id ON _line_no(id)")
+        conn.execute(f"""
+            UPDATE {table} SET line_no = (SELECT n.line_no FROM temp._line_no n WHERE n.id = {table}.id)
+             WHERE line_no IS NULL
+        """)
+        conn.execute("DROP TABLE temp._line_no")
+
+
+@migration(14, "Registro de años fiscales archivados (fiscal_archives)")
+def _m014_fiscal_archives(conn: sqlite3.Connection) -> None:
+    from services.archive_service import install_fiscal_archives
+    install_fiscal_archives(conn)
+
+
+# (tabla, columna de fecha, columna generada con el número de día)
+DAY_COLUMNS = (
+    ("invoices", "invoice_date", "invoice_day"),
+    ("invoices", "due_date", "due_day"),
+    ("quotations", "quotation_date", "quotation_day"),
+    ("quotations", "due_date", "due_day"),
+)
+_ISO_DATE_GLOB = "[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]"
+
+
+@migration(15, "Fechas normalizadas a ISO y columnas de número de día indexadas")
+def _m015_day_numbers(conn: sqlite3.Connection) -> None:
+    from utils.dates import DAY_NUMBER_SQL, normalize_date
+
+    # Fechas escritas a mano o con otros formatos -> 'AAAA-MM-DD' (las no reconocibles quedan igual)
+    for table, column in (("invoices", "invoice_date"), ("invoices", "imputation_date"), ("invoices", "due_date"),
+                          ("quotations", "quotation_date"), ("quotations", "due_date")):
+        rows = conn.execute(
+            f"SELECT id, {column} FROM {table} WHERE COALESCE({column}, '') != '' AND {column} NOT GLOB ?",
+            (_ISO_DATE_GLOB,)
+        ).fetchall()
+        fixes = [(normalize_date(value), row_id) for row_id, value in rows if normalize_date(value)]
+        if fixes:
+            conn.executemany(f"UPDATE {table} SET {column} = ? WHERE id = ?", fixes)
+            print(f"[SCHEMA] {table}.{column}: {len(fixes)} fechas normalizadas")
+
+    for table, column, day_column in DAY_COLUMNS:
+        existing = {r[1] for r in conn.execute(f"PRAGMA table_xinfo({table})")}
+        if day_column not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {day_column} INTEGER "
+                         f"GENERATED ALWAYS AS ({DAY_NUMBER_SQL.format(col=column)}) VIRTUAL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_invoices_type_day ON invoices(company_id, invoice_type, invoice_day)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_invoices_due_day ON invoices(company_id, due_day)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_quotations_day ON quotations(company_id, quotation_day)")
+
+
+@migration(16, "Índice FTS5 de búsqueda de documentos (doc_search)")
+def _m016_doc_search(conn: sqlite3.Connection) -> None:
+    from services.doc_search_service import install_doc_search
+    install_doc_search(conn)
+
+
+@migration(17, "Padrón de RNC de la DGII (rnc_registry)")
+def _m017_rnc_registry(conn: sqlite3.Connection) -> None:
+    from services.rnc_registry_service import install_rnc_registry
+    install_rnc_registry(conn)
+
+
+@migration(18, "Índice de trigramas de nombres de ítems (item_trigrams)")
+def _m018_item_trigrams(conn: sqlite3.Connection) -> None:
+    from services.item_trigram_service import install_item_trigrams, refresh_item_trigrams
+    install_item_trigrams(conn)
+    refresh_item_trigrams(conn)
+
+
+@migration(19, "Versión del catálogo de ítems e índice por nombre (resolución de unidades)")
+def _m019_items_version(conn: sqlite3.Connection) -> None:
+    from services.unit_resolver import install_items_version
+    install_items_version(conn)
+
+
+@migration(20, "doc_search: las líneas se reindexan una vez por documento (doc_search_pending)")
+def _m020_doc_search_pending(conn: sqlite3.Connection) -> None:
+    from services.doc_search_service import install_doc_search
+    install_doc_search(conn)
+
+
+@migration(21, "sales_summary: las facturas anuladas no cuentan (triggers sobre status)")
+def _m021_sales_summary_status(conn: sqlite3.Connection) -> None:
+    from services.sales_summary_service import install_sales_summary
+    install_sales_summary(conn)
@@ -0,0 +1,525 @@
+"""
+Servicio de sincronización incremental SQLite ⇄ Firestore.
+
+En lugar de copiar toda la base en cada migración, las tablas principales
+tienen triggers que registran cada INSERT/UPDATE/DELETE en `change_log`.
+El motor de sincronización envía sólo las filas cambiadas (en lotes) y trae
+de Firestore sólo los documentos con `updated_at` posterior a la última
+sincronización, detectando conflictos cuando ambos lados modificaron la
+misma fila.
+
+Cada documento lleva dos marcas: `updated_at` es la hora del push (lo que
+filtra el pull: una edición vieja enviada tarde igual queda después de la
+marca de agua de las otras estaciones) y `edited_at` la hora de la edición
+local, que es la que decide los conflictos. El pull relee una ventana de
+PULL_OVERLAP_S antes de la marca de agua para cubrir batches en vuelo y
+diferencias de reloj entre estaciones; los documentos que ya coinciden con
+la fila local se saltan.
+
+En una base que nunca sincronizó el change_log lo recorta el mantenimiento
+(`prune_change_log`, tarea 'prune_change_log' de MaintenanceService) y el
+primer push registra entonces todas las filas (seed_full).
+
+Uso:
+    install_change_log(conn)              # idempotente
+    sync = SyncService(db_path, firestore_db)
+    sync.push()                           # SQLite → Firestore
+    sync.pull()                           # Firestore → SQLite
+"""
+from __future__ import annotations
+
+import socket
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+# tabla → (colección Firestore, tabla padre, columna FK al padre)
+SYNC_TABLES: Dict[str, Tuple[str, Optional[str], Optional[str]]] = {
+    'companies': ('companies', None, None),
+    'third_parties': ('third_parties', None, None),
+    'items': ('items', None, None),
+    'invoices': ('invoices', None, None),
+    'quotations': ('quotations', None, None),
+    'invoice_items': ('items', 'invoices', 'invoice_id'),
+    'quotation_items': ('items', 'quotations', 'quotation_id'),
+}
+
+# Límite de operaciones por batch de Firestore es 500; dejamos margen.
+FIRESTORE_BATCH_LIMIT = 450
+
+CONFLICT_POLICIES = ('newer_wins', 'local_wins', 'remote_wins')
+
+# Segundos que el pull relee antes de la marca de agua (batches en vuelo, relojes desfasados)
+PULL_OVERLAP_S = 120
+
+_ISO_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+def _utc_now_iso() -> str:
+    return datetime.now(timezone.utc).strftime(_ISO_FORMAT)
+
+
+def _to_utc_datetime(value: Any) -> Optional[datetime]:
+    """Convierte str ISO / datetime (naive = UTC) a datetime UTC."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        dt = value
+    else:
+        try:
+            dt = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def install_change_log(conn: sqlite3.Connection) -> None:
+    """
+    Crea las tablas de control y los triggers de change-log.
+
+    Es idempotente; sólo instala triggers para las tablas que ya existen
+    (p. ej. `items` se crea al abrir la gestión de ítems).
+    """
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS change_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            parent_id INTEGER,
+            op TEXT NOT NULL,
+            changed_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+        );
+        CREATE INDEX IF NOT EXISTS idx_change_log_row ON change_log(table_name, row_id);
+        CREATE TABLE IF NOT EXISTS sync_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS sync_conflicts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            direction TEXT NOT NULL,
+            local_changed_at TEXT,
+            remote_updated_at TEXT,
+            resolution TEXT NOT NULL,
+            detected_at TEXT NOT NULL
+        );
+    """)
+    existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    # Los triggers no registran cambios mientras se aplican datos remotos (pull)
+    guard = "(SELECT value FROM sync_state WHERE key = 'applying_remote') IS NOT '1'"
+    for table, (_collection, _parent, fk) in SYNC_TABLES.items():
+        if table not in existing:
+            continue
+        new_parent = f"NEW.{fk}" if fk else "NULL"
+        old_parent = f"OLD.{fk}" if fk else "NULL"
+        conn.executescript(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_log_ins AFTER INSERT ON {table}
+            WHEN {guard}
+            BEGIN
+                INSERT INTO change_log (table_name, row_id, parent_id, op)
+                VALUES ('{table}', NEW.id, {new_parent}, 'I');
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_log_upd AFTER UPDATE ON {table}
+            WHEN {guard}
+            BEGIN
+                INSERT INTO change_log (table_name, row_id, parent_id, op)
+                VALUES ('{table}', NEW.id, {new_parent}, 'U');
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_log_del AFTER DELETE ON {table}
+            WHEN {guard}
+            BEGIN
+                INSERT INTO change_log (table_name, row_id, parent_id, op)
+                VALUES ('{table}', OLD.id, {old_parent}, 'D');
+            END;
+        """)
+    conn.commit()
+
+
+def prune_change_log(conn: sqlite3.Connection) -> int:
+    """
+    Recorta el change_log (mantenimiento periódico).
+
+    Si la base ya sincronizó (hay push_cursor) borra lo enviado, como
+    SyncService.compact_log. Si nunca sincronizó lo borra todo y marca
+    `needs_seed`: el primer push hará seed_full, así el log no crece sin
+    límite en instalaciones que sólo usan SQLite.
+
+    Returns:
+        Entradas borradas
+    """
+    row = conn.execute("SELECT value FROM sync_state WHERE key = 'push_cursor'").fetchone()
+    if row and row[0]:
+        return conn.execute("DELETE FROM change_log WHERE id <= ?", (int(row[0]),)).rowcount
+    deleted = conn.execute("DELETE FROM change_log").rowcount
+    if deleted:
+        conn.execute("""
+            INSERT INTO sync_state (key, value) VALUES ('needs_seed', '1')
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        """)
+    return deleted
+
+
+class SyncService:
+    """Motor de sincronización incremental basado en `change_log`."""
+
+    def __init__(
+        self,
+        db_path: str,
+        firestore_db,
+        station_id: Optional[str] = None,
+        batch_size: int = FIRESTORE_BATCH_LIMIT,
+        conflict_policy: str = 'newer_wins'
+    ):
+        """
+        Args:
+            db_path: Ruta a la base de datos SQLite
+            firestore_db: Cliente Firestore (real o compatible)
+            station_id: Identificador de esta estación (default: hostname)
+            batch_size: Operaciones por batch de escritura
+            conflict_policy: 'newer_wins', 'local_wins' o 'remote_wins'
+        """
+        if conflict_policy not in CONFLICT_POLICIES:
+            raise ValueError(f"Política de conflicto inválida: {conflict_policy}")
+        self.db_path = db_path
+        self.db = firestore_db
+        self.station_id = station_id or socket.gethostname()
+        self.batch_size = max(1, min(int(batch_size), FIRESTORE_BATCH_LIMIT))
+        self.conflict_policy = conflict_policy
+        self._columns_cache: Dict[str, List[str]] = {}
+
+        with self._connect() as conn:
+            install_change_log(conn)
+
+    # -------------------------
+    # Estado
+    # -------------------------
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _get_state(conn: sqlite3.Connection, key: str, default: str = '') -> str:
+        row = conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row and row[0] is not None else default
+
+    @staticmethod
+    def _set_state(conn: sqlite3.Connection, key: str, value: str) -> None:
+        conn.execute("""
+            INSERT INTO sync_state (key, value) VALUES (?, ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        """, (key, value))
+
+    def pending_changes(self) -> int:
+        """Número de filas distintas con cambios aún no enviados."""
+        with self._connect() as conn:
+            cursor = int(self._get_state(conn, 'push_cursor', '0') or 0)
+            row = conn.execute("""
+                SELECT COUNT(*) FROM (
+                    SELECT DISTINCT table_name, row_id FROM change_log WHERE id > ?
+                )
+            """, (cursor,)).fetchone()
+            return int(row[0])
+
+    def seed_full(self) -> int:
+        """
+        Registra todas las filas existentes como pendientes.
+
+        Se usa una sola vez al activar la sincronización sobre una base con
+        datos previos (equivale a la migración completa inicial).
+        """
+        total = 0
+        with self._connect() as conn:
+            existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+            for table, (_collection, _parent, fk) in SYNC_TABLES.items():
+                if table not in existing:
+                    continue
+                parent_expr = fk if fk else "NULL"
+                cur = conn.execute(f"""
+                    INSERT INTO change_log (table_name, row_id, parent_id, op)
+                    SELECT '{table}', id, {parent_expr}, 'I' FROM {table}
+                """)
+                total += cur.rowcount
+            conn.commit()
+        return total
+
+    def _seed_if_pruned(self) -> None:
+        """Si el mantenimiento recortó el log antes del primer push, registrar todas las filas."""
+        with self._connect() as conn:
+            if self._get_state(conn, 'needs_seed') != '1':
+                return
+        print(f"[SYNC] change_log recortado antes de sincronizar: {self.seed_full()} filas marcadas como pendientes")
+        with self._connect() as conn:
+            self._set_state(conn, 'needs_seed', '0')
+            conn.commit()
+
+    def compact_log(self) -> int:
+        """Elimina del change_log las entradas ya enviadas."""
+        with self._connect() as conn:
+            cursor = int(self._get_state(conn, 'push_cursor', '0') or 0)
+            cur = conn.execute("DELETE FROM change_log WHERE id <= ?", (cursor,))
+            conn.commit()
+            return cur.rowcount
+
+    # -------------------------
+    # Helpers Firestore
+    # -------------------------
+    def _doc_ref(self, table: str, row_id: Any, parent_id: Any = None):
+        collection, parent_table, _fk = SYNC_TABLES[table]
+        if parent_table:
+            parent_collection = SYNC_TABLES[parent_table][0]
+            return (self.db.collection(parent_collection).document(str(parent_id))
+                    .collection(collection).document(str(row_id)))
+        return self.db.collection(collection).document(str(row_id))
+
+    def _get_remote_snapshots(self, refs: List[Any]) -> Dict[str, Any]:
+        """Lee varios documentos en un solo round-trip si el cliente lo soporta."""
+        if not refs:
+            return {}
+        if hasattr(self.db, 'get_all'):
+            snaps = self.db.get_all(refs)
+        else:
+            snaps = [r.get() for r in refs]
+        return {s.reference.path: s for s in snaps}
+
+    def _table_columns(self, conn: sqlite3.Connection, table: str) -> List[str]:
+        if table not in self._columns_cache:
+            self._columns_cache[table] = [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+        return self._columns_cache[table]
+
+    def _resolve(self, local_at: Optional[datetime], remote_at: Optional[datetime]) -> str:
+        """Devuelve 'local' o 'remote' según la política configurada."""
+        if self.conflict_policy == 'local_wins':
+            return 'local'
+        if self.conflict_policy == 'remote_wins':
+            return 'remote'
+        if remote_at and local_at and remote_at > local_at:
+            return 'remote'
+        return 'local'
+
+    def _log_conflict(self, conn, table, row_id, direction, local_at, remote_at, resolution):
+        conn.execute("""
+            INSERT INTO sync_conflicts
+            (table_name, row_id, direction, local_changed_at, remote_updated_at, resolution, detected_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (
+            table, row_id, direction,
+            local_at.isoformat() if local_at else None,
+            remote_at.isoformat() if remote_at else None,
+            resolution, _utc_now_iso()
+        ))
+
+    # -------------------------
+    # PUSH: SQLite → Firestore
+    # -------------------------
+    def push(self, max_changes: Optional[int] = None) -> Dict[str, int]:
+        """
+        Envía a Firestore los cambios registrados desde el último push.
+
+        Los cambios se compactan por fila (la última operación gana) y se
+        escriben en batches. El cursor avanza sólo tras cada batch confirmado.
+
+        Returns:
+            Dict con contadores: written, deleted, conflicts, skipped
+        """
+        stats = {'written': 0, 'deleted': 0, 'conflicts': 0, 'skipped': 0}
+        self._seed_if_pruned()
+        with self._connect() as conn:
+            cursor = int(self._get_state(conn, 'push_cursor', '0') or 0)
+            last_pull = _to_utc_datetime(self._get_state(conn, 'pull_watermark', ''))
+
+            sql = "SELECT id, table_name, row_id, parent_id, op, changed_at FROM change_log WHERE id > ? ORDER BY id"
+            params: List[Any] = [cursor]
+            if max_changes:
+                sql += " LIMIT ?"
+                params.append(int(max_changes))
+            entries = conn.execute(sql, params).fetchall()
+            if not entries:
+                return stats
+
+            # Compactar: última operación por (tabla, fila)
+            latest: Dict[Tuple[str, int], sqlite3.Row] = {}
+            for e in entries:
+                if e['table_name'] in SYNC_TABLES:
+                    latest[(e['table_name'], e['row_id'])] = e
+            max_id = entries[-1]['id']
+            changes = sorted(latest.values(), key=lambda e: e['id'])
+
+            for start in range(0, len(changes), self.batch_size):
+                chunk = changes[start:start + self.batch_size]
+                rows = self._load_rows(conn, chunk)
+                refs = {(c['table_name'], c['row_id']): self._doc_ref(
+                    c['table_name'], c['row_id'],
+                    (rows.get((c['table_name'], c['row_id'])) or {}).get(SYNC_TABLES[c['table_name']][2] or '', c['parent_id'])
+                ) for c in chunk}
+                remote = self._get_remote_snapshots(list(refs.values()))
+
+                batch = self.db.batch()
+                ops = 0
+                pushed_at = _utc_now_iso()
+                for c in chunk:
+                    key = (c['table_name'], c['row_id'])
+                    ref = refs[key]
+                    local_at = _to_utc_datetime(c['changed_at'])
+                    snap = remote.get(ref.path)
+                    if snap is not None and getattr(snap, 'exists', False):
+                        rdata = snap.to_dict() or {}
+                        remote_pushed_at = _to_utc_datetime(rdata.get('updated_at'))
+                        foreign = rdata.get('updated_by') != self.station_id
+                        # Conflicto: otra estación lo envió después de nuestro último pull
+                        if foreign and remote_pushed_at and (last_pull is None or remote_pushed_at > last_pull):
+                            remote_at = _to_utc_datetime(rdata.get('edited_at')) or remote_pushed_at
+                            winner = self._resolve(local_at, remote_at)
+                            self._log_conflict(conn, c['table_name'], c['row_id'], 'push',
+                                               local_at, remote_at, winner)
+                            stats['conflicts'] += 1
+                            if winner == 'remote':
+                                stats['skipped'] += 1
+                                continue
+
+                    if c['op'] == 'D' or key not in rows:
+                        batch.delete(ref)
+                        stats['deleted'] += 1
+                    else:
+                        doc = dict(rows[key])
+                        doc.pop('id', None)
+                        doc['updated_at'] = pushed_at
+                        doc['edited_at'] = (local_at or datetime.now(timezone.utc)).strftime(_ISO_FORMAT)
+                        doc['updated_by'] = self.station_id
+                        batch.set(ref, doc)
+                        stats['written'] += 1
+                    ops += 1
+
+                if ops:
+                    batch.commit()
+                # Avanzar cursor hasta el último cambio cubierto por este batch
+                covered = chunk[-1]['id'] if start + self.batch_size < len(changes) else max_id
+                self._set_state(conn, 'push_cursor', str(covered))
+                conn.commit()
+
+        print(f"[SYNC] Push: {stats}")
+        return stats
+
+    def _load_rows(self, conn: sqlite3.Connection, changes: Iterable[sqlite3.Row]) -> Dict[Tuple[str, int], Dict[str, Any]]:
+        """Carga las filas actuales agrupando por tabla (una consulta por tabla)."""
+        by_table: Dict[str, List[int]] = {}
+        for c in changes:
+            if c['op'] != 'D':
+                by_table.setdefault(c['table_name'], []).append(c['row_id'])
+        out: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        for table, ids in by_table.items():
+            placeholders = ",".join("?" * len(ids))
+            for r in conn.execute(f"SELECT * FROM {table} WHERE id IN ({placeholders})", ids):
+                out[(table, r['id'])] = dict(r)
+        return out
+
+    # -------------------------
+    # PULL: Firestore → SQLite
+    # -------------------------
+    def pull(self) -> Dict[str, int]:
+        """
+        Trae de Firestore los documentos modificados desde el último pull.
+
+        Los documentos escritos por esta misma estación se ignoran. Si la
+        fila local tiene cambios pendientes de push, se registra conflicto
+        (decide `edited_at`, la hora de la edición remota).
+
+        Returns:
+            Dict con contadores: applied, conflicts, skipped
+        """
+        stats = {'applied': 0, 'conflicts': 0, 'skipped': 0}
+        started = _utc_now_iso()
+        with self._connect() as conn:
+            watermark = self._get_state(conn, 'pull_watermark', '')
+            cursor = int(self._get_state(conn, 'push_cursor', '0') or 0)
+            pending = {
+                (r['table_name'], r['row_id']): _to_utc_datetime(r['changed_at'])
+                for r in conn.execute(
+                    "SELECT table_name, row_id, MAX(changed_at) AS changed_at FROM change_log "
+                    "WHERE id > ? GROUP BY table_name, row_id", (cursor,)
+                )
+            }
+
+            self._set_state(conn, 'applying_remote', '1')
+            try:
+                for table, (collection, parent_table, fk) in SYNC_TABLES.items():
+                    if parent_table:
+                        docs = self._changed_subdocs(collection, watermark)
+                    else:
+                        docs = self._changed_docs(collection, watermark)
+                    for doc in docs:
+                        parent_id = None
+                        if parent_table:
+                            parent_ref = doc.reference.parent.parent
+                            if parent_ref is None or parent_ref.parent.id != SYNC_TABLES[parent_table][0]:
+                                continue
+                            parent_id = parent_ref.id
+                        applied = self._apply_remote(conn, table, fk, doc, parent_id, pending, stats)
+                        if applied:
+                            stats['applied'] += 1
+                self._set_state(conn, 'pull_watermark', started)
+            finally:
+                self._set_state(conn, 'applying_remote', '0')
+                conn.commit()
+
+        print(f"[SYNC] Pull: {stats}")
+        return stats
+
+    @staticmethod
+    def _since(watermark: str) -> str:
+        """Marca de agua menos la ventana de solapamiento (PULL_OVERLAP_S)."""
+        dt = _to_utc_datetime(watermark)
+        return (dt - timedelta(seconds=PULL_OVERLAP_S)).strftime(_ISO_FORMAT) if dt else ''
+
+    def _changed_docs(self, collection: str, watermark: str):
+        watermark = self._since(watermark)
+        ref = self.db.collection(collection)
+        query = ref.where('updated_at', '>', watermark) if watermark else ref
+        return query.stream()
+
+    def _changed_subdocs(self, collection: str, watermark: str):
+        watermark = self._since(watermark)
+        group = self.db.collection_group(collection)
+        query = group.where('updated_at', '>', watermark) if watermark else group
+        return query.stream()
+
+    def _apply_remote(self, conn, table, fk, doc, parent_id, pending, stats) -> bool:
+        if not str(doc.id).isdigit():
+            stats['skipped'] += 1
+            return False
+        data = doc.to_dict() or {}
+        if data.get('updated_by') == self.station_id:
+            return False
+        row_id = int(doc.id)
+        remote_at = _to_utc_datetime(data.get('edited_at') or data.get('updated_at'))
+
+        columns = self._table_columns(conn, table)
+        values = {k: v for k, v in data.items() if k in columns and k != 'id'}
+        if fk and parent_id is not None and str(parent_id).isdigit():
+            values[fk] = int(parent_id)
+        # Ya aplicado (p. ej. releído en la ventana de solapamiento): nada que hacer
+        if values:
+            current = conn.execute(f"SELECT {', '.join(values)} FROM {table} WHERE id = ?", (row_id,)).fetchone()
+            if current is not None and tuple(current) == tuple(values.values()):
+                return False
+
+        local_at = pending.get((table, row_id))
+        if (table, row_id) in pending:
+            winner = self._resolve(local_at, remote_at)
+            self._log_conflict(conn, table, row_id, 'pull', local_at, remote_at, winner)
+            stats['conflicts'] += 1
+            if winner == 'local':
+                return False
+
+        values['id'] = row_id
+        cols = list(values.keys())
+        updates = ", ".join(f"{c} = excluded.{c}" for c in cols if c != 'id')
+        sql = (f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))}) "
+               f"ON CONFLICT(id) DO UPDATE SET {updates}" if updates else
+               f"INSERT OR IGNORE INTO {table} (id) VALUES (?)")
+        conn.execute(sql, [values[c] for c in cols])
+        return True
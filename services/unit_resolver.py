@@ -3,41 +3,121 @@ UnitResolver - Service for resolving item units from database.
 
 Provides automatic unit resolution for items with missing unit information:
 1. Try to resolve by item code (exact match)
-2. Try to resolve by item name (fuzzy match with get_items_like)
+2. Try to resolve by item name (exact match, then trigram similarity with
+   get_items_similar)
 3. Fallback to default unit ("UND")
 
+Lists are resolved in batch: the codes and names of every line are looked up
+with one set query each (`get_units_for`), so a 300-line invoice costs the
+same handful of queries as a 3-line one. Results, including "not found",
+live in a bounded LRU cache keyed by code and by name. The cache is dropped
+whenever the catalog version changes (`items_version`, bumped by triggers on
+`items`, so writes from any connection invalidate it); `invalidate()` is the
+explicit hook for backends without that counter.
+
 Usage:
     resolver = UnitResolver(logic_controller)
     unit = resolver.resolve_unit(item_code, item_name, current_unit)
+    resolver.resolve_items(items)                      # in place, batched
+    units = resolver.lookup_units([(code, name), ...])  # exact only, '' if unknown
 """
 
 from __future__ import annotations
-from typing import Optional
+
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+SET_QUERY_CHUNK = 500   # bound parameters per IN (...) query
+
+
+def install_items_version(conn: sqlite3.Connection) -> None:
+    """Creates the catalog version counter, its triggers and the name index (idempotent; migration 19)."""
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS items_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO items_version (id, version) VALUES (1, 0);
+        CREATE TRIGGER IF NOT EXISTS trg_items_version_ins AFTER INSERT ON items
+        BEGIN
+            UPDATE items_version SET version = version + 1 WHERE id = 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_items_version_upd AFTER UPDATE ON items
+        BEGIN
+            UPDATE items_version SET version = version + 1 WHERE id = 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_items_version_del AFTER DELETE ON items
+        BEGIN
+            UPDATE items_version SET version = version + 1 WHERE id = 1;
+        END;
+        CREATE INDEX IF NOT EXISTS idx_items_name ON items(name);
+    """)
+
+
+def fetch_units(
+    conn: sqlite3.Connection,
+    codes: Iterable[str] = (),
+    names: Iterable[str] = ()
+) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """
+    Catalog units for exact codes and names, one IN (...) query per kind.
+
+    Items with an empty unit are skipped; with duplicated names the oldest
+    item wins.
+
+    Returns:
+        ({code: unit}, {name: unit}) with only the keys that were found
+    """
+    found: Tuple[Dict[str, str], Dict[str, str]] = ({}, {})
+    for out, column, keys in ((found[0], "code", list(dict.fromkeys(codes))),
+                              (found[1], "name", list(dict.fromkeys(names)))):
+        for start in range(0, len(keys), SET_QUERY_CHUNK):
+            chunk = keys[start:start + SET_QUERY_CHUNK]
+            rows = conn.execute(f"""
+                SELECT {column}, TRIM(unit) FROM items
+                 WHERE {column} IN ({', '.join('?' * len(chunk))}) AND TRIM(COALESCE(unit, '')) <> ''
+                 ORDER BY id DESC
+            """, chunk).fetchall()
+            # ORDER BY id DESC: the last assignment (oldest item) wins
+            out.update((key, unit) for key, unit in rows)
+    return found
 
 
 class UnitResolver:
     """
     Service for resolving item units from the database.
-    
+
     Resolution priority:
     1. Use current_unit if not empty
     2. Look up by code (exact match)
-    3. Look up by name (fuzzy match)
+    3. Look up by name (exact match, then fuzzy match)
     4. Fallback to DEFAULT_UNIT
     """
-    
+
     DEFAULT_UNIT = "UND"
-    
-    def __init__(self, logic_controller):
+    NAME_MATCH_THRESHOLD = 0.45  # minimum trigram similarity to trust a name match
+    DEFAULT_CACHE_SIZE = 4096
+
+    def __init__(self, logic_controller, cache_size: int = DEFAULT_CACHE_SIZE):
         """
         Initialize the resolver with a logic controller.
-        
+
         Args:
-            logic_controller: Instance with get_item_by_code() and get_items_like() methods
+            logic_controller: Instance with get_item_by_code() and get_items_similar()
+                (or get_items_like()) methods; get_units_for() and
+                get_items_version() enable batch lookups and automatic invalidation
+            cache_size: Maximum cached lookups (LRU, negative results included)
         """
         self.logic = logic_controller
-        self._cache = {}  # Cache resolved units: {(code, name): unit}
-        
+        self.cache_size = max(1, int(cache_size))
+        # {('code'|'name'|'similar', key): unit}; '' caches "not found"
+        self._cache: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self.stats = {"hits": 0, "misses": 0}
+
     def resolve_unit(
         self,
         item_code: Optional[str] = None,
@@ -46,81 +126,187 @@ class UnitResolver:
     ) -> str:
         """
         Resolve the unit for an item.
-        
+
         Args:
             item_code: Item code to look up
             item_name: Item name to look up (used if code fails)
             current_unit: Current unit value (returned if not empty)
-            
+
         Returns:
             Resolved unit string (never empty - falls back to DEFAULT_UNIT)
         """
         # 1. If current_unit is already set, use it
         if current_unit and str(current_unit).strip():
             return str(current_unit).strip()
-            
-        # Normalize inputs
-        code = (item_code or "").strip()
-        name = (item_name or "").strip()
-        
-        # Check cache
-        cache_key = (code, name)
-        if cache_key in self._cache:
-            return self._cache[cache_key]
-            
-        # 2. Try to resolve by code (exact match)
-        if code:
-            unit = self._resolve_by_code(code)
-            if unit:
-                self._cache[cache_key] = unit
-                return unit
-                
-        # 3. Try to resolve by name (fuzzy match)
-        if name:
-            unit = self._resolve_by_name(name)
-            if unit:
-                self._cache[cache_key] = unit
-                return unit
-                
-        # 4. Fallback to default
-        self._cache[cache_key] = self.DEFAULT_UNIT
-        return self.DEFAULT_UNIT
-    
+        return self._resolve_many([(item_code, item_name)])[0]
+
     def resolve_items(self, items: list) -> None:
         """
         Resolve units for a list of items in-place.
-        
-        Modifies each item dict to ensure it has a 'unit' field.
-        
+
+        Modifies each item dict to ensure it has a 'unit' field. Lines that
+        already have a unit are left as they are; the rest are resolved in
+        one batch.
+
         Args:
             items: List of item dicts with 'code', 'description', and optionally 'unit'
         """
         if not items:
             return
-            
+
+        pending = []
         for item in items:
             if not isinstance(item, dict):
                 continue
-                
-            # Get current values
-            code = item.get("code") or item.get("item_code")
-            name = item.get("description") or item.get("name")
-            current_unit = item.get("unit")
-            
-            # Resolve and update
-            item["unit"] = self.resolve_unit(code, name, current_unit)
-    
+            if str(item.get("unit") or "").strip():
+                item["unit"] = str(item["unit"]).strip()
+            else:
+                pending.append(item)
+        if not pending:
+            return
+        units = self._resolve_many([
+            (item.get("code") or item.get("item_code"), item.get("description") or item.get("name"))
+            for item in pending
+        ])
+        for item, unit in zip(pending, units):
+            item["unit"] = unit
+
+    def lookup_units(self, pairs: Sequence[Tuple[Optional[str], Optional[str]]]) -> List[str]:
+        """
+        Catalog unit for each (code, name) pair: exact code, then exact name.
+
+        No fuzzy matching and no default: unknown lines get ''. Costs at most
+        one query per kind for all cache misses together.
+
+        Args:
+            pairs: (item_code, item_name) per line
+
+        Returns:
+            One unit per pair, '' where the catalog has none
+        """
+        keys = [((code or "").strip(), (name or "").strip()) for code, name in pairs]
+        if not keys:
+            return []
+        with self._lock:
+            self._check_version()
+            by_code = self._units_for("code", {code for code, _name in keys if code})
+            # Names only matter for lines whose code did not resolve
+            by_name = self._units_for("name", {name for code, name in keys if name and not by_code.get(code)})
+            return [by_code.get(code) or by_name.get(name) or "" for code, name in keys]
+
+    def invalidate(self, codes: Iterable[str] = (), names: Iterable[str] = ()) -> None:
+        """
+        Drop cached lookups for the given codes/names (all of them if none given).
+
+        Call after changing items through a backend without get_items_version();
+        with SQLite the catalog version triggers already take care of it.
+        """
+        codes, names = list(codes), list(names)
+        with self._lock:
+            if not codes and not names:
+                self._cache.clear()
+                return
+            for code in codes:
+                self._cache.pop(("code", (code or "").strip()), None)
+            for name in names:
+                name = (name or "").strip()
+                self._cache.pop(("name", name), None)
+                self._cache.pop(("similar", name), None)
+            # A renamed or recoded item may also have been a negative entry for other keys
+            for key in [k for k, unit in self._cache.items() if not unit]:
+                del self._cache[key]
+
     def clear_cache(self):
         """Clear the resolution cache."""
-        self._cache.clear()
-    
+        self.invalidate()
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _resolve_many(self, pairs: Sequence[Tuple[Optional[str], Optional[str]]]) -> List[str]:
+        """Full resolution (exact, fuzzy by name, default) for a batch of (code, name)."""
+        units = self.lookup_units(pairs)
+        out = []
+        for (code, name), unit in zip(pairs, units):
+            name = (name or "").strip()
+            if not unit and name:
+                with self._lock:
+                    unit = self._get("similar", name)
+                if unit is None:
+                    unit = self._resolve_by_name(name) or ""
+                    with self._lock:
+                        self._put(("similar", name), unit)
+            out.append(unit or self.DEFAULT_UNIT)
+        return out
+
+    def _check_version(self) -> None:
+        """Drop the cache if the catalog changed since the last lookup (caller holds the lock)."""
+        if not hasattr(self.logic, "get_items_version"):
+            return
+        try:
+            version = self.logic.get_items_version()
+        except Exception as e:
+            print(f"[UnitResolver] Error reading catalog version: {e}")
+            version = None
+        if version is None or version != self._version:
+            self._cache.clear()
+        self._version = version
+
+    def _get(self, kind: str, key: str) -> Optional[str]:
+        """Cached unit ('' = known miss) or None if not cached (caller holds the lock)."""
+        unit = self._cache.get((kind, key))
+        if unit is not None:
+            self._cache.move_to_end((kind, key))
+        return unit
+
+    def _put(self, key: Tuple[str, str], unit: str) -> None:
+        self._cache[key] = unit
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _units_for(self, kind: str, keys: set) -> Dict[str, str]:
+        """
+        {key: unit} for codes or names: cached ones plus one batch lookup for
+        the rest, whose answers (misses included) are cached (caller holds the lock).
+        """
+        units: Dict[str, str] = {}
+        missing = []
+        for key in keys:
+            unit = self._get(kind, key)
+            if unit is None:
+                missing.append(key)
+            else:
+                units[key] = unit
+        self.stats["hits"] += len(units)
+        self.stats["misses"] += len(missing)
+        if not missing:
+            return units
+        if hasattr(self.logic, "get_units_for"):
+            try:
+                by_code, by_name = self.logic.get_units_for(missing, []) if kind == "code" \
+                    else self.logic.get_units_for([], missing)
+            except Exception as e:
+                print(f"[UnitResolver] Error in batch lookup: {e}")
+                return units
+            found = by_code if kind == "code" else by_name
+        elif kind == "code":
+            found = {code: unit for code in missing for unit in [self._resolve_by_code(code)] if unit}
+        else:
+            found = {}  # no exact-name lookup in this backend: names go straight to fuzzy matching
+        for key in missing:
+            units[key] = found.get(key, "")
+            self._put((kind, key), units[key])
+        return units
+
     def _resolve_by_code(self, code: str) -> Optional[str]:
         """
         Resolve unit by exact code match.
-        
+
         Args:
             code: Item code to look up
-            
+
         Returns:
             Unit string if found, None otherwise
         """
@@ -133,22 +319,27 @@ class UnitResolver:
         except Exception as e:
             print(f"[UnitResolver] Error resolving by code '{code}': {e}")
         return None
-    
+
     def _resolve_by_name(self, name: str) -> Optional[str]:
         """
         Resolve unit by fuzzy name match.
-        
-        Uses get_items_like to find similar items and returns
-        the unit from the first match.
-        
+
+        Uses get_items_similar (trigram similarity: accent-, case- and
+        typo-tolerant) and takes the best item above NAME_MATCH_THRESHOLD.
+        Backends without the trigram index fall back to the first
+        get_items_like hit.
+
         Args:
             name: Item name/description to search for
-            
+
         Returns:
             Unit string if found, None otherwise
         """
         try:
-            matches = self.logic.get_items_like(name, limit=1)
+            if hasattr(self.logic, "get_items_similar"):
+                matches = self.logic.get_items_similar(name, limit=1, threshold=self.NAME_MATCH_THRESHOLD)
+            else:
+                matches = self.logic.get_items_like(name, limit=1)
             if matches and len(matches) > 0:
                 item = matches[0]
                 if item.get("unit"):
@@ -1,21 +1,31 @@
 from __future__ import annotations
 
 import os
+import tempfile
+import time
 from typing import List, Dict, Any, Tuple
 
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QLabel, QPushButton, QTableWidget, QTableWidgetItem,
-    QHBoxLayout, QWidget as QWidgetAlias, QFileDialog, QMessageBox, QHeaderView
+    QHBoxLayout, QWidget as QWidgetAlias, QFileDialog, QMessageBox, QHeaderView, QInputDialog
 )
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QTimer
 
 from constants import ITBIS_RATE
+from services.dgii_report_service import VOID_REASONS
+from widgets.date_range_filter import DateRangeFilter, filter_by_date
+from widgets.doc_search_box import DocSearchBox, search_records
 
 try:
     from dialogs.invoice_preview_dialog import InvoicePreviewDialog
 except Exception:
     InvoicePreviewDialog = None
 
+try:
+    from dialogs.email_dialog import BulkEmailSenderThread
+except Exception:
+    BulkEmailSenderThread = None
+
 # Carga de plantilla
 try:
     from utils.template_manager import load_template
@@ -47,6 +57,12 @@ class InvoiceHistoryTab(QWidget):
     def _build_ui(self):
         layout = QVBoxLayout(self)
         layout.addWidget(QLabel("Historial de Facturas"))
+        self.date_filter = DateRangeFilter()
+        self.date_filter.changed.connect(self.refresh)
+        layout.addWidget(self.date_filter)
+        self.search_box = DocSearchBox()
+        self.search_box.changed.connect(self.refresh)
+        layout.addWidget(self.search_box)
         # Add an actions column at the end
         self.table = QTableWidget(0, 8)
         self.table.setHorizontalHeaderLabels(["ID", "Fecha", "NCF", "Cliente", "RNC", "Moneda", "Total", "Acciones"])
@@ -61,13 +77,18 @@ class InvoiceHistoryTab(QWidget):
         layout.addWidget(self.table)
         btn_refresh = QPushButton("Refrescar Historial")
         btn_refresh.clicked.connect(self.refresh)
-        layout.addWidget(btn_refresh)
+        btn_email_period = QPushButton("Enviar facturas del mes por email")
+        btn_email_period.clicked.connect(self._email_period_invoices)
+        buttons = QHBoxLayout()
+        buttons.addWidget(btn_refresh)
+        buttons.addWidget(btn_email_period)
+        layout.addLayout(buttons)
 
     def refresh(self):
         company = self.get_current_company()
         if not company:
             return
-        facturas = self.logic.get_facturas(company['id']) if hasattr(self.logic, "get_facturas") else []
+        facturas = self._load_facturas(company['id'])
         self.table.setRowCount(0)
         for f in facturas:
             row = self.table.rowCount()
@@ -83,6 +104,28 @@ class InvoiceHistoryTab(QWidget):
             # Actions cell (buttons)
             self._add_invoice_action_buttons(row, f)
 
+    def _load_facturas(self, company_id: int) -> List[Dict[str, Any]]:
+        text = self.search_box.text()
+        if text:
+            # Búsqueda en el índice de documentos (respeta el filtro de fechas)
+            start, end = self.date_filter.date_range()
+            records, status = search_records(self.logic, text, company_id, 'invoice', 'invoice_date', start, end)
+        else:
+            records, status = None, ""
+        self.search_box.set_status(status)
+        if records is not None:
+            return records
+        if not hasattr(self.logic, "get_facturas"):
+            return []
+        start, end = self.date_filter.date_range()
+        if not start:
+            return self.logic.get_facturas(company_id)
+        try:
+            # Rango por índice de número de día (incluye años archivados)
+            return self.logic.get_facturas(company_id, start_date=start, end_date=end)
+        except TypeError:
+            return filter_by_date(self.logic.get_facturas(company_id), 'invoice_date', start, end)
+
     def _add_invoice_action_buttons(self, row: int, record: Dict[str, Any]):
         widget = QWidgetAlias()
         layout = QHBoxLayout(widget)
@@ -90,15 +133,19 @@ class InvoiceHistoryTab(QWidget):
         btn_preview = QPushButton("Vista Previa")
         btn_pdf = QPushButton("PDF")
         btn_excel = QPushButton("Excel")
+        btn_void = QPushButton("Anular")
+        btn_void.setEnabled(record.get('status') != 'anulada')
         layout.addWidget(btn_preview)
         layout.addWidget(btn_pdf)
         layout.addWidget(btn_excel)
+        layout.addWidget(btn_void)
         widget.setLayout(layout)
 
         # Connect handlers capturing the record
         btn_preview.clicked.connect(lambda _, rec=record: self._open_invoice_preview(rec))
         btn_pdf.clicked.connect(lambda _, rec=record: self._export_invoice_pdf(rec))
         btn_excel.clicked.connect(lambda _, rec=record: self._export_invoice_excel(rec))
+        btn_void.clicked.connect(lambda _, rec=record: self._void_invoice(rec))
 
         self.table.setCellWidget(row, 7, widget)
 
@@ -247,6 +294,111 @@ class InvoiceHistoryTab(QWidget):
         except Exception as e:
             QMessageBox.critical(self, "Error", f"No se pudo exportar la factura a PDF:\n{e}")
 
+    def _void_invoice(self, record: Dict[str, Any]):
+        """Anula la factura con el tipo de anulación DGII que se reporta en el 608."""
+        if not hasattr(self.logic, "void_invoice"):
+            QMessageBox.warning(self, "Anular", "El backend actual no admite anular facturas"); return
+        ncf = record.get('invoice_number') or record.get('ncf') or record.get('id')
+        options = [f"{code} - {label}" for code, label in VOID_REASONS.items()]
+        choice, ok = QInputDialog.getItem(self, "Anular factura", f"Tipo de anulación de {ncf}:", options, 0, False)
+        if not ok:
+            return
+        try:
+            self.logic.void_invoice(record['id'], choice.split(" - ", 1)[0])
+        except (ValueError, TimeoutError) as e:
+            QMessageBox.warning(self, "Anular", str(e)); return
+        self.refresh()
+
+    def _email_period_invoices(self):
+        """Encola y envía por email (con PDF) todas las facturas emitidas de un mes, en segundo plano."""
+        company = self.get_current_company()
+        if not company:
+            QMessageBox.warning(self, "Empresa", "Seleccione una empresa válida"); return
+        if BulkEmailSenderThread is None or not hasattr(self.logic, "queue_period_invoice_emails"):
+            QMessageBox.warning(self, "Email", "El envío masivo no está disponible"); return
+        period, ok = QInputDialog.getText(self, "Enviar facturas del mes", "Período (AAAA-MM):")
+        if not ok or not period:
+            return
+        try:
+            year, month = (int(p) for p in period.strip().split("-"))
+            start = f"{year:04d}-{month:02d}-01"
+            end = f"{year + month // 12:04d}-{month % 12 + 1:02d}-01"
+        except ValueError:
+            QMessageBox.warning(self, "Período", "Use el formato AAAA-MM (p. ej. 2025-01)"); return
+
+        pdf_dir = tempfile.mkdtemp(prefix=f"facturas_{period}_")
+
+        def invoice_pdf(inv: Dict[str, Any]):
+            # Corre en el hilo de envío: las líneas vienen en inv['items'], sin usar la conexión de la UI
+            payload = {
+                "company_id": company.get('id'),
+                "company_name": company.get('name', ''),
+                "invoice_date": inv.get("invoice_date", ""),
+                "invoice_number": inv.get("invoice_number", ""),
+                "client_name": inv.get("third_party_name") or "",
+                "client_rnc": inv.get("rnc") or "",
+                "apply_itbis": float(inv.get("itbis") or 0) > 0.01,
+                "itbis_rate": ITBIS_RATE
+            }
+            path = os.path.join(pdf_dir, f"factura_{inv.get('invoice_number', inv['id'])}.pdf")
+            try:
+                export_invoice_pdf_with_template(payload, self._get_record_items(inv), path,
+                                                 company_name=company.get('name', ''))
+                return path
+            except Exception as e:
+                print(f"[EMAIL] No se pudo generar el PDF de {inv.get('invoice_number')}: {e}")
+                return None
+
+        company_id = company['id']
+        self._bulk_thread = BulkEmailSenderThread(
+            self.logic,
+            prepare=lambda: self.logic.queue_period_invoice_emails(company_id, start, end, attachment_for=invoice_pdf),
+            cleanup_dir=pdf_dir
+        )
+        self._bulk_thread.queued.connect(self._on_bulk_email_queued)
+        self._bulk_thread.finished.connect(self._on_bulk_email_done)
+        self._bulk_thread.start()
+
+    def _on_bulk_email_queued(self, result: Dict[str, Any]):
+        if result['missing_email']:
+            QMessageBox.information(
+                self, "Email",
+                f"{len(result['missing_email'])} factura(s) sin email del cliente no se enviarán:\n"
+                + ", ".join(result['missing_email'][:20])
+            )
+
+    def _on_bulk_email_done(self, stats: Dict[str, Any]):
+        if stats.get('error'):
+            QMessageBox.critical(self, "Email", f"Error en el envío masivo:\n{stats['error']}"); return
+        self._schedule_email_retry(stats)
+        QMessageBox.information(
+            self, "Email",
+            f"Enviadas: {stats['sent']}\nPendientes de reintento: {stats['retry']}\nFallidas: {stats['failed']}"
+        )
+
+    def _schedule_email_retry(self, stats: Dict[str, Any]):
+        """Programa otro envío de la cola para cuando vence el próximo reintento."""
+        due = stats.get('next_attempt_at')
+        if not stats.get('retry') or due is None:
+            return
+        delay_ms = int(max(due - time.time(), 1.0) * 1000)
+        QTimer.singleShot(delay_ms, self._resume_queued_emails)
+        print(f"[EMAIL] {stats['retry']} email(s) pendientes; reintento en {delay_ms // 1000} s")
+
+    def _resume_queued_emails(self):
+        thread = getattr(self, "_bulk_thread", None)
+        if thread is not None and thread.isRunning():
+            return  # el envío en curso ya espera sus reintentos
+        self._bulk_thread = BulkEmailSenderThread(self.logic)
+        self._bulk_thread.finished.connect(self._on_email_retry_done)
+        self._bulk_thread.start()
+
+    def _on_email_retry_done(self, stats: Dict[str, Any]):
+        if stats.get('error'):
+            print(f"[EMAIL] Error reintentando la cola: {stats['error']}"); return
+        print(f"[EMAIL] Reintento de la cola: {stats['sent']} enviados, {stats['failed']} fallidos")
+        self._schedule_email_retry(stats)
+
     def _export_invoice_excel(self, record: Dict[str, Any]):
         company = self.get_current_company()
         if not company:
@@ -11,6 +11,9 @@ from PyQt6.QtCore import QDate, Qt, pyqtSignal, QRegularExpression
 from PyQt6.QtGui import QRegularExpressionValidator
 
 from constants import NCF_TYPES, ITBIS_RATE, DEFAULT_CURRENCY
+from utils.money import (
+    convert_cents, format_cents, from_cents, itbis_cents, line_total_cents, to_cents
+)
 
 from utils.quotation_templates import (
     generate_quotation_excel as generate_invoice_excel,
@@ -81,6 +84,9 @@ class InvoiceTab(QWidget):
         super().__init__(parent)
         self.logic = logic
         self.get_current_company = get_current_company_callable
+        # Importe de cada fila en centavos (mismo orden que la tabla) y su suma
+        self._line_cents: List[int] = []
+        self._subtotal_cents = 0
         try:
             print(f"[LOAD] InvoiceTab module: {__file__}")
         except Exception:
@@ -173,6 +179,8 @@ class InvoiceTab(QWidget):
         g.addWidget(QLabel("Vencimiento:"), 1, 0); g.addWidget(self.invoice_due_date, 1, 1)
         g.addWidget(QLabel("Moneda:"), 1, 2); g.addWidget(self.currency_combo, 1, 3)
         g.addWidget(QLabel("Tasa:"), 1, 4); g.addWidget(self.exchange_rate_edit, 1, 5)
+        self.ncf_range_label = QLabel(""); self.ncf_range_label.setToolTip("Rango NCF autorizado vigente")
+        g.addWidget(self.ncf_range_label, 1, 6, 1, 3)
 
         # stretches
         g.setColumnStretch(1, 2); g.setColumnStretch(3, 2); g.setColumnStretch(6, 2); g.setColumnStretch(8, 2)
@@ -211,6 +219,7 @@ class InvoiceTab(QWidget):
         self.invoice_items_table.setHorizontalHeaderLabels(["#", "Código", "Descripción", "Unidad", "Cantidad", "Precio Unitario", "Subtotal"])
         self.invoice_items_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
         self.invoice_items_table.verticalHeader().setVisible(False)
+        self.invoice_items_table.itemChanged.connect(self._on_invoice_item_changed)
         detalles_layout.addWidget(self.invoice_items_table)
         layout.addWidget(detalles_box)
 
@@ -295,6 +304,29 @@ class InvoiceTab(QWidget):
             print(f"[NCF] Error preview: {e}")
         preview = self._dedupe_ncf(preview, prefix3)
         self.ncf_number_edit.setText(preview or "")
+        self._update_ncf_range_label(int(company['id']), prefix3)
+
+    def _update_ncf_range_label(self, company_id: int, prefix3: str):
+        """'N restantes / vence el ...' del rango autorizado (vacío si no hay rangos)."""
+        status = None
+        try:
+            if hasattr(self.logic, "get_ncf_range_status"):
+                status = self.logic.get_ncf_range_status(company_id, prefix3)
+        except Exception as e:
+            print(f"[NCF] Error estado de rango: {e}")
+        if not status:
+            self.ncf_range_label.clear(); return
+        if status['alert'] == 'exhausted':
+            text = f"⚠ {prefix3}: sin números autorizados vigentes"
+        else:
+            text = f"{status['remaining']:,} restantes"
+            if status['expires_on']:
+                text += f" / vence el {status['expires_on']}"
+            if status['alert']:
+                text = "⚠ " + text
+        color = "#B91C1C" if status['alert'] else "#374151"
+        self.ncf_range_label.setStyleSheet(f"color: {color};")
+        self.ncf_range_label.setText(text)
 
     def _on_next_ncf_clicked(self):
         """
@@ -311,6 +343,7 @@ class InvoiceTab(QWidget):
                 next_ncf = self.logic.get_next_ncf(int(comp['id']), prefix3)
             next_ncf = self._dedupe_ncf(next_ncf, prefix3)
             self.ncf_number_edit.setText(next_ncf)
+            self._update_ncf_range_label(int(comp['id']), prefix3)
         except Exception as e:
             QMessageBox.critical(self, "NCF", f"No se pudo asignar el siguiente NCF:\n{e}")
 
@@ -446,11 +479,7 @@ class InvoiceTab(QWidget):
         self._recalculate_invoice_totals()
 
     def _append_row(self, code, name, unit, qty, price, subtotal=None):
-        if subtotal is None:
-            try:
-                subtotal = float(qty) * float(price)
-            except Exception:
-                subtotal = 0.0
+        cents = line_total_cents(qty or 0, price or 0) if subtotal is None else to_cents(subtotal)
         row = self.invoice_items_table.rowCount()
         self.invoice_items_table.insertRow(row)
         self.invoice_items_table.setItem(row, 0, QTableWidgetItem(str(row + 1)))
@@ -459,7 +488,35 @@ class InvoiceTab(QWidget):
         self.invoice_items_table.setItem(row, 3, QTableWidgetItem((unit or "").strip()))
         self.invoice_items_table.setItem(row, 4, QTableWidgetItem(f"{float(qty):.2f}" if qty is not None else "0.00"))
         self.invoice_items_table.setItem(row, 5, QTableWidgetItem(f"{float(price):.2f}" if price is not None else "0.00"))
-        self.invoice_items_table.setItem(row, 6, QTableWidgetItem(f"{float(subtotal):,.2f}"))
+        self.invoice_items_table.setItem(row, 6, self._readonly_item(format_cents(cents)))
+        self._line_cents.append(cents)
+        self._subtotal_cents += cents
+        self._recalculate_invoice_totals()
+
+    @staticmethod
+    def _readonly_item(text: str) -> QTableWidgetItem:
+        item = QTableWidgetItem(text)
+        item.setFlags(item.flags() & ~Qt.ItemFlag.ItemIsEditable)
+        return item
+
+    def _on_invoice_item_changed(self, item: QTableWidgetItem):
+        """Recalcula el importe de la fila al editar Cantidad o Precio en la celda."""
+        row, col = item.row(), item.column()
+        # Durante _append_row la fila aún no está en _line_cents: se ignora
+        if col not in (4, 5) or row >= len(self._line_cents):
+            return
+        qty_item = self.invoice_items_table.item(row, 4)
+        price_item = self.invoice_items_table.item(row, 5)
+        qty = self._safe_float(qty_item.text() if qty_item else "", 0.0)
+        price = self._safe_float(price_item.text() if price_item else "", 0.0)
+        cents = line_total_cents(qty, price)
+        self._subtotal_cents += cents - self._line_cents[row]
+        self._line_cents[row] = cents
+        self.invoice_items_table.blockSignals(True)
+        try:
+            self.invoice_items_table.setItem(row, 6, self._readonly_item(format_cents(cents)))
+        finally:
+            self.invoice_items_table.blockSignals(False)
         self._recalculate_invoice_totals()
 
     def _remove_invoice_item_row(self):
@@ -467,26 +524,23 @@ class InvoiceTab(QWidget):
         if r < 0:
             QMessageBox.warning(self, "Sin Selección", "Selecciona un detalle para eliminar."); return
         self.invoice_items_table.removeRow(r)
+        if r < len(self._line_cents):
+            self._subtotal_cents -= self._line_cents.pop(r)
         for i in range(self.invoice_items_table.rowCount()):
             self.invoice_items_table.setItem(i, 0, QTableWidgetItem(str(i + 1)))
         self._recalculate_invoice_totals()
 
+    def _invoice_totals_cents(self):
+        """(subtotal, itbis, total) en centavos desde el subtotal acumulado."""
+        subtotal = self._subtotal_cents
+        itbis = itbis_cents(subtotal, ITBIS_RATE) if self.apply_itbis_checkbox.isChecked() else 0
+        return subtotal, itbis, subtotal + itbis
+
     def _recalculate_invoice_totals(self):
-        subtotal = 0.0
-        for r in range(self.invoice_items_table.rowCount()):
-            cell = self.invoice_items_table.item(r, 6)
-            if not cell:
-                continue
-            txt = (cell.text() or "").replace(",", "").strip()
-            try:
-                subtotal += float(txt) if txt else 0.0
-            except Exception:
-                pass
-        itbis = subtotal * ITBIS_RATE if self.apply_itbis_checkbox.isChecked() else 0.0
-        total = subtotal + itbis
-        self.subtotal_label.setText(f"Subtotal: RD$ {subtotal:,.2f}")
-        self.itbis_label.setText(f"ITBIS ({ITBIS_RATE*100:.0f}%): RD$ {itbis:,.2f}")
-        self.total_label.setText(f"Total: RD$ {total:,.2f}")
+        subtotal, itbis, total = self._invoice_totals_cents()
+        self.subtotal_label.setText(f"Subtotal: RD$ {format_cents(subtotal)}")
+        self.itbis_label.setText(f"ITBIS ({ITBIS_RATE*100:.0f}%): RD$ {format_cents(itbis)}")
+        self.total_label.setText(f"Total: RD$ {format_cents(total)}")
 
     # -------------------------
     # Vista previa / exportación
@@ -747,6 +801,12 @@ class InvoiceTab(QWidget):
         cliente_rnc = self.client_rnc.text().strip()
         if not cliente_nombre or not cliente_rnc:
             QMessageBox.warning(self, "Cliente", "Complete nombre y RNC del cliente."); return
+        if hasattr(self.logic, "validate_client_rnc"):
+            valid, reason = self.logic.validate_client_rnc(cliente_rnc)
+            if not valid:
+                answer = QMessageBox.question(self, "RNC del Cliente", f"{reason}\n\n¿Guardar la factura de todos modos?")
+                if answer != QMessageBox.StandardButton.Yes:
+                    self.client_rnc.setFocus(); return
 
         moneda = self.currency_combo.currentText()
         try:
@@ -756,14 +816,10 @@ class InvoiceTab(QWidget):
             tasa = 1.0
 
         items = self._collect_items_for_export()
-        subtotal = 0.0
-        for it in items:
-            try: subtotal += (it.get('quantity', 0.0) or 0.0) * (it.get('unit_price', 0.0) or 0.0)
-            except Exception: pass
-
-        itbis = subtotal * ITBIS_RATE if self.apply_itbis_checkbox.isChecked() else 0.0
-        total = subtotal + itbis
-        total_rd = total * tasa
+        _subtotal_c, itbis_c, total_c = self._invoice_totals_cents()
+        itbis = from_cents(itbis_c)
+        total = from_cents(total_c)
+        total_rd = from_cents(convert_cents(total_c, tasa))
 
         # Asegurar consumo si el campo está vacío o igual al preview
         self._ensure_ncf_assigned_and_mark(company)
@@ -790,7 +846,11 @@ class InvoiceTab(QWidget):
             "pdf_path": "",
         }
 
-        invoice_id = self.logic.add_invoice(payload, items)
+        try:
+            invoice_id = self.logic.add_invoice(payload, items)
+        except TimeoutError as e:
+            # Firebase aún inicializando (DeferredDataAccess no bloquea la UI)
+            QMessageBox.warning(self, "Factura", str(e)); return
         QMessageBox.information(self, "Factura", f"Factura creada (ID: {invoice_id})")
         self._clear_invoice_form()
         self.invoice_saved.emit(invoice_id)
@@ -803,6 +863,8 @@ class InvoiceTab(QWidget):
         self.currency_combo.setCurrentText(DEFAULT_CURRENCY)
         self.exchange_rate_edit.setText("1.00"); self.exchange_rate_edit.setVisible(False)
         self.invoice_items_table.setRowCount(0)
+        self._line_cents = []
+        self._subtotal_cents = 0
         self.subtotal_label.setText("Subtotal: RD$ 0.00")
         self.itbis_label.setText("ITBIS: RD$ 0.00")
         self.total_label.setText("Total: RD$ 0.00")
@@ -10,6 +10,8 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtCore import Qt
 
 from constants import ITBIS_RATE
+from widgets.date_range_filter import DateRangeFilter, filter_by_date
+from widgets.doc_search_box import DocSearchBox, search_records
 
 try:
     from dialogs.quotation_preview_dialog import QuotationPreviewDialog
@@ -47,6 +49,12 @@ class QuotationHistoryTab(QWidget):
     def _build_ui(self):
         layout = QVBoxLayout(self)
         layout.addWidget(QLabel("Historial de Cotizaciones"))
+        self.date_filter = DateRangeFilter()
+        self.date_filter.changed.connect(self.refresh)
+        layout.addWidget(self.date_filter)
+        self.search_box = DocSearchBox()
+        self.search_box.changed.connect(self.refresh)
+        layout.addWidget(self.search_box)
         # add actions column
         self.table = QTableWidget(0, 8)
         self.table.setHorizontalHeaderLabels(["ID", "Fecha", "Cliente", "RNC", "Moneda", "Total", "Notas", "Acciones"])
@@ -66,7 +74,7 @@ class QuotationHistoryTab(QWidget):
         company = self.get_current_company()
         if not company:
             return
-        cotizaciones = self.logic.get_quotations(company['id']) if hasattr(self.logic, "get_quotations") else []
+        cotizaciones = self._load_quotations(company['id'])
         self.table.setRowCount(0)
         for q in cotizaciones:
             row = self.table.rowCount()
@@ -82,6 +90,27 @@ class QuotationHistoryTab(QWidget):
             # actions
             self._add_quotation_action_buttons(row, q)
 
+    def _load_quotations(self, company_id: int) -> List[Dict[str, Any]]:
+        text = self.search_box.text()
+        if text:
+            # Búsqueda en el índice de documentos (respeta el filtro de fechas)
+            start, end = self.date_filter.date_range()
+            records, status = search_records(self.logic, text, company_id, 'quotation', 'quotation_date', start, end)
+        else:
+            records, status = None, ""
+        self.search_box.set_status(status)
+        if records is not None:
+            return records
+        if not hasattr(self.logic, "get_quotations"):
+            return []
+        start, end = self.date_filter.date_range()
+        if not start:
+            return self.logic.get_quotations(company_id)
+        try:
+            return self.logic.get_quotations(company_id, start_date=start, end_date=end)
+        except TypeError:
+            return filter_by_date(self.logic.get_quotations(company_id), 'quotation_date', start, end)
+
     def _add_quotation_action_buttons(self, row: int, record: Dict[str, Any]):
         widget = QWidgetAlias()
         layout = QHBoxLayout(widget)
@@ -47,7 +47,16 @@ class ItemsLookupMixin:
             except Exception:
                 pass
 
-        if name and hasattr(self.logic, "get_items_like"):
+        if name and hasattr(self.logic, "get_items_similar"):
+            # Índice de trigramas: tolera acentos y errores de tipeo en líneas pegadas/importadas
+            try:
+                best = (self.logic.get_items_similar(name, limit=1, threshold=0.45) or [{}])[0]
+                u = (best.get("unit") or "").strip()
+                if u:
+                    return u
+            except Exception:
+                pass
+        elif name and hasattr(self.logic, "get_items_like"):
             try:
                 target = self._normalize_name(name)
                 cands = self.logic.get_items_like(name, limit=25) or []
@@ -624,7 +633,11 @@ class QuotationTab(QWidget, ItemsLookupMixin):
                 qty_val = 0.0; price_val = 0.0
             items.append({"description": desc.text() if desc else "", "quantity": qty_val, "unit_price": price_val})
 
-        quotation_id = self.logic.add_quotation(data, items)
+        try:
+            quotation_id = self.logic.add_quotation(data, items)
+        except TimeoutError as e:
+            # Firebase aún inicializando (DeferredDataAccess no bloquea la UI)
+            QMessageBox.warning(self, "Cotización", str(e)); return
         QMessageBox.information(self, "Cotización", f"Cotización creada (ID: {quotation_id})")
         self._clear_form()
         self.quotation_saved.emit(quotation_id)
@@ -734,6 +747,20 @@ class QuotationTab(QWidget, ItemsLookupMixin):
         items = []
 
         row_count = table.rowCount() if table else 0
+
+        # Unidades del maestro para todas las filas de una vez (código/nombre exactos, con caché)
+        master_units = None
+        resolver = getattr(self.logic, "unit_resolver", None)
+        if resolver is not None:
+            try:
+                master_units = resolver.lookup_units([
+                    ((table.item(r, 1).text() if table.item(r, 1) else ""),
+                     (table.item(r, 2).text() if table.item(r, 2) else ""))
+                    for r in range(row_count)
+                ])
+            except Exception as e:
+                print(f"[QUOTATION] batch unit lookup error: {e}")
+
         for r in range(row_count):
             code_item = table.item(r, 1)  # Código
             desc_item = table.item(r, 2)  # Descripción
@@ -745,16 +772,16 @@ class QuotationTab(QWidget, ItemsLookupMixin):
             desc = (desc_item.text().strip() if desc_item and desc_item.text() else "")
 
             # 1) Intentar unidad por código en 'items'
-            unit_master = ""
+            unit_master = master_units[r] if master_units is not None else ""
             try:
-                if code and hasattr(self.logic, "get_item_by_code"):
+                if master_units is None and code and hasattr(self.logic, "get_item_by_code"):
                     found = self.logic.get_item_by_code(code) or {}
                     unit_master = (found.get("unit") or "").strip()
             except Exception as e:
                 print(f"[QUOTATION] get_item_by_code error: {e}")
 
             # 2) Si no hay code o no devolvió, intenta por nombre EXACTO en 'items'
-            if not unit_master and desc:
+            if master_units is None and not unit_master and desc:
                 try:
                     if hasattr(self.logic, "conn") and self.logic.conn:
                         cur = self.logic.conn.cursor()
@@ -28,6 +28,34 @@ def temp_db():
         pass
 
 
+@pytest.fixture
+def logic_company(temp_db):
+    """LogicController sobre temp_db con una empresa creada: (logic, company_id). Se cierra al terminar."""
+    from logic import LogicController
+    logic = LogicController(temp_db)
+    logic.add_company("Empresa", "101010101")
+    yield logic, logic.get_all_companies()[0]['id']
+    logic.close()
+
+
+@pytest.fixture
+def drop_insert_triggers():
+    """
+    Función que elimina los triggers AFTER INSERT de una tabla.
+
+    Para las cargas masivas de los tests de rendimiento: mide la consulta,
+    no el mantenimiento de change_log, resúmenes o índices de búsqueda.
+    """
+    def drop(conn, table):
+        names = [r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ? "
+            "AND sql LIKE '%AFTER INSERT%'", (table,))]
+        for name in names:
+            conn.execute(f"DROP TRIGGER {name}")
+        return names
+    return drop
+
+
 @pytest.fixture
 def sample_invoice_data():
     """Datos de ejemplo para una factura."""
@@ -0,0 +1,119 @@
+"""
+Tests para el archivo de años fiscales (services/archive_service.py).
+"""
+import os
+import shutil
+import sqlite3
+from datetime import date
+
+import pytest
+
+from services.archive_service import ArchiveService
+from services.dgii_report_service import DGIIReportService
+from services.ncf_integrity_service import NCFIntegrityService
+from services.sales_summary_service import SalesSummaryService
+
+TODAY = date(2025, 6, 1)
+
+
+def _invoice(cid, seq, day):
+    return {
+        "company_id": cid, "invoice_type": "emitida", "invoice_date": day,
+        "invoice_number": f"B01{seq:08d}", "invoice_category": "B01", "rnc": "131246796",
+        "third_party_name": "Cliente", "currency": "RD$", "itbis": 180.0,
+        "total_amount": 1180.0, "exchange_rate": 1.0, "total_amount_rd": 1180.0,
+    }
+
+
+@pytest.fixture
+def archived(temp_db, logic_company):
+    """Facturas B01 1-6 en 2023 y 7-9 en 2024; se archiva 2023."""
+    logic, cid = logic_company
+    for seq in range(1, 10):
+        day = f"2023-{seq:02d}-10" if seq <= 6 else f"2024-0{seq - 6}-10"
+        logic.add_invoice(_invoice(cid, seq, day), [
+            {"code": "P1", "description": f"Línea {seq}", "quantity": 1, "unit_price": 1000.0}
+        ])
+    svc = ArchiveService(temp_db)
+    assert svc.closable_years(today=TODAY) == [2023, 2024]
+    ok, message = svc.archive_year(2023, today=TODAY)
+    assert ok, message
+    yield logic, cid, svc
+    shutil.rmtree(svc.archive_dir, ignore_errors=True)
+
+
+class TestArchiveService:
+    """Tests de cierre de año y lectura transparente de los archivos."""
+
+    def test_archive_moves_year_out_of_hot_db(self, archived, temp_db):
+        """El año sale de la base caliente y queda en su archivo, sin bajas en change_log."""
+        logic, cid, svc = archived
+        with sqlite3.connect(temp_db) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0] == 3
+            assert conn.execute("SELECT COUNT(*) FROM invoice_items").fetchone()[0] == 3
+            assert conn.execute("SELECT COUNT(*) FROM change_log WHERE op = 'D'").fetchone()[0] == 0
+        with sqlite3.connect(svc.archive_path(2023)) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0] == 6
+            assert conn.execute("SELECT COUNT(*) FROM invoice_items").fetchone()[0] == 6
+        assert [(a['year'], a['invoice_count'], a['item_count']) for a in svc.list_archives()] == [(2023, 6, 6)]
+        assert svc.closable_years(today=TODAY) == [2024]
+
+    def test_get_facturas_spans_archive_by_range(self, archived):
+        """Sin rango sólo la base; con un rango que cruza 2023 se lee el archivo."""
+        logic, cid, _svc = archived
+        assert len(logic.get_facturas(cid)) == 3
+        spanning = logic.get_facturas(cid, start_date="2023-05-01", end_date="2024-01-31")
+        assert [f['invoice_date'] for f in spanning] == ["2024-01-10", "2023-06-10", "2023-05-10"]
+        items = logic.get_invoice_items(spanning[-1]['id'])
+        assert [it['description'] for it in items] == ["Línea 5"]
+
+    def test_reports_and_ncf_checks_include_archive(self, archived, temp_db):
+        """El 607 de un mes archivado y los chequeos de NCF ven los años archivados."""
+        logic, cid, _svc = archived
+        ok, summary = DGIIReportService(temp_db).generate('607', cid, '2023-03')
+        assert ok and summary['count'] == 1
+
+        assert logic.ncf_service.check_ncf_exists(cid, "B0100000002")
+        ok, message, suggestion = logic.update_invoice_number(
+            logic.get_facturas(cid)[0]['id'], cid, "101010101", "B0100000002")
+        assert not ok and suggestion == "B0100000010"
+        result = NCFIntegrityService(temp_db).scan(cid, "B01")
+        assert result['sequences'][0]['count'] == 9
+        assert result['sequences'][0]['gaps'] == []
+
+    def test_sales_summary_keeps_archived_year(self, archived, temp_db):
+        """El resumen mensual sigue contando el año archivado, también tras reconstruirlo."""
+        _logic, cid, _svc = archived
+        summary = SalesSummaryService(temp_db)
+        rows = summary.get_monthly_summary(cid, "2023-01", "2023-12")
+        assert [r['period'] for r in rows] == [f"2023-{m:02d}" for m in range(1, 7)]
+        assert summary.get_period_totals(cid, "2023-01", "2023-12")['emitida']['RD$']['total_amount'] == 6 * 1180.0
+        assert summary.check_consistency() == []
+
+        assert summary.rebuild() == 9
+        assert summary.get_monthly_summary(cid, "2023-01", "2023-12") == rows
+
+    def test_archived_invoices_are_read_only(self, archived, temp_db):
+        """Editar, borrar o anular una factura de un año cerrado falla sin tocar la base."""
+        logic, cid, _svc = archived
+        archived_id = logic.get_facturas(cid, start_date="2023-01-01", end_date="2023-01-31")[0]['id']
+        with pytest.raises(ValueError, match="año cerrado 2023"):
+            logic.update_invoice(archived_id, _invoice(cid, 1, "2023-01-10"), [
+                {"code": "P1", "description": "Editada", "quantity": 2, "unit_price": 1000.0}
+            ])
+        with pytest.raises(ValueError, match="año cerrado 2023"):
+            logic.delete_factura(archived_id)
+        with pytest.raises(ValueError, match="año cerrado 2023"):
+            logic.void_invoice(archived_id, "01")
+        with pytest.raises(ValueError, match="no encontrada"):
+            logic.update_invoice(9999, _invoice(cid, 1, "2024-01-10"), [])
+        with sqlite3.connect(temp_db) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM invoice_items").fetchone()[0] == 3
+        assert [it['description'] for it in logic.get_invoice_items(archived_id)] == ["Línea 1"]
+
+    def test_rejects_open_or_empty_year(self, archived):
+        """No se archiva el año en curso ni un año sin facturas en la base."""
+        _logic, _cid, svc = archived
+        assert svc.archive_year(2025, today=TODAY)[0] is False
+        assert svc.archive_year(2023, today=TODAY)[0] is False
+        assert os.path.exists(svc.archive_path(2023))
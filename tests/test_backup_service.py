@@ -0,0 +1,125 @@
+"""
+Tests para los respaldos en caliente (services/backup_service.py).
+"""
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+from services.archive_service import ArchiveService
+from services.backup_service import BackupService, table_counts
+
+
+def _populate(logic_company, invoices=200):
+    logic, cid = logic_company
+    logic.conn.executemany("""
+        INSERT INTO invoices (company_id, invoice_type, invoice_date, invoice_number, currency, total_amount)
+        VALUES (?, 'emitida', '2025-01-15', ?, 'RD$', 100)
+    """, [(cid, f"B01{n:08d}") for n in range(invoices)])
+    logic.conn.commit()
+    return logic, cid
+
+
+class TestBackupService:
+    """Tests de creación, verificación, retención y restauración."""
+
+    def test_backup_while_writing_is_consistent(self, temp_db, logic_company, tmp_path):
+        """Se puede facturar durante el backup y el resultado pasa la verificación."""
+        logic, cid = _populate(logic_company)
+        svc = BackupService(temp_db, str(tmp_path), pages_per_step=1, step_sleep=0)
+        steps = []
+
+        def progress(fraction):
+            steps.append(fraction)
+            if len(steps) == 2:
+                # Otra conexión escribe entre tramos: no queda bloqueada
+                logic.conn.execute("""
+                    INSERT INTO invoices (company_id, invoice_type, invoice_date, invoice_number, currency, total_amount)
+                    VALUES (?, 'emitida', '2025-01-16', 'B0199999999', 'RD$', 1)
+                """, (cid,))
+                logic.conn.commit()
+
+        ok, path = svc.create_backup(progress=progress)
+        assert ok, path
+        assert path.endswith(".db.gz") and os.path.exists(path + ".json")
+        assert steps[-1] == 1.0 and len(steps) > 2
+
+        ok, message = svc.verify_backup(path)
+        assert ok, message
+        restored = str(tmp_path / "restaurada.db")
+        assert svc.restore_backup(path, restored)[0]
+        with sqlite3.connect(restored) as conn:
+            assert table_counts(conn)['invoices'] == 201
+
+    def test_verify_detects_damage(self, temp_db, logic_company, tmp_path):
+        """Un archivo alterado o un manifiesto que no cuadra no pasan la verificación."""
+        logic, _ = _populate(logic_company, invoices=10)
+        svc = BackupService(temp_db, str(tmp_path))
+        ok, path = svc.create_backup()
+        assert ok
+
+        with open(path, "r+b") as f:
+            f.seek(40)
+            f.write(b"\x00" * 16)
+        ok, message = svc.verify_backup(path)
+        assert not ok and "SHA-256" in message
+
+        ok, path = svc.create_backup(now=datetime.now() + timedelta(seconds=1))
+        manifest_path = path + ".json"
+        with open(manifest_path) as f:
+            content = f.read().replace('"invoices": 10', '"invoices": 11')
+        with open(manifest_path, "w") as f:
+            f.write(content)
+        ok, message = svc.verify_backup(path)
+        assert not ok and "invoices" in message
+
+    def test_generational_retention(self, temp_db, logic_company, tmp_path):
+        """Se conserva uno por día reciente y uno por semana; el resto se borra."""
+        logic, _ = _populate(logic_company, invoices=5)
+        svc = BackupService(temp_db, str(tmp_path), compression=None, keep_daily=3, keep_weekly=2)
+        today = datetime(2025, 3, 14, 22, 0)  # viernes
+        for days_ago in range(30):
+            for hour in (9, 18):
+                stamp = (today - timedelta(days=days_ago)).replace(hour=hour)
+                assert svc.create_backup(now=stamp)[0]
+        svc.apply_retention(now=today)
+
+        kept = [b['created'] for b in svc.list_backups()]
+        assert kept[:3] == [datetime(2025, 3, 14, 18), datetime(2025, 3, 13, 18), datetime(2025, 3, 12, 18)]
+        # Semana anterior: sólo su último respaldo (domingo 9 de marzo)
+        assert kept[3:] == [datetime(2025, 3, 9, 18)]
+        assert sorted(os.listdir(tmp_path)) == sorted(
+            f for b in svc.list_backups() for f in (os.path.basename(b['path']), os.path.basename(b['path']) + ".json")
+        )
+
+        assert svc.backup_if_due(max_age_hours=24 * 365 * 10) is None
+
+    def test_backups_include_archived_years(self, temp_db, logic_company, tmp_path):
+        """El archivo de un año cerrado entra en cada respaldo, se verifica, se restaura y sobrevive a la retención."""
+        logic, cid = _populate(logic_company, invoices=5)
+        logic.conn.execute("UPDATE invoices SET invoice_date = '2023-05-10'")
+        logic.conn.commit()
+        archives = ArchiveService(temp_db, str(tmp_path / "archivo_vivo"))
+        svc = BackupService(temp_db, str(tmp_path / "backups"), keep_daily=1, keep_weekly=1)
+        svc.archives = archives
+        ok, message = archives.archive_year(2023, today=datetime(2025, 6, 1).date())
+        assert ok, message
+
+        today = datetime(2025, 6, 2, 9)
+        paths = [svc.create_backup(now=today - timedelta(days=days))[1] for days in (60, 0)]
+        copies = os.listdir(tmp_path / "backups" / "archivo")
+        assert len(copies) == 1  # mismo contenido: una sola copia compartida
+        ok, message = svc.verify_backup(paths[-1])
+        assert ok and "1 años archivados" in message, message
+        # Retención: el respaldo viejo se borra y la copia sigue referenciada por el nuevo
+        assert not os.path.exists(paths[0])
+        assert os.listdir(tmp_path / "backups" / "archivo") == copies
+
+        restored = str(tmp_path / "restaurada" / "facot.db")
+        os.makedirs(os.path.dirname(restored))
+        assert svc.restore_backup(paths[-1], restored)[0]
+        with sqlite3.connect(ArchiveService(restored).archive_path(2023)) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0] == 5
+
+        os.unlink(os.path.join(tmp_path, "backups", "archivo", copies[0]))
+        ok, message = svc.verify_backup(paths[-1])
+        assert not ok and "2023" in message
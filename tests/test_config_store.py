@@ -0,0 +1,77 @@
+"""
+Tests para el almacén de configuración en caché (utils/config_store.py).
+"""
+import json
+import os
+
+from utils.config_store import ConfigStore
+
+
+def _write(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+class TestConfigStore:
+    """Tests de lectura en caché, escritura diferida y notificaciones."""
+
+    def test_reads_are_served_from_memory(self, tmp_path):
+        """Muchas lecturas seguidas leen el archivo una sola vez."""
+        path = tmp_path / "cfg.json"
+        _write(path, {"invoice_due_days": 30})
+        store = ConfigStore(str(path))
+        for _ in range(1000):
+            assert store.get("invoice_due_days", 0) == 30
+        assert store.stats['reads'] == 1
+
+    def test_writes_are_coalesced_and_atomic(self, tmp_path):
+        """Varias escrituras producen un solo archivo completo, sin temporales."""
+        path = tmp_path / "cfg.json"
+        store = ConfigStore(str(path), write_delay=60)
+        for i in range(50):
+            store.set("counter", i)
+        store.set("connection_mode", "SQLITE")
+        assert store.stats['writes'] == 0
+        store.flush()
+        assert store.stats['writes'] == 1
+        with open(path, encoding="utf-8") as f:
+            assert json.load(f) == {"counter": 49, "connection_mode": "SQLITE"}
+        assert os.listdir(tmp_path) == ["cfg.json"]
+
+    def test_external_change_reloads_and_notifies(self, tmp_path):
+        """Si el archivo cambia por fuera se recarga y se avisa a los suscriptores."""
+        path = tmp_path / "cfg.json"
+        _write(path, {"a": 1})
+        store = ConfigStore(str(path), check_interval=0)
+        assert store.get("a") == 1
+        events = []
+        store.subscribe(lambda changed, data: events.append((changed, data["a"])))
+
+        _write(path, {"a": 2, "b": "x"})
+        os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10**9))
+        assert store.get("a") == 2
+        assert events == [({"a", "b"}, 2)]
+
+    def test_failed_write_keeps_previous_file(self, tmp_path):
+        """Un valor no serializable no deja el archivo a medio escribir."""
+        path = tmp_path / "cfg.json"
+        _write(path, {"a": 1})
+        store = ConfigStore(str(path), write_delay=0)
+        store.set("bad", object())
+        with open(path, encoding="utf-8") as f:
+            assert json.load(f) == {"a": 1}
+        assert os.listdir(tmp_path) == ["cfg.json"]
+
+    def test_legacy_module_attributes_use_store(self, tmp_path, monkeypatch):
+        """config_facot expone INVOICE_DUE_DAYS desde el caché y los setters persisten."""
+        import config_facot
+        store = ConfigStore(str(tmp_path / "facot_config.json"), write_delay=0)
+        monkeypatch.setattr(config_facot, "get_config_store", lambda: store)
+
+        assert config_facot.INVOICE_DUE_DAYS == 0
+        store.set("invoice_due_days", 15)
+        assert config_facot.INVOICE_DUE_DAYS == 15
+        config_facot.set_connection_mode("SQLITE")
+        assert config_facot.get_connection_mode() == "SQLITE"
+        with open(tmp_path / "facot_config.json", encoding="utf-8") as f:
+            assert json.load(f) == {"invoice_due_days": 15, "connection_mode": "SQLITE"}
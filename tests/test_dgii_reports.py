@@ -0,0 +1,141 @@
+"""
+Tests para los formatos DGII 606/607/608 (services/dgii_report_service.py).
+"""
+import sqlite3
+import time
+
+import pytest
+
+from services.dgii_report_service import DGIIReportService, validate_ncf, validate_rnc
+
+LARGE_PERIOD_ROWS = 100_000
+LARGE_PERIOD_BUDGET_S = 10.0
+
+
+def _invoice(cid, number, date, rnc="131246796", invoice_type="emitida", total=1180.0, itbis=180.0):
+    return {
+        "company_id": cid, "invoice_type": invoice_type, "invoice_date": date,
+        "invoice_number": number, "invoice_category": number[:3], "rnc": rnc,
+        "third_party_name": "Tercero", "currency": "RD$", "itbis": itbis,
+        "total_amount": total, "exchange_rate": 1.0, "total_amount_rd": total,
+    }
+
+
+class TestValidators:
+    """Tests de validación de NCF y RNC."""
+
+    def test_ncf(self):
+        assert validate_ncf("B0100000001")
+        assert validate_ncf("E310000000001")
+        assert not validate_ncf("B011")
+        assert not validate_ncf("")
+
+    def test_rnc_and_cedula_check_digit(self):
+        assert validate_rnc("131246796")
+        assert validate_rnc("001-1391820-5")
+        assert not validate_rnc("131246797")
+        assert not validate_rnc("12345")
+
+
+class TestDGIIReports:
+    """Tests de generación de los formatos."""
+
+    def test_607_txt_layout_and_totals(self, temp_db, logic_company, tmp_path):
+        """El 607 incluye sólo emitidas del mes, con encabezado y totales."""
+        logic, cid = logic_company
+        logic.add_invoice(_invoice(cid, "B0100000001", "2025-01-05"), [])
+        logic.add_invoice(_invoice(cid, "B0100000002", "2025-01-31", rnc="00113918205"), [])
+        logic.add_invoice(_invoice(cid, "B0100000003", "2025-02-01"), [])
+        logic.add_invoice(_invoice(cid, "B0100000004", "2025-01-10", invoice_type="recibida"), [])
+
+        out = tmp_path / "607.txt"
+        ok, summary = DGIIReportService(temp_db).generate('607', cid, '2025-01', txt_path=str(out))
+        assert ok
+        assert summary['count'] == 2
+        assert summary['monto_facturado'] == 2000.0
+        assert summary['itbis_facturado'] == 360.0
+        assert summary['error_count'] == 0
+
+        lines = out.read_text(encoding="utf-8").splitlines()
+        assert lines[0] == "607|101010101|202501|2"
+        first = lines[1].split("|")
+        assert len(first) == 23
+        assert first[:3] == ["131246796", "1", "B0100000001"]
+        assert first[5] == "20250105"
+        assert first[7:9] == ["1000.00", "180.00"]
+        assert lines[2].split("|")[1] == "2"
+
+    def test_606_and_608(self, temp_db, logic_company):
+        """El 606 toma las recibidas; el 608 las anuladas, que salen del 607."""
+        logic, cid = logic_company
+        logic.add_invoice(_invoice(cid, "B0100000010", "2025-03-02", invoice_type="recibida"), [])
+        voided = logic.add_invoice(_invoice(cid, "B0100000011", "2025-03-03"), [])
+        logic.void_invoice(voided, "04")
+
+        svc = DGIIReportService(temp_db)
+        rows_606 = list(svc.iter_rows('606', cid, '202503'))
+        assert len(rows_606) == 1 and rows_606[0][3] == "B0100000010"
+        assert list(svc.iter_rows('608', cid, '202503')) == [["B0100000011", "20250303", "04"]]
+        assert list(svc.iter_rows('607', cid, '202503')) == []
+
+    def test_invalid_rows_are_reported(self, temp_db, logic_company):
+        """NCF y RNC inválidos se cuentan en el resumen sin detener el reporte."""
+        logic, cid = logic_company
+        logic.add_invoice(_invoice(cid, "B01XX", "2025-04-01", rnc="123"), [])
+        ok, summary = DGIIReportService(temp_db).generate('607', cid, '2025-04')
+        assert ok
+        assert summary['count'] == 1
+        assert summary['error_count'] == 2
+        assert summary['errors'][0]['row'] == 1
+
+    def test_void_reason_is_required(self, temp_db, logic_company):
+        """Anular exige el tipo de anulación; un 608 sin él se reporta como error."""
+        logic, cid = logic_company
+        voided = logic.add_invoice(_invoice(cid, "B0100000012", "2025-03-04"), [])
+        for reason in ("", "  ", "11", "motivo libre"):
+            with pytest.raises(ValueError):
+                logic.void_invoice(voided, reason)
+        logic.conn.execute("UPDATE invoices SET status = 'anulada' WHERE id = ?", (voided,))
+        logic.conn.commit()
+        ok, summary = DGIIReportService(temp_db).generate('608', cid, '202503')
+        assert ok and summary['error_count'] == 1
+        assert "anulación" in summary['errors'][0]['error']
+
+    def test_invalid_arguments(self, temp_db, logic_company):
+        """Formato, período o empresa inválidos devuelven (False, mensaje)."""
+        _logic, cid = logic_company
+        svc = DGIIReportService(temp_db)
+        assert svc.generate('609', cid, '202501')[0] is False
+        assert svc.generate('607', cid, '2025-13')[0] is False
+        assert svc.generate('607', 999, '202501')[0] is False
+
+    @pytest.mark.slow
+    def test_large_period_streams_within_budget(self, temp_db, logic_company, tmp_path, drop_insert_triggers):
+        """Un período con 100k facturas se genera en pocos segundos."""
+        logic, cid = logic_company
+        logic.close()
+        with sqlite3.connect(temp_db) as conn:
+            drop_insert_triggers(conn, "invoices")
+            conn.executemany(
+                "INSERT INTO invoices (company_id, invoice_type, invoice_date, invoice_number, rnc, currency,"
+                " itbis, total_amount, exchange_rate, total_amount_rd) VALUES (?, 'emitida', ?, ?, ?, 'RD$', 18, 118, 1, 118)",
+                ((cid, f"2025-05-{i % 28 + 1:02d}", f"B01{i:08d}", "131246796") for i in range(LARGE_PERIOD_ROWS))
+            )
+        out = tmp_path / "607.txt"
+        start = time.perf_counter()
+        ok, summary = DGIIReportService(temp_db).generate('607', cid, '202505', txt_path=str(out))
+        elapsed = time.perf_counter() - start
+        assert ok and summary['count'] == LARGE_PERIOD_ROWS
+        assert summary['monto_facturado'] == 100.0 * LARGE_PERIOD_ROWS
+        assert elapsed < LARGE_PERIOD_BUDGET_S
+
+    def test_excel_output(self, temp_db, logic_company, tmp_path):
+        """El Excel write-only tiene encabezado y una fila por factura."""
+        openpyxl = pytest.importorskip("openpyxl")
+        logic, cid = logic_company
+        logic.add_invoice(_invoice(cid, "B0100000001", "2025-06-01"), [])
+        out = tmp_path / "607.xlsx"
+        ok, _summary = DGIIReportService(temp_db).generate('607', cid, '202506', xlsx_path=str(out))
+        assert ok
+        ws = openpyxl.load_workbook(out).active
+        assert ws.max_row == 2
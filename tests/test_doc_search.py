@@ -0,0 +1,137 @@
+"""
+Tests para la búsqueda de documentos con FTS5 (services/doc_search_service.py, migraciones 16 y 20).
+"""
+import sqlite3
+import time
+
+from services import doc_search_service
+from services.doc_search_service import build_match_query, rebuild_doc_search
+
+
+def _invoice(cid, seq, client="Ferretería Ochoa", rnc="131-24679-6"):
+    return {
+        "company_id": cid, "invoice_type": "emitida", "invoice_date": "2025-01-15",
+        "invoice_number": f"B01{seq:08d}", "invoice_category": "B01", "rnc": rnc,
+        "third_party_name": client, "currency": "RD$", "itbis": 18.0,
+        "total_amount": 118.0, "exchange_rate": 1.0, "total_amount_rd": 118.0,
+    }
+
+
+def _line(code, description):
+    return {"code": code, "description": description, "quantity": 1, "unit_price": 100.0}
+
+
+class TestDocSearch:
+    """Tests del índice de búsqueda, sus triggers y el orden de resultados."""
+
+    def test_matches_header_and_lines(self, logic_company):
+        """Palabras de cabecera y de líneas se combinan; acentos, prefijos y guiones del RNC no importan."""
+        logic, cid = logic_company
+        first = logic.add_invoice(_invoice(cid, 1), [_line("CEM-42", "Cemento gris Portland"),
+                                                    _line("VAR-38", "Varilla 3/8")])
+        logic.add_invoice(_invoice(cid, 2, client="Constructora Pérez", rnc="101-00000-1"),
+                          [_line("CEM-42", "Cemento gris Portland")])
+
+        def ids(text):
+            return [r['doc_id'] for r in logic.search_documents(text, cid)['results']]
+
+        assert ids("cemento ferreteria") == [first]
+        assert ids("ferreteria varilla") == [first]
+        assert sorted(ids("cem")) == sorted([first, first + 1])
+        assert ids("perez") == [first + 1]
+        assert ids("131-24679-6") == [first]
+        assert ids("B0100000001") == [first]
+        assert ids("tubo") == []
+        assert ids('"); DROP TABLE invoices; --') == []
+
+    def test_triggers_follow_updates_and_deletes(self, temp_db, logic_company):
+        """Cambios de cabecera y de líneas reindexan; borrar la factura la saca del índice."""
+        logic, cid = logic_company
+        invoice_id = logic.add_invoice(_invoice(cid, 1), [_line("CEM-42", "Cemento gris")])
+        items = logic.get_invoice_items(invoice_id)
+        logic.update_invoice(invoice_id, {**_invoice(cid, 1, client="Inversiones Lora")},
+                             [{**items[0], "description": "Arena lavada"}])
+        assert logic.search_documents("cemento", cid)['total'] == 0
+        assert logic.search_documents("ferreteria", cid)['total'] == 0
+        assert logic.search_documents("lora arena", cid)['total'] == 1
+
+        with sqlite3.connect(temp_db) as conn:
+            conn.execute("DELETE FROM invoice_items WHERE invoice_id = ?", (invoice_id,))
+            conn.execute("DELETE FROM invoices WHERE id = ?", (invoice_id,))
+            assert conn.execute("SELECT COUNT(*) FROM doc_search").fetchone()[0] == 0
+            # Reconstrucción coincide con lo que mantienen los triggers
+            assert rebuild_doc_search(conn) == 0
+        assert logic.search_documents("lora", cid)['total'] == 0
+
+    def test_lines_reindex_once_per_document(self, temp_db, logic_company):
+        """Guardar muchas líneas no recalcula el índice por línea; SQL directo se ve en la próxima búsqueda."""
+        logic, cid = logic_company
+        lines = [_line(f"MAT{n:04d}", f"Material {n}") for n in range(1000)]
+        t0 = time.perf_counter()
+        invoice_id = logic.add_invoice(_invoice(cid, 1), lines)
+        assert time.perf_counter() - t0 < 1.0
+        assert logic.conn.execute("SELECT COUNT(*) FROM doc_search_pending").fetchone()[0] == 0
+        assert [r['doc_id'] for r in logic.search_documents("MAT0999", cid)['results']] == [invoice_id]
+
+        with sqlite3.connect(temp_db) as conn:
+            conn.execute("INSERT INTO invoice_items (invoice_id, item_code, description, quantity, unit_price)"
+                         " VALUES (?, 'TUB-12', 'Tubo PVC', 1, 1)", (invoice_id,))
+        assert logic.search_documents("tubo", cid)['total'] == 1
+
+    def test_scopes_by_company_and_doc_type(self, logic_company):
+        """Cotizaciones se indexan aparte; empresa y tipo filtran dentro del índice."""
+        logic, cid = logic_company
+        logic.add_company("Otra", "202020202")
+        other = [c['id'] for c in logic.get_all_companies() if c['id'] != cid][0]
+        logic.add_invoice(_invoice(cid, 1), [_line("CEM-42", "Cemento")])
+        logic.add_invoice(_invoice(other, 1), [_line("CEM-42", "Cemento")])
+        quotation_id = logic.add_quotation({'company_id': cid, 'quotation_date': '2025-01-10',
+                                            'client_name': 'Ferretería Ochoa', 'currency': 'RD$',
+                                            'total_amount': 0}, [_line("CEM-42", "Cemento")])
+
+        assert logic.search_documents("cemento")['total'] == 3
+        assert logic.search_documents("cemento", cid)['total'] == 2
+        result = logic.search_documents("cemento ochoa", cid, doc_type='quotation')
+        assert [(r['doc_type'], r['doc_id']) for r in result['results']] == [('quotation', quotation_id)]
+        assert result['results'][0]['record']['client_name'] == 'Ferretería Ochoa'
+        assert build_match_query("  --  ") == ""
+
+    def test_ranking_and_pagination(self, logic_company, monkeypatch):
+        """bm25 pone primero la coincidencia en el tercero; más allá del tope se pagina por más recientes."""
+        logic, cid = logic_company
+        for seq in range(1, 7):
+            logic.add_invoice(_invoice(cid, seq, client=f"Cliente {seq}"),
+                              [_line("P1", f"Bloque de 6 pulgadas ochoa {seq}")])
+        logic.add_invoice(_invoice(cid, 7), [_line("P2", "Block de 8 pulgadas")])
+        result = logic.search_documents("ochoa", cid, limit=3)
+        assert result['ranked'] and result['total'] == 7
+        # Coincidencia en el tercero (peso 5) antes que sólo en líneas (peso 1)
+        assert result['results'][0]['record']['third_party_name'] == "Ferretería Ochoa"
+        assert "[ochoa]" in result['results'][-1]['snippet'].lower()
+        pages = [logic.search_documents("ochoa", cid, limit=3, offset=o)['results'] for o in (0, 3, 6)]
+        assert sorted(r['doc_id'] for page in pages for r in page) == list(range(1, 8))
+
+        monkeypatch.setattr(doc_search_service, "RANK_MAX_MATCHES", 4)
+        result = logic.search_documents("ochoa", cid, limit=2)
+        assert not result['ranked'] and result['total'] == 5
+        assert [r['doc_id'] for r in result['results']] == [7, 6]
+
+    def test_search_stays_fast(self, temp_db, logic_company):
+        """Con miles de documentos y decenas de miles de líneas la búsqueda sigue en milisegundos."""
+        logic, cid = logic_company
+        words = ["cemento", "arena", "varilla", "block", "tubo", "pintura", "cable", "clavo"]
+        with sqlite3.connect(temp_db) as conn:
+            conn.executemany(
+                "INSERT INTO invoice_items (invoice_id, item_code, description, quantity, unit_price)"
+                " VALUES (?, ?, ?, 1, 1)",
+                ((k // 10 + 1, f"MAT{k % 997:05d}", f"{words[k % 8]} {words[k % 7]} {k}") for k in range(30000))
+            )
+            conn.executemany(
+                "INSERT INTO invoices (id, company_id, invoice_type, invoice_date, invoice_number, third_party_name,"
+                " rnc, currency, total_amount) VALUES (?, ?, 'emitida', '2025-01-15', ?, ?, '131246796', 'RD$', 0)",
+                ((n, cid, f"B01{n:08d}", f"Cliente {n % 300}") for n in range(1, 3001))
+            )
+        for text in ("cemento arena", "MAT00042", "B0100001500", "cliente 17"):
+            result = logic.search_documents(text, cid)
+            assert result['total'] > 0
+            assert result['elapsed'] < 0.5, (text, result['elapsed'])
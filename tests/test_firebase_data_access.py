@@ -0,0 +1,261 @@
+"""
+Tests de FirebaseDataAccess contra el Firestore local en memoria.
+"""
+import pytest
+
+from firebase.fake_firestore import FakeFirestore
+from data_access.firebase_data_access import FirebaseDataAccess
+
+
+@pytest.fixture
+def fake_db():
+    return FakeFirestore()
+
+
+@pytest.fixture
+def data_access(fake_db):
+    return FirebaseDataAccess(user_id='tester', db=fake_db)
+
+
+class TestFakeFirestoreQueries:
+    """Tests de las consultas del Firestore local."""
+
+    def test_where_order_limit_offset(self, fake_db):
+        """where, order_by, limit y offset se aplican como en Firestore."""
+        col = fake_db.collection('invoices')
+        for n in range(10):
+            col.document(str(n)).set({'company_id': n % 2, 'total': n})
+        col.document('sin_total').set({'company_id': 0})
+
+        docs = (col.where('company_id', '==', 0)
+                .order_by('total', direction='DESCENDING')
+                .offset(1).limit(2).get())
+        assert [d.get('total') for d in docs] == [6, 4]
+        assert fake_db.stats['rpcs'] == 11 + 1
+
+    def test_missing_field_excluded_from_inequality(self, fake_db):
+        """Los documentos sin el campo no aparecen en filtros de desigualdad."""
+        col = fake_db.collection('items')
+        col.document('a').set({'price': 5})
+        col.document('b').set({'name': 'sin precio'})
+        assert [d.id for d in col.where('price', '>', 0).stream()] == ['a']
+
+    def test_collection_group(self, fake_db):
+        """collection_group recorre subcolecciones con el mismo nombre."""
+        fake_db.collection('invoices').document('1').collection('items').document('0').set({'q': 1})
+        fake_db.collection('quotations').document('2').collection('items').document('0').set({'q': 2})
+        fake_db.collection('items').document('x').set({'q': 3})
+        qs = sorted(d.get('q') for d in fake_db.collection_group('items').where('q', '<', 3).stream())
+        assert qs == [1, 2]
+
+
+class TestFirebaseDataAccessFake:
+    """Tests de FirebaseDataAccess con cliente inyectado."""
+
+    def test_add_and_get_invoice(self, data_access, fake_db):
+        """Encabezado e ítems se escriben en un solo batch y se leen de vuelta."""
+        items = [{'description': 'Cemento', 'quantity': 2, 'unit_price': 500.0},
+                 {'description': 'Arena', 'quantity': 1, 'unit_price': 800.0}]
+        fake_db.reset_stats()
+        invoice_id = data_access.add_invoice({'company_id': 1, 'total_amount': 1800.0}, items)
+        # 1 transacción de IDs (lectura + commit) + 1 batch
+        assert fake_db.stats['commits'] == 2
+
+        invoice = data_access.get_invoice_by_id(invoice_id)
+        assert invoice['total_amount'] == 1800.0
+        assert [i['description'] for i in invoice['items']] == ['Cemento', 'Arena']
+        assert invoice['created_by'] == 'tester'
+
+    def test_get_invoices_filters_by_company(self, data_access):
+        """get_invoices filtra por empresa y pagina."""
+        for n in range(6):
+            data_access.add_invoice({'company_id': 1 + n % 2, 'total_amount': n}, [])
+        assert len(data_access.get_invoices(company_id=1)) == 3
+        assert len(data_access.get_invoices(company_id=1, limit=2)) == 2
+        assert len(data_access.get_invoices(company_id=1, limit=10, offset=2)) == 1
+
+    def test_get_next_ncf_format(self, data_access):
+        """get_next_ncf devuelve NCF bien formados y consecutivos."""
+        assert data_access.get_next_ncf(1, 'B01') == 'B0100000001'
+        assert data_access.get_next_ncf(1, 'B01') == 'B0100000002'
+        assert data_access.get_next_ncf(1, 'E31') == 'E3100000000001'
+
+    def test_update_and_delete_quotation(self, data_access, fake_db):
+        """update_quotation reemplaza los ítems y delete_quotation los elimina."""
+        qid = data_access.add_quotation({'company_id': 1}, [{'description': 'A'}, {'description': 'B'}])
+        data_access.update_quotation(qid, {'company_id': 1, 'notes': 'x'}, [{'description': 'C'}])
+        quotation = data_access.get_quotation_by_id(qid)
+        assert [i['description'] for i in quotation['items']] == ['C']
+
+        data_access.delete_quotation(qid)
+        assert data_access.get_quotation_by_id(qid) is None
+        assert list(fake_db.collection_group('items').stream()) == []
+
+    def test_outbox_writes_are_flushed(self, fake_db, temp_db):
+        """Con outbox las escrituras se encolan y llegan al reconectar."""
+        da = FirebaseDataAccess(user_id='tester', db=fake_db, outbox_path=temp_db)
+        da._get_id_allocator().reserve('invoices', 5)
+        da.set_online(False)
+        invoice_id = da.add_invoice({'company_id': 1, 'total_amount': 10.0}, [{'description': 'X'}])
+        assert da.pending_writes() == 2
+        # Lo encolado se ve en las lecturas aunque no se haya enviado
+        assert fake_db.collection('invoices').document(str(invoice_id)).get().exists is False
+        assert da.get_invoice_by_id(invoice_id)['items'][0]['description'] == 'X'
+        assert [i['id'] for i in da.get_invoices(company_id=1)] == [invoice_id]
+
+        da.set_online(True)
+        da.wait_for_flush(timeout=5)
+        assert da.pending_writes() == 0
+        assert da.get_invoice_by_id(invoice_id)['total_amount'] == 10.0
+
+    def test_pending_overlay_on_reads(self, fake_db, temp_db):
+        """Ediciones, borrados y terceros encolados sin conexión se ven al leer."""
+        da = FirebaseDataAccess(user_id='tester', db=fake_db, outbox_path=temp_db)
+        qid = da.add_quotation({'company_id': 1}, [{'description': 'A'}, {'description': 'B'}])
+        kept = da.add_invoice({'company_id': 1, 'total_amount': 5.0}, [])
+        da.wait_for_flush(timeout=5)
+        da.set_online(False)
+
+        da.update_quotation(qid, {'company_id': 1, 'notes': 'x'}, [{'description': 'C'}])
+        quotation = da.get_quotation_by_id(qid)
+        assert quotation['notes'] == 'x' and [i['description'] for i in quotation['items']] == ['C']
+        assert [i['description'] for i in da.get_quotation_items(qid)] == ['C']
+
+        da.delete_factura(kept)
+        assert da.get_invoice_by_id(kept) is None and da.get_invoices() == []
+
+        da.add_or_update_third_party('101000001', 'Cliente Nuevo')
+        da.add_or_update_third_party('101000001', 'Cliente Renombrado')
+        assert da.get_third_party_by_rnc('101000001')['name'] == 'Cliente Renombrado'
+        assert list(fake_db.collection('third_parties').stream()) == []
+
+        da.set_online(True)
+        da.wait_for_flush(timeout=5)
+        assert da.pending_writes() == 0
+        assert [d.to_dict()['name'] for d in fake_db.collection('third_parties').stream()] == ['Cliente Renombrado']
+        assert [i['description'] for i in da.get_quotation_by_id(qid)['items']] == ['C']
+
+
+class TestFirebaseBenchmark:
+    """Prueba de humo del benchmark (sin red)."""
+
+    def test_benchmark_runs(self, capsys):
+        """El benchmark produce métricas por método."""
+        from scripts.benchmark_firebase import run_benchmarks
+        results = run_benchmarks(latency_ms=0, invoices=20, items_per_invoice=2, repeat=3,
+                                 include_migration=False)
+        by_method = {r['method']: r for r in results}
+        assert by_method['get_invoices(limit=50)']['rpcs_per_call'] == 1
+        assert by_method['add_invoice (outbox)']['rpcs_per_call'] == 0
+        assert by_method['get_next_ncf']['rpcs_per_call'] < 1
+
+
+class TestDeferredDataAccess:
+    """Tests del enrutamiento mientras Firebase se inicializa."""
+
+    @pytest.fixture
+    def sqlite_access(self, temp_db):
+        from logic import LogicController
+        from data_access import SQLiteDataAccess
+        logic = LogicController(temp_db)
+        yield SQLiteDataAccess(logic)
+        logic.conn.close()
+
+    def _deferred(self, sqlite_access, fake_db, ready, **kwargs):
+        from data_access import DeferredDataAccess
+        fake_db.collection('companies').document('1').set({'name': 'Nube', 'rnc': '1'})
+        return DeferredDataAccess(
+            sqlite_access, lambda: FirebaseDataAccess(user_id='tester', db=fake_db), ready, **kwargs
+        )
+
+    def test_routes_to_sqlite_until_ready(self, sqlite_access, fake_db):
+        """Antes de estar listo responde SQLite; después, Firestore."""
+        from concurrent.futures import Future
+        ready = Future()
+        da = self._deferred(sqlite_access, fake_db, ready)
+        notified = []
+        da.add_ready_callback(notified.append)
+
+        assert da.get_all_companies() == []
+        assert da.active is sqlite_access
+
+        ready.set_result(True)
+        assert da.is_ready() and notified == [True]
+        assert [c['name'] for c in da.get_all_companies()] == ['Nube']
+        assert callable(da.set_online)  # métodos propios del backend activo
+
+    def test_stays_on_sqlite_when_unavailable(self, sqlite_access, fake_db):
+        """Si Firebase no queda disponible se sigue con SQLite."""
+        from concurrent.futures import Future
+        ready = Future()
+        da = self._deferred(sqlite_access, fake_db, ready)
+        ready.set_result(False)
+        notified = []
+        da.add_ready_callback(notified.append)
+        assert notified == [False]
+        assert da.active is sqlite_access
+
+    def test_wait_timeout_waits_for_firebase(self, sqlite_access, fake_db):
+        """Con wait_timeout las llamadas esperan a la inicialización."""
+        import threading
+        from concurrent.futures import Future
+        ready = Future()
+        da = self._deferred(sqlite_access, fake_db, ready, wait_timeout=5)
+        threading.Timer(0.05, ready.set_result, args=(True,)).start()
+        assert [c['name'] for c in da.get_all_companies()] == ['Nube']
+
+    def test_writes_wait_for_firebase(self, sqlite_access, fake_db):
+        """Escrituras y NCF pedidos antes de estar listo (fuera de la UI) van a Firestore, nunca a SQLite."""
+        import threading
+        from concurrent.futures import Future, ThreadPoolExecutor
+        ready = Future()
+        da = self._deferred(sqlite_access, fake_db, ready)
+        threading.Timer(0.05, ready.set_result, args=(True,)).start()
+
+        def writes():
+            ncf = da.get_next_ncf(1, 'B01')
+            da.add_or_update_third_party('101000001', 'Cliente')
+            return ncf, da.add_invoice({'company_id': 1, 'total_amount': 10.0}, [])
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            ncf, invoice_id = pool.submit(writes).result(timeout=10)
+        assert ncf == 'B0100000001'
+        assert fake_db.collection('invoices').document(str(invoice_id)).get().exists
+        assert sqlite_access.logic.conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0] == 0
+        assert sqlite_access.logic.search_third_parties('Cliente') == []
+
+    def test_write_times_out_while_initializing(self, sqlite_access, fake_db):
+        """Si Firebase no termina de inicializar, la escritura falla en lugar de ir a SQLite."""
+        from concurrent.futures import Future
+        da = self._deferred(sqlite_access, fake_db, Future(), write_timeout=0.01)
+        with pytest.raises(TimeoutError):
+            da.add_company('Empresa', '101000001')
+        assert sqlite_access.get_all_companies() == []
+
+    def test_ui_thread_never_waits_for_writes(self, sqlite_access, fake_db):
+        """En el hilo de la UI resolver o llamar una escritura no espera a Firebase."""
+        import time
+        from concurrent.futures import Future
+        ready = Future()
+        da = self._deferred(sqlite_access, fake_db, ready)
+        start = time.perf_counter()
+        assert hasattr(da, 'delete_factura') and hasattr(da, 'void_invoice')
+        with pytest.raises(TimeoutError):
+            da.add_invoice({'company_id': 1, 'total_amount': 10.0}, [])
+        with pytest.raises(TimeoutError):
+            da.delete_factura(1)
+        assert time.perf_counter() - start < 0.5
+        assert sqlite_access.logic.conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0] == 0
+
+        ready.set_result(True)
+        assert not hasattr(da, 'void_invoice')  # Firestore no anula facturas
+
+    def test_client_does_not_block(self):
+        """get_firebase_client(wait=False) retorna sin esperar al SDK."""
+        import time
+        from firebase import get_firebase_client
+        start = time.perf_counter()
+        client = get_firebase_client(wait=False)
+        assert time.perf_counter() - start < 0.5
+        assert client.wait_until_ready(timeout=10) in (True, False)
+        assert client.is_ready()
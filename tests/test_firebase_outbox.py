@@ -0,0 +1,168 @@
+"""
+Tests para la cola de escrituras offline (firebase/outbox.py).
+"""
+import sqlite3
+
+from firebase.fake_firestore import FakeFirestore
+from firebase.outbox import FirestoreOutbox, write_ops
+
+
+class OfflineFirestore(FakeFirestore):
+    """Firestore que falla en cada RPC, como sin conexión."""
+
+    def _rpc(self):
+        raise ConnectionError("sin conexión")
+
+
+class LimitedFirestore(FakeFirestore):
+    """Firestore que rechaza batches de más de 500 escrituras, como el real."""
+
+    def batch(self):
+        batch = super().batch()
+        commit = batch.commit
+
+        def checked_commit():
+            assert len(batch._ops) <= 500, f"batch de {len(batch._ops)} escrituras"
+            commit()
+        batch.commit = checked_commit
+        return batch
+
+
+def _doc(db, path):
+    col, doc_id = path.rsplit('/', 1)
+    parts = col.split('/')
+    ref = db.collection(parts[0])
+    for i in range(1, len(parts), 2):
+        ref = ref.document(parts[i]).collection(parts[i + 1])
+    return ref.document(doc_id).get()
+
+
+class TestFirestoreOutbox:
+    """Tests del outbox persistente."""
+
+    def test_enqueue_is_idempotent(self, temp_db):
+        """Encolar dos veces con la misma clave no duplica operaciones."""
+        outbox = FirestoreOutbox(temp_db)
+        ops = [('set', 'invoices/1', {'total': 10}), ('set', 'invoices/1/items/0', {'q': 1})]
+        outbox.enqueue(ops, key='factura-1')
+        outbox.enqueue(ops, key='factura-1')
+        assert outbox.pending_count() == 2
+
+    def test_flush_coalesces_and_preserves_order(self, temp_db):
+        """Las operaciones sobre un mismo documento se compactan en un batch."""
+        db = FakeFirestore()
+        outbox = FirestoreOutbox(temp_db)
+        outbox.enqueue([('set', 'companies/1', {'name': 'A', 'rnc': '1'})])
+        outbox.enqueue([('update', 'companies/1', {'name': 'B'})])
+        outbox.enqueue([('set', 'invoices/5', {'total': 1})])
+        outbox.enqueue([('delete', 'invoices/5', None)])
+
+        stats = outbox.flush(db)
+        assert stats['sent'] == 4
+        assert stats['batches'] == 1
+        assert stats['writes'] == 2
+        assert _doc(db, 'companies/1').to_dict() == {'name': 'B', 'rnc': '1'}
+        assert not _doc(db, 'invoices/5').exists
+        assert outbox.pending_count() == 0
+
+    def test_offline_keeps_queue_until_reconnect(self, temp_db):
+        """Sin conexión las operaciones quedan pendientes y se envían después."""
+        outbox = FirestoreOutbox(temp_db)
+        outbox.enqueue([('set', 'invoices/7', {'total': 118})])
+
+        stats = outbox.flush(OfflineFirestore())
+        assert stats['failed'] == 1
+        assert outbox.pending_count() == 1
+        with sqlite3.connect(temp_db) as conn:
+            attempts, error = conn.execute(
+                "SELECT attempts, last_error FROM firebase_outbox"
+            ).fetchone()
+        assert attempts == 1 and 'sin conexión' in error
+
+        db = FakeFirestore()
+        assert outbox.flush(db)['sent'] == 1
+        assert _doc(db, 'invoices/7').get('total') == 118
+
+    def test_marker_prevents_replay(self, temp_db):
+        """Un tramo ya aplicado en Firestore no se vuelve a enviar."""
+        db = FakeFirestore()
+        outbox = FirestoreOutbox(temp_db)
+        outbox.enqueue([('set', 'companies/2', {'name': 'Original'})])
+        outbox.flush(db)
+
+        # Simular caída antes de marcar como enviado + escritura posterior de otra estación
+        with sqlite3.connect(temp_db) as conn:
+            conn.execute("UPDATE firebase_outbox SET sent_at = NULL")
+        db.collection('companies').document('2').set({'name': 'Editado en otra estación'})
+
+        stats = outbox.flush(db)
+        assert stats['skipped'] == 1
+        assert stats['writes'] == 0
+        assert _doc(db, 'companies/2').get('name') == 'Editado en otra estación'
+
+    def test_purge_removes_remote_and_pending_items(self, temp_db):
+        """'purge' borra los ítems remotos y los encolados en el mismo tramo."""
+        db = FakeFirestore()
+        write_ops(db, [
+            ('set', 'quotations/3', {'total': 1}),
+            ('set', 'quotations/3/items/0', {'q': 1}),
+            ('set', 'quotations/3/items/1', {'q': 2}),
+        ])
+        outbox = FirestoreOutbox(temp_db)
+        outbox.enqueue([('set', 'quotations/3/items/2', {'q': 3})])
+        outbox.enqueue([
+            ('purge', 'quotations/3/items', None),
+            ('delete', 'quotations/3', None),
+        ])
+        outbox.flush(db)
+        assert list(db.collection('quotations').document('3').collection('items').stream()) == []
+        assert not _doc(db, 'quotations/3').exists
+
+    def test_flush_splits_large_queues(self, temp_db):
+        """Colas grandes se envían en varios batches de hasta 450 operaciones."""
+        db = FakeFirestore()
+        outbox = FirestoreOutbox(temp_db)
+        outbox.enqueue([('set', f'items/{i}', {'code': f'C{i}'}) for i in range(1000)])
+        stats = outbox.flush(db)
+        assert stats['sent'] == 1000
+        assert stats['batches'] == 3
+        assert len(list(db.collection('items').stream())) == 1000
+
+    def test_purge_expansion_respects_batch_limit(self, temp_db):
+        """Un 'purge' que se expande a cientos de borrados se parte en varios batches."""
+        db = LimitedFirestore()
+        write_ops(db, [('set', f'invoices/9/items/{i}', {'q': i}) for i in range(600)])
+        outbox = FirestoreOutbox(temp_db)
+        outbox.enqueue([('purge', 'invoices/9/items', None), ('set', 'invoices/9', {'total': 0})])
+        stats = outbox.flush(db)
+        assert stats['sent'] == 2 and stats['writes'] == 601
+        assert stats['batches'] == 2
+        assert list(db.collection('invoices').document('9').collection('items').stream()) == []
+        assert outbox.pending_count() == 0
+
+    def test_failing_op_goes_to_dead_letter(self, temp_db):
+        """Una operación que siempre falla no bloquea la cola: tras max_attempts pasa al dead letter."""
+        db = FakeFirestore()
+        outbox = FirestoreOutbox(temp_db, max_attempts=2)
+        outbox.enqueue([('set', 'companies/1', {'name': 'A'})])
+        outbox.enqueue([('update', 'companies/404', {'name': 'No existe'})])
+        outbox.enqueue([('set', 'companies/3', {'name': 'C'})])
+
+        stats = outbox.flush(db)
+        assert stats['sent'] == 1 and stats['dead'] == 0
+        assert _doc(db, 'companies/1').exists
+        assert outbox.pending_count() == 2  # el orden se respeta mientras queden intentos
+
+        stats = outbox.flush(db)
+        assert stats['dead'] == 1 and stats['sent'] == 1
+        assert _doc(db, 'companies/3').get('name') == 'C'
+        assert outbox.pending_count() == 0
+        dead = outbox.dead_letters()
+        assert [(d['path'], d['attempts']) for d in dead] == [('companies/404', 2)]
+        assert 'No existe el documento' in dead[0]['last_error']
+
+        db.collection('companies').document('404').set({'name': 'Creada'})
+        assert outbox.retry_dead_letters() == 1
+        outbox.flush(db)
+        assert _doc(db, 'companies/404').get('name') == 'No existe'
+        assert outbox.dead_letters() == []
@@ -0,0 +1,58 @@
+"""
+Tests para id_allocator.py usando el Firestore local en memoria.
+"""
+import threading
+
+from firebase.fake_firestore import FakeFirestore
+from firebase.id_allocator import DocumentIdAllocator, ID_FLOOR
+
+
+class TestDocumentIdAllocator:
+    """Tests del asignador de IDs por rangos."""
+
+    def test_ids_above_floor_and_cached(self):
+        """Los IDs superan el piso y salen de memoria tras la primera reserva."""
+        db = FakeFirestore()
+        alloc = DocumentIdAllocator(db, block_size=10, num_shards=4)
+        first = alloc.next_id('invoices')
+        assert first >= ID_FLOOR
+        assert alloc.cached('invoices') == 9
+        ids = [alloc.next_id('invoices') for _ in range(9)]
+        assert ids == list(range(first + 1, first + 10))
+        assert db.stats['transactions'] == 1
+
+    def test_bulk_allocation_single_transaction(self):
+        """Reservar miles de IDs cuesta una sola transacción."""
+        db = FakeFirestore()
+        alloc = DocumentIdAllocator(db, block_size=100, num_shards=4)
+        ids = alloc.allocate('quotations', 2500)
+        assert len(set(ids)) == 2500
+        assert db.stats['transactions'] == 1
+        assert db.stats['reads'] == 1
+
+    def test_collections_are_independent(self):
+        """Cada colección usa sus propios contadores."""
+        db = FakeFirestore()
+        alloc = DocumentIdAllocator(db, block_size=5, num_shards=1)
+        assert alloc.next_id('invoices') == ID_FLOOR
+        assert alloc.next_id('quotations') == ID_FLOOR
+
+    def test_parallel_processes_never_collide(self):
+        """Varios procesos (asignadores) en paralelo no repiten IDs."""
+        db = FakeFirestore(latency=0.0005)
+        allocators = [DocumentIdAllocator(db, block_size=20, num_shards=4) for _ in range(6)]
+        out = []
+        lock = threading.Lock()
+
+        def worker(alloc):
+            local = [alloc.next_id('invoices') for _ in range(150)]
+            with lock:
+                out.extend(local)
+
+        threads = [threading.Thread(target=worker, args=(a,)) for a in allocators]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(out) == 900
+        assert len(set(out)) == 900
@@ -0,0 +1,82 @@
+"""
+Tests para el índice de trigramas de ítems (services/item_trigram_service.py, migración 18).
+"""
+import sqlite3
+import time
+
+from services.unit_resolver import UnitResolver
+from utils.text_keys import fold_key
+
+CATALOG = [
+    ("CEM-01", "Cemento Gris Portland 42.5kg", "FUNDA"),
+    ("CEM-02", "Cemento Blanco", "FUNDA"),
+    ("VAR-38", "Varilla Corrugada 3/8", "QQ"),
+    ("TUB-PVC", "Tubo PVC Presión 1/2\"", "UND"),
+    ("PLY-34", "Plywood 3/4 Fenólico", "PLANCHA"),
+]
+
+
+def _add_items(db_path, rows):
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany("INSERT INTO items (code, name, unit, cost, price) VALUES (?, ?, ?, 0, 0)", rows)
+
+
+class TestItemTrigrams:
+    """Tests de similitud por trigramas, mantenimiento incremental y resolución de unidades."""
+
+    def test_similar_tolerates_typos_and_accents(self, temp_db, logic_company):
+        """Errores de tipeo, acentos y mayúsculas llevan al ítem correcto, más parecido primero."""
+        logic, _ = logic_company
+        _add_items(temp_db, CATALOG)
+        assert fold_key("Presión  1/2\"") == "PRESION 1 2"
+
+        top = logic.get_items_similar("cemnto gris portlan")
+        assert top[0]['code'] == "CEM-01" and 0.3 <= top[0]['similarity'] < 1
+        assert logic.get_items_similar("TUBO PVC PRESION 1/2")[0]['code'] == "TUB-PVC"
+        assert logic.get_items_similar("plywod fenolico 3/4")[0]['code'] == "PLY-34"
+        assert [r['code'] for r in logic.get_items_similar("cemento", limit=2, threshold=0.1)] == ["CEM-02", "CEM-01"]
+        assert logic.get_items_similar("arena lavada") == []
+        assert logic.get_items_similar("  --  ") == []
+
+    def test_index_follows_catalog_changes(self, temp_db, logic_company):
+        """Altas, renombres y bajas hechas por cualquier conexión se reflejan en la próxima búsqueda."""
+        logic, _ = logic_company
+        _add_items(temp_db, CATALOG)
+        assert logic.get_items_similar("block 6 pulgadas") == []
+        _add_items(temp_db, [("BLK-6", "Block de 6 pulgadas", "UND")])
+        assert logic.get_items_similar("blok 6 pulgadas")[0]['code'] == "BLK-6"
+
+        with sqlite3.connect(temp_db) as conn:
+            conn.execute("UPDATE items SET name = 'Bloque hueco 8 pulgadas' WHERE code = 'BLK-6'")
+            conn.execute("DELETE FROM items WHERE code = 'CEM-02'")
+        assert logic.get_items_similar("block de 6 pulgadas", threshold=0.6) == []
+        assert logic.get_items_similar("bloque hueco 8")[0]['code'] == "BLK-6"
+        assert [r['code'] for r in logic.get_items_similar("cemento blanco", threshold=0.1)] == ["CEM-01"]
+        with sqlite3.connect(temp_db) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM item_trigram_queue").fetchone()[0] == 0
+            orphan = conn.execute("SELECT COUNT(*) FROM item_trigrams WHERE item_id NOT IN "
+                                  "(SELECT id FROM items)").fetchone()[0]
+            assert orphan == 0
+
+    def test_unit_resolver_uses_similarity(self, temp_db, logic_company):
+        """UnitResolver toma la unidad del ítem parecido; sin uno claro cae en la unidad por defecto."""
+        logic, _ = logic_company
+        _add_items(temp_db, CATALOG)
+        resolver = UnitResolver(logic)
+        assert resolver.resolve_unit(None, "Varila corrugada 3/8") == "QQ"
+        assert resolver.resolve_unit("", "cemento gris portland 42,5 kg") == "FUNDA"
+        assert resolver.resolve_unit("", "Servicio de transporte") == UnitResolver.DEFAULT_UNIT
+
+    def test_similar_is_fast_on_large_catalog(self, temp_db, logic_company):
+        """Con 20.000 ítems cada consulta top-k sigue en pocos milisegundos."""
+        logic, _ = logic_company
+        words = ["cemento", "varilla", "tubo", "codo", "llave", "pintura", "cable", "clavo", "malla", "yeso"]
+        _add_items(temp_db, [(f"MAT{n:05d}", f"{words[n % 10]} {words[n // 10 % 10]} modelo {n:05d}", "UND")
+                             for n in range(20000)])
+        logic.get_items_similar("warm up")  # procesa la cola
+        queries = [f"{words[n % 10][:-1]} {words[n // 10 % 10]} modelo {n:05d}" for n in range(0, 20000, 400)]
+        t0 = time.perf_counter()
+        for n, query in zip(range(0, 20000, 400), queries):
+            assert logic.get_items_similar(query, limit=3)[0]['code'] == f"MAT{n:05d}"
+        per_query = (time.perf_counter() - t0) / len(queries)
+        assert per_query < 0.05, per_query
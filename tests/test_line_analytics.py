@@ -0,0 +1,89 @@
+"""
+Tests para las agregaciones de líneas de factura (services/line_analytics_service.py).
+"""
+import pytest
+
+from services.line_analytics_service import LineAnalyticsService
+
+
+def _build(logic_company):
+    logic, cid = logic_company
+    logic.conn.executemany(
+        "INSERT INTO items (code, name, unit, cost, price) VALUES (?, ?, 'UND', ?, 0)",
+        [("MAT1", "Cemento", 300.0), ("MAT2", "Arena", 0.5)]
+    )
+    invoices = [
+        # (fecha, rnc, itbis, líneas[(código, cantidad, precio)])
+        ("2025-01-10", "131246796", 144.19, [("MAT1", 2, 400.0), ("MAT2", 10.5, 0.1)]),
+        ("2025-02-10", "101010101", 999.0, [("MAT1", 1, 400.0)]),       # ITBIS incorrecto
+        ("2025-02-20", "131246796", 0.0, [("SERV", 3, 33.335)]),         # exenta, sin catálogo
+    ]
+    for n, (date, rnc, itbis, lines) in enumerate(invoices, start=1):
+        cur = logic.conn.execute(
+            "INSERT INTO invoices (company_id, invoice_type, invoice_date, invoice_number, rnc, currency,"
+            " itbis, total_amount, total_amount_rd) VALUES (?, 'emitida', ?, ?, ?, 'RD$', ?, 0, 0)",
+            (cid, date, f"B01{n:08d}", rnc, itbis)
+        )
+        logic.conn.executemany(
+            "INSERT INTO invoice_items (invoice_id, item_code, description, quantity, unit_price)"
+            " VALUES (?, ?, ?, ?, ?)",
+            [(cur.lastrowid, code, code, q, p) for code, q, p in lines]
+        )
+    logic.conn.commit()
+    return logic, cid
+
+
+class TestLineAnalytics:
+    """Tests de agrupación, margen, auditoría de ITBIS y caché."""
+
+    @pytest.mark.parametrize("use_numpy", [False, True])
+    def test_aggregate_by_item_client_month(self, temp_db, logic_company, use_numpy):
+        """Los dos motores agrupan igual con redondeo por línea a centavos."""
+        if use_numpy:
+            pytest.importorskip("numpy")
+        logic, cid = _build(logic_company)
+        svc = LineAnalyticsService(temp_db, chunk_size=2, use_numpy=use_numpy)
+
+        by_item = {r['key']: r for r in svc.aggregate('item_code', cid)}
+        assert by_item['MAT1']['quantity'] == 3 and by_item['MAT1']['revenue'] == 1200.0
+        assert by_item['MAT1']['cost'] == 900.0 and by_item['MAT1']['margin'] == 300.0
+        assert by_item['MAT2']['revenue'] == 1.05 and by_item['MAT2']['cost'] == 5.25
+        assert by_item['SERV']['revenue'] == 100.01 and by_item['SERV']['cost'] == 0
+        assert [r['key'] for r in svc.top_items(cid, limit=2)] == ['MAT1', 'SERV']
+
+        by_client = {r['key']: r['revenue'] for r in svc.aggregate('client', cid)}
+        assert by_client == {'131246796': 901.06, '101010101': 400.0}
+        by_month = {r['key']: r['lines'] for r in svc.aggregate('month', cid, start_date='2025-02-01')}
+        assert by_month == {'2025-02': 2}
+
+    @pytest.mark.parametrize("use_numpy", [False, True])
+    def test_itbis_audit(self, temp_db, logic_company, use_numpy):
+        """Sólo se reporta la factura con ITBIS distinto al 18% de sus líneas."""
+        if use_numpy:
+            pytest.importorskip("numpy")
+        logic, cid = _build(logic_company)
+        svc = LineAnalyticsService(temp_db, use_numpy=use_numpy)
+        audit = svc.itbis_audit(cid)
+        assert len(audit) == 1
+        assert audit[0]['invoice_number'] == "B0100000002"
+        assert audit[0]['expected'] == 72.0 and audit[0]['diff'] == 927.0
+
+    def test_cache_follows_change_log(self, temp_db, logic_company):
+        """Repetir la consulta usa la caché hasta que cambia una tabla registrada."""
+        logic, cid = _build(logic_company)
+        svc = LineAnalyticsService(temp_db)
+        first = svc.aggregate('item_code', cid)
+        assert svc.aggregate('item_code', cid) is first
+        assert (svc.stats['hits'], svc.stats['misses']) == (1, 1)
+        # Otra agrupación con los mismos datos no vuelve a leer las líneas
+        svc.aggregate('month', cid)
+        assert svc.stats['loads'] == (1 if svc.use_numpy else 0)
+
+        logic.conn.execute("UPDATE items SET cost = 0 WHERE code = 'MAT1'")
+        logic.conn.commit()
+        by_item = {r['key']: r for r in svc.aggregate('item_code', cid)}
+        assert by_item['MAT1']['cost'] == 0
+        assert svc.stats['misses'] == 3
+
+        with pytest.raises(ValueError):
+            svc.aggregate('vendedor', cid)
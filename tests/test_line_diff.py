@@ -0,0 +1,114 @@
+"""
+Tests para la edición de líneas por diferencias (utils/line_diff.py y
+update_invoice/update_quotation).
+"""
+from logic import LogicController
+from utils.line_diff import diff_lines
+
+
+def _lines(n):
+    return [{'code': f'P{i:03d}', 'description': f'Producto {i}', 'quantity': 1, 'unit_price': 100.0 + i}
+            for i in range(n)]
+
+
+def _writes(statements, table):
+    """Sentencias de escritura distintas sobre `table` capturadas con set_trace_callback."""
+    out = []
+    for s in dict.fromkeys(statements):
+        words = s.split()
+        verb = words[0].upper() if words else ''
+        # Tabla destino: UPDATE t / INSERT INTO t / DELETE FROM t (no las de subconsultas)
+        target = words[1] if verb == 'UPDATE' else words[2] if verb in ('INSERT', 'DELETE') and len(words) > 2 else ''
+        if target.split('(')[0] == table:
+            out.append(verb)
+    return out
+
+
+class TestLineDiff:
+    """Tests del diff de líneas y de su aplicación al guardar."""
+
+    def _setup(self, temp_db, sample_invoice_data, n=10):
+        logic = LogicController(temp_db)
+        logic.add_company("Test Company", "123456789")
+        invoice_id = logic.add_invoice(sample_invoice_data, _lines(n))
+        return logic, invoice_id
+
+    def test_single_price_change_is_one_update(self, temp_db, sample_invoice_data):
+        """Cambiar un precio en una factura de 10 líneas emite un solo UPDATE y conserva los ids."""
+        logic, invoice_id = self._setup(temp_db, sample_invoice_data)
+        items = logic.get_invoice_items(invoice_id)
+        ids = [it['id'] for it in items]
+        items[4]['unit_price'] = 999.0
+
+        statements = []
+        logic.conn.set_trace_callback(statements.append)
+        logic.update_invoice(invoice_id, sample_invoice_data, items)
+        logic.conn.set_trace_callback(None)
+
+        assert _writes(statements, 'invoice_items') == ['UPDATE']
+        after = logic.get_invoice_items(invoice_id)
+        assert [it['id'] for it in after] == ids
+        assert after[4]['unit_price'] == 999.0
+
+        entry = logic.audit_service.get_audit_trail(entity_type='invoice', entity_id=invoice_id)[0]
+        lines = entry['payload_after']['lines']
+        assert lines['added'] == [] and lines['removed'] == []
+        assert lines['updated'] == [{'id': ids[4], 'changes': {'unit_price': [104.0, 999.0]}}]
+        logic.close()
+
+    def test_insert_and_delete_keep_order(self, temp_db, sample_invoice_data):
+        """Insertar en medio y borrar una línea respeta el orden; la fila libre se reusa."""
+        logic, invoice_id = self._setup(temp_db, sample_invoice_data, n=4)
+        items = logic.get_invoice_items(invoice_id)
+        ids = [it['id'] for it in items]
+        new = {'code': 'NEW', 'description': 'Nueva', 'quantity': 2, 'unit_price': 50.0}
+        edited = [items[0], new, items[1], items[3]]
+
+        statements = []
+        logic.conn.set_trace_callback(statements.append)
+        logic.update_invoice(invoice_id, sample_invoice_data, edited)
+        logic.conn.set_trace_callback(None)
+
+        # P001 sólo cambia de posición; la fila de P002 pasa a ser la nueva línea
+        assert _writes(statements, 'invoice_items') == ['UPDATE', 'UPDATE']
+        after = logic.get_invoice_items(invoice_id)
+        assert [it['code'] for it in after] == ['P000', 'NEW', 'P001', 'P003']
+        assert [it['id'] for it in after] == [ids[0], ids[2], ids[1], ids[3]]
+        logic.close()
+
+    def test_lines_without_ids_match_by_content(self):
+        """Sin ids (p. ej. de la UI antigua), las líneas idénticas no generan escrituras."""
+        existing = [{'id': 10 + i, 'line_no': i + 1, 'item_code': f'C{i}', 'description': 'd',
+                     'quantity': 1.0, 'unit_price': 5.0, 'unit': None} for i in range(3)]
+        new = [{k: v for k, v in row.items() if k not in ('id', 'line_no')} for row in existing]
+        diff = diff_lines(existing, new)
+        assert not diff.changed and diff.unchanged == 3
+
+        new[1]['quantity'] = 3.0
+        diff = diff_lines(existing, new[:2])
+        assert diff.summary() == {'inserted': 0, 'updated': 1, 'deleted': 1, 'unchanged': 1}
+        assert [row_id for row_id, _ in diff.updates] == [11]
+        assert diff.deletes == [12]
+
+    def test_update_quotation_diffs_and_audits(self, temp_db):
+        """update_quotation aplica el diff y deja la traza de líneas en auditoría."""
+        logic = LogicController(temp_db)
+        logic.add_company("Test Company", "123456789")
+        quotation = {'company_id': 1, 'quotation_date': '2025-01-15', 'client_name': 'Cliente',
+                     'client_rnc': '', 'currency': 'RD$', 'total_amount': 400.0}
+        quotation_id = logic.add_quotation(quotation, _lines(3))
+        items = logic.get_quotation_items(quotation_id)
+        items[0]['quantity'] = 5
+
+        statements = []
+        logic.conn.set_trace_callback(statements.append)
+        logic.update_quotation(quotation_id, quotation, items[:2])
+        logic.conn.set_trace_callback(None)
+
+        assert sorted(_writes(statements, 'quotation_items')) == ['DELETE', 'UPDATE']
+        after = logic.get_quotation_items(quotation_id)
+        assert [it['id'] for it in after] == [items[0]['id'], items[1]['id']]
+        assert after[0]['quantity'] == 5.0
+        trail = logic.audit_service.get_audit_trail(entity_type='quotation', entity_id=quotation_id)
+        assert trail[0]['payload_after']['lines']['removed'][0]['id'] == items[2]['id']
+        logic.close()
@@ -0,0 +1,249 @@
+"""
+Tests para la cola de envío masivo de emails (utils/mail_outbox.py).
+
+Se usa un servidor SMTP local mínimo (sin red externa) que cuenta
+conexiones, logins y mensajes, y que puede rechazar mensajes a pedido.
+"""
+import base64
+import socketserver
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from utils.mail_outbox import EmailOutbox
+from utils.mail_utils import SMTPConnectionPool
+
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    """Servidor SMTP de prueba: EHLO, AUTH PLAIN, MAIL, RCPT, DATA, RSET, NOOP, QUIT."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _SMTPHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.logins = 0
+        self.messages = []
+        self.replies = {}  # destinatario -> [respuestas a DATA, en orden]
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def config(self):
+        return {
+            'smtp_host': '127.0.0.1', 'smtp_port': self.server_address[1],
+            'smtp_user': 'facturas@empresa.do', 'smtp_password': 'secreto',
+            'use_tls': False, 'from_email': 'facturas@empresa.do',
+        }
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        srv = self.server
+        with srv.lock:
+            srv.connections += 1
+        self._reply("220 local ESMTP")
+        rcpt = None
+        while True:
+            line = self.rfile.readline().decode().rstrip("\r\n")
+            if not line:
+                return
+            cmd = line.split(" ", 1)[0].upper()
+            if cmd == "EHLO":
+                self._reply("250-local")
+                self._reply("250 AUTH PLAIN")
+            elif cmd == "AUTH":
+                user = base64.b64decode(line.split()[2]).split(b"\0")[1].decode()
+                with srv.lock:
+                    srv.logins += 1
+                self._reply("235 OK" if user == 'facturas@empresa.do' else "535 credenciales")
+            elif cmd == "MAIL":
+                self._reply("250 OK")
+            elif cmd == "RCPT":
+                rcpt = line.split(":", 1)[1].strip("<> ")
+                self._reply("250 OK")
+            elif cmd == "DATA":
+                self._reply("354 fin con .")
+                data = []
+                while True:
+                    chunk = self.rfile.readline().decode()
+                    if chunk.rstrip("\r\n") == ".":
+                        break
+                    data.append(chunk)
+                with srv.lock:
+                    queued = srv.replies.get(rcpt) or []
+                    reply = queued.pop(0) if queued else "250 aceptado"
+                    if reply.startswith("250"):
+                        srv.messages.append((rcpt, "".join(data)))
+                self._reply(reply)
+            elif cmd in ("RSET", "NOOP"):
+                self._reply("250 OK")
+            elif cmd == "QUIT":
+                self._reply("221 adiós")
+                return
+            else:
+                self._reply("502 no implementado")
+
+
+@pytest.fixture
+def smtp_server():
+    server = LocalSMTPServer()
+    yield server
+    server.stop()
+
+
+def _period_invoices(logic_company, count=12):
+    logic, cid = logic_company
+    for n in range(1, count + 1):
+        rnc = f"1300000{n:02d}"
+        logic.add_or_update_third_party(rnc, f"Cliente {n}", f"cliente{n}@correo.do" if n != 3 else None)
+        logic.conn.execute("""
+            INSERT INTO invoices (company_id, invoice_type, invoice_date, invoice_number, rnc,
+                                  third_party_name, currency, itbis, total_amount, total_amount_rd)
+            VALUES (?, 'emitida', ?, ?, ?, ?, 'RD$', 18, 118, 118)
+        """, (cid, f"2025-01-{n:02d}", f"B01{n:08d}", rnc, f"Cliente {n}"))
+    # Fuera del período
+    logic.conn.execute("""
+        INSERT INTO invoices (company_id, invoice_type, invoice_date, invoice_number, rnc, currency, total_amount)
+        VALUES (?, 'emitida', '2025-02-01', 'B0100000099', '130000001', 'RD$', 50)
+    """, (cid,))
+    logic.conn.commit()
+    return logic, cid
+
+
+class TestEmailOutbox:
+    """Tests del envío masivo con pool de conexiones, reintentos y logs por tanda."""
+
+    def test_period_bulk_send_reuses_connections(self, temp_db, logic_company, smtp_server, tmp_path):
+        """Las facturas del período salen con una conexión (y un login) por hilo, no por mensaje."""
+        logic, cid = _period_invoices(logic_company)
+        pdf = tmp_path / "factura.pdf"
+        pdf.write_bytes(b"%PDF-1.4 prueba")
+        outbox = logic.get_email_outbox(config=smtp_server.config, workers=2, rate_per_second=0, batch_size=5)
+
+        result = logic.queue_period_invoice_emails(
+            cid, "2025-01-01", "2025-02-01",
+            recipients={"130000003": "compras@cliente3.do"},
+            attachment_for=lambda inv: str(pdf)
+        )
+        assert result == {'queued': 12, 'duplicates': 0, 'missing_email': []}
+        # Repetir el encolado del mismo período no duplica
+        assert logic.queue_period_invoice_emails(cid, "2025-01-01", "2025-02-01")['queued'] == 0
+
+        stats = logic.send_queued_emails()
+        assert stats['sent'] == 12 and stats['failed'] == 0
+        assert smtp_server.connections <= 2 and smtp_server.logins == smtp_server.connections
+        assert stats['connections'] == smtp_server.connections
+        recipients = sorted(r for r, _ in smtp_server.messages)
+        assert "compras@cliente3.do" in recipients and len(recipients) == 12
+        assert all("factura.pdf" in body for _, body in smtp_server.messages)
+
+        assert outbox.status_counts() == {'sent': 12}
+        with sqlite3.connect(temp_db) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM email_logs WHERE status = 'sent'").fetchone()[0] == 12
+
+    def test_requeue_skips_attachments_of_queued_invoices(self, logic_company, smtp_server):
+        """Repetir el período no vuelve a generar adjuntos; los nuevos reciben sus líneas."""
+        logic, cid = _period_invoices(logic_company, count=3)
+        logic.get_email_outbox(config=smtp_server.config, rate_per_second=0)
+        first_id = logic.conn.execute("SELECT MIN(id) FROM invoices").fetchone()[0]
+        logic.conn.execute("""
+            INSERT INTO invoice_items (invoice_id, item_code, description, quantity, unit_price)
+            VALUES (?, 'A1', 'Cemento', 2, 50)
+        """, (first_id,))
+        logic.conn.commit()
+        seen = []
+
+        def attachment_for(inv):
+            seen.append(inv)
+            return None
+
+        assert logic.queue_period_invoice_emails(cid, "2025-01-01", "2025-02-01", attachment_for=attachment_for)['queued'] == 2
+        assert len(seen) == 2
+        lines = next(inv['items'] for inv in seen if inv['id'] == first_id)
+        assert [(l['code'], l['quantity'], l['unit_price']) for l in lines] == [('A1', 2, 50)]
+
+        seen.clear()
+        result = logic.queue_period_invoice_emails(cid, "2025-01-01", "2025-02-01", attachment_for=attachment_for)
+        assert result == {'queued': 0, 'duplicates': 2, 'missing_email': ['B0100000003']}
+        assert seen == []
+
+    def test_transient_errors_retry_with_backoff(self, temp_db, smtp_server):
+        """Un 4xx se reintenta después de la espera; un 5xx falla sin reintentos."""
+        outbox = EmailOutbox(temp_db, smtp_server.config, workers=1, rate_per_second=0, backoff_base=0)
+        smtp_server.replies = {
+            "ocupado@correo.do": ["451 intente luego", "451 intente luego"],
+            "noexiste@correo.do": ["550 buzón inexistente"],
+        }
+        for to in ("ok@correo.do", "ocupado@correo.do", "noexiste@correo.do"):
+            outbox.enqueue(to, "Factura", "<p>x</p>", invoice_id=1)
+
+        assert outbox.process() == {'sent': 1, 'retry': 1, 'failed': 1, 'connections': 1}
+        assert outbox.process()['retry'] == 1
+        assert outbox.process()['sent'] == 1
+        assert outbox.status_counts() == {'failed': 1, 'sent': 2}
+
+        with sqlite3.connect(temp_db) as conn:
+            attempts = dict(conn.execute("SELECT to_email, attempts FROM email_outbox"))
+        assert attempts["ocupado@correo.do"] == 3
+        assert outbox.service.get_email_logs(invoice_id=1)[0]['status'] in ('sent', 'failed')
+
+        outbox.backoff_base = 3600
+        smtp_server.replies = {"ocupado2@correo.do": ["421 cerrando"]}
+        outbox.enqueue("ocupado2@correo.do", "Factura", "<p>x</p>")
+        assert outbox.process()['retry'] == 1
+        assert outbox.process()['sent'] == 0  # Aún no vence la espera
+        assert outbox.pending_count() == 1
+
+    def test_process_until_done_waits_for_retries_and_cleans_attachments(self, temp_db, smtp_server, tmp_path):
+        """Los reintentos que vencen dentro del plazo se envían; la carpeta de adjuntos se borra al final."""
+        pdf_dir = tmp_path / "pdfs"
+        pdf_dir.mkdir()
+        (pdf_dir / "f1.pdf").write_bytes(b"%PDF-1.4 uno")
+        (pdf_dir / "f2.pdf").write_bytes(b"%PDF-1.4 dos")
+        outbox = EmailOutbox(temp_db, smtp_server.config, workers=1, rate_per_second=0, backoff_base=0.2)
+        smtp_server.replies = {"ocupado@correo.do": ["451 intente luego"]}
+        outbox.enqueue("ok@correo.do", "Factura 1", "<p>x</p>", attachments=[str(pdf_dir / "f1.pdf")])
+        outbox.enqueue("ocupado@correo.do", "Factura 2", "<p>x</p>", attachments=[str(pdf_dir / "f2.pdf")])
+        outbox.register_temp_dir(str(pdf_dir))
+
+        assert outbox.process()['retry'] == 1
+        assert pdf_dir.exists()  # el reintento todavía necesita f2.pdf
+
+        stats = outbox.process_until_done(max_wait=10)
+        assert stats['sent'] == 1 and stats['retry'] == 0 and stats['next_attempt_at'] is None
+        assert outbox.status_counts() == {'sent': 2}
+        assert not pdf_dir.exists()
+
+        outbox.backoff_base = 3600
+        smtp_server.replies = {"tarde@correo.do": ["421 cerrando"]}
+        outbox.enqueue("tarde@correo.do", "Factura 3", "<p>x</p>")
+        stats = outbox.process_until_done(max_wait=1)
+        assert stats['retry'] == 1 and stats['next_attempt_at'] > time.time() + 3000
+
+    def test_pool_recovers_from_dropped_connection(self, smtp_server):
+        """Una conexión ociosa que ya no responde se descarta y se abre otra."""
+        pool = SMTPConnectionPool(smtp_server.config, size=1, idle_check=0)
+        with pool.connection() as server:
+            server.noop()
+        with pool.connection() as server:
+            assert pool.stats['reused'] == 1
+            server.close()  # p. ej. el servidor cortó por inactividad
+        with pool.connection() as server:
+            assert server.noop()[0] == 250
+        with pytest.raises(OSError):
+            with pool.connection() as server:
+                raise OSError("conexión perdida")
+        pool.close()
+        assert pool.stats == {'connections': 2, 'reused': 2, 'discarded': 2}
+        assert smtp_server.logins == 2
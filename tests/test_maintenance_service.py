@@ -0,0 +1,113 @@
+"""
+Tests para el mantenimiento de la base (services/maintenance_service.py).
+"""
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from services.maintenance_service import MaintenanceScheduler, MaintenanceService
+
+
+def _fragment(logic, cid, rows=3000, drop_insert_triggers=None):
+    """Inserta y borra muchas líneas para dejar páginas libres."""
+    if drop_insert_triggers:
+        drop_insert_triggers(logic.conn, "invoice_items")
+    logic.conn.execute("""
+        INSERT INTO invoices (id, company_id, invoice_type, invoice_date, invoice_number, currency, total_amount)
+        VALUES (1, ?, 'emitida', '2025-01-15', 'B0100000001', 'RD$', 100)
+    """, (cid,))
+    logic.conn.executemany(
+        "INSERT INTO invoice_items (invoice_id, description, quantity, unit_price) VALUES (1, ?, 1, 1)",
+        [("x" * 200,) for _ in range(rows)]
+    )
+    logic.conn.commit()
+    logic.conn.execute("DELETE FROM invoice_items")
+    logic.conn.commit()
+
+
+@pytest.fixture
+def legacy_db(temp_db):
+    """Base creada sin auto_vacuum, como las anteriores a la migración; pedirlo antes de logic_company."""
+    with sqlite3.connect(temp_db) as conn:
+        conn.execute("CREATE TABLE companies (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL,"
+                     " rnc TEXT UNIQUE NOT NULL)")
+
+
+class TestMaintenanceService:
+    """Tests de tareas, registro, salud y programador en reposo."""
+
+    @pytest.mark.slow
+    def test_new_db_runs_due_tasks_and_logs(self, temp_db, logic_company, drop_insert_triggers):
+        """Una base nueva ya es INCREMENTAL; el vacuum devuelve las páginas libres."""
+        logic, cid = logic_company
+        _fragment(logic, cid, drop_insert_triggers=drop_insert_triggers)
+        svc = MaintenanceService(temp_db)
+        assert svc.health_report()['auto_vacuum'] == 'INCREMENTAL'
+        assert svc.due_tasks() == ['optimize', 'prune_change_log', 'incremental_vacuum', 'analyze', 'integrity']
+
+        results = {r['task']: r for r in svc.run_due()}
+        vacuum = results['incremental_vacuum']
+        assert vacuum['free_pages_after'] < vacuum['free_pages_before']
+        assert vacuum['bytes_after'] < vacuum['bytes_before']
+        assert results['integrity']['result'] == 'ok'
+        with sqlite3.connect(temp_db) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM sqlite_stat1").fetchone()[0] > 0
+
+        # Recién ejecutadas: nada vence hasta que pase el intervalo
+        assert svc.due_tasks() == []
+        assert 'analyze' in svc.due_tasks(now=datetime.now() + timedelta(days=8))
+        assert set(svc.last_runs()) == set(results)
+
+    def test_legacy_db_switches_to_incremental(self, temp_db, legacy_db, logic_company):
+        """Una base creada sin auto_vacuum se convierte una sola vez con VACUUM."""
+        logic, cid = logic_company
+        svc = MaintenanceService(temp_db)
+        assert svc.health_report()['auto_vacuum'] == 'NONE'
+        assert svc.due_tasks()[0] == 'enable_incremental'
+
+        assert svc.run_task('enable_incremental')['result'] == 'ok'
+        assert svc.health_report()['auto_vacuum'] == 'INCREMENTAL'
+        assert 'enable_incremental' not in svc.due_tasks(now=datetime.now() + timedelta(days=30))
+
+    def test_large_legacy_db_converts_only_on_request(self, temp_db, legacy_db, logic_company, monkeypatch):
+        """En reposo no se hace el VACUUM completo de una base grande; a pedido sí."""
+        logic, cid = logic_company
+        monkeypatch.setattr("services.maintenance_service.ENABLE_INCREMENTAL_MAX_BYTES", 0)
+        svc = MaintenanceService(temp_db)
+        assert 'enable_incremental' not in svc.due_tasks()
+        assert all(r['task'] != 'enable_incremental' for r in svc.run_due())
+        assert svc.health_report()['auto_vacuum'] == 'NONE'
+
+        assert svc.due_tasks(explicit=True) == ['enable_incremental']
+        assert svc.run_due(explicit=True)[0]['task'] == 'enable_incremental'
+        assert svc.health_report()['auto_vacuum'] == 'INCREMENTAL'
+
+    def test_health_report_sizes(self, temp_db, logic_company):
+        """El panel lista tablas e índices con su tamaño (dbstat)."""
+        logic, cid = logic_company
+        _fragment(logic, cid, rows=500)
+        report = MaintenanceService(temp_db).health_report()
+        objects = {o['name']: o for o in report['objects']}
+        assert objects['invoices']['type'] == 'table'
+        assert objects['idx_invoice_items_invoice']['type'] == 'index'
+        assert objects['idx_invoice_items_invoice']['table'] == 'invoice_items'
+        # Las páginas de punteros de auto_vacuum no aparecen en dbstat
+        assert 0 <= report['page_count'] - report['free_pages'] - sum(o['pages'] for o in report['objects']) <= 2
+
+    def test_scheduler_waits_for_idle(self, temp_db, logic_company):
+        """El programador no corre mientras hay actividad y sí en reposo."""
+        logic, _ = logic_company
+        svc = MaintenanceService(temp_db)
+        scheduler = MaintenanceScheduler(svc, idle_after=3600, check_every=0.01)
+        scheduler.start()
+        time.sleep(0.1)
+        assert svc.last_runs() == {}
+
+        scheduler.idle_after = 0
+        deadline = time.monotonic() + 5
+        while 'integrity' not in svc.last_runs() and time.monotonic() < deadline:
+            time.sleep(0.02)
+        scheduler.stop(timeout=5)
+        assert 'integrity' in svc.last_runs()
@@ -0,0 +1,63 @@
+"""
+Tests para los montos en centavos (utils/money.py) y las columnas *_cents.
+"""
+from utils.money import (
+    compute_totals, convert_cents, format_cents, from_cents, item_lines,
+    itbis_cents, line_total_cents, to_cents
+)
+
+
+class TestMoney:
+    """Tests de conversión, redondeo y totales en centavos."""
+
+    def test_to_cents_and_format(self):
+        """Conversión desde float/str formateado y formato sin pasar por float."""
+        assert to_cents(0.1 + 0.2) == 30
+        assert to_cents("1,234.56") == 123456
+        assert to_cents("RD$ 10") == 1000
+        assert to_cents(1.005) == 101  # mitad hacia arriba sobre el valor visible
+        assert to_cents(None) == 0 and to_cents("abc") == 0
+        assert format_cents(123456789) == "1,234,567.89"
+        assert format_cents(-5) == "-0.05"
+        assert from_cents(123456) == 1234.56
+
+    def test_line_totals_round_once(self):
+        """Cada línea se redondea una sola vez, con descuento incluido."""
+        assert line_total_cents(3, 19.99) == 5997
+        assert line_total_cents(0.333, 10) == 333
+        assert line_total_cents(5, 500, 10) == 225000
+        assert line_total_cents("2", "1,000.50", "15") == 170085
+
+    def test_compute_totals_matches_sum_of_lines(self):
+        """Sumar 0.10 diez veces da exacto; ITBIS sobre el subtotal en centavos."""
+        totals = compute_totals([(1, 0.1)] * 10, apply_itbis=True, rate=0.18)
+        assert totals['subtotal'] == 100
+        assert totals['itbis'] == 18
+        assert totals['total'] == 118
+        assert compute_totals([(1, 0.1)], apply_itbis=False)['itbis'] == 0
+        assert itbis_cents(12345) == 2222  # 2222.1
+        assert convert_cents(10000, "58.75") == 587500
+
+    def test_item_lines_accepts_app_formats(self):
+        """Ítems de la tabla, del modelo y de la BD usan nombres distintos."""
+        lines = item_lines([
+            {'quantity': 2, 'unit_price': 10.0, 'discount_percent': 50},
+            {'qty': 1, 'price': 5.0, 'discount': 0},
+            {'cantidad': 3, 'precio': 1.0},
+        ])
+        assert compute_totals(lines, apply_itbis=False)['lines'] == [1000, 500, 300]
+
+    def test_cents_columns_follow_real_columns(self, logic_company):
+        """Las columnas generadas *_cents coinciden con los montos guardados."""
+        logic, cid = logic_company
+        for _ in range(10):
+            logic.conn.execute(
+                "INSERT INTO invoices (company_id, invoice_type, invoice_date, invoice_number, currency,"
+                " itbis, total_amount, total_amount_rd) VALUES (?, 'recibida', '2025-01-01', 'B0100000001',"
+                " 'RD$', 0.018, 0.118, 0.118)", (cid,)
+            )
+        logic.conn.commit()
+        row = logic.conn.execute(
+            "SELECT SUM(total_amount_cents), SUM(itbis_cents), SUM(total_amount_rd_cents) FROM invoices"
+        ).fetchone()
+        assert tuple(row) == (120, 20, 120)
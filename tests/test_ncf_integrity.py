@@ -0,0 +1,90 @@
+"""
+Tests para la verificación de integridad de NCF (services/ncf_integrity_service.py).
+"""
+import sqlite3
+import time
+
+import pytest
+
+from services.ncf_integrity_service import NCFIntegrityService
+
+LARGE_ROWS = 500_000
+SCAN_BUDGET_S = 1.0
+
+
+def _insert(conn, company_id, numbers, invoice_type='emitida'):
+    conn.executemany(
+        "INSERT INTO invoices (company_id, invoice_type, invoice_date, invoice_number, currency,"
+        " total_amount, total_amount_rd) VALUES (?, ?, '2025-01-01', ?, 'RD$', 0, 0)",
+        [(company_id, invoice_type, n) for n in numbers]
+    )
+
+
+class TestNCFIntegrity:
+    """Tests de huecos, duplicados, fuera de rango y mal formados."""
+
+    def test_detects_all_issue_kinds(self, logic_company):
+        """Una pasada encuentra huecos, duplicados, fuera de rango y mal formados."""
+        logic, cid = logic_company
+        _insert(logic.conn, cid, ["B0100000001", "B0100000002", "B0100000005", "B0100000005",
+                                  "B0100000009", "B01-BAD", "B0200000001"])
+        # Una recibida con el mismo número no cuenta como duplicado
+        _insert(logic.conn, cid, ["B0100000002"], invoice_type='recibida')
+        logic.conn.commit()
+        logic.set_ncf_last_seq(cid, "B01", 8)
+
+        result = logic.scan_ncf_integrity(cid)
+        b01 = next(b for b in result['sequences'] if b['prefix'] == 'B01')
+        assert b01['count'] == 5
+        assert b01['gaps'] == [(3, 4), (6, 8)]
+        assert b01['missing'] == 5
+        assert b01['duplicates'] == [(5, 2)]
+        assert b01['out_of_range'] == [9]
+        assert [m['invoice_number'] for m in result['malformed']] == ["B01-BAD"]
+        assert result['ok'] is False
+
+        b02 = logic.scan_ncf_integrity(cid, "B02")['sequences']
+        assert len(b02) == 1 and b02[0]['gaps'] == [] and b02[0]['duplicate_count'] == 0
+
+        report = NCFIntegrityService.format_report(result)
+        assert "Huecos (5 números): 3-4, 6-8" in report
+        assert "B01-BAD" in report
+
+    def test_clean_sequence_is_ok(self, logic_company):
+        """Secuencias continuas (incluido e-CF) no reportan problemas."""
+        logic, cid = logic_company
+        _insert(logic.conn, cid, [f"B01{i:08d}" for i in range(1, 51)] + [f"E31{i:011d}" for i in range(1, 4)])
+        logic.conn.commit()
+        result = logic.scan_ncf_integrity(cid)
+        assert result['ok'] is True
+        assert {b['prefix']: b['max_seq'] for b in result['sequences']} == {'B01': 50, 'E31': 3}
+
+    def test_find_next_free_ncf_skips_used_block(self, logic_company):
+        """find_next_free_ncf salta un bloque usado con una sola consulta."""
+        logic, cid = logic_company
+        _insert(logic.conn, cid, [f"B01{i:08d}" for i in range(10, 5000)])
+        logic.conn.commit()
+        assert logic.find_next_free_ncf(cid, "B01", 10) == "B0100005000"
+        assert logic.find_next_free_ncf(cid, "B01", 3) == "B0100000003"
+
+    @pytest.mark.slow
+    def test_large_scan_within_budget(self, temp_db, logic_company, drop_insert_triggers):
+        """500k facturas se analizan en menos de 1 s."""
+        logic, cid = logic_company
+        logic.close()
+        with sqlite3.connect(temp_db) as conn:
+            drop_insert_triggers(conn, "invoices")
+            # Carga en SQL (sin ida y vuelta a Python): uno de cada mil números falta
+            conn.execute("""
+                WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+                INSERT INTO invoices (company_id, invoice_type, invoice_date, invoice_number, currency,
+                                      total_amount, total_amount_rd)
+                SELECT ?, 'emitida', '2025-01-01', printf('B01%08d', i), 'RD$', 0, 0 FROM n WHERE i % 1000
+            """, (LARGE_ROWS, cid))
+
+        start = time.perf_counter()
+        result = NCFIntegrityService(temp_db).scan(cid)
+        elapsed = time.perf_counter() - start
+        b01 = result['sequences'][0]
+        assert b01['missing'] == LARGE_ROWS // 1000 - 1
+        assert elapsed < SCAN_BUDGET_S
@@ -0,0 +1,133 @@
+"""
+Tests para ncf_lease_allocator.py usando el Firestore local en memoria.
+"""
+import threading
+
+import pytest
+
+from firebase.fake_firestore import FakeFirestore
+from firebase.ncf_lease_allocator import NCFLeaseAllocator, format_ncf
+
+
+def _run_parallel(n_threads, fn):
+    errors = []
+
+    def worker(idx):
+        try:
+            fn(idx)
+        except Exception as e:  # pragma: no cover - se reporta abajo
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n_threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors, errors
+
+
+class TestNCFLeaseAllocator:
+    """Tests del asignador de NCF por bloques."""
+
+    def test_format_ncf(self):
+        """B usa 8 dígitos de secuencia y E usa 11."""
+        assert format_ncf('B01', 7) == 'B0100000007'
+        assert format_ncf('e31', 7) == 'E3100000000007'
+
+    def test_sequential_within_block(self):
+        """Los números salen consecutivos y se reserva otro bloque al agotarse."""
+        db = FakeFirestore()
+        alloc = NCFLeaseAllocator(db, station_id='A', block_size=3)
+        ncfs = [alloc.next_ncf(1, 'B01') for _ in range(4)]
+        assert ncfs == ['B0100000001', 'B0100000002', 'B0100000003', 'B0100000004']
+        head = db.collection('sequences').document('1_ncf_B01').get()
+        assert head.get('current') == 6
+        assert alloc.remaining(1, 'B01') == 2
+        # Dos bloques → dos transacciones, no cuatro
+        assert db.stats['transactions'] == 2
+
+    def test_release_returns_unused_range(self):
+        """Si nadie reservó después, el rango no usado vuelve a la secuencia."""
+        db = FakeFirestore()
+        alloc = NCFLeaseAllocator(db, station_id='A', block_size=10)
+        alloc.next_ncf(1, 'B01')
+        alloc.next_ncf(1, 'B01')
+        results = alloc.release_all()
+        assert results[0]['status'] == 'returned'
+        head = db.collection('sequences').document('1_ncf_B01').get()
+        assert head.get('current') == 2
+
+        # La siguiente estación continúa sin huecos
+        other = NCFLeaseAllocator(db, station_id='B', block_size=10)
+        assert other.next_ncf(1, 'B01') == 'B0100000003'
+
+    def test_release_voids_range_when_sequence_moved(self):
+        """Si otra estación reservó después, el rango no usado queda anulado."""
+        db = FakeFirestore()
+        a = NCFLeaseAllocator(db, station_id='A', block_size=10)
+        b = NCFLeaseAllocator(db, station_id='B', block_size=10)
+        a.next_ncf(1, 'B01')
+        assert b.next_ncf(1, 'B01') == 'B0100000011'
+        result = a.release_all()[0]
+        assert result['status'] == 'void'
+        assert (result['from'], result['to']) == (2, 10)
+        lease = db.collection('ncf_leases').document(result['lease_id']).get()
+        assert lease.get('status') == 'void'
+        assert db.collection('sequences').document('1_ncf_B01').get().get('current') == 20
+
+    @pytest.mark.slow
+    def test_parallel_stations_unique_and_low_contention(self):
+        """Varias estaciones en paralelo: NCF únicos y muchos menos reintentos."""
+        stations, per_station = 8, 25
+
+        # Línea base: una transacción sobre el documento compartido por NCF
+        base_db = FakeFirestore(latency=0.001)
+        ref = base_db.collection('sequences').document('1_ncf_B01')
+
+        @base_db.transactional
+        def increment(transaction):
+            snap = ref.get(transaction=transaction)
+            value = (snap.get('current') or 0) + 1
+            transaction.set(ref, {'current': value})
+            return value
+
+        base_out = []
+        _run_parallel(stations, lambda i: base_out.extend(
+            increment(base_db.transaction(max_attempts=1000)) for _ in range(per_station)
+        ))
+        assert len(set(base_out)) == stations * per_station
+
+        # Con bloques arrendados
+        lease_db = FakeFirestore(latency=0.001)
+        allocators = [NCFLeaseAllocator(lease_db, station_id=f"S{i}", block_size=50)
+                      for i in range(stations)]
+        lease_out = []
+        lock = threading.Lock()
+
+        def issue(i):
+            for _ in range(per_station):
+                ncf = allocators[i].next_ncf(1, 'B01')
+                with lock:
+                    lease_out.append(ncf)
+
+        _run_parallel(stations, issue)
+        assert len(set(lease_out)) == stations * per_station
+        assert lease_db.stats['transactions'] * 5 < base_db.stats['transactions']
+        assert lease_db.stats['transaction_retries'] < base_db.stats['transaction_retries']
+
+    def test_threads_share_station_allocator(self):
+        """Hilos de una misma estación comparten el bloque sin duplicar."""
+        db = FakeFirestore()
+        alloc = NCFLeaseAllocator(db, station_id='A', block_size=20)
+        out = []
+        lock = threading.Lock()
+
+        def issue(_):
+            for _ in range(30):
+                ncf = alloc.next_ncf(2, 'E31')
+                with lock:
+                    out.append(ncf)
+
+        _run_parallel(4, issue)
+        assert len(set(out)) == 120
+        assert all(len(n) == 14 for n in out)
@@ -0,0 +1,87 @@
+"""
+Tests para los rangos de NCF autorizados (services/ncf_range_service.py).
+"""
+from datetime import date, timedelta
+
+from services.ncf_service import NCFService
+
+
+class TestNCFRanges:
+    """Tests de asignación dentro de rangos, cambio de rango y alertas."""
+
+    def test_without_ranges_keeps_legacy_counter(self, logic_company):
+        """Sin rangos cargados el contador sigue libre y no hay estado de rango."""
+        logic, cid = logic_company
+        assert logic.allocate_next_ncf(cid, "B01") == "B0100000001"
+        assert logic.get_ncf_range_status(cid, "B01") is None
+
+    def test_allocation_switches_to_next_range(self, logic_company):
+        """Al agotarse un rango el asignador salta al inicio del siguiente."""
+        logic, cid = logic_company
+        assert logic.add_ncf_range(cid, "B01", 101, 102)[0]
+        assert logic.add_ncf_range(cid, "B01", 500, 501)[0]
+
+        assert logic.get_ncf_preview(cid, "B01") == "B0100000101"
+        allocated = [logic.allocate_next_ncf(cid, "B01") for _ in range(4)]
+        assert allocated == ["B0100000101", "B0100000102", "B0100000500", "B0100000501"]
+        assert [r['status'] for r in logic.list_ncf_ranges(cid, "B01")] == ['agotada', 'agotada']
+
+        try:
+            logic.allocate_next_ncf(cid, "B01")
+            assert False, "Debió fallar con los rangos agotados"
+        except ValueError as e:
+            assert "B01" in str(e)
+        assert logic.get_ncf_range_status(cid, "B01")['alert'] == 'exhausted'
+
+    def test_remaining_and_alerts(self, logic_company):
+        """Restantes sin recorrer facturas; alertas por pocos números y por vencimiento."""
+        logic, cid = logic_company
+        soon = (date.today() + timedelta(days=10)).isoformat()
+        later = (date.today() + timedelta(days=300)).isoformat()
+        logic.add_ncf_range(cid, "B01", 1, 100, soon)
+        logic.add_ncf_range(cid, "B01", 1001, 1100, later)
+        for _ in range(30):
+            logic.allocate_next_ncf(cid, "B01")
+
+        status = logic.get_ncf_range_status(cid, "B01")
+        assert status['remaining'] == 170
+        assert status['current_remaining'] == 70
+        assert status['expires_on'] == soon
+        assert status['alert'] == 'expiring'
+
+        # Contador editado a mano por encima del rango vigente: se respeta
+        logic.set_ncf_last_seq(cid, "B01", 1060)
+        status = logic.get_ncf_range_status(cid, "B01")
+        assert status['remaining'] == 40
+        assert status['alert'] == 'low'
+        assert logic.allocate_next_ncf(cid, "B01") == "B0100001061"
+
+    def test_expired_range_is_skipped(self, logic_company):
+        """Un rango vencido se marca y se usa el siguiente vigente."""
+        logic, cid = logic_company
+        yesterday = (date.today() - timedelta(days=1)).isoformat()
+        logic.add_ncf_range(cid, "B01", 1, 100, yesterday)
+        logic.add_ncf_range(cid, "B01", 201, 300)
+        assert logic.allocate_next_ncf(cid, "B01") == "B0100000201"
+        assert [r['status'] for r in logic.list_ncf_ranges(cid, "B01")] == ['vencida', 'activa']
+
+    def test_add_range_validation(self, logic_company):
+        """Rangos inválidos o solapados se rechazan con mensaje."""
+        logic, cid = logic_company
+        assert logic.add_ncf_range(cid, "B01", 1, 100)[0]
+        assert not logic.add_ncf_range(cid, "B01", 50, 150)[0]
+        assert not logic.add_ncf_range(cid, "B01", 300, 200)[0]
+        assert not logic.add_ncf_range(cid, "B01", 200, 300, "31/12/2026")[0]
+        assert logic.add_ncf_range(cid, "B02", 50, 150)[0]
+        range_id = logic.list_ncf_ranges(cid, "B02")[0]['id']
+        assert logic.delete_ncf_range(range_id)
+        assert logic.list_ncf_ranges(cid, "B02") == []
+
+    def test_ncf_service_reserve_respects_ranges(self, temp_db, logic_company):
+        """NCFService.reserve_ncf usa el mismo rango que el asignador de la UI."""
+        logic, cid = logic_company
+        logic.add_ncf_range(cid, "B02", 7, 7)
+        service = NCFService(temp_db, ensure_schema=False)
+        assert service.reserve_ncf(cid, "B02") == (True, "B0200000007")
+        ok, msg = service.reserve_ncf(cid, "B02")
+        assert not ok and "agotados" in msg
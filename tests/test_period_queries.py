@@ -0,0 +1,78 @@
+"""
+Tests para fechas normalizadas y consultas por período (utils/dates.py, migración 15).
+"""
+
+from services.schema_migrations import latest_version, migrate
+from utils.dates import day_number, normalize_date
+
+
+def _invoice(cid, seq, day, invoice_type="emitida"):
+    return {
+        "company_id": cid, "invoice_type": invoice_type, "invoice_date": day,
+        "invoice_number": f"B01{seq:08d}", "invoice_category": "B01", "rnc": "131246796",
+        "third_party_name": "Cliente", "currency": "RD$", "itbis": 18.0,
+        "total_amount": 118.0, "exchange_rate": 1.0, "total_amount_rd": 118.0,
+    }
+
+
+def _plan(conn, statement):
+    return " ".join(r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + statement))
+
+
+class TestPeriodQueries:
+    """Tests de normalización de fechas y filtros por rango indexados."""
+
+    def test_normalize_date_formats(self):
+        """Formatos de la UI y tecleados a mano terminan en ISO."""
+        assert normalize_date("2025-01-15") == "2025-01-15"
+        assert normalize_date("15/01/2025") == "2025-01-15"
+        assert normalize_date("2025/1/5") == "2025-01-05"
+        assert normalize_date("20250115") == "2025-01-15"
+        assert normalize_date("2025-01-15T10:30:00") == "2025-01-15"
+        assert normalize_date("31/02/2025") is None
+        assert normalize_date("pendiente") is None
+        assert day_number("1970-01-02") == 1
+
+    def test_write_paths_store_iso_and_day(self, logic_company):
+        """add_invoice/add_quotation guardan ISO y la columna de día coincide con day_number."""
+        logic, cid = logic_company
+        invoice_id = logic.add_invoice(_invoice(cid, 1, "15/01/2025"), [])
+        row = logic.conn.execute("SELECT invoice_date, invoice_day FROM invoices WHERE id = ?",
+                                 (invoice_id,)).fetchone()
+        assert tuple(row) == ("2025-01-15", day_number("2025-01-15"))
+
+        quotation_id = logic.add_quotation({'company_id': cid, 'quotation_date': '2025/1/5', 'client_name': 'C',
+                                            'currency': 'RD$', 'total_amount': 0}, [])
+        row = logic.conn.execute("SELECT quotation_date, quotation_day, due_date FROM quotations WHERE id = ?",
+                                 (quotation_id,)).fetchone()
+        assert tuple(row) == ("2025-01-05", day_number("2025-01-05"), "2025-02-04")
+
+    def test_migration_normalizes_legacy_dates(self, logic_company):
+        """Las fechas libres ya guardadas se pasan a ISO al migrar."""
+        logic, cid = logic_company
+        invoice_id = logic.add_invoice(_invoice(cid, 1, "2025-03-01"), [])
+        logic.conn.execute("UPDATE invoices SET invoice_date = '07/03/2025', due_date = 'sin fecha' WHERE id = ?",
+                           (invoice_id,))
+        logic.conn.execute("PRAGMA user_version = 14")
+        logic.conn.commit()
+        assert migrate(logic.conn) == latest_version() - 14
+        row = logic.conn.execute("SELECT invoice_date, invoice_day, due_date FROM invoices").fetchone()
+        assert tuple(row) == ("2025-03-07", day_number("2025-03-07"), "sin fecha")
+
+    def test_period_filter_is_indexed(self, logic_company):
+        """get_facturas por rango y tipo filtra inclusivo y usa el índice de número de día."""
+        logic, cid = logic_company
+        for seq, day in enumerate(["2025-01-31", "2025-02-01", "2025-02-28", "2025-03-01"], 1):
+            logic.add_invoice(_invoice(cid, seq, day), [])
+        logic.add_invoice(_invoice(cid, 9, "2025-02-10", invoice_type="recibida"), [])
+
+        statements = []
+        logic.conn.set_trace_callback(statements.append)
+        rows = logic.get_facturas(cid, start_date="01/02/2025", end_date="2025-02-28")
+        logic.conn.set_trace_callback(None)
+
+        assert [r['invoice_date'] for r in rows] == ["2025-02-28", "2025-02-01"]
+        assert [r['invoice_date'] for r in logic.get_facturas(cid, start_date="2025-02-01", end_date="2025-02-28",
+                                                               invoice_type="recibida")] == ["2025-02-10"]
+        query = next(s for s in statements if "FROM invoices" in s)
+        assert "idx_invoices_type_day" in _plan(logic.conn, query)
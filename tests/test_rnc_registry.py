@@ -0,0 +1,123 @@
+"""
+Tests para el padrón de RNC de la DGII (services/rnc_registry_service.py, migración 17).
+"""
+import os
+import time
+import zipfile
+
+from services.rnc_registry_service import RncRegistryService
+
+
+def _rnc(base8: int) -> str:
+    """RNC de 9 dígitos con dígito verificador válido."""
+    digits = f"{base8:08d}"
+    rem = sum(int(d) * w for d, w in zip(digits, (7, 9, 8, 6, 5, 4, 3, 2))) % 11
+    return digits + str(2 if rem == 0 else 1 if rem == 1 else 11 - rem)
+
+
+def _line(rnc, name, trade="", status="ACTIVO"):
+    return f"{rnc[:3]}-{rnc[3:8]}-{rnc[8:]}|{name}|{trade}|VENTA AL POR MENOR| | | | |01/01/2010|{status}|NORMAL\r\n"
+
+
+def _write_registry(path, lines, as_zip=False):
+    data = "".join(lines).encode("latin-1")
+    if as_zip:
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("TMP/DGII_RNC.TXT", data)
+    else:
+        with open(path, "wb") as f:
+            f.write(data)
+    return path
+
+
+RNC_A, RNC_B, RNC_C = _rnc(13124679), _rnc(10100000), _rnc(40200000)
+
+
+class TestRncRegistry:
+    """Tests de importación incremental, búsquedas y validación del RNC del cliente."""
+
+    def _import_sample(self, logic, temp_db):
+        registry = _write_registry(temp_db + ".zip", [
+            "RNC|RAZON SOCIAL|NOMBRE COMERCIAL|ACTIVIDAD|||||FECHA|ESTADO|REGIMEN\r\n",
+            _line(RNC_A, "FERRETERÍA OCHOA SRL", "OCHOA"),
+            _line(RNC_B, "CONSTRUCTORA PÉREZ & ASOCIADOS", ""),
+            _line(RNC_C, "COMERCIAL LA ÚNICA", "LA UNICA", status="SUSPENDIDO"),
+        ], as_zip=True)
+        ok, message = logic.import_rnc_registry(registry)
+        assert ok, message
+        return registry
+
+    def test_import_zip_and_lookup(self, temp_db, logic_company):
+        """Importa el .zip en latin-1; busca por RNC con guiones y por nombre sin acentos."""
+        logic, _ = logic_company
+        registry = self._import_sample(logic, temp_db)
+        svc = logic.rnc_registry
+        assert svc.count() == 3
+        entry = logic.lookup_rnc(f"{RNC_A[:3]}-{RNC_A[3:8]}-{RNC_A[8]}")
+        assert entry['name'] == "FERRETERÍA OCHOA SRL" and entry['status'] == "ACTIVO"
+        assert [r['rnc'] for r in svc.search(RNC_A[:4])] == [RNC_A]
+        assert [r['rnc'] for r in svc.search("ferreteria oc", by='name')] == [RNC_A]
+        assert [r['rnc'] for r in svc.search("ochoa", by='name')] == [RNC_A]          # nombre comercial
+        assert [r['rnc'] for r in svc.search("constructora perez &", by='name')] == [RNC_B]
+        assert svc.search("z", by='name') == []
+        os.unlink(registry)
+
+    def test_reimport_writes_only_differences(self, temp_db, logic_company):
+        """Al reimportar sólo se escriben altas y cambios, y se borran los que salieron del padrón."""
+        logic, _ = logic_company
+        registry = self._import_sample(logic, temp_db)
+        rnc_d = _rnc(13000001)
+        _write_registry(registry + ".txt", [
+            _line(RNC_A, "FERRETERÍA OCHOA SRL", "OCHOA"),
+            _line(RNC_C, "COMERCIAL LA ÚNICA", "LA UNICA", status="ACTIVO"),
+            _line(rnc_d, "DISTRIBUIDORA NUEVA", ""),
+        ])
+        ok, message = logic.import_rnc_registry(registry + ".txt")
+        assert ok and "1 nuevas, 1 cambiadas, 1 bajas" in message
+        assert logic.lookup_rnc(RNC_B) is None
+        assert logic.lookup_rnc(RNC_C)['status'] == "ACTIVO"
+        assert logic.lookup_rnc(rnc_d)['name'] == "DISTRIBUIDORA NUEVA"
+
+        ok, message = logic.import_rnc_registry(registry + ".txt")
+        assert ok and "0 nuevas, 0 cambiadas, 0 bajas" in message
+        assert logic.import_rnc_registry(registry)[0] and logic.rnc_registry.count() == 3
+        for path in (registry, registry + ".txt"):
+            os.unlink(path)
+
+    def test_suggestions_and_client_validation(self, temp_db, logic_company):
+        """Sugerencias: terceros facturados primero y luego el padrón; validación antes de guardar."""
+        logic, _ = logic_company
+        registry = self._import_sample(logic, temp_db)
+        logic.add_or_update_third_party(RNC_B, "Constructora Pérez (cliente)")
+        assert logic.search_third_parties("con", search_by='name') == [
+            {'rnc': RNC_B, 'name': "Constructora Pérez (cliente)"}]
+        assert logic.search_third_parties(RNC_A[:3], search_by='rnc') == [
+            {'rnc': RNC_A, 'name': "FERRETERÍA OCHOA SRL"}]
+
+        assert logic.validate_client_rnc(RNC_A) == (True, "")
+        assert logic.validate_client_rnc(RNC_A[:8] + str((int(RNC_A[8]) + 1) % 10))[0] is False
+        ok, reason = logic.validate_client_rnc(RNC_C)
+        assert not ok and "SUSPENDIDO" in reason
+        ok, reason = logic.validate_client_rnc(_rnc(13000001))
+        assert not ok and "no figura" in reason
+        os.unlink(registry)
+
+    def test_lookups_are_sub_millisecond(self, temp_db):
+        """Con decenas de miles de contribuyentes cada búsqueda cuesta menos de 1 ms."""
+        path = _write_registry(temp_db + ".txt", [
+            _line(_rnc(10000000 + n * 37), f"EMPRESA {n:06d} SRL", f"TIENDA {n % 997}") for n in range(50000)
+        ])
+        svc = RncRegistryService(temp_db)
+        ok, message = svc.import_file(path, chunk_rows=5000)
+        assert ok and "50,000 nuevas" in message
+
+        probes = [_rnc(10000000 + n * 37) for n in range(0, 50000, 50)]
+        t0 = time.perf_counter()
+        for rnc in probes:
+            assert svc.lookup(rnc) is not None
+            svc.search(rnc[:5])
+            svc.search("empresa 0123", by='name')
+        per_call = (time.perf_counter() - t0) / (3 * len(probes))
+        assert per_call < 0.001, per_call
+        svc.close()
+        os.unlink(path)
@@ -0,0 +1,99 @@
+"""
+Tests para el resumen mensual materializado (services/sales_summary_service.py).
+"""
+import sqlite3
+
+from services.sales_summary_service import SalesSummaryService
+
+
+def _invoice(company_id, date, number, total, itbis, invoice_type='emitida', currency='RD$', rate=1.0):
+    return {
+        "company_id": company_id,
+        "invoice_type": invoice_type,
+        "invoice_date": date,
+        "invoice_number": number,
+        "invoice_category": number[:3],
+        "rnc": "101010101",
+        "third_party_name": "Cliente",
+        "currency": currency,
+        "itbis": itbis,
+        "total_amount": total,
+        "exchange_rate": rate,
+        "total_amount_rd": total * rate,
+    }
+
+
+class TestSalesSummary:
+    """Tests de mantenimiento incremental del resumen."""
+
+    def test_add_update_delete_keep_summary_in_sync(self, logic_company):
+        """Crear, editar y borrar facturas actualiza el resumen sin recalcular."""
+        logic, cid = logic_company
+        a = logic.add_invoice(_invoice(cid, "2025-01-10", "B0100000001", 1180.0, 180.0), [])
+        logic.add_invoice(_invoice(cid, "2025-01-20", "B0100000002", 590.0, 90.0), [])
+        b = logic.add_invoice(_invoice(cid, "2025-02-05", "B0100000003", 118.0, 18.0), [])
+
+        jan = logic.get_monthly_summary(cid, "2025-01", "2025-01")
+        assert len(jan) == 1
+        assert jan[0]['invoice_count'] == 2
+        assert jan[0]['subtotal'] == 1500.0
+        assert jan[0]['itbis'] == 270.0
+
+        # Mover una factura de enero a febrero
+        logic.update_invoice(a, _invoice(cid, "2025-02-01", "B0100000001", 1180.0, 180.0), [])
+        rows = {r['period']: r for r in logic.get_monthly_summary(cid)}
+        assert rows["2025-01"]['invoice_count'] == 1
+        assert rows["2025-02"]['invoice_count'] == 2
+        assert rows["2025-02"]['total_amount_rd'] == 1298.0
+
+        logic.delete_factura(b)
+        logic.delete_factura(a)
+        assert [r['period'] for r in logic.get_monthly_summary(cid)] == ["2025-01"]
+        assert logic.summary_service.check_consistency() == []
+
+    def test_totals_by_type_and_currency(self, logic_company):
+        """Los totales del período separan emitidas/recibidas y monedas."""
+        logic, cid = logic_company
+        logic.add_invoice(_invoice(cid, "2025-03-01", "B0100000001", 1180.0, 180.0), [])
+        logic.add_invoice(_invoice(cid, "2025-03-02", "B0100000002", 100.0, 0.0, currency="USD", rate=60.0), [])
+        logic.add_invoice(_invoice(cid, "2025-03-03", "B0100000077", 236.0, 36.0, invoice_type='recibida'), [])
+
+        totals = logic.summary_service.get_period_totals(cid, "2025-03", "2025-03")
+        assert totals['emitida']['RD$']['itbis'] == 180.0
+        assert totals['emitida']['USD']['total_amount_rd'] == 6000.0
+        assert totals['recibida']['RD$']['subtotal'] == 200.0
+
+    def test_voided_invoices_leave_the_summary(self, logic_company):
+        """Anular saca la factura del resumen como del 607; el 608 la reporta."""
+        logic, cid = logic_company
+        logic.add_invoice(_invoice(cid, "2025-05-01", "B0100000001", 1180.0, 180.0), [])
+        voided = logic.add_invoice(_invoice(cid, "2025-05-02", "B0100000002", 590.0, 90.0), [])
+        logic.void_invoice(voided, "04")
+
+        totals = logic.summary_service.get_period_totals(cid, "2025-05", "2025-05")
+        assert totals['emitida']['RD$']['invoice_count'] == 1
+        assert totals['emitida']['RD$']['itbis'] == 180.0
+        assert logic.summary_service.check_consistency() == []
+        assert logic.generate_dgii_report('607', cid, '2025-05')[1]['count'] == 1
+        assert logic.generate_dgii_report('608', cid, '2025-05')[1]['count'] == 1
+
+        logic.delete_factura(voided)
+        assert logic.summary_service.get_period_totals(cid, "2025-05", "2025-05") == totals
+        assert logic.summary_service.rebuild() == 1
+        assert logic.summary_service.get_period_totals(cid, "2025-05", "2025-05") == totals
+
+    def test_consistency_check_and_rebuild(self, temp_db, logic_company):
+        """El verificador detecta un resumen alterado y rebuild lo repara."""
+        logic, cid = logic_company
+        logic.add_invoice(_invoice(cid, "2025-04-01", "B0100000001", 1180.0, 180.0), [])
+        logic.close()
+
+        with sqlite3.connect(temp_db) as conn:
+            conn.execute("UPDATE sales_summary SET itbis = itbis + 1")
+        svc = SalesSummaryService(temp_db)
+        mismatches = svc.check_consistency()
+        assert len(mismatches) == 1
+        assert mismatches[0]['expected']['itbis'] == 180.0
+
+        assert svc.rebuild() == 1
+        assert svc.check_consistency() == []
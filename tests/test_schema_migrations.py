@@ -0,0 +1,73 @@
+"""
+Tests para las migraciones versionadas (services/schema_migrations.py).
+"""
+import sqlite3
+
+from logic import LogicController
+from services.schema_migrations import latest_version, get_schema_version, migrate
+
+
+def _columns(conn, table):
+    return {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+
+
+class TestSchemaMigrations:
+    """Tests del registro de migraciones."""
+
+    def test_fresh_db_reaches_latest_version(self, temp_db):
+        """Una base nueva queda en la última versión con todas las tablas."""
+        with sqlite3.connect(temp_db) as conn:
+            assert migrate(conn) == latest_version()
+            assert get_schema_version(conn) == latest_version()
+            tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        for table in ('companies', 'invoices', 'invoice_items', 'quotations', 'quotation_items',
+                      'third_parties', 'ncf_sequences', 'audit_log', 'categories', 'items', 'change_log'):
+            assert table in tables
+
+    def test_second_startup_runs_no_ddl(self, temp_db):
+        """Con el esquema al día, abrir la app sólo lee PRAGMA user_version."""
+        LogicController(temp_db).conn.close()
+
+        statements = []
+        with sqlite3.connect(temp_db) as conn:
+            conn.set_trace_callback(statements.append)
+            assert migrate(conn) == 0
+        assert statements == ["PRAGMA user_version"]
+
+    def test_legacy_db_is_upgraded(self, temp_db):
+        """Una base antigua (user_version 0, sin columnas nuevas) se completa sin perder datos."""
+        with sqlite3.connect(temp_db) as conn:
+            conn.executescript("""
+                CREATE TABLE companies (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL,
+                                        rnc TEXT UNIQUE NOT NULL);
+                CREATE TABLE invoice_items (id INTEGER PRIMARY KEY AUTOINCREMENT, invoice_id INTEGER NOT NULL,
+                                            description TEXT NOT NULL, quantity REAL, unit_price REAL);
+                CREATE TABLE categories (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE);
+                INSERT INTO companies (name, rnc) VALUES ('Empresa', '101010101');
+                INSERT INTO categories (name) VALUES ('Eléctricos');
+                INSERT INTO invoice_items (invoice_id, description, quantity, unit_price) VALUES
+                    (1, 'a', 1, 1), (2, 'b', 1, 1), (1, 'c', 1, 1), (2, 'd', 1, 1), (1, 'e', 1, 1);
+            """)
+
+        logic = LogicController(temp_db)
+        conn = logic.conn
+        assert get_schema_version(conn) == latest_version()
+        assert {'phone', 'invoice_due_date'} <= _columns(conn, 'companies')
+        assert {'item_code', 'unit'} <= _columns(conn, 'invoice_items')
+        assert conn.execute("SELECT name FROM companies").fetchone()[0] == 'Empresa'
+        prefix, next_seq = conn.execute("SELECT code_prefix, next_seq FROM categories").fetchone()
+        assert prefix == 'ELC' and next_seq == 1
+        # Las líneas existentes reciben su posición dentro de cada factura
+        rows = conn.execute("SELECT description, line_no FROM invoice_items ORDER BY invoice_id, line_no").fetchall()
+        assert [tuple(r) for r in rows] == [('a', 1), ('c', 2), ('e', 3), ('b', 1), ('d', 2)]
+        conn.close()
+
+    def test_only_pending_steps_run(self, temp_db):
+        """Desde una versión intermedia sólo se aplican los pasos posteriores."""
+        with sqlite3.connect(temp_db) as conn:
+            migrate(conn)
+            conn.execute("DROP TABLE audit_log")
+            conn.execute("PRAGMA user_version = 1")
+            applied = migrate(conn)
+            assert applied == latest_version() - 1
+            assert conn.execute("SELECT COUNT(*) FROM audit_log").fetchone()[0] == 0
@@ -0,0 +1,101 @@
+"""
+Presupuestos de importación y arranque.
+
+Los módulos pesados (reportlab, openpyxl, firebase_admin, WebEngine) sólo
+deben cargarse al usarse por primera vez, nunca al abrir la aplicación.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).parent.parent
+
+HEAVY_MODULES = ("reportlab", "openpyxl", "firebase_admin", "PyQt6.QtWebEngineWidgets")
+IMPORT_BUDGET_S = 1.5
+LOGIC_STARTUP_BUDGET_S = 0.5
+WINDOW_BUDGET_S = 3.0
+
+
+def _import_in_subprocess(*modules):
+    """Importa `modules` en un intérprete limpio; devuelve (segundos, módulos cargados)."""
+    code = (
+        "import json, sys, time\n"
+        "t = time.perf_counter()\n"
+        + "".join(f"import {m}\n" for m in modules)
+        + "elapsed = time.perf_counter() - t\n"
+        "print(json.dumps({'elapsed': elapsed, 'modules': sorted(sys.modules)}))\n"
+    )
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT_DIR, env=env,
+                         capture_output=True, text=True, check=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    return result["elapsed"], result["modules"]
+
+
+def _heavy(loaded):
+    return [m for m in HEAVY_MODULES if m in loaded]
+
+
+class TestImportBudget:
+    """Tests de tiempo de importación."""
+
+    def test_core_modules_do_not_load_heavy_dependencies(self):
+        """logic, data_access y los generadores no importan SDKs pesados al cargarse."""
+        elapsed, loaded = _import_in_subprocess(
+            "logic", "data_access", "utils.quotation_templates",
+            "utils.invoice_templates", "utils.quotation_pdf", "utils.bootstrap",
+        )
+        assert _heavy(loaded) == []
+        assert elapsed < IMPORT_BUDGET_S
+
+    def test_main_window_import_is_light(self):
+        """Importar la ventana principal no carga pestañas ni dependencias pesadas."""
+        pytest.importorskip("PyQt6.QtWidgets")
+        elapsed, loaded = _import_in_subprocess("ui_mainwindow")
+        assert _heavy(loaded) == []
+        assert not [m for m in loaded if m.startswith("tabs.")]
+        assert elapsed < IMPORT_BUDGET_S
+
+
+class TestStartupBudget:
+    """Tests de tiempo de arranque."""
+
+    def test_logic_controller_reopen_budget(self, temp_db):
+        """Reabrir una base ya migrada cabe en el presupuesto de arranque."""
+        from logic import LogicController
+        LogicController(temp_db).conn.close()
+
+        start = time.perf_counter()
+        logic = LogicController(temp_db)
+        elapsed = time.perf_counter() - start
+        logic.conn.close()
+        assert elapsed < LOGIC_STARTUP_BUDGET_S
+
+    def test_main_window_defers_tabs(self, temp_db, monkeypatch):
+        """La ventana se construye sin pestañas; la activa se crea tras mostrarse."""
+        pytest.importorskip("PyQt6.QtWidgets")
+        monkeypatch.setenv("QT_QPA_PLATFORM", "offscreen")
+        from PyQt6.QtWidgets import QApplication
+        app = QApplication.instance() or QApplication([])
+
+        import facot_config
+        monkeypatch.setattr(facot_config, "get_db_path", lambda: temp_db)
+        from ui_mainwindow import MainWindow, TAB_SPECS
+
+        start = time.perf_counter()
+        window = MainWindow()
+        elapsed = time.perf_counter() - start
+        assert elapsed < WINDOW_BUDGET_S
+        assert all(getattr(window, attr) is None for attr, _ in TAB_SPECS)
+
+        window._ensure_tab(0)
+        assert window.invoice_tab is not None
+        assert window.tabs.widget(0) is window.invoice_tab
+        assert window.quotation_tab is None
+        window.close()
+        app.processEvents()
@@ -0,0 +1,236 @@
+"""
+Tests para sync_service.py (change-log y sincronización incremental).
+"""
+import os
+import sqlite3
+
+import pytest
+
+from firebase.fake_firestore import FakeFirestore
+from services.sync_service import SyncService, install_change_log
+
+
+def _doc(fake, path):
+    return fake.document(path).get().to_dict()
+
+
+def _make_schema(db_path):
+    with sqlite3.connect(db_path) as conn:
+        conn.executescript("""
+            CREATE TABLE companies (id INTEGER PRIMARY KEY, name TEXT, rnc TEXT);
+            CREATE TABLE invoices (id INTEGER PRIMARY KEY, company_id INTEGER,
+                                   invoice_number TEXT, total_amount REAL);
+            CREATE TABLE invoice_items (id INTEGER PRIMARY KEY, invoice_id INTEGER,
+                                        description TEXT, quantity REAL, unit_price REAL);
+        """)
+        install_change_log(conn)
+
+
+class TestChangeLog:
+    """Tests de los triggers de change-log."""
+
+    def test_triggers_record_operations(self, temp_db):
+        """Cada INSERT/UPDATE/DELETE queda registrado con su operación."""
+        _make_schema(temp_db)
+        with sqlite3.connect(temp_db) as conn:
+            conn.execute("INSERT INTO invoices (id, company_id, invoice_number) VALUES (1, 1, 'B0100000001')")
+            conn.execute("INSERT INTO invoice_items (id, invoice_id, description) VALUES (7, 1, 'Cemento')")
+            conn.execute("UPDATE invoices SET total_amount = 10 WHERE id = 1")
+            conn.execute("DELETE FROM invoice_items WHERE id = 7")
+            rows = conn.execute(
+                "SELECT table_name, row_id, parent_id, op FROM change_log ORDER BY id"
+            ).fetchall()
+        assert rows == [
+            ('invoices', 1, None, 'I'),
+            ('invoice_items', 7, 1, 'I'),
+            ('invoices', 1, None, 'U'),
+            ('invoice_items', 7, 1, 'D'),
+        ]
+
+    def test_install_is_idempotent(self, temp_db):
+        """Instalar dos veces no duplica registros."""
+        _make_schema(temp_db)
+        with sqlite3.connect(temp_db) as conn:
+            install_change_log(conn)
+            conn.execute("INSERT INTO companies (id, name, rnc) VALUES (1, 'A', '1')")
+            count = conn.execute("SELECT COUNT(*) FROM change_log").fetchone()[0]
+        assert count == 1
+
+    def test_logic_controller_installs_change_log(self, temp_db):
+        """LogicController instala el change-log al inicializar."""
+        from logic import LogicController
+        logic = LogicController(temp_db)
+        logic.add_company("Empresa", "000000001", "")
+        cur = logic.conn.execute("SELECT table_name, op FROM change_log")
+        assert ('companies', 'I') in [tuple(r) for r in cur.fetchall()]
+
+
+    def test_maintenance_prunes_log_of_unsynced_base(self, temp_db):
+        """Sin sincronizar el log se vacía en el mantenimiento; el primer push igual envía todo."""
+        from services.maintenance_service import MaintenanceService
+        _make_schema(temp_db)
+        with sqlite3.connect(temp_db) as conn:
+            conn.executemany("INSERT INTO companies (id, name, rnc) VALUES (?, ?, ?)",
+                             [(i, f"E{i}", str(i)) for i in range(1, 6)])
+            conn.execute("UPDATE companies SET name = 'Editada' WHERE id = 1")
+        maintenance = MaintenanceService(temp_db)
+        assert 'prune_change_log' in maintenance.due_tasks()
+        assert maintenance.run_task('prune_change_log')['result'] == "6 entradas borradas"
+        with sqlite3.connect(temp_db) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM change_log").fetchone()[0] == 0
+        assert 'prune_change_log' not in maintenance.due_tasks()
+
+        fake = FakeFirestore()
+        sync = SyncService(temp_db, fake, station_id='A')
+        assert sync.push()['written'] == 5
+        assert _doc(fake, 'companies/1')['name'] == 'Editada'
+        assert sync.push()['written'] == 0
+
+    def test_maintenance_keeps_unsent_changes_of_synced_base(self, temp_db):
+        """Con sincronización en uso sólo se borra lo ya enviado."""
+        from services.maintenance_service import MaintenanceService
+        _make_schema(temp_db)
+        fake = FakeFirestore()
+        sync = SyncService(temp_db, fake, station_id='A')
+        with sqlite3.connect(temp_db) as conn:
+            conn.execute("INSERT INTO companies (id, name, rnc) VALUES (1, 'A', '1')")
+        sync.push()
+        with sqlite3.connect(temp_db) as conn:
+            conn.execute("INSERT INTO companies (id, name, rnc) VALUES (2, 'B', '2')")
+        assert MaintenanceService(temp_db).run_task('prune_change_log')['result'] == "1 entradas borradas"
+        assert sync.pending_changes() == 1
+        assert sync.push()['written'] == 1
+        assert _doc(fake, 'companies/2')['name'] == 'B'
+
+
+class TestSyncService:
+    """Tests de push/pull incremental."""
+
+    @pytest.fixture
+    def env(self, temp_db):
+        _make_schema(temp_db)
+        fake = FakeFirestore()
+        return temp_db, fake, SyncService(temp_db, fake, station_id='A')
+
+    def test_push_sends_only_changed_rows(self, env):
+        """El push coalesce cambios por fila y avanza el cursor."""
+        db_path, fake, sync = env
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("INSERT INTO invoices (id, company_id, invoice_number) VALUES (1, 1, 'B0100000001')")
+            conn.execute("UPDATE invoices SET total_amount = 118 WHERE id = 1")
+            conn.execute("INSERT INTO invoice_items (id, invoice_id, description) VALUES (5, 1, 'Arena')")
+
+        assert sync.pending_changes() == 2
+        stats = sync.push()
+        assert stats['written'] == 2
+        assert _doc(fake, 'invoices/1')['total_amount'] == 118
+        assert _doc(fake, 'invoices/1/items/5')['description'] == 'Arena'
+        assert sync.pending_changes() == 0
+
+        # Un segundo push no envía nada
+        assert sync.push()['written'] == 0
+
+    def test_push_deletes_removed_rows(self, env):
+        """Las filas eliminadas se borran en Firestore."""
+        db_path, fake, sync = env
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("INSERT INTO invoices (id, company_id) VALUES (2, 1)")
+        sync.push()
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("DELETE FROM invoices WHERE id = 2")
+        stats = sync.push()
+        assert stats['deleted'] == 1
+        assert _doc(fake, 'invoices/2') is None
+
+    def test_push_uses_batches(self, temp_db):
+        """Los cambios se agrupan según batch_size."""
+        _make_schema(temp_db)
+        fake = FakeFirestore()
+        sync = SyncService(temp_db, fake, station_id='A', batch_size=10)
+        with sqlite3.connect(temp_db) as conn:
+            conn.executemany("INSERT INTO companies (id, name, rnc) VALUES (?, ?, ?)",
+                             [(i, f"E{i}", str(i)) for i in range(1, 26)])
+        sync.push()
+        assert fake.stats['commits'] == 3
+        assert len(fake.collection('companies').get()) == 25
+
+    def test_pull_applies_remote_without_logging(self, env):
+        """Los cambios remotos se aplican sin volver a entrar en el change_log."""
+        db_path, fake, sync = env
+        fake.document('invoices/9').set({'company_id': 1, 'invoice_number': 'B0100000009',
+                                         'updated_at': '2030-01-01T00:00:00', 'updated_by': 'B'})
+        fake.document('invoices/9/items/3').set({'description': 'Varilla', 'quantity': 2,
+                                                 'updated_at': '2030-01-01T00:00:00', 'updated_by': 'B'})
+        stats = sync.pull()
+        assert stats['applied'] == 2
+        with sqlite3.connect(db_path) as conn:
+            assert conn.execute("SELECT invoice_number FROM invoices WHERE id = 9").fetchone()[0] == 'B0100000009'
+            assert conn.execute("SELECT invoice_id FROM invoice_items WHERE id = 3").fetchone()[0] == 9
+        assert sync.pending_changes() == 0
+
+    def test_pull_conflict_newer_wins(self, env):
+        """Si la fila local tiene cambios pendientes más nuevos, se conserva la local."""
+        db_path, fake, sync = env
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("INSERT INTO companies (id, name, rnc) VALUES (1, 'Local', '1')")
+        fake.document('companies/1').set({'name': 'Remota', 'rnc': '1',
+                                          'updated_at': '2000-01-01T00:00:00', 'updated_by': 'B'})
+        stats = sync.pull()
+        assert stats['conflicts'] == 1
+        with sqlite3.connect(db_path) as conn:
+            assert conn.execute("SELECT name FROM companies WHERE id = 1").fetchone()[0] == 'Local'
+            assert conn.execute("SELECT COUNT(*) FROM sync_conflicts").fetchone()[0] == 1
+
+    def test_late_push_of_old_edit_is_pulled(self, temp_db):
+        """Una edición hecha en B antes del último pull de A, pero enviada después, igual llega a A."""
+        db_b = temp_db + ".b"
+        for path in (temp_db, db_b):
+            _make_schema(path)
+        fake = FakeFirestore()
+        sync_a = SyncService(temp_db, fake, station_id='A')
+        sync_b = SyncService(db_b, fake, station_id='B')
+
+        with sqlite3.connect(db_b) as conn:
+            conn.execute("INSERT INTO companies (id, name, rnc) VALUES (4, 'Editada en B', '4')")
+        sync_a.pull()                       # la marca de agua de A queda después de la edición de B
+        sync_b.push()
+        doc = _doc(fake, 'companies/4')
+        assert doc['updated_at'] > doc['edited_at']
+
+        assert sync_a.pull()['applied'] == 1
+        with sqlite3.connect(temp_db) as conn:
+            assert conn.execute("SELECT name FROM companies WHERE id = 4").fetchone()[0] == 'Editada en B'
+        # Releer la ventana de solapamiento no vuelve a aplicar ni registra conflictos
+        assert sync_a.pull() == {'applied': 0, 'conflicts': 0, 'skipped': 0}
+        os.unlink(db_b)
+
+    def test_reedit_of_pushed_row_reaches_other_station(self, temp_db):
+        """Re-editar una fila ya enviada la vuelve a marcar con la hora del push, no con la anterior."""
+        db_b = temp_db + ".b"
+        for path in (temp_db, db_b):
+            _make_schema(path)
+        fake = FakeFirestore()
+        sync_a = SyncService(temp_db, fake, station_id='A')
+        sync_b = SyncService(db_b, fake, station_id='B')
+
+        with sqlite3.connect(db_b) as conn:
+            conn.execute("INSERT INTO companies (id, name, rnc) VALUES (4, 'Original', '4')")
+            conn.execute("INSERT INTO companies (id, name, rnc) VALUES (5, 'Otra', '5')")
+        sync_b.push()
+        # El primer envío fue hace tiempo (fuera de la ventana de solapamiento)
+        for path in ('companies/4', 'companies/5'):
+            fake.document(path).set({**_doc(fake, path), 'updated_at': '2000-01-01T00:00:00.000000Z'})
+        assert sync_a.pull()['applied'] == 2
+
+        with sqlite3.connect(db_b) as conn:
+            conn.execute("UPDATE companies SET name = 'Reeditada' WHERE id = 4")
+            conn.execute("UPDATE companies SET name = 'Otra reeditada' WHERE id = 5")
+        sync_b.push()
+        for path in ('companies/4', 'companies/5'):
+            updated_at = _doc(fake, path)['updated_at']
+            assert isinstance(updated_at, str) and updated_at > '2001'
+
+        assert sync_a.pull()['applied'] == 2
+        with sqlite3.connect(temp_db) as conn:
+            assert dict(conn.execute("SELECT id, name FROM companies")) == {4: 'Reeditada', 5: 'Otra reeditada'}
+        os.unlink(db_b)
@@ -0,0 +1,102 @@
+"""
+Tests para la resolución de unidades por lotes (services/unit_resolver.py, migración 19).
+"""
+import sqlite3
+
+from logic import LogicController
+from services.unit_resolver import UnitResolver
+
+CATALOG = [
+    ("CEM-01", "Cemento Gris Portland 42.5kg", "FUNDA"),
+    ("VAR-38", "Varilla Corrugada 3/8", "QQ"),
+    ("ARE-01", "Arena lavada", "M3"),
+    ("SRV-01", "Servicio sin unidad", ""),
+]
+
+
+def _add_items(db_path, rows):
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany("INSERT INTO items (code, name, unit, cost, price) VALUES (?, ?, ?, 0, 0)", rows)
+
+
+def _count_selects(logic, fn):
+    """Ejecuta fn() contando las sentencias SELECT de logic.conn."""
+    statements = []
+    logic.conn.set_trace_callback(statements.append)
+    try:
+        result = fn()
+    finally:
+        logic.conn.set_trace_callback(None)
+    return result, [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+
+
+class TestUnitResolverBatch:
+    """Tests de consultas por lote, caché LRU con negativos e invalidación por cambios del catálogo."""
+
+    def _setup(self, temp_db):
+        logic = LogicController(temp_db)
+        _add_items(temp_db, CATALOG)
+        return logic
+
+    def test_lookup_units_exact_code_then_name(self, temp_db):
+        """Código exacto primero, luego nombre exacto; sin unidad en el catálogo queda ''."""
+        logic = self._setup(temp_db)
+        units = logic.unit_resolver.lookup_units([
+            ("CEM-01", "otra cosa"), ("", "Arena lavada"), ("NO-EXISTE", "Varilla Corrugada 3/8"),
+            ("SRV-01", "Servicio sin unidad"), (None, None), ("X", "Cemnto gris"),
+        ])
+        assert units == ["FUNDA", "M3", "QQ", "", "", ""]
+        assert logic._get_unit_from_items("VAR-38", "") == "QQ"
+        logic.close()
+
+    def test_invoice_with_300_lines_costs_constant_queries(self, temp_db):
+        """Abrir una factura de 300 líneas hace las mismas pocas consultas que una de 3."""
+        logic = self._setup(temp_db)
+        _add_items(temp_db, [(f"MAT{n:04d}", f"Material {n:04d}", "UND") for n in range(200)])
+        with sqlite3.connect(temp_db) as conn:
+            conn.execute("INSERT INTO invoices (id, company_id, invoice_type, invoice_date, invoice_number, "
+                         "client_name, client_rnc, currency, total_amount) "
+                         "VALUES (1, 1, 'emitida', '2025-01-02', 'B0100000001', 'C', '', 'RD$', 0)")
+            conn.executemany(
+                "INSERT INTO invoice_items (invoice_id, item_code, description, quantity, unit_price) "
+                "VALUES (1, ?, ?, 1, 1)",
+                [(f"MAT{n:04d}", "") for n in range(200)]
+                + [("", f"Sin codigo {n}") for n in range(80)]
+                + [("", "Arena lavada")] * 20)
+
+        items, selects = _count_selects(logic, lambda: logic.get_invoice_items(1))
+        assert len(items) == 300 and items[0]['unit'] == "UND" and items[-1]['unit'] == "M3"
+        assert items[200]['unit'] == ""
+        assert len(selects) <= 4, selects                     # líneas + versión + códigos + nombres
+
+        # Segunda apertura: todo sale del caché (incluidos los "no encontrado")
+        _items, selects = _count_selects(logic, lambda: logic.get_invoice_items(1))
+        assert len(selects) == 2, selects                     # líneas + versión
+        logic.close()
+
+    def test_catalog_changes_invalidate_cache(self, temp_db):
+        """Altas y cambios de ítems hechos por otra conexión invalidan también los negativos."""
+        logic = self._setup(temp_db)
+        resolver = logic.unit_resolver
+        assert resolver.lookup_units([("BLK-6", "Block de 6")]) == [""]
+        _add_items(temp_db, [("BLK-6", "Block de 6", "UND")])
+        assert resolver.lookup_units([("BLK-6", "Block de 6")]) == ["UND"]
+        with sqlite3.connect(temp_db) as conn:
+            conn.execute("UPDATE items SET unit = 'QQ' WHERE code = 'VAR-38'")
+        assert resolver.lookup_units([("VAR-38", "")]) == ["QQ"]
+        logic.close()
+
+    def test_cache_is_bounded_and_resolve_items_batches(self, temp_db):
+        """El LRU no pasa de cache_size; resolve_items completa sólo las líneas sin unidad."""
+        logic = self._setup(temp_db)
+        resolver = UnitResolver(logic, cache_size=3)
+        items = [{"code": "CEM-01", "description": ""}, {"code": "", "description": "Varila corrugada 3/8"},
+                 {"code": "", "description": "Servicio de transporte"}, {"code": "ARE-01", "unit": "KG"},
+                 {"code": "N1"}, {"code": "N2"}, {"code": "N3"}]
+        resolver.resolve_items(items)
+        assert [it["unit"] for it in items] == ["FUNDA", "QQ", UnitResolver.DEFAULT_UNIT, "KG",
+                                                UnitResolver.DEFAULT_UNIT, UnitResolver.DEFAULT_UNIT,
+                                                UnitResolver.DEFAULT_UNIT]
+        assert len(resolver._cache) <= 3
+        assert resolver.resolve_unit("CEM-01") == "FUNDA"
+        logic.close()
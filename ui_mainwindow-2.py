@@ -1155,7 +1155,11 @@ class MainWindow(QMainWindow):
         factura_id = int(self.facturas_list_table.item(selected, 0).text())
         confirm = QMessageBox.question(self, "Eliminar", "¿Seguro que desea eliminar la factura?", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
         if confirm == QMessageBox.StandardButton.Yes:
-            self.logic.delete_factura(factura_id)
+            try:
+                self.logic.delete_factura(factura_id)
+            except ValueError as e:
+                QMessageBox.warning(self, "Eliminar Factura", str(e))
+                return
             self._refresh_facturas_list()
 
     def _ver_cotizacion_seleccionada(self):
@@ -2,34 +2,27 @@ from __future__ import annotations
 
 from PyQt6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QLabel, QComboBox, QMessageBox,
-    QMenuBar, QMenu, QFileDialog, QStatusBar
+    QMenuBar, QMenu, QFileDialog, QStatusBar, QProgressDialog
 )
 from PyQt6.QtGui import QAction
 from PyQt6.QtNetwork import QNetworkAccessManager, QNetworkRequest
-from PyQt6.QtCore import QUrl
+from PyQt6.QtCore import QUrl, QTimer, QThread, QEvent
 import os, sys
 
 import facot_config
 from logic import LogicController
 from widgets.connection_status_bar import ConnectionStatusBar
 
-# Tabs modulares
-from tabs.invoice_tab import InvoiceTab
-import sys
-# Fuerza recarga de módulos
-if 'tabs.quotation_tab' in sys.modules:
-    del sys.modules['tabs.quotation_tab']
-from tabs.quotation_tab import QuotationTab
-from tabs.invoice_history_tab import InvoiceHistoryTab
-from tabs.quotation_history_tab import QuotationHistoryTab
+# Las pestañas, ventanas secundarias y diálogos se importan al usarse por
+# primera vez: arrastran openpyxl/reportlab/WebEngine y retrasan el arranque.
 
-# Ventanas secundarias
-from settings_window import SettingsWindow
-from company_management_window import CompanyManagementWindow
-from items_management_window import ItemsManagementWindow
-
-# Dialog para editar plantillas (botón/menú)
-from dialogs.template_editor_dialog import TemplateEditorDialog
+# (atributo, título) de las pestañas en orden; se construyen al activarse
+TAB_SPECS = [
+    ("invoice_tab", "Factura"),
+    ("quotation_tab", "Cotización"),
+    ("invoice_history_tab", "Historial de Facturas"),
+    ("quotation_history_tab", "Historial de Cotizaciones"),
+]
 
 # -*- coding: utf-8 -*-
 
@@ -104,8 +97,89 @@ class HybridLogicWrapper:
         """Retorna conexión SQLite para compatibilidad."""
         return self._logic.conn if hasattr(self._logic, 'conn') else None
 
+    def set_data_access(self, data_access):
+        """Cambia el backend sin recrear las pestañas que guardan este wrapper."""
+        self._data_access = data_access
+        self._use_firebase = data_access is not None
+
+
+class DataAccessInitThread(QThread):
+    """
+    Crea el DataAccess del modo preferido fuera del hilo de la UI.
+
+    En modo FIREBASE/AUTO esto importa el SDK, lee credenciales y abre
+    Firestore (autenticación y DNS), lo que puede tardar varios segundos.
+    """
+    ready = pyqtSignal(object, str)   # (data_access, modo)
+    failed = pyqtSignal(str)
+
+    def __init__(self, logic, mode_name: str, parent=None):
+        super().__init__(parent)
+        self.logic = logic
+        self.mode_name = mode_name
+
+    def run(self):
+        try:
+            from data_access import get_data_access, DataAccessMode
+            data_access = get_data_access(logic_controller=self.logic, mode=DataAccessMode[self.mode_name])
+            self.ready.emit(data_access, self.mode_name)
+        except Exception as e:
+            self.failed.emit(str(e))
+
+
+class BackupThread(QThread):
+    """
+    Respaldo en caliente (API de backup de SQLite) fuera del hilo de la UI.
+
+    Con `only_if_due` sólo respalda si el último backup tiene más de un día
+    (respaldo automático al arrancar).
+    """
+    progress = pyqtSignal(int)         # porcentaje copiado
+    done = pyqtSignal(bool, str)       # (ok, ruta o mensaje)
+
+    def __init__(self, db_path: str, backup_dir: str = None, only_if_due: bool = False, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.backup_dir = backup_dir
+        self.only_if_due = only_if_due
+
+    def run(self):
+        from services.backup_service import BackupService
+        service = BackupService(self.db_path, self.backup_dir)
+        report = lambda fraction: self.progress.emit(int(fraction * 100))
+        if self.only_if_due:
+            result = service.backup_if_due(progress=report)
+            if result is None:
+                return
+        else:
+            result = service.create_backup(progress=report)
+        self.done.emit(*result)
+
+
+class RncImportThread(QThread):
+    """Importación del padrón de RNC de la DGII fuera del hilo de la UI."""
+    progress = pyqtSignal(int)         # porcentaje leído
+    done = pyqtSignal(bool, str)       # (ok, mensaje)
+
+    def __init__(self, db_path: str, path: str, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.path = path
+
+    def run(self):
+        from services.rnc_registry_service import RncRegistryService
+        service = RncRegistryService(self.db_path)
+        try:
+            result = service.import_file(self.path, progress=lambda fraction: self.progress.emit(int(fraction * 100)))
+        finally:
+            service.close()
+        self.done.emit(*result)
+
 
 class MainWindow(QMainWindow):
+    # Emitida desde el hilo de inicialización de Firebase (se entrega en el de la UI)
+    firebase_ready = pyqtSignal(bool)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Gestión de Facturas y Cotizaciones")
@@ -113,12 +187,32 @@ class MainWindow(QMainWindow):
         self.data_access = None  # Will hold DataAccess instance
         self.current_access_mode = "SQLITE"  # Track current mode
         self.hybrid_logic = None  # Will hold HybridLogicWrapper
+        self._startup_done = False
+        self._data_access_thread = None
+        self._backup_thread = None
+        self._rnc_import_thread = None
+        self._maintenance = None
+        self.firebase_ready.connect(self._on_firebase_ready)
         self._init_db()
         self._setup_ui()
         self._setup_menu()
         self._setup_connection_status()
+        # Firebase, la verificación de red y la primera pestaña se cargan
+        # después de mostrar la ventana (ver _deferred_startup)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not self._startup_done:
+            self._startup_done = True
+            QTimer.singleShot(0, self._deferred_startup)
+
+    def _deferred_startup(self):
+        """Trabajo de arranque que no hace falta para pintar la ventana."""
+        self._ensure_tab(self.tabs.currentIndex())
+        self._start_data_access_init()
         self._check_online_status()
-        self._detect_and_set_connection_mode()
+        self._start_backup(only_if_due=True)
+        self._start_maintenance()
 
     def _init_db(self):
         db_path = facot_config.get_db_path()
@@ -130,33 +224,77 @@ class MainWindow(QMainWindow):
                 QMessageBox.critical(self, "Error", "No se seleccionó una base de datos. El programa se cerrará.")
                 sys.exit(1)
         self.logic = LogicController(db_path)
-        
-        # Initialize data_access with preferred mode from config
+
+        # Se arranca con SQLite; el modo preferido (Firebase/AUTO) se
+        # inicializa en segundo plano al mostrar la ventana
         try:
             from data_access import get_data_access, DataAccessMode
-            from config_facot import get_connection_mode
-            
-            # Cargar modo preferido de configuración
-            preferred_mode = get_connection_mode()  # "SQLITE", "FIREBASE", or "AUTO"
-            print(f"[MAIN] Modo de conexión preferido: {preferred_mode}")
-            
-            # Convertir a DataAccessMode enum
-            mode_enum = DataAccessMode[preferred_mode]
-            
-            # Inicializar data_access con el modo preferido
-            self.data_access = get_data_access(logic_controller=self.logic, mode=mode_enum)
-            self.current_access_mode = preferred_mode
-            
-            # Crear wrapper híbrido que combina logic y data_access
+            self.data_access = get_data_access(logic_controller=self.logic, mode=DataAccessMode.SQLITE)
             self.hybrid_logic = HybridLogicWrapper(self.logic, self.data_access)
-            print(f"[MAIN] Created hybrid logic wrapper")
-            
         except Exception as e:
             print(f"[MAIN] Warning: Could not initialize data_access: {e}")
             self.data_access = None
-            self.current_access_mode = "SQLITE"
             # Wrapper solo con logic
             self.hybrid_logic = HybridLogicWrapper(self.logic, None)
+        self.current_access_mode = "SQLITE"
+
+    def _start_data_access_init(self):
+        """Lanza la inicialización del modo de conexión preferido en un hilo."""
+        try:
+            from config_facot import get_connection_mode
+            preferred_mode = get_connection_mode()  # "SQLITE", "FIREBASE", or "AUTO"
+        except Exception as e:
+            print(f"[MAIN] Warning: Could not read connection mode: {e}")
+            return
+        print(f"[MAIN] Modo de conexión preferido: {preferred_mode}")
+        if preferred_mode == "SQLITE":
+            return
+
+        if preferred_mode == "AUTO":
+            # No bloquea: usa SQLite hasta que Firebase termine de inicializarse
+            try:
+                from data_access import get_data_access, DataAccessMode
+                data_access = get_data_access(logic_controller=self.logic, mode=DataAccessMode.AUTO)
+                self._on_data_access_ready(data_access, preferred_mode)
+            except Exception as e:
+                print(f"[MAIN] Warning: Could not initialize data_access: {e}")
+            return
+
+        # FIREBASE explícito: se espera al cliente, pero fuera del hilo de la UI
+        self._data_access_thread = DataAccessInitThread(self.logic, preferred_mode, self)
+        self._data_access_thread.ready.connect(self._on_data_access_ready)
+        self._data_access_thread.failed.connect(
+            lambda err: print(f"[MAIN] Warning: Could not initialize data_access: {err}")
+        )
+        self._data_access_thread.start()
+
+    def _on_data_access_ready(self, data_access, mode_name: str):
+        """Activa el backend inicializado en segundo plano."""
+        self.data_access = data_access
+        self.current_access_mode = mode_name
+        if self.hybrid_logic is not None:
+            self.hybrid_logic.set_data_access(data_access)
+        else:
+            self.hybrid_logic = HybridLogicWrapper(self.logic, data_access)
+        print(f"[MAIN] Backend {mode_name} listo: {type(data_access).__name__}")
+        self._watch_firebase_ready(data_access)
+
+        self._populate_companies()
+        self._on_company_change()
+        self._detect_and_set_connection_mode()
+
+    def _watch_firebase_ready(self, data_access):
+        """Si el backend cambia a Firebase más tarde, refrescar la UI en ese momento."""
+        add_ready_callback = getattr(data_access, "add_ready_callback", None)
+        if callable(add_ready_callback) and not data_access.is_ready():
+            add_ready_callback(lambda using_firebase: self.firebase_ready.emit(using_firebase))
+
+    def _on_firebase_ready(self, using_firebase: bool):
+        print(f"[MAIN] Inicialización de Firebase terminada (usando Firebase: {using_firebase})")
+        if using_firebase:
+            self._populate_companies()
+            self._on_company_change()
+        self._detect_and_set_connection_mode()
 
     def _setup_ui(self):
         central = QWidget(); layout = QVBoxLayout(central); self.setCentralWidget(central)
@@ -170,28 +308,68 @@ class MainWindow(QMainWindow):
         # Función para obtener la empresa actual (las pestañas usan get_current_company inyectado)
         get_company = lambda: self.companies.get(self.company_selector.currentText())
 
-        # Tabs modulares
+        # Tabs modulares: se reserva la posición con un widget vacío y la
+        # pestaña real se construye la primera vez que se activa
         from PyQt6.QtWidgets import QTabWidget
         self.tabs = QTabWidget()
+        self._get_company = get_company
+        for attr, title in TAB_SPECS:
+            setattr(self, attr, None)
+            self.tabs.addTab(QWidget(), title)
+        self.tabs.currentChanged.connect(self._ensure_tab)
+        layout.addWidget(self.tabs)
 
+    def _create_tab(self, attr: str):
         # Usar hybrid_logic en lugar de logic directo
         # Esto permite que los tabs usen Firebase o SQLite transparentemente
         logic_to_pass = self.hybrid_logic if self.hybrid_logic else self.logic
-        
-        self.invoice_tab = InvoiceTab(logic_to_pass, get_company)
-        self.quotation_tab = QuotationTab(logic_to_pass, get_company)
-        self.invoice_history_tab = InvoiceHistoryTab(logic_to_pass, get_company)
-        self.quotation_history_tab = QuotationHistoryTab(logic_to_pass, get_company)
-
-        # Conexiones: refrescar historial al guardar
-        self.invoice_tab.invoice_saved.connect(lambda _id: self.invoice_history_tab.refresh())
-        self.quotation_tab.quotation_saved.connect(lambda _id: self.quotation_history_tab.refresh())
-
-        self.tabs.addTab(self.invoice_tab, "Factura")
-        self.tabs.addTab(self.quotation_tab, "Cotización")
-        self.tabs.addTab(self.invoice_history_tab, "Historial de Facturas")
-        self.tabs.addTab(self.quotation_history_tab, "Historial de Cotizaciones")
-        layout.addWidget(self.tabs)
+
+        if attr == "invoice_tab":
+            from tabs.invoice_tab import InvoiceTab
+            tab = InvoiceTab(logic_to_pass, self._get_company)
+            # Refrescar historial al guardar
+            tab.invoice_saved.connect(lambda _id: self._refresh_tab("invoice_history_tab"))
+        elif attr == "quotation_tab":
+            from tabs.quotation_tab import QuotationTab
+            tab = QuotationTab(logic_to_pass, self._get_company)
+            tab.quotation_saved.connect(lambda _id: self._refresh_tab("quotation_history_tab"))
+        elif attr == "invoice_history_tab":
+            from tabs.invoice_history_tab import InvoiceHistoryTab
+            tab = InvoiceHistoryTab(logic_to_pass, self._get_company)
+        else:
+            from tabs.quotation_history_tab import QuotationHistoryTab
+            tab = QuotationHistoryTab(logic_to_pass, self._get_company)
+        return tab
+
+    def _ensure_tab(self, index: int):
+        """Construye la pestaña `index` si todavía es un marcador vacío."""
+        if index < 0 or index >= len(TAB_SPECS):
+            return None
+        attr, title = TAB_SPECS[index]
+        tab = getattr(self, attr)
+        if tab is not None:
+            return tab
+
+        tab = self._create_tab(attr)
+        setattr(self, attr, tab)
+        current = self.tabs.currentIndex()
+        placeholder = self.tabs.widget(index)
+        blocked = self.tabs.blockSignals(True)
+        self.tabs.removeTab(index)
+        self.tabs.insertTab(index, tab, title)
+        self.tabs.setCurrentIndex(current)
+        self.tabs.blockSignals(blocked)
+        placeholder.deleteLater()
+        return tab
+
+    def _built_tabs(self):
+        """Pestañas ya construidas."""
+        return [t for t in (getattr(self, attr) for attr, _ in TAB_SPECS) if t is not None]
+
+    def _refresh_tab(self, attr: str):
+        tab = getattr(self, attr, None)
+        if tab is not None:
+            tab.refresh()
 
     def _setup_menu(self):
         menu_bar = QMenuBar(self); self.setMenuBar(menu_bar)
@@ -208,6 +386,9 @@ class MainWindow(QMainWindow):
         backup_action = QAction("Hacer Backup...", self)
         backup_action.triggered.connect(self._hacer_backup)
         archivo_menu.addAction(backup_action)
+        verify_backup_action = QAction("Verificar Backup...", self)
+        verify_backup_action.triggered.connect(self._verificar_backup)
+        archivo_menu.addAction(verify_backup_action)
 
         archivo_menu.addSeparator()
         salir_action = QAction("Salir", self); salir_action.triggered.connect(self.close)
@@ -221,6 +402,11 @@ class MainWindow(QMainWindow):
         reporte_clientes_action = QAction("Reporte por Cliente", self)
         reporte_clientes_action.triggered.connect(lambda: QMessageBox.information(self, "Reporte", "Aquí se abriría el reporte por cliente."))
         reportes_menu.addAction(reporte_clientes_action)
+        reportes_menu.addSeparator()
+        dgii_report_action = QAction("🧾 Formatos DGII 606/607/608...", self)
+        dgii_report_action.setToolTip("Generar el TXT (y opcionalmente el Excel) de compras, ventas o NCF anulados de un mes")
+        dgii_report_action.triggered.connect(self._generar_formato_dgii)
+        reportes_menu.addAction(dgii_report_action)
 
         # Menú Herramientas
         herramientas_menu = QMenu("&Herramientas", self); menu_bar.addMenu(herramientas_menu)
@@ -236,6 +422,21 @@ class MainWindow(QMainWindow):
         ncf_config_action.triggered.connect(self._abrir_configuracion_ncf)
         herramientas_menu.addAction(ncf_config_action)
 
+        db_health_action = QAction("🩺 Salud de la Base de Datos...", self)
+        db_health_action.setToolTip("Tamaños por tabla e índice y mantenimiento (ANALYZE, vacuum, integridad)")
+        db_health_action.triggered.connect(self._abrir_salud_bd)
+        herramientas_menu.addAction(db_health_action)
+
+        archive_year_action = QAction("📦 Cerrar Año Fiscal...", self)
+        archive_year_action.setToolTip("Mover las facturas de un año cerrado a su archivo (sigue consultable)")
+        archive_year_action.triggered.connect(self._cerrar_anio_fiscal)
+        herramientas_menu.addAction(archive_year_action)
+
+        rnc_registry_action = QAction("🗂️ Importar Padrón RNC (DGII)...", self)
+        rnc_registry_action.setToolTip("Cargar o actualizar el registro de contribuyentes para buscar y validar clientes")
+        rnc_registry_action.triggered.connect(self._importar_padron_rnc)
+        herramientas_menu.addAction(rnc_registry_action)
+
         # Menú Opciones
         opciones_menu = QMenu("&Opciones", self); menu_bar.addMenu(opciones_menu)
         config_rutas_action = QAction("Configurar Rutas...", self)
@@ -264,9 +465,8 @@ class MainWindow(QMainWindow):
             self.logic = LogicController(filename)
             self._populate_companies()
             # Reinyectar lógica en tabs
-            get_company = lambda: self.companies.get(self.company_selector.currentText())
-            self.invoice_tab.logic = self.logic; self.quotation_tab.logic = self.logic
-            self.invoice_history_tab.logic = self.logic; self.quotation_history_tab.logic = self.logic
+            for tab in self._built_tabs():
+                tab.logic = self.logic
             self._on_company_change()
             QMessageBox.information(self, "Base de Datos", "Base de datos abierta correctamente.")
 
@@ -280,23 +480,65 @@ class MainWindow(QMainWindow):
             QMessageBox.information(self, "Base de Datos", "Nueva base de datos creada correctamente.")
 
     def _hacer_backup(self):
-        import shutil
-        db_path = self.logic.db_path
-        backup_path, _ = QFileDialog.getSaveFileName(self, "Guardar Backup de la Base de Datos", "", "Database Files (*.db);;Todos los archivos (*)")
-        if backup_path:
-            shutil.copy2(db_path, backup_path)
-            QMessageBox.information(self, "Backup", f"Backup guardado en:\n{backup_path}")
+        from services.backup_service import BackupService
+        default_dir = BackupService(self.logic.db_path).backup_dir
+        backup_dir = QFileDialog.getExistingDirectory(self, "Carpeta de Backups de la Base de Datos", default_dir)
+        if backup_dir:
+            self._start_backup(backup_dir=backup_dir)
+
+    def _start_backup(self, backup_dir: str = None, only_if_due: bool = False):
+        """Lanza el respaldo en segundo plano; la facturación sigue disponible."""
+        if self._backup_thread is not None and self._backup_thread.isRunning():
+            if not only_if_due:
+                QMessageBox.information(self, "Backup", "Ya hay un backup en curso.")
+            return
+        self._backup_thread = BackupThread(self.logic.db_path, backup_dir, only_if_due, self)
+        if only_if_due:
+            self._backup_thread.done.connect(
+                lambda ok, msg: self.statusBar().showMessage(
+                    f"Backup automático: {os.path.basename(msg)}" if ok else msg, 8000)
+            )
+        else:
+            progress = QProgressDialog("Creando backup...", None, 0, 100, self)
+            progress.setWindowTitle("Backup")
+            progress.setMinimumDuration(500)
+            self._backup_thread.progress.connect(progress.setValue)
+            self._backup_thread.done.connect(lambda ok, msg: self._on_backup_done(progress, ok, msg))
+        self._backup_thread.start()
+
+    def _on_backup_done(self, progress_dialog, ok: bool, message: str):
+        progress_dialog.close()
+        if ok:
+            QMessageBox.information(self, "Backup", f"Backup guardado en:\n{message}")
+        else:
+            QMessageBox.critical(self, "Backup", message)
+
+    def _verificar_backup(self):
+        from services.backup_service import BackupService
+        service = BackupService(self.logic.db_path)
+        path, _ = QFileDialog.getOpenFileName(self, "Verificar Backup", service.backup_dir,
+                                              "Backups (*.db.gz *.db.zst *.db);;Todos los archivos (*)")
+        if not path:
+            return
+        ok, message = service.verify_backup(path)
+        if ok:
+            QMessageBox.information(self, "Backup", message)
+        else:
+            QMessageBox.critical(self, "Backup", f"El backup no es válido:\n{message}")
 
     def _abrir_configuracion(self):
+        from settings_window import SettingsWindow
         dlg = SettingsWindow(self.logic, self); dlg.exec()
 
     def _abrir_gestion_empresas(self):
+        from company_management_window import CompanyManagementWindow
         dlg = CompanyManagementWindow(self, self.logic); dlg.exec()
         # Si cambian empresas, repoblar
         self._populate_companies()
         self._on_company_change()
 
     def _abrir_gestion_items(self):
+        from items_management_window import ItemsManagementWindow
         dlg = ItemsManagementWindow(self); dlg.exec()
 
     def _abrir_dialogo_migracion(self):
@@ -329,11 +571,13 @@ class MainWindow(QMainWindow):
         self.company_selector.addItems(self.companies.keys())
 
     def _on_company_change(self):
-        # Notifica a las pestañas
-        self.invoice_tab.on_company_change()
-        self.quotation_tab.on_company_change()
-        self.invoice_history_tab.refresh()
-        self.quotation_history_tab.refresh()
+        # Notifica a las pestañas ya construidas (las demás leen la empresa al crearse)
+        for attr in ("invoice_tab", "quotation_tab"):
+            tab = getattr(self, attr, None)
+            if tab is not None:
+                tab.on_company_change()
+        self._refresh_tab("invoice_history_tab")
+        self._refresh_tab("quotation_history_tab")
 
     # Helper para obtener la empresa actual desde cualquier lugar
     def get_current_company(self):
@@ -375,6 +619,7 @@ class MainWindow(QMainWindow):
             return
 
         try:
+            from dialogs.template_editor_dialog import TemplateEditorDialog
             dlg = TemplateEditorDialog(company_id=company_id, parent=self)
             if dlg.exec():
                 QMessageBox.information(self, "Plantilla", "Plantilla guardada correctamente.")
@@ -396,20 +641,29 @@ class MainWindow(QMainWindow):
         # Conectar señales
         self.connection_status.database_changed.connect(self._on_database_changed)
         self.connection_status.mode_changed.connect(self._on_connection_mode_changed)
+        self.connection_status.online_status_changed.connect(self._on_online_status_changed)
         
         # Agregar a la barra de estado
         status_bar.addPermanentWidget(self.connection_status)
     
     def _check_online_status(self):
         """Verifica si hay conexión a internet."""
-        # Crear network manager
-        self.network_manager = QNetworkAccessManager(self)
-        self.network_manager.finished.connect(self._on_network_check_finished)
+        # Crear network manager (una sola vez)
+        if not hasattr(self, "network_manager"):
+            self.network_manager = QNetworkAccessManager(self)
+            self.network_manager.finished.connect(self._on_network_check_finished)
         
         # Hacer request a un servidor confiable
         request = QNetworkRequest(QUrl("https://www.google.com"))
         request.setTransferTimeout(3000)  # 3 segundos timeout
         self.network_manager.get(request)
+        
+        # Re-verificar periódicamente para detectar cuándo vuelve la conexión
+        if not hasattr(self, "_online_timer"):
+            self._online_timer = QTimer(self)
+            self._online_timer.setInterval(30000)
+            self._online_timer.timeout.connect(self._check_online_status)
+            self._online_timer.start()
     
     def _on_network_check_finished(self, reply):
         """Callback cuando se completa la verificación de red."""
@@ -417,6 +671,12 @@ class MainWindow(QMainWindow):
         self.connection_status.set_online_status(is_online)
         reply.deleteLater()
     
+    def _on_online_status_changed(self, is_online: bool):
+        """Informa al backend Firebase; al volver la conexión se envía la cola offline en segundo plano."""
+        set_online = getattr(self.data_access, "set_online", None)
+        if callable(set_online):
+            set_online(is_online)
+
     def _detect_and_set_connection_mode(self):
         """
         Detecta si se está usando Firebase y actualiza el widget de estado.
@@ -426,13 +686,15 @@ class MainWindow(QMainWindow):
             from firebase import get_firebase_client
             
             # Verificar si data_access es realmente FirebaseDataAccess
+            # (DeferredDataAccess expone el backend que atiende en `active`)
+            backend = getattr(self.data_access, "active", self.data_access)
             is_using_firebase = (
-                self.data_access is not None and 
-                "Firebase" in type(self.data_access).__name__
+                backend is not None and 
+                "Firebase" in type(backend).__name__
             )
             
-            # Verificar si Firebase está disponible
-            firebase_client = get_firebase_client()
+            # Verificar si Firebase está disponible (sin esperar la inicialización)
+            firebase_client = get_firebase_client(wait=False)
             firebase_available = firebase_client.is_available()
             
             if is_using_firebase and firebase_available:
@@ -476,16 +738,11 @@ class MainWindow(QMainWindow):
             self._populate_companies()
             
             # Reinyectar lógica en tabs
-            self.invoice_tab.logic = self.logic
-            self.quotation_tab.logic = self.logic
-            self.invoice_history_tab.logic = self.logic
-            self.quotation_history_tab.logic = self.logic
+            for tab in self._built_tabs():
+                tab.logic = self.logic
             
             # Refrescar
-            self.invoice_tab.on_company_change()
-            self.quotation_tab.on_company_change()
-            self.invoice_history_tab.refresh()
-            self.quotation_history_tab.refresh()
+            self._on_company_change()
             
             QMessageBox.information(
                 self,
@@ -519,18 +776,27 @@ class MainWindow(QMainWindow):
             
             mode = mode_map.get(new_mode.upper())
             if mode:
+                # La elección del usuario prevalece sobre la inicialización de arranque pendiente
+                self._discard_pending_data_access_init()
                 set_data_access_mode(mode)
                 self.current_access_mode = new_mode.upper()
                 
+                # Liberar bloques de NCF del backend anterior
+                self._release_ncf_leases()
+
                 # Recreate data_access with new mode
                 try:
                     if mode == DataAccessMode.SQLITE:
                         self.data_access = get_data_access(logic_controller=self.logic, mode=mode)
                     elif mode == DataAccessMode.FIREBASE:
-                        self.data_access = get_data_access(user_id=None, mode=mode)
+                        self.data_access = get_data_access(logic_controller=self.logic, user_id=None, mode=mode)
                     else:  # AUTO
                         self.data_access = get_data_access(logic_controller=self.logic, user_id=None, mode=mode)
+                        self._watch_firebase_ready(self.data_access)
                     
+                    if self.hybrid_logic is not None:
+                        self.hybrid_logic.set_data_access(self.data_access)
+
                     # Reload companies with new data access
                     self._populate_companies()
                     
@@ -568,12 +834,155 @@ class MainWindow(QMainWindow):
                 "Solo se puede usar SQLite."
             )
     
+    def _release_ncf_leases(self):
+        """Devuelve a Firestore los NCF arrendados y no usados por esta estación."""
+        release = getattr(self.data_access, "release_ncf_leases", None)
+        if callable(release):
+            try:
+                release()
+            except Exception as e:
+                print(f"[MAIN] Error liberando bloques NCF: {e}")
+
+    def _discard_pending_data_access_init(self):
+        thread = self._data_access_thread
+        if thread is not None and thread.isRunning():
+            try:
+                thread.ready.disconnect(self._on_data_access_ready)
+            except TypeError:
+                pass
+
+    def _start_maintenance(self):
+        """Mantenimiento de la base en un hilo, sólo tras unos minutos sin actividad."""
+        from PyQt6.QtWidgets import QApplication
+        from services.maintenance_service import MaintenanceScheduler, MaintenanceService
+        self._maintenance = MaintenanceScheduler(MaintenanceService(self.logic.db_path))
+        QApplication.instance().installEventFilter(self)
+        self._maintenance.start()
+
+    def eventFilter(self, obj, event):
+        if self._maintenance is not None and event.type() in (
+            QEvent.Type.KeyPress, QEvent.Type.MouseButtonPress, QEvent.Type.Wheel
+        ):
+            self._maintenance.touch()
+        return super().eventFilter(obj, event)
+
+    def _abrir_salud_bd(self):
+        from dialogs.db_health_dialog import DatabaseHealthDialog
+        DatabaseHealthDialog(self.logic.db_path, self).exec()
+
+    def _cerrar_anio_fiscal(self):
+        from PyQt6.QtWidgets import QInputDialog
+        if not hasattr(self.logic, "archive_fiscal_year"):
+            QMessageBox.information(self, "Cerrar Año Fiscal", "El backend actual no admite archivo por año.")
+            return
+        years = [str(y) for y in self.logic.get_closable_years()]
+        if not years:
+            QMessageBox.information(self, "Cerrar Año Fiscal", "No hay años cerrados con facturas en la base.")
+            return
+        year, ok = QInputDialog.getItem(self, "Cerrar Año Fiscal", "Año a archivar:", years, 0, False)
+        if not ok:
+            return
+        confirm = QMessageBox.question(
+            self, "Cerrar Año Fiscal",
+            f"Las facturas de {year} se moverán a un archivo aparte.\n"
+            "Seguirán disponibles en reportes y búsquedas por fecha. ¿Continuar?"
+        )
+        if confirm != QMessageBox.StandardButton.Yes:
+            return
+        success, message = self.logic.archive_fiscal_year(int(year))
+        if success:
+            QMessageBox.information(self, "Cerrar Año Fiscal",
+                                    f"{message}\n\nSe creará un backup que incluye el archivo del año.")
+            # El año ya no está en la base caliente: respaldar su archivo de inmediato
+            self._start_backup()
+        else:
+            QMessageBox.warning(self, "Cerrar Año Fiscal", message)
+
+    def _generar_formato_dgii(self):
+        from PyQt6.QtWidgets import QInputDialog
+        if not hasattr(self.logic, "generate_dgii_report"):
+            QMessageBox.information(self, "Formatos DGII", "El backend actual no genera formatos DGII.")
+            return
+        company = self.get_current_company()
+        if not company:
+            QMessageBox.warning(self, "Formatos DGII", "Seleccione una empresa válida.")
+            return
+        reports = ["606 - Compras", "607 - Ventas", "608 - NCF anulados"]
+        choice, ok = QInputDialog.getItem(self, "Formatos DGII", "Formato:", reports, 1, False)
+        if not ok:
+            return
+        report = choice[:3]
+        last_month = QDate.currentDate().addMonths(-1).toString("yyyy-MM")
+        period, ok = QInputDialog.getText(self, "Formatos DGII", "Período (AAAA-MM):", text=last_month)
+        if not ok or not period.strip():
+            return
+        path, _ = QFileDialog.getSaveFileName(
+            self, f"Guardar formato {report}", f"DGII_{report}_{period.strip().replace('-', '')}.txt",
+            "TXT DGII (*.txt);;Excel (*.xlsx)"
+        )
+        if not path:
+            return
+        xlsx = path.lower().endswith(".xlsx")
+        success, result = self.logic.generate_dgii_report(
+            report, company['id'], period.strip(),
+            txt_path=None if xlsx else path, xlsx_path=path if xlsx else None
+        )
+        if not success:
+            QMessageBox.warning(self, "Formatos DGII", result)
+            return
+        message = (f"Formato {report} generado: {result['count']} registro(s)\n"
+                   f"Monto facturado: {result['monto_facturado']:,.2f}\n"
+                   f"ITBIS facturado: {result['itbis_facturado']:,.2f}")
+        if result['error_count']:
+            details = "\n".join(f"{e['ncf']}: {e['error']}" for e in result['errors'][:10])
+            message += f"\n\n{result['error_count']} error(es) de validación:\n{details}"
+        QMessageBox.information(self, "Formatos DGII", message)
+
+    def _importar_padron_rnc(self):
+        if not hasattr(self.logic, "import_rnc_registry"):
+            QMessageBox.information(self, "Padrón RNC", "El backend actual no admite el padrón local de RNC.")
+            return
+        if self._rnc_import_thread is not None and self._rnc_import_thread.isRunning():
+            QMessageBox.information(self, "Padrón RNC", "Ya hay una importación en curso.")
+            return
+        path, _ = QFileDialog.getOpenFileName(self, "Padrón RNC de la DGII", "",
+                                              "Padrón DGII (*.zip *.txt *.TXT);;Todos los archivos (*)")
+        if not path:
+            return
+        self._rnc_import_thread = RncImportThread(self.logic.db_path, path, self)
+        progress = QProgressDialog("Importando padrón RNC...", None, 0, 100, self)
+        progress.setWindowTitle("Padrón RNC")
+        progress.setMinimumDuration(500)
+        self._rnc_import_thread.progress.connect(progress.setValue)
+        self._rnc_import_thread.done.connect(lambda ok, msg: self._on_rnc_import_done(progress, ok, msg))
+        self._rnc_import_thread.start()
+
+    def _on_rnc_import_done(self, progress_dialog, ok: bool, message: str):
+        progress_dialog.close()
+        if ok:
+            QMessageBox.information(self, "Padrón RNC", message)
+        else:
+            QMessageBox.warning(self, "Padrón RNC", message)
+
+    def closeEvent(self, event):
+        if self._maintenance is not None:
+            self._maintenance.stop(timeout=0)
+        self._release_ncf_leases()
+        # No destruir el hilo de inicialización mientras corre
+        self._discard_pending_data_access_init()
+        if self._data_access_thread is not None:
+            self._data_access_thread.wait(3000)
+        super().closeEvent(event)
+
     def _check_firebase_availability(self):
         """Verifica si Firebase está disponible y configurado."""
         try:
             from firebase import get_firebase_client
             
-            client = get_firebase_client()
+            client = get_firebase_client(wait=False)
+            if not client.is_ready():
+                # Se avisa al terminar la inicialización (ver _on_firebase_ready)
+                return
             if not client.is_available():
                 QMessageBox.warning(
                     self,
@@ -148,10 +148,11 @@ def seed_company_templates_if_missing(dest_dir: Path) -> None:
                 pass
 
 def _call_optional_schema_initializers(db_path: str) -> None:
-    # Inicializador de ítems/categorías si existe
+    # Migraciones versionadas (incluye ítems/categorías). Se evita importar
+    # items_management_window, que carga PyQt y openpyxl en el arranque.
     try:
-        from items_management_window import ensure_items_schema  # type: ignore
-        ensure_items_schema(db_path)
+        from services.schema_migrations import ensure_schema
+        ensure_schema(db_path)
     except Exception:
         # Esquema mínimo
         try:
@@ -0,0 +1,247 @@
+"""
+Almacén de configuración JSON con caché en memoria.
+
+- Las lecturas se sirven de una copia en memoria; el archivo sólo se vuelve
+  a leer si cambió su mtime (comprobado como mucho cada `check_interval`
+  segundos), así las rutas calientes de la UI no hacen E/S de disco.
+- Las escrituras actualizan la memoria al instante y se agrupan: el archivo
+  se reescribe una sola vez tras `write_delay` segundos, de forma atómica
+  (archivo temporal en la misma carpeta + os.replace).
+- `subscribe(callback)` notifica las claves cambiadas, tanto por escrituras
+  locales como por recargas del archivo editado desde fuera.
+
+Uso:
+    store = get_store("facot_config.json")
+    store.get("connection_mode", "AUTO")
+    store.set("connection_mode", "SQLITE")
+"""
+from __future__ import annotations
+
+import atexit
+import copy
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+DEFAULT_WRITE_DELAY = 0.5
+DEFAULT_CHECK_INTERVAL = 1.0
+
+ChangeCallback = Callable[[Set[str], Dict[str, Any]], None]
+
+
+class ConfigStore:
+    """Configuración JSON en memoria con recarga por mtime y escritura diferida atómica."""
+
+    def __init__(
+        self,
+        path: str,
+        write_delay: float = DEFAULT_WRITE_DELAY,
+        check_interval: float = DEFAULT_CHECK_INTERVAL
+    ):
+        self.path = os.path.abspath(path)
+        self.write_delay = write_delay
+        self.check_interval = check_interval
+        self.stats = {'reads': 0, 'writes': 0}
+        self._data: Dict[str, Any] = {}
+        self._mtime: Optional[Tuple[int, int]] = None
+        self._loaded = False
+        self._last_check = 0.0
+        self._dirty = False
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.RLock()
+        self._subscribers: List[ChangeCallback] = []
+
+    # ----- Lectura -----
+
+    def _stat_mtime(self) -> Optional[Tuple[int, int]]:
+        """(mtime_ns, tamaño) del archivo, o None si no existe."""
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def _read_file(self) -> Dict[str, Any]:
+        self.stats['reads'] += 1
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def _ensure_fresh(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if self._loaded and now - self._last_check < self.check_interval:
+                return
+            self._last_check = now
+            mtime = self._stat_mtime()
+            if self._loaded and (mtime == self._mtime or self._dirty):
+                # Sin cambios en disco, o cambios locales pendientes de escribir
+                return
+            old = self._data
+            self._data = self._read_file()
+            self._mtime = mtime
+            first_load = not self._loaded
+            self._loaded = True
+            changed = _changed_keys(old, self._data)
+        if changed and not first_load:
+            self._notify(changed)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Valor de `key` (copia para dicts/listas, así el caché no se modifica por fuera)."""
+        self._ensure_fresh()
+        with self._lock:
+            if key not in self._data:
+                return default
+            value = self._data[key]
+        return copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Copia completa de la configuración."""
+        self._ensure_fresh()
+        with self._lock:
+            return copy.deepcopy(self._data)
+
+    # ----- Escritura -----
+
+    def set(self, key: str, value: Any) -> None:
+        self.update({key: value})
+
+    def update(self, values: Dict[str, Any]) -> None:
+        """Actualiza varias claves y programa la escritura."""
+        self._ensure_fresh()
+        with self._lock:
+            changed = {k for k, v in values.items() if self._data.get(k, _MISSING) != v}
+            if not changed:
+                return
+            for k in changed:
+                self._data[k] = copy.deepcopy(values[k])
+            self._schedule_write()
+        self._notify(changed)
+
+    def delete(self, key: str) -> None:
+        self._ensure_fresh()
+        with self._lock:
+            if key not in self._data:
+                return
+            del self._data[key]
+            self._schedule_write()
+        self._notify({key})
+
+    def replace(self, data: Dict[str, Any]) -> None:
+        """Reemplaza toda la configuración (equivale al antiguo save_config)."""
+        self._ensure_fresh()
+        with self._lock:
+            changed = _changed_keys(self._data, data)
+            if not changed:
+                return
+            self._data = copy.deepcopy(data)
+            self._schedule_write()
+        self._notify(changed)
+
+    def _schedule_write(self) -> None:
+        self._dirty = True
+        if self.write_delay <= 0:
+            self.flush()
+            return
+        if self._timer is None:
+            self._timer = threading.Timer(self.write_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self) -> None:
+        """Escribe los cambios pendientes de inmediato (atómico)."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return
+            try:
+                payload = json.dumps(self._data, indent=2, ensure_ascii=False)
+            except (TypeError, ValueError) as e:
+                print(f"[CONFIG] Configuración no serializable, no se guarda: {e}")
+                return
+            folder = os.path.dirname(self.path) or "."
+            try:
+                os.makedirs(folder, exist_ok=True)
+                fd, tmp = tempfile.mkstemp(prefix=".facot_cfg_", suffix=".tmp", dir=folder)
+                try:
+                    with os.fdopen(fd, "w", encoding="utf-8") as f:
+                        f.write(payload)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(tmp, self.path)
+                except BaseException:
+                    try:
+                        os.unlink(tmp)
+                    except OSError:
+                        pass
+                    raise
+            except OSError as e:
+                print(f"[CONFIG] No se pudo guardar {self.path}: {e}")
+                return
+            self.stats['writes'] += 1
+            self._dirty = False
+            self._mtime = self._stat_mtime()
+
+    # ----- Notificaciones -----
+
+    def subscribe(self, callback: ChangeCallback) -> Callable[[], None]:
+        """
+        Registra `callback(claves_cambiadas, snapshot)`. Retorna la función
+        para cancelar la suscripción.
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return unsubscribe
+
+    def _notify(self, changed: Set[str]) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+            data = copy.deepcopy(self._data) if subscribers else None
+        for callback in subscribers:
+            try:
+                callback(set(changed), data)
+            except Exception as e:
+                print(f"[CONFIG] Error en suscriptor: {e}")
+
+
+_MISSING = object()
+
+
+def _changed_keys(old: Dict[str, Any], new: Dict[str, Any]) -> Set[str]:
+    return {k for k in set(old) | set(new) if old.get(k, _MISSING) != new.get(k, _MISSING)}
+
+
+_stores: Dict[str, ConfigStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path: str) -> ConfigStore:
+    """Almacén compartido para `path` (una instancia por archivo)."""
+    key = os.path.abspath(path)
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                store = _stores[key] = ConfigStore(key)
+    return store
+
+
+@atexit.register
+def flush_all() -> None:
+    """Escribe los cambios pendientes de todos los almacenes."""
+    for store in list(_stores.values()):
+        store.flush()
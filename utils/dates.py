@@ -0,0 +1,64 @@
+"""
+Fechas de documentos: normalización a ISO y número de día.
+
+Las fechas llegan como texto en varios formatos (QDate.toString, ISO,
+tecleadas a mano: '15/01/2025', '2025/1/5', '20250115'...). Se guardan
+siempre como 'AAAA-MM-DD' y cada fecha tiene además una columna generada
+con su número de día (días desde 1970-01-01, `DAY_NUMBER_SQL`) indexada,
+para filtrar y ordenar por período con comparaciones enteras.
+
+Uso:
+    normalize_date("15/01/2025")     # '2025-01-15'
+    day_number("2025-01-15")         # 20103
+"""
+from __future__ import annotations
+
+import re
+from datetime import date, datetime
+from typing import Any, Optional
+
+EPOCH = date(1970, 1, 1)
+
+# Número de día de una columna en SQL; NULL si el texto no empieza con una fecha ISO
+DAY_NUMBER_SQL = (
+    "CASE WHEN {col} GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]*' "
+    "THEN CAST(julianday(substr({col}, 1, 10)) - 2440587.5 AS INTEGER) END"
+)
+
+_YMD = re.compile(r'^(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})(?:[ T].*)?$')
+_DMY = re.compile(r'^(\d{1,2})[-/.](\d{1,2})[-/.](\d{4})(?:[ T].*)?$')
+_COMPACT = re.compile(r'^(\d{4})(\d{2})(\d{2})$')
+
+
+def parse_date(value: Any) -> Optional[date]:
+    """date para un valor de fecha (date, datetime, QDate o texto); None si no se reconoce."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if hasattr(value, "toPyDate"):  # QDate
+        return value.toPyDate() if value.isValid() else None
+    text = str(value).strip()
+    for pattern, order in ((_YMD, (1, 2, 3)), (_DMY, (3, 2, 1)), (_COMPACT, (1, 2, 3))):
+        match = pattern.match(text)
+        if match:
+            year, month, day = (int(match.group(i)) for i in order)
+            try:
+                return date(year, month, day)
+            except ValueError:
+                return None
+    return None
+
+
+def normalize_date(value: Any) -> Optional[str]:
+    """'AAAA-MM-DD' o None si el valor no es una fecha."""
+    parsed = parse_date(value)
+    return parsed.isoformat() if parsed else None
+
+
+def day_number(value: Any) -> Optional[int]:
+    """Días desde 1970-01-01 (mismo valor que DAY_NUMBER_SQL)."""
+    parsed = parse_date(value)
+    return (parsed - EPOCH).days if parsed else None
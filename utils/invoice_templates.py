@@ -5,15 +5,23 @@ import os
 import datetime
 from typing import List, Dict, Optional
 
-# Excel
-try:
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, Alignment, Border, Side, PatternFill, NamedStyle
-    from openpyxl.utils import get_column_letter
-    from openpyxl.drawing.image import Image as XLImage
-except Exception:
-    Workbook = None
-    XLImage = None
+# Excel (se importa al generar el primer Excel)
+Workbook = None
+XLImage = None
+
+
+def _load_openpyxl() -> bool:
+    global Workbook, Font, Alignment, Border, Side, PatternFill, NamedStyle, get_column_letter, XLImage
+    if Workbook is not None:
+        return True
+    try:
+        from openpyxl import Workbook
+        from openpyxl.styles import Font, Alignment, Border, Side, PatternFill, NamedStyle
+        from openpyxl.utils import get_column_letter
+        from openpyxl.drawing.image import Image as XLImage
+    except Exception:
+        return False
+    return True
 
 # Pillow (opcional, para redimensionar logos)
 try:
@@ -21,19 +29,29 @@ try:
 except Exception:
     PILImage = None
 
-# PDF (optional)
-try:
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib import colors
-    from reportlab.lib.styles import getSampleStyleSheet
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image as RLImage
-    from reportlab.lib.utils import ImageReader
+# PDF (opcional, se importa al generar el primer PDF)
+REPORTLAB_AVAILABLE = False
+
+
+def _load_reportlab() -> bool:
+    global REPORTLAB_AVAILABLE, A4, colors, getSampleStyleSheet
+    global SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, RLImage, ImageReader
+    if REPORTLAB_AVAILABLE:
+        return True
+    try:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib import colors
+        from reportlab.lib.styles import getSampleStyleSheet
+        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image as RLImage
+        from reportlab.lib.utils import ImageReader
+    except Exception:
+        return False
     REPORTLAB_AVAILABLE = True
-except Exception:
-    REPORTLAB_AVAILABLE = False
+    return True
 
 # helper to resolve template data root
 from utils.template_manager import get_data_root, load_template
+from utils.money import compute_totals, from_cents, format_cents, item_lines
 
 def _resolve_template(data: Dict, template: Optional[Dict]) -> Dict:
     tpl = template
@@ -82,7 +100,7 @@ def generate_invoice_excel(invoice_data: Dict, items: List[Dict], save_path: str
         sh["D3"] = invoice_data.get("due_date") or ""
     """
     ...
-    if Workbook is None:
+    if not _load_openpyxl():
         raise RuntimeError("openpyxl no está instalado. Instala con: pip install openpyxl")
 
     import tempfile, shutil, urllib.parse
@@ -200,7 +218,7 @@ def generate_invoice_excel(invoice_data: Dict, items: List[Dict], save_path: str
         c.border = border
 
     row = start_row + 1
-    total = 0.0
+    totals = compute_totals(item_lines(items), apply_itbis, itbis_rate)
     for i, it in enumerate(items, start=1):
         code = it.get("code", "") or it.get("item_code", "")
         desc = it.get("description", "") or it.get("nombre", "")
@@ -215,8 +233,7 @@ def generate_invoice_excel(invoice_data: Dict, items: List[Dict], save_path: str
             price = 0.0
         disc = float(it.get("discount_pct", 0) or 0)  # %
 
-        line_total = qty * price * (1 - disc / 100.0)
-        total += line_total
+        line_total = from_cents(totals['lines'][i - 1])
 
         sh.cell(row=row, column=1, value=i).border = border
         sh.cell(row=row, column=2, value=code).border = border
@@ -249,11 +266,12 @@ def generate_invoice_excel(invoice_data: Dict, items: List[Dict], save_path: str
     lbl_sub = sh.cell(row=row + 1, column=7, value="Subtotal:")
     lbl_sub.font = bold
     lbl_sub.alignment = Alignment(horizontal="right")
+    total = from_cents(totals['subtotal'])
     val_sub = sh.cell(row=row + 1, column=8, value=total)
     val_sub.number_format = '#,##0.00'
     val_sub.alignment = Alignment(horizontal="right")
 
-    itbis = total * itbis_rate if apply_itbis else 0.0
+    itbis = from_cents(totals['itbis'])
     if itbis > 0:
         lbl_itb = sh.cell(row=row + 2, column=7, value=f"ITBIS ({itbis_rate*100:.0f}%):")
         lbl_itb.font = bold
@@ -265,7 +283,7 @@ def generate_invoice_excel(invoice_data: Dict, items: List[Dict], save_path: str
         lbl_tot = sh.cell(row=row + 3, column=7, value="Total:")
         lbl_tot.font = bold
         lbl_tot.alignment = Alignment(horizontal="right")
-        val_tot = sh.cell(row=row + 3, column=8, value=total + itbis)
+        val_tot = sh.cell(row=row + 3, column=8, value=from_cents(totals['total']))
         val_tot.number_format = '#,##0.00'
         val_tot.alignment = Alignment(horizontal="right")
     else:
@@ -307,7 +325,7 @@ def generate_invoice_pdf(invoice_data: Dict, items: List[Dict], save_path: str,
     Genera un PDF de la Factura. Requiere reportlab.
     Acepta template (dict) para logo/encabezado/colores.
     """
-    if not REPORTLAB_AVAILABLE:
+    if not _load_reportlab():
         raise RuntimeError("reportlab no está instalado. Instala con: pip install reportlab")
 
     template = _resolve_template(invoice_data or {}, template)
@@ -360,8 +378,11 @@ def generate_invoice_pdf(invoice_data: Dict, items: List[Dict], save_path: str,
     elements.append(Spacer(1, 12))
 
     # Table of items
+    apply_itbis = bool(invoice_data.get("apply_itbis", False))
+    itbis_rate = float(invoice_data.get("itbis_rate", 0.0) or 0.0)
+    totals = compute_totals(item_lines(items), apply_itbis, itbis_rate)
+
     table_data = [["#", "Código", "Descripción", "Unidad", "Cantidad", "Precio Unit.", "Desc %", "Subtotal"]]
-    total = 0.0
     for i, it in enumerate(items, start=1):
         code = it.get("code", "")
         desc = it.get("description", "") or it.get("nombre", "")
@@ -369,9 +390,8 @@ def generate_invoice_pdf(invoice_data: Dict, items: List[Dict], save_path: str,
         qty = float(it.get("quantity", it.get("cantidad", 0)) or 0)
         price = float(it.get("unit_price", it.get("precio", 0)) or 0)
         disc = float(it.get("discount_pct", 0) or 0)
-        subtotal = qty * price * (1 - disc / 100.0)
-        total += subtotal
-        table_data.append([str(i), code, desc, unit, f"{qty:.2f}", f"{price:,.2f}", f"{disc:.2f}", f"{subtotal:,.2f}"])
+        subtotal = format_cents(totals['lines'][i - 1])
+        table_data.append([str(i), code, desc, unit, f"{qty:.2f}", f"{price:,.2f}", f"{disc:.2f}", subtotal])
 
     t = Table(table_data, colWidths=[30, 60, 200, 40, 50, 70, 50, 80])
     t.setStyle(TableStyle([
@@ -383,14 +403,10 @@ def generate_invoice_pdf(invoice_data: Dict, items: List[Dict], save_path: str,
     elements.append(t)
     elements.append(Spacer(1, 12))
 
-    apply_itbis = bool(invoice_data.get("apply_itbis", False))
-    itbis_rate = float(invoice_data.get("itbis_rate", 0.0) or 0.0)
-    itbis = total * itbis_rate if apply_itbis else 0.0
-
-    elements.append(Paragraph(f"Subtotal: {total:,.2f}", styles["Normal"]))
-    if itbis:
-        elements.append(Paragraph(f"ITBIS ({itbis_rate*100:.0f}%): {itbis:,.2f}", styles["Normal"]))
-    elements.append(Paragraph(f"Total: {total + itbis:,.2f}", styles["Normal"]))
+    elements.append(Paragraph(f"Subtotal: {format_cents(totals['subtotal'])}", styles["Normal"]))
+    if totals['itbis']:
+        elements.append(Paragraph(f"ITBIS ({itbis_rate*100:.0f}%): {format_cents(totals['itbis'])}", styles["Normal"]))
+    elements.append(Paragraph(f"Total: {format_cents(totals['total'])}", styles["Normal"]))
     elements.append(Spacer(1, 12))
 
     notes = invoice_data.get("notes", "")
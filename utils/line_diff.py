@@ -0,0 +1,107 @@
+"""
+Diferencias entre las líneas guardadas de un documento y las nuevas.
+
+Al editar una factura o cotización se comparan las líneas existentes
+(invoice_items / quotation_items) con las que llegan de la UI y se generan
+sólo los INSERT, UPDATE y DELETE necesarios, en lugar de borrar y
+reinsertar todo el detalle.
+
+Emparejamiento de cada línea nueva con una fila existente:
+1. por `id` (las líneas que vienen de get_invoice_items/get_quotation_items);
+2. sin id, con una fila libre de contenido idéntico;
+3. el resto, en orden, con las filas libres que queden (UPDATE);
+las que sobran se insertan o se borran. La posición en el documento se
+guarda en `line_no`, así reusar una fila no altera el orden.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, List, Sequence, Tuple
+
+# Campos de contenido de una línea (los que se comparan y auditan)
+LINE_FIELDS = ('item_code', 'description', 'quantity', 'unit_price', 'unit')
+
+
+class LineDiff:
+    """Resultado de diff_lines: filas a insertar, actualizar y borrar."""
+
+    def __init__(self):
+        self.inserts: List[Dict[str, Any]] = []              # líneas nuevas (con line_no)
+        self.updates: List[Tuple[int, Dict[str, Any]]] = []  # (id, línea con line_no)
+        self.deletes: List[int] = []
+        self.audit: Dict[str, list] = {'added': [], 'updated': [], 'removed': []}
+        self.unchanged = 0
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.inserts or self.updates or self.deletes)
+
+    def summary(self) -> Dict[str, int]:
+        return {'inserted': len(self.inserts), 'updated': len(self.updates),
+                'deleted': len(self.deletes), 'unchanged': self.unchanged}
+
+
+def _key(line: Dict[str, Any], fields: Sequence[str]) -> tuple:
+    return tuple(line.get(f) for f in fields)
+
+
+def diff_lines(
+    existing: List[Dict[str, Any]],
+    new: List[Dict[str, Any]],
+    fields: Sequence[str] = LINE_FIELDS
+) -> LineDiff:
+    """
+    Compara filas guardadas (con 'id' y 'line_no') contra las líneas nuevas.
+
+    Args:
+        existing: Filas actuales del documento, en su orden
+        new: Líneas normalizadas (campos de `fields`, 'id' opcional), en el orden deseado
+
+    Returns:
+        LineDiff con las operaciones mínimas y el diff compacto para auditoría
+    """
+    result = LineDiff()
+    by_id = {r['id']: r for r in existing}
+    lines = [{**line, 'line_no': pos} for pos, line in enumerate(new, start=1)]
+
+    matched: Dict[int, Dict[str, Any]] = {}
+    pending = []
+    for line in lines:
+        line_id = line.get('id')
+        if line_id in by_id and line_id not in matched:
+            matched[line_id] = line
+        else:
+            pending.append(line)
+
+    free: Dict[tuple, List[Dict[str, Any]]] = {}
+    for row in existing:
+        if row['id'] not in matched:
+            free.setdefault(_key(row, fields), []).append(row)
+    rest = []
+    for line in pending:
+        bucket = free.get(_key(line, fields))
+        if bucket:
+            matched[bucket.pop(0)['id']] = line
+        else:
+            rest.append(line)
+
+    leftovers = [r for r in existing if r['id'] not in matched]
+    for row, line in zip(leftovers, rest):
+        matched[row['id']] = line
+    result.inserts = rest[len(leftovers):]
+    result.deletes = [r['id'] for r in leftovers[len(rest):]]
+
+    for row_id, line in matched.items():
+        row = by_id[row_id]
+        changes = {f: [row.get(f), line.get(f)] for f in fields if row.get(f) != line.get(f)}
+        if changes or row.get('line_no') != line['line_no']:
+            result.updates.append((row_id, line))
+        else:
+            result.unchanged += 1
+        if changes:
+            result.audit['updated'].append({'id': row_id, 'changes': changes})
+    result.updates.sort(key=lambda u: u[1]['line_no'])
+    result.audit['updated'].sort(key=lambda u: u['id'])
+    result.audit['added'] = [{'line_no': l['line_no'], **{f: l.get(f) for f in fields}} for l in result.inserts]
+    result.audit['removed'] = [{'id': r['id'], **{f: r.get(f) for f in fields}}
+                               for r in existing if r['id'] in set(result.deletes)]
+    return result
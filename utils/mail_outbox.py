@@ -0,0 +1,490 @@
+"""
+Cola persistente de emails (outbox) para envíos masivos.
+
+Los mensajes se guardan primero en la tabla SQLite `email_outbox` y se
+envían después con unos pocos hilos que comparten un `SMTPConnectionPool`
+(una negociación STARTTLS + login por conexión, no por mensaje), con un
+límite de mensajes por segundo.
+
+- Cada mensaje tiene una clave de idempotencia: volver a encolar el mismo
+  envío (p. ej. "facturas de enero" dos veces) no lo duplica.
+- Errores transitorios (4xx, desconexión, timeout) se reintentan con espera
+  exponencial; los permanentes (5xx, destinatario rechazado) o agotar los
+  intentos marcan el mensaje como 'failed'.
+- Los resultados se escriben por tandas: una transacción para la cola y otra
+  para `email_logs` por cada tanda, no una conexión por mensaje.
+- Los mensajes (y sus adjuntos) se arman al momento de enviarlos, así en
+  memoria sólo están los de la tanda en curso.
+- `process_until_done` sigue enviando los reintentos que vencen dentro de un
+  plazo máximo; las carpetas temporales de adjuntos registradas con
+  `register_temp_dir` se borran cuando ningún mensaje pendiente las usa.
+
+Uso:
+    outbox = EmailOutbox(db_path)
+    outbox.enqueue_period_invoices(company_id, '2025-01-01', '2025-02-01')
+    outbox.process()                            # o process_until_done(max_wait=600)
+"""
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import smtplib
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from services.unit_resolver import fetch_units
+from utils.mail_utils import EmailConfig, EmailService, RateLimiter, SMTPConnectionPool
+
+DEFAULT_SUBJECT = "Factura {invoice_number}"
+DEFAULT_BODY = (
+    "<p>Estimado cliente {third_party_name}:</p>"
+    "<p>Adjuntamos la factura <b>{invoice_number}</b> del {invoice_date} "
+    "por {currency} {total_amount:,.2f}.</p>"
+    "<p>Gracias por preferirnos.</p>"
+)
+
+# Tiempo máximo (s) que process_until_done espera reintentos pendientes
+DEFAULT_MAX_WAIT = 600.0
+
+# (id, invoice_id, to_email, subject, body_html, attachments, payload, attempts)
+_OutboxRow = Tuple[int, Optional[int], str, str, str, Optional[str], Optional[str], int]
+
+
+def _is_transient(error: Exception) -> bool:
+    """True si vale la pena reintentar el envío más tarde."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _msg in error.recipients.values())
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return False
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError))
+
+
+class EmailOutbox:
+    """Outbox persistente en SQLite con envío concurrente por pool SMTP."""
+
+    def __init__(
+        self,
+        db_path: str,
+        config: Optional[Dict[str, Any]] = None,
+        workers: int = 3,
+        rate_per_second: float = 5.0,
+        batch_size: int = 50,
+        max_attempts: int = 5,
+        backoff_base: float = 60.0,
+        backoff_max: float = 3600.0,
+        max_messages_per_connection: int = 100
+    ):
+        """
+        Args:
+            db_path: Ruta a la base de datos
+            config: Configuración SMTP (default: EmailConfig.get_config())
+            workers: Hilos de envío (= conexiones SMTP del pool)
+            rate_per_second: Mensajes por segundo como máximo (0 = sin límite)
+            batch_size: Mensajes por tanda de escritura de resultados
+            max_attempts: Intentos antes de marcar un mensaje como fallido
+            backoff_base / backoff_max: Espera (s) tras el primer fallo y tope; se duplica en cada intento
+            max_messages_per_connection: Mensajes por conexión antes de renovarla
+        """
+        self.db_path = db_path
+        self.service = EmailService(config or EmailConfig.get_config(), db_path)
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pool = SMTPConnectionPool(self.service.config, size=self.workers,
+                                       max_messages=max_messages_per_connection)
+        self.limiter = RateLimiter(rate_per_second)
+        self._process_lock = threading.Lock()
+        self._ensure_outbox_table()
+
+    def _ensure_outbox_table(self):
+        """Crea la tabla email_outbox si no existe."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS email_outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    idempotency_key TEXT NOT NULL UNIQUE,
+                    invoice_id INTEGER,
+                    to_email TEXT NOT NULL,
+                    subject TEXT NOT NULL,
+                    body_html TEXT NOT NULL,
+                    attachments TEXT,
+                    payload TEXT,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    created_at TEXT NOT NULL,
+                    sent_at TEXT
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_email_outbox_due
+                ON email_outbox(status, next_attempt_at)
+            """)
+            conn.execute("CREATE TABLE IF NOT EXISTS email_outbox_temp_dirs (path TEXT PRIMARY KEY)")
+            conn.commit()
+
+    # -------------------------
+    # Encolar
+    # -------------------------
+    def enqueue(
+        self,
+        to_email: str,
+        subject: str,
+        body_html: str,
+        attachments: Optional[Iterable[str]] = None,
+        invoice_id: Optional[int] = None,
+        payload: Optional[Dict[str, Any]] = None,
+        key: Optional[str] = None
+    ) -> bool:
+        """
+        Encola un mensaje.
+
+        Returns:
+            False si ya había uno con la misma clave
+        """
+        return self.enqueue_many([{
+            'to_email': to_email, 'subject': subject, 'body_html': body_html,
+            'attachments': attachments, 'invoice_id': invoice_id, 'payload': payload, 'key': key,
+        }]) == 1
+
+    def enqueue_many(self, messages: Iterable[Dict[str, Any]]) -> int:
+        """
+        Encola varios mensajes en una sola transacción.
+
+        Cada dict lleva to_email, subject, body_html y opcionalmente
+        attachments, invoice_id, payload (datos para el texto plano) y key.
+
+        Returns:
+            Número de mensajes nuevos (los repetidos por clave se ignoran)
+        """
+        now = datetime.now().isoformat()
+        rows = []
+        for m in messages:
+            key = m.get('key') or (
+                self._invoice_key(m['invoice_id'], m['to_email']) if m.get('invoice_id') is not None
+                else f"{m['to_email'].lower()}:{m['subject']}:{now}"
+            )
+            attachments = list(m.get('attachments') or [])
+            rows.append((
+                key, m.get('invoice_id'), m['to_email'], m['subject'], m['body_html'],
+                json.dumps(attachments) if attachments else None,
+                json.dumps(m['payload'], ensure_ascii=False, default=str) if m.get('payload') else None,
+                now,
+            ))
+        with sqlite3.connect(self.db_path) as conn:
+            before = conn.total_changes
+            conn.executemany("""
+                INSERT OR IGNORE INTO email_outbox
+                (idempotency_key, invoice_id, to_email, subject, body_html, attachments, payload, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            conn.commit()
+            return conn.total_changes - before
+
+    def enqueue_period_invoices(
+        self,
+        company_id: int,
+        start_date: str,
+        end_date: str,
+        subject_template: str = DEFAULT_SUBJECT,
+        body_template: str = DEFAULT_BODY,
+        recipients: Optional[Dict[str, str]] = None,
+        attachment_for: Optional[Callable[[Dict[str, Any]], Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Encola el envío de todas las facturas emitidas (no anuladas) del período [inicio, fin).
+
+        El destinatario sale de `recipients` (RNC -> email) o, si no está,
+        de `third_parties.email` del RNC de la factura. Las facturas que ya
+        están en la cola se saltan antes de llamar a `attachment_for`, así
+        repetir el período no vuelve a generar sus PDFs.
+
+        Args:
+            subject_template / body_template: Textos con campos de la factura ({invoice_number}, ...)
+            attachment_for: Función factura -> ruta (o lista de rutas) a adjuntar, p. ej. el PDF;
+                la factura trae sus líneas en 'items' (leídas con la conexión de la cola,
+                se puede llamar desde otro hilo)
+
+        Returns:
+            {'queued': nuevos, 'duplicates': ya encolados, 'missing_email': [NCF sin destinatario]}
+        """
+        recipients = {k.strip(): v for k, v in (recipients or {}).items()}
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            has_email = any(r[1] == 'email' for r in conn.execute("PRAGMA table_info(third_parties)"))
+            email_sql = "tp.email" if has_email else "NULL"
+            invoices = [dict(r) for r in conn.execute(f"""
+                SELECT i.id, i.invoice_number, i.invoice_date, i.third_party_name,
+                       COALESCE(NULLIF(i.rnc, ''), i.client_rnc, '') AS rnc,
+                       COALESCE(i.currency, 'RD$') AS currency,
+                       COALESCE(i.itbis, 0) AS itbis, COALESCE(i.total_amount, 0) AS total_amount,
+                       {email_sql} AS email
+                  FROM invoices i
+                  LEFT JOIN third_parties tp ON tp.rnc = COALESCE(NULLIF(i.rnc, ''), i.client_rnc)
+                 WHERE i.company_id = ? AND i.invoice_type = 'emitida'
+                   AND COALESCE(i.status, 'activa') != 'anulada'
+                   AND i.invoice_date >= ? AND i.invoice_date < ?
+                 ORDER BY i.invoice_date, i.id
+            """, (company_id, start_date, end_date))]
+            queued_keys = {r[0] for r in conn.execute(
+                "SELECT idempotency_key FROM email_outbox WHERE idempotency_key LIKE 'invoice:%'"
+            )}
+
+            pending, missing, duplicates = [], [], 0
+            for inv in invoices:
+                stored_email = inv.pop('email')
+                to_email = (recipients.get(inv['rnc'].strip()) or stored_email or '').strip()
+                if not to_email:
+                    missing.append(inv['invoice_number'])
+                elif self._invoice_key(inv['id'], to_email) in queued_keys:
+                    duplicates += 1
+                else:
+                    pending.append((inv, to_email))
+            lines = self._invoice_lines(conn, [inv['id'] for inv, _to in pending]) if attachment_for else {}
+
+        messages = []
+        for inv, to_email in pending:
+            fields = {**inv, 'third_party_name': inv['third_party_name'] or ''}
+            attachments = attachment_for({**inv, 'items': lines.get(inv['id'], [])}) if attachment_for else None
+            if isinstance(attachments, str):
+                attachments = [attachments]
+            messages.append({
+                'to_email': to_email,
+                'subject': subject_template.format_map(fields),
+                'body_html': body_template.format_map(fields),
+                'attachments': attachments,
+                'invoice_id': inv['id'],
+                'payload': fields,
+            })
+        queued = self.enqueue_many(messages)
+        duplicates += len(messages) - queued
+        print(f"[EMAIL-OUTBOX] Período {start_date}..{end_date}: {queued} encolados, "
+              f"{duplicates} ya en cola, {len(missing)} sin email")
+        return {'queued': queued, 'duplicates': duplicates, 'missing_email': missing}
+
+    @staticmethod
+    def _invoice_key(invoice_id: int, to_email: str) -> str:
+        """Clave de idempotencia del email de una factura a un destinatario."""
+        return f"invoice:{invoice_id}:{to_email.lower()}"
+
+    @staticmethod
+    def _invoice_lines(conn: sqlite3.Connection, invoice_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """Líneas de las facturas (unidad del catálogo, o la guardada si no está), por id de factura."""
+        if not invoice_ids:
+            return {}
+        has_line_no = any(r[1] == 'line_no' for r in conn.execute("PRAGMA table_info(invoice_items)"))
+        rows = []
+        for start in range(0, len(invoice_ids), 500):
+            chunk = invoice_ids[start:start + 500]
+            rows += conn.execute(f"""
+                SELECT invoice_id, COALESCE(item_code, '') AS code, COALESCE(description, '') AS description,
+                       COALESCE(quantity, 0) AS quantity, COALESCE(unit_price, 0) AS unit_price,
+                       COALESCE(unit, '') AS unit
+                  FROM invoice_items WHERE invoice_id IN ({', '.join('?' * len(chunk))})
+                 ORDER BY invoice_id, {'line_no, ' if has_line_no else ''}id
+            """, chunk).fetchall()
+        by_code, by_name = fetch_units(conn, {r['code'] for r in rows if r['code']},
+                                       {r['description'] for r in rows if r['description']})
+        lines: Dict[int, List[Dict[str, Any]]] = {}
+        for r in rows:
+            line = dict(r)
+            line['unit'] = by_code.get(line['code']) or by_name.get(line['description']) or line['unit']
+            lines.setdefault(line.pop('invoice_id'), []).append(line)
+        return lines
+
+    # -------------------------
+    # Consultas
+    # -------------------------
+    def pending_count(self) -> int:
+        """Mensajes pendientes (incluye los que esperan reintento)."""
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute("SELECT COUNT(*) FROM email_outbox WHERE status = 'pending'").fetchone()
+            return int(row[0])
+
+    def status_counts(self) -> Dict[str, int]:
+        """Cantidad de mensajes por estado ('pending', 'sent', 'failed')."""
+        with sqlite3.connect(self.db_path) as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM email_outbox GROUP BY status").fetchall())
+
+    def next_attempt_at(self) -> Optional[float]:
+        """Momento (epoch) del próximo reintento pendiente, o None si no queda ninguno."""
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute("SELECT MIN(next_attempt_at) FROM email_outbox WHERE status = 'pending'").fetchone()
+            return row[0]
+
+    def retry_failed(self) -> int:
+        """Vuelve a poner en cola los mensajes fallidos."""
+        with sqlite3.connect(self.db_path) as conn:
+            cur = conn.execute("""
+                UPDATE email_outbox SET status = 'pending', attempts = 0, next_attempt_at = 0
+                WHERE status = 'failed'
+            """)
+            conn.commit()
+            return cur.rowcount
+
+    # -------------------------
+    # Enviar
+    # -------------------------
+    def process(self, max_messages: Optional[int] = None) -> Dict[str, int]:
+        """
+        Envía los mensajes pendientes cuyo reintento ya venció.
+
+        Returns:
+            Dict con contadores: sent, retry, failed, connections
+        """
+        stats = {'sent': 0, 'retry': 0, 'failed': 0, 'connections': 0}
+        if not self._process_lock.acquire(blocking=False):
+            return stats  # Ya hay un envío en curso
+        connections_before = self.pool.stats['connections']
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="email-outbox") as executor:
+                processed = 0
+                last_id = 0
+                while max_messages is None or processed < max_messages:
+                    limit = self.batch_size if max_messages is None else min(self.batch_size, max_messages - processed)
+                    with sqlite3.connect(self.db_path) as conn:
+                        rows = conn.execute("""
+                            SELECT id, invoice_id, to_email, subject, body_html, attachments, payload, attempts
+                              FROM email_outbox
+                             WHERE status = 'pending' AND next_attempt_at <= ? AND id > ?
+                             ORDER BY id LIMIT ?
+                        """, (time.time(), last_id, limit)).fetchall()
+                    if not rows:
+                        break
+                    last_id = rows[-1][0]
+                    processed += len(rows)
+                    results = list(executor.map(self._send_one, rows))
+                    self._record(rows, results, stats)
+        finally:
+            self.pool.close()
+            self._process_lock.release()
+        self.cleanup_temp_dirs()
+        stats['connections'] = self.pool.stats['connections'] - connections_before
+        if stats['sent'] or stats['retry'] or stats['failed']:
+            print(f"[EMAIL-OUTBOX] Envío: {stats}")
+        return stats
+
+    def process_until_done(
+        self,
+        max_wait: float = DEFAULT_MAX_WAIT,
+        should_stop: Optional[Callable[[], bool]] = None
+    ) -> Dict[str, Any]:
+        """
+        Envía la cola y espera los reintentos que vencen dentro de `max_wait` segundos.
+
+        Args:
+            max_wait: Tope de espera desde ahora
+            should_stop: Se consulta mientras se espera; True corta la espera
+
+        Returns:
+            Dict con sent, failed y connections acumulados, retry (pendientes
+            al terminar) y next_attempt_at (epoch del próximo reintento o None)
+        """
+        deadline = time.time() + max_wait
+        totals: Dict[str, Any] = {'sent': 0, 'retry': 0, 'failed': 0, 'connections': 0}
+        while True:
+            stats = self.process()
+            for field in ('sent', 'failed', 'connections'):
+                totals[field] += stats[field]
+            due = self.next_attempt_at()
+            if due is None or due > deadline or not self._wait_until(due, should_stop):
+                break
+        totals['retry'] = self.pending_count()
+        totals['next_attempt_at'] = self.next_attempt_at()
+        return totals
+
+    @staticmethod
+    def _wait_until(due: float, should_stop: Optional[Callable[[], bool]]) -> bool:
+        """Duerme hasta `due` (al menos un instante, por si otro envío tiene la cola). False si se cortó."""
+        while True:
+            if should_stop and should_stop():
+                return False
+            remaining = due - time.time()
+            time.sleep(min(1.0, max(remaining, 0.05)))
+            if remaining <= 1.0:
+                return True
+
+    # -------------------------
+    # Adjuntos temporales
+    # -------------------------
+    def register_temp_dir(self, path: str) -> None:
+        """Carpeta de adjuntos generados para la cola: se borra cuando ningún pendiente la usa."""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("INSERT OR IGNORE INTO email_outbox_temp_dirs (path) VALUES (?)",
+                         (os.path.abspath(path),))
+            conn.commit()
+
+    def cleanup_temp_dirs(self) -> int:
+        """Borra las carpetas registradas cuyos mensajes ya quedaron enviados o fallidos."""
+        with sqlite3.connect(self.db_path) as conn:
+            dirs = [r[0] for r in conn.execute("SELECT path FROM email_outbox_temp_dirs")]
+            if not dirs:
+                return 0
+            needed = {
+                os.path.abspath(path)
+                for (attachments,) in conn.execute(
+                    "SELECT attachments FROM email_outbox WHERE status = 'pending' AND attachments IS NOT NULL"
+                )
+                for path in json.loads(attachments)
+            }
+            done = [d for d in dirs if not any(p.startswith(d + os.sep) for p in needed)]
+            for path in done:
+                shutil.rmtree(path, ignore_errors=True)
+            conn.executemany("DELETE FROM email_outbox_temp_dirs WHERE path = ?", [(d,) for d in done])
+            conn.commit()
+        return len(done)
+
+    def _send_one(self, row: _OutboxRow) -> Optional[Exception]:
+        _id, _invoice_id, to_email, subject, body_html, attachments, payload, _attempts = row
+        self.limiter.wait()
+        try:
+            msg = self.service.build_message(
+                json.loads(payload) if payload else {}, to_email, subject, body_html,
+                json.loads(attachments) if attachments else None
+            )
+            with self.pool.connection() as server:
+                server.send_message(msg)
+            return None
+        except Exception as e:
+            return e
+
+    def _record(self, rows: List[_OutboxRow], results: List[Optional[Exception]], stats: Dict[str, int]) -> None:
+        """Escribe los resultados de una tanda (cola + email_logs) en bloque."""
+        now = datetime.now().isoformat()
+        sent, retry, failed, logs = [], [], [], []
+        for row, error in zip(rows, results):
+            row_id, invoice_id, to_email, subject = row[0], row[1], row[2], row[3]
+            attempts = row[7] + 1
+            if error is None:
+                sent.append((now, attempts, row_id))
+                logs.append((invoice_id, to_email, subject, 'sent', None))
+                continue
+            message = f"{type(error).__name__}: {error}"[:500]
+            if _is_transient(error) and attempts < self.max_attempts:
+                delay = min(self.backoff_base * (2 ** (attempts - 1)), self.backoff_max)
+                retry.append((attempts, time.time() + delay, message, row_id))
+            else:
+                failed.append((attempts, message, row_id))
+                logs.append((invoice_id, to_email, subject, 'failed', message))
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany("UPDATE email_outbox SET status = 'sent', sent_at = ?, attempts = ?, "
+                             "last_error = NULL WHERE id = ?", sent)
+            conn.executemany("UPDATE email_outbox SET attempts = ?, next_attempt_at = ?, last_error = ? "
+                             "WHERE id = ?", retry)
+            conn.executemany("UPDATE email_outbox SET status = 'failed', attempts = ?, last_error = ? "
+                             "WHERE id = ?", failed)
+            conn.commit()
+        self.service._log_emails(logs)
+        stats['sent'] += len(sent)
+        stats['retry'] += len(retry)
+        stats['failed'] += len(failed)
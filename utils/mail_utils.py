@@ -1,10 +1,19 @@
 """
 Utilidades para envío de emails.
 Soporta SMTP con TLS y SendGrid API.
+
+Para envíos masivos (utils/mail_outbox.py) se usan `SMTPConnectionPool`,
+que mantiene unas pocas conexiones ya autenticadas (STARTTLS + login una
+sola vez por conexión), y `RateLimiter` para no exceder el ritmo que
+acepta el servidor.
 """
 import os
+import queue
 import smtplib
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -40,6 +49,148 @@ class EmailConfig:
         }
 
 
+def open_smtp(config: Dict[str, Any], timeout: int = 30) -> smtplib.SMTP:
+    """Abre una conexión SMTP con STARTTLS (si aplica) y autenticada."""
+    server = smtplib.SMTP(config['smtp_host'], config['smtp_port'], timeout=timeout)
+    try:
+        if config.get('use_tls', True):
+            server.starttls()
+        server.login(config['smtp_user'], config['smtp_password'])
+    except Exception:
+        _close_quietly(server)
+        raise
+    return server
+
+
+def _close_quietly(server) -> None:
+    try:
+        server.quit()
+    except Exception:
+        try:
+            server.close()
+        except Exception:
+            pass
+
+
+# Errores de un mensaje puntual: la conexión sigue sirviendo tras RSET
+_MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+class SMTPConnectionPool:
+    """Pool de conexiones SMTP autenticadas reutilizables entre mensajes e hilos."""
+
+    def __init__(
+        self,
+        config: Dict[str, Any],
+        size: int = 3,
+        max_messages: int = 100,
+        idle_check: float = 30.0,
+        timeout: int = 30
+    ):
+        """
+        Args:
+            config: Configuración SMTP (ver EmailConfig)
+            size: Conexiones simultáneas máximas
+            max_messages: Mensajes por conexión antes de renovarla
+            idle_check: Segundos ociosos tras los que se verifica la conexión con NOOP
+            timeout: Timeout de socket en segundos
+        """
+        self.config = config
+        self.max_messages = max_messages
+        self.idle_check = idle_check
+        self.timeout = timeout
+        self.stats = {'connections': 0, 'reused': 0, 'discarded': 0}
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle: "queue.LifoQueue[list]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    def _take(self) -> list:
+        """[conexión, mensajes enviados, último uso] ociosa y viva, o una nueva."""
+        while True:
+            try:
+                entry = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if time.monotonic() - entry[2] < self.idle_check:
+                self._count('reused')
+                return entry
+            try:
+                if entry[0].noop()[0] == 250:
+                    self._count('reused')
+                    return entry
+            except Exception:
+                pass
+            self._discard(entry[0])
+        server = open_smtp(self.config, self.timeout)
+        self._count('connections')
+        return [server, 0, time.monotonic()]
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def _discard(self, server) -> None:
+        self._count('discarded')
+        _close_quietly(server)
+
+    @contextmanager
+    def connection(self):
+        """Presta una conexión autenticada; se devuelve al pool al salir."""
+        self._slots.acquire()
+        entry = None
+        try:
+            entry = self._take()
+            yield entry[0]
+            entry[1] += 1
+        except _MESSAGE_ERRORS:
+            try:
+                entry[0].rset()
+            except Exception:
+                self._discard(entry[0])
+                entry = None
+            raise
+        except BaseException:
+            if entry is not None:
+                self._discard(entry[0])
+                entry = None
+            raise
+        finally:
+            if entry is not None:
+                entry[2] = time.monotonic()
+                if entry[1] >= self.max_messages:
+                    _close_quietly(entry[0])
+                else:
+                    self._idle.put(entry)
+            self._slots.release()
+
+    def close(self) -> None:
+        """Cierra las conexiones ociosas."""
+        while True:
+            try:
+                _close_quietly(self._idle.get_nowait()[0])
+            except queue.Empty:
+                return
+
+
+class RateLimiter:
+    """Espacia los envíos para no superar `per_second` mensajes por segundo (entre hilos)."""
+
+    def __init__(self, per_second: float = 0):
+        self.interval = 1.0 / per_second if per_second else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
 class EmailService:
     """Servicio para envío de emails."""
     
@@ -95,19 +246,7 @@ class EmailService:
             if not self.config.get('smtp_user') or not self.config.get('smtp_password'):
                 return False, "Credenciales SMTP no configuradas"
             
-            server = smtplib.SMTP(
-                self.config['smtp_host'],
-                self.config['smtp_port'],
-                timeout=10
-            )
-            
-            if self.config.get('use_tls', True):
-                server.starttls()
-            
-            server.login(
-                self.config['smtp_user'],
-                self.config['smtp_password']
-            )
+            server = open_smtp(self.config, timeout=10)
             server.quit()
             
             return True, "Conexión SMTP exitosa"
@@ -149,50 +288,10 @@ class EmailService:
                 self._log_email(invoice_id, to_email, subject, 'failed', error_msg)
                 return False, error_msg
             
-            # Crear mensaje
-            msg = MIMEMultipart('alternative')
-            msg['From'] = self.config.get('from_email', self.config['smtp_user'])
-            msg['To'] = to_email
-            msg['Subject'] = subject
-            
-            # Agregar cuerpo HTML
-            html_part = MIMEText(body_html, 'html', 'utf-8')
-            msg.attach(html_part)
-            
-            # Agregar texto plano como fallback
-            text_body = self._html_to_text(body_html, invoice_payload)
-            text_part = MIMEText(text_body, 'plain', 'utf-8')
-            msg.attach(text_part)
-            
-            # Agregar adjuntos
-            if attachments:
-                for attachment_path in attachments:
-                    if os.path.exists(attachment_path):
-                        with open(attachment_path, 'rb') as f:
-                            part = MIMEApplication(f.read())
-                            filename = os.path.basename(attachment_path)
-                            part.add_header(
-                                'Content-Disposition',
-                                'attachment',
-                                filename=filename
-                            )
-                            msg.attach(part)
+            msg = self.build_message(invoice_payload, to_email, subject, body_html, attachments)
             
             # Enviar email
-            server = smtplib.SMTP(
-                self.config['smtp_host'],
-                self.config['smtp_port'],
-                timeout=30
-            )
-            
-            if self.config.get('use_tls', True):
-                server.starttls()
-            
-            server.login(
-                self.config['smtp_user'],
-                self.config['smtp_password']
-            )
-            
+            server = open_smtp(self.config, timeout=30)
             server.send_message(msg)
             server.quit()
             
@@ -216,6 +315,46 @@ class EmailService:
             self._log_email(invoice_id, to_email, subject, 'failed', error_msg)
             return False, error_msg
     
+    def build_message(
+        self,
+        invoice_payload: Dict[str, Any],
+        to_email: str,
+        subject: str,
+        body_html: str,
+        attachments: List[str] = None
+    ) -> MIMEMultipart:
+        """Arma el mensaje (HTML + texto plano + adjuntos existentes)."""
+        # Crear mensaje
+        msg = MIMEMultipart('alternative')
+        msg['From'] = self.config.get('from_email', self.config['smtp_user'])
+        msg['To'] = to_email
+        msg['Subject'] = subject
+        
+        # Agregar cuerpo HTML
+        html_part = MIMEText(body_html, 'html', 'utf-8')
+        msg.attach(html_part)
+        
+        # Agregar texto plano como fallback
+        text_body = self._html_to_text(body_html, invoice_payload)
+        text_part = MIMEText(text_body, 'plain', 'utf-8')
+        msg.attach(text_part)
+        
+        # Agregar adjuntos
+        if attachments:
+            for attachment_path in attachments:
+                if os.path.exists(attachment_path):
+                    with open(attachment_path, 'rb') as f:
+                        part = MIMEApplication(f.read())
+                        filename = os.path.basename(attachment_path)
+                        part.add_header(
+                            'Content-Disposition',
+                            'attachment',
+                            filename=filename
+                        )
+                        msg.attach(part)
+        
+        return msg
+    
     def _html_to_text(self, html: str, invoice_payload: Dict[str, Any]) -> str:
         """
         Convierte HTML a texto plano simple para fallback.
@@ -251,23 +390,21 @@ class EmailService:
         error_message: Optional[str]
     ):
         """Registra el envío de email en la base de datos."""
-        if not self.db_path:
+        self._log_emails([(invoice_id, to_email, subject, status, error_message)])
+    
+    def _log_emails(self, entries: List[Tuple[Optional[int], str, str, str, Optional[str]]]):
+        """Registra varios envíos (invoice_id, to_email, subject, status, error) en una transacción."""
+        if not self.db_path or not entries:
             return
         
+        now = datetime.now().isoformat()
         try:
             with sqlite3.connect(self.db_path) as conn:
-                conn.execute("""
+                conn.executemany("""
                     INSERT INTO email_logs 
                     (invoice_id, to_email, subject, sent_at, status, error_message)
                     VALUES (?, ?, ?, ?, ?, ?)
-                """, (
-                    invoice_id,
-                    to_email,
-                    subject,
-                    datetime.now().isoformat(),
-                    status,
-                    error_message
-                ))
+                """, [(inv, to, subj, now, status, err) for inv, to, subj, status, err in entries])
         except Exception as e:
             # No fallar el envío si falla el logging
             print(f"Error al registrar email log: {e}")
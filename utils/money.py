@@ -0,0 +1,122 @@
+"""
+Montos en centavos enteros.
+
+Los totales de facturas se calculan en centavos (int) con un único redondeo
+por línea (mitad hacia arriba, como la DGII), en lugar de sumar floats y
+volver a leer textos formateados "1,234.56". Los floats sólo aparecen en los
+bordes: al guardar en las columnas REAL existentes (`from_cents`) y al
+mostrar (`format_cents`). La migración 9 agrega columnas generadas
+`*_cents` (invoices.total_amount_cents, itbis_cents, total_amount_rd_cents,
+invoice_items.unit_price_cents) para sumar en SQL sin errores de float.
+
+Uso:
+    totals = compute_totals([(qty, precio, desc_pct), ...], apply_itbis=True)
+    totals['subtotal'], totals['itbis'], totals['total']   # centavos
+    format_cents(totals['total'])                          # "1,234.56"
+"""
+from __future__ import annotations
+
+from decimal import Context, Decimal, InvalidOperation, ROUND_HALF_UP
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Sequence
+
+from constants import ITBIS_RATE
+
+# Contexto propio (no el global del hilo): precisión fija y redondeo comercial
+_CTX = Context(prec=28, rounding=ROUND_HALF_UP)
+_ONE = Decimal(1)
+_HUNDRED = Decimal(100)
+
+
+@lru_cache(maxsize=4096)
+def _dec(value: Any) -> Decimal:
+    """Decimal exacto de lo que se ve (1.1 -> 1.1, no 1.100000000000000088...)."""
+    if isinstance(value, str):
+        value = value.replace(",", "").replace("RD$", "").strip() or "0"
+    elif isinstance(value, float):
+        value = repr(value)
+    try:
+        return Decimal(value)
+    except (InvalidOperation, TypeError, ValueError):
+        return Decimal(0)
+
+
+def _round(value: Decimal) -> int:
+    return int(value.to_integral_value(rounding=ROUND_HALF_UP, context=_CTX))
+
+
+def to_cents(value: Any) -> int:
+    """Monto (float, str "1,234.56", Decimal o int en pesos) a centavos."""
+    if value is None or value == "":
+        return 0
+    return _round(_CTX.multiply(_dec(value), _HUNDRED))
+
+
+def from_cents(cents: int) -> float:
+    """Centavos a float para las columnas REAL y APIs existentes."""
+    return cents / 100
+
+
+def format_cents(cents: int) -> str:
+    """Centavos a texto "1,234.56" (sin pasar por float)."""
+    sign = "-" if cents < 0 else ""
+    pesos, cts = divmod(abs(int(cents)), 100)
+    return f"{sign}{pesos:,}.{cts:02d}"
+
+
+def line_total_cents(quantity: Any, unit_price: Any, discount_percent: Any = 0) -> int:
+    """Importe de una línea en centavos: cantidad × precio × (1 - desc%), un solo redondeo."""
+    amount = _CTX.multiply(_CTX.multiply(_dec(quantity), _dec(unit_price)), _HUNDRED)
+    disc = _dec(discount_percent)
+    if disc:
+        amount = _CTX.multiply(amount, _CTX.subtract(_ONE, _CTX.divide(disc, _HUNDRED)))
+    return _round(amount)
+
+
+def line_totals_cents(lines: Iterable[Sequence[Any]]) -> List[int]:
+    """Importes de varias líneas (cantidad, precio[, desc%]) en centavos."""
+    return [line_total_cents(*line) for line in lines]
+
+
+def itbis_cents(subtotal_cents: int, rate: Any = ITBIS_RATE) -> int:
+    """ITBIS sobre un subtotal en centavos."""
+    return _round(_CTX.multiply(Decimal(int(subtotal_cents)), _dec(rate)))
+
+
+def convert_cents(cents: int, exchange_rate: Any) -> int:
+    """Centavos convertidos con una tasa de cambio (p. ej. USD -> RD$)."""
+    return _round(_CTX.multiply(Decimal(int(cents)), _dec(exchange_rate)))
+
+
+def compute_totals(
+    lines: Iterable[Sequence[Any]],
+    apply_itbis: bool = True,
+    rate: Any = ITBIS_RATE
+) -> Dict[str, Any]:
+    """
+    Subtotal, ITBIS y total de una factura.
+
+    Args:
+        lines: Tuplas (cantidad, precio unitario[, descuento %])
+        apply_itbis: Calcular ITBIS sobre el subtotal
+        rate: Tasa de ITBIS (0.18)
+
+    Returns:
+        {'lines': [centavos por línea], 'subtotal', 'itbis', 'total'} en centavos
+    """
+    line_cents = line_totals_cents(lines)
+    subtotal = sum(line_cents)
+    itbis = itbis_cents(subtotal, rate) if apply_itbis else 0
+    return {'lines': line_cents, 'subtotal': subtotal, 'itbis': itbis, 'total': subtotal + itbis}
+
+
+def item_lines(items: Iterable[Dict[str, Any]]) -> List[tuple]:
+    """(cantidad, precio, desc%) de ítems en cualquiera de los formatos usados en la app."""
+    return [
+        (
+            it.get('quantity', it.get('qty', it.get('cantidad', 0))) or 0,
+            it.get('unit_price', it.get('price', it.get('precio', 0))) or 0,
+            it.get('discount_percent', it.get('discount_pct', it.get('discount', 0))) or 0,
+        )
+        for it in items
+    ]
@@ -18,24 +18,34 @@ import os
 import datetime
 from typing import List, Dict, Optional
 
-try:
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib import colors
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.platypus import (
-        SimpleDocTemplate,
-        Paragraph,
-        Spacer,
-        Table,
-        TableStyle,
-        Image as RLImage,
-        PageBreak,
-    )
-    from reportlab.lib.units import mm
-    from reportlab.lib.enums import TA_RIGHT, TA_LEFT
+# reportlab se importa al generar el primer PDF
+REPORTLAB_AVAILABLE = False
+
+
+def _load_reportlab() -> bool:
+    global REPORTLAB_AVAILABLE, A4, colors, getSampleStyleSheet, ParagraphStyle
+    global SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, RLImage, PageBreak, mm, TA_RIGHT, TA_LEFT
+    if REPORTLAB_AVAILABLE:
+        return True
+    try:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib import colors
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.platypus import (
+            SimpleDocTemplate,
+            Paragraph,
+            Spacer,
+            Table,
+            TableStyle,
+            Image as RLImage,
+            PageBreak,
+        )
+        from reportlab.lib.units import mm
+        from reportlab.lib.enums import TA_RIGHT, TA_LEFT
+    except Exception:
+        return False
     REPORTLAB_AVAILABLE = True
-except Exception:
-    REPORTLAB_AVAILABLE = False
+    return True
 
 # Optional Pillow to compute image aspect ratio
 try:
@@ -103,7 +113,7 @@ def generate_quotation_pdf(quotation_data: Dict, items: List[Dict], save_path: s
     - company_name: nombre para mostrar (override)
     - template: dict opcional con configuraciones visuales
     """
-    if not REPORTLAB_AVAILABLE:
+    if not _load_reportlab():
         raise RuntimeError("reportlab no está instalado. Instala con: pip install reportlab")
 
     tpl = _resolve_template(quotation_data or {}, template)
@@ -24,16 +24,24 @@ from typing import List, Dict, Optional
 from xml.sax.saxutils import escape
 
 # --------------------
-# openpyxl (Excel)
+# openpyxl (Excel) — se importa al generar el primer Excel
 # --------------------
-try:
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
-    from openpyxl.utils import get_column_letter
-    from openpyxl.drawing.image import Image as XLImage
-except Exception:
-    Workbook = None
-    XLImage = None
+Workbook = None
+XLImage = None
+
+
+def _load_openpyxl() -> bool:
+    global Workbook, Font, Alignment, Border, Side, PatternFill, get_column_letter, XLImage
+    if Workbook is not None:
+        return True
+    try:
+        from openpyxl import Workbook
+        from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
+        from openpyxl.utils import get_column_letter
+        from openpyxl.drawing.image import Image as XLImage
+    except Exception:
+        return False
+    return True
 
 # --------------------
 # Pillow (opcional)
@@ -44,27 +52,35 @@ except Exception:
     PILImage = None
 
 # --------------------
-# reportlab (PDF)
+# reportlab (PDF) — se importa al generar el primer PDF
 # --------------------
 REPORTLAB_AVAILABLE = False
-try:
-    from reportlab.lib.pagesizes import letter
-    from reportlab.lib import colors
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.platypus import (
-        SimpleDocTemplate,
-        Table,
-        TableStyle,
-        Paragraph,
-        Spacer,
-        Image as RLImage,
-    )
-    from reportlab.lib.units import mm
-    from reportlab.lib.enums import TA_LEFT, TA_RIGHT
+
+
+def _load_reportlab() -> bool:
+    global REPORTLAB_AVAILABLE, letter, colors, getSampleStyleSheet, ParagraphStyle
+    global SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, RLImage, mm, TA_LEFT, TA_RIGHT
+    if REPORTLAB_AVAILABLE:
+        return True
+    try:
+        from reportlab.lib.pagesizes import letter
+        from reportlab.lib import colors
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.platypus import (
+            SimpleDocTemplate,
+            Table,
+            TableStyle,
+            Paragraph,
+            Spacer,
+            Image as RLImage,
+        )
+        from reportlab.lib.units import mm
+        from reportlab.lib.enums import TA_LEFT, TA_RIGHT
+    except Exception:
+        # reportlab es opcional; el módulo sigue funcionando sólo con Excel
+        return False
     REPORTLAB_AVAILABLE = True
-except Exception:
-    # reportlab is optional; the module still works for Excel-only setups
-    REPORTLAB_AVAILABLE = False
+    return True
 
 # --------------------
 # Template manager (optional, used to load saved templates)
@@ -155,7 +171,7 @@ def generate_quotation_template(path: str):
     """
     Genera una plantilla Excel básica para cotizaciones.
     """
-    if Workbook is None:
+    if not _load_openpyxl():
         raise RuntimeError("openpyxl no está instalado. Instala con: pip install openpyxl")
 
     wb = Workbook()
@@ -218,7 +234,7 @@ def generate_quotation_excel(
     - Totales alineados a la derecha.
     - Colores/estilos tomados del template cuando existan.
     """
-    if Workbook is None:
+    if not _load_openpyxl():
         raise RuntimeError("openpyxl no está instalado. Instala con: pip install openpyxl")
 
     # -------------------------
@@ -511,7 +527,7 @@ def generate_quotation_pdf(
     - totales alineados a la derecha
     - dos firmas al pie (Firma Autorizada / Recibido Por)
     """
-    if not REPORTLAB_AVAILABLE:
+    if not _load_reportlab():
         raise RuntimeError("reportlab no está instalado. Instala con: pip install reportlab")
 
     tpl = _resolve_template(quotation_data or {}, template)
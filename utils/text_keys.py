@@ -0,0 +1,46 @@
+"""
+Claves de texto para búsquedas sin acentos ni mayúsculas.
+
+`fold_key` lleva un nombre a MAYÚSCULAS sin acentos, con letras, dígitos y
+'&' separados por un espacio ("Ferretería Ñoño, S.R.L." -> "FERRETERIA NONO
+S R L"). Los textos en latin-1 (padrón de la DGII, catálogo de ítems) se
+resuelven con una tabla de str.translate, unas 10 veces más rápido que
+pasar por unicodedata carácter por carácter.
+
+`trigrams` da los trigramas de cada palabra de la clave, con relleno al
+estilo pg_trgm ("  CE", " CEM", "CEM", ... "TO "), para medir similitud
+entre nombres con errores de tipeo.
+
+Uso:
+    fold_key("Cemento Gris Portland")       # 'CEMENTO GRIS PORTLAND'
+    trigrams("cemnto")                      # {'  C', ' CE', 'CEM', 'EMN', 'MNT', 'NTO', 'TO '}
+"""
+from __future__ import annotations
+
+import re
+import unicodedata
+from typing import Any, Set
+
+
+def _slow_fold(text: str) -> str:
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(c for c in text if not unicodedata.combining(c)).upper()
+    return ' '.join(re.sub(r'[^0-9A-Z&]+', ' ', text).split())
+
+
+_FOLD_TABLE = {code: _slow_fold(chr(code)) or ' ' for code in range(256)}
+
+
+def fold_key(value: Any) -> str:
+    """Clave de búsqueda de un nombre: mayúsculas, sin acentos, espacios simples."""
+    text = str(value or '').translate(_FOLD_TABLE)
+    return ' '.join(text.split()) if text.isascii() else _slow_fold(text)
+
+
+def trigrams(value: Any) -> Set[str]:
+    """Trigramas de las palabras de `fold_key(value)` (vacío si no hay palabras)."""
+    grams: Set[str] = set()
+    for word in fold_key(value).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
@@ -5,10 +5,14 @@ Widgets personalizados para FACOT.
 from .connection_status_bar import ConnectionStatusBar
 from .enhanced_items_table import EnhancedItemsTable
 from .connection_mode_dialog import ConnectionModeDialog, show_connection_mode_dialog
+from .date_range_filter import DateRangeFilter
+from .doc_search_box import DocSearchBox
 
 __all__ = [
     "ConnectionStatusBar",
     "EnhancedItemsTable",
     "ConnectionModeDialog",
     "show_connection_mode_dialog",
+    "DateRangeFilter",
+    "DocSearchBox",
 ]
@@ -29,10 +29,12 @@ class ConnectionStatusBar(QWidget):
     Signals:
         database_changed: Emitido cuando se cambia la base de datos
         mode_changed: Emitido cuando se cambia el modo de conexión
+        online_status_changed: Emitido cuando cambia el estado online/offline
     """
     
     database_changed = pyqtSignal(str)  # Ruta de nueva base de datos
     mode_changed = pyqtSignal(str)  # Nuevo modo (SQLITE, FIREBASE, AUTO)
+    online_status_changed = pyqtSignal(bool)  # True al recuperar conexión
     
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -95,9 +97,11 @@ class ConnectionStatusBar(QWidget):
         """Verifica si Firebase está realmente disponible y conectado."""
         try:
             from firebase import get_firebase_client
-            client = get_firebase_client()
+            client = get_firebase_client(wait=False)
             
-            if client.is_available():
+            if not client.is_ready():
+                print("[CONNECTION_STATUS] Firebase still initializing")
+            elif client.is_available():
                 # Firebase is available, check if online
                 # The online status will be set separately by set_online_status()
                 print("[CONNECTION_STATUS] Firebase is available")
@@ -114,8 +118,11 @@ class ConnectionStatusBar(QWidget):
         Args:
             is_online: True si hay conexión a internet
         """
-        self.is_online = is_online
+        changed = bool(is_online) != self.is_online
+        self.is_online = bool(is_online)
         self._update_appearance()
+        if changed:
+            self.online_status_changed.emit(self.is_online)
     
     def _update_appearance(self):
         """Actualiza la apariencia según el estado actual."""
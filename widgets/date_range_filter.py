@@ -0,0 +1,79 @@
+"""
+Filtro por rango de fechas para los historiales.
+
+Un checkbox activa el filtro y dos QDateEdit fijan desde/hasta (inclusivos).
+`date_range()` devuelve las fechas en 'AAAA-MM-DD' listas para
+LogicController.get_facturas / get_quotations, que filtran por las columnas
+de número de día indexadas.
+"""
+
+from __future__ import annotations
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from PyQt6.QtWidgets import QWidget, QHBoxLayout, QLabel, QCheckBox, QDateEdit
+from PyQt6.QtCore import QDate, pyqtSignal
+
+from utils.dates import normalize_date
+
+
+class DateRangeFilter(QWidget):
+    """
+    Desde/hasta con activación.
+
+    Signals:
+        changed: Emitido al activar/desactivar el filtro o cambiar una fecha
+    """
+
+    changed = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.enabled_check = QCheckBox("Filtrar por fecha")
+        today = QDate.currentDate()
+        self.date_from = QDateEdit(QDate(today.year(), today.month(), 1))
+        self.date_to = QDateEdit(today)
+        for edit in (self.date_from, self.date_to):
+            edit.setCalendarPopup(True)
+            edit.setDisplayFormat("dd/MM/yyyy")
+            edit.setEnabled(False)
+            edit.dateChanged.connect(self._on_date_changed)
+        self.enabled_check.toggled.connect(self._on_toggled)
+
+        layout.addWidget(self.enabled_check)
+        layout.addWidget(QLabel("Desde:"))
+        layout.addWidget(self.date_from)
+        layout.addWidget(QLabel("Hasta:"))
+        layout.addWidget(self.date_to)
+        layout.addStretch()
+
+    def _on_toggled(self, checked: bool):
+        self.date_from.setEnabled(checked)
+        self.date_to.setEnabled(checked)
+        self.changed.emit()
+
+    def _on_date_changed(self, _date):
+        if self.enabled_check.isChecked():
+            self.changed.emit()
+
+    def date_range(self) -> Tuple[Optional[str], Optional[str]]:
+        """(desde, hasta) en 'AAAA-MM-DD'; (None, None) si el filtro está apagado."""
+        if not self.enabled_check.isChecked():
+            return None, None
+        start = self.date_from.date().toString("yyyy-MM-dd")
+        end = self.date_to.date().toString("yyyy-MM-dd")
+        return (start, end) if start <= end else (end, start)
+
+
+def filter_by_date(records: Iterable[Dict[str, Any]], key: str,
+                   start: Optional[str], end: Optional[str]) -> List[Dict[str, Any]]:
+    """Filtro en memoria para backends cuyo listado no acepta rango (p. ej. Firebase)."""
+    out = []
+    for record in records:
+        value = normalize_date(record.get(key))
+        if (start and (not value or value < start)) or (end and (not value or value > end)):
+            continue
+        out.append(record)
+    return out
@@ -0,0 +1,93 @@
+"""
+Caja de búsqueda para los historiales.
+
+Busca mientras se escribe (con una pausa de SEARCH_DELAY_MS para no consultar
+en cada tecla) sobre el índice FTS5 de LogicController.search_documents:
+tercero, RNC, NCF, códigos y descripciones de líneas. `search_records()`
+devuelve las filas de la página de resultados combinadas con el filtro de
+fechas, y una línea de estado para mostrar debajo.
+"""
+
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Tuple
+
+from PyQt6.QtWidgets import QWidget, QHBoxLayout, QLabel, QLineEdit
+from PyQt6.QtCore import QTimer, pyqtSignal
+
+from widgets.date_range_filter import filter_by_date
+
+SEARCH_DELAY_MS = 250
+SEARCH_LIMIT = 200
+
+
+class DocSearchBox(QWidget):
+    """
+    Texto de búsqueda con espera y línea de estado.
+
+    Signals:
+        changed: Emitido tras la pausa de escritura o al borrar la búsqueda
+    """
+
+    changed = pyqtSignal()
+
+    def __init__(self, placeholder: str = "Buscar cliente, RNC, NCF, código o descripción...", parent=None):
+        super().__init__(parent)
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.edit = QLineEdit()
+        self.edit.setPlaceholderText(placeholder)
+        self.edit.setClearButtonEnabled(True)
+        self.status_label = QLabel("")
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(SEARCH_DELAY_MS)
+        self._timer.timeout.connect(self.changed.emit)
+        self.edit.textChanged.connect(self._on_text_changed)
+        self.edit.returnPressed.connect(self._emit_now)
+
+        layout.addWidget(QLabel("🔍"))
+        layout.addWidget(self.edit, 1)
+        layout.addWidget(self.status_label)
+
+    def _on_text_changed(self, text: str):
+        if text.strip():
+            self._timer.start()
+        else:
+            self._emit_now()
+
+    def _emit_now(self):
+        self._timer.stop()
+        self.changed.emit()
+
+    def text(self) -> str:
+        return self.edit.text().strip()
+
+    def set_status(self, message: str):
+        self.status_label.setText(message)
+
+
+def search_records(
+    logic,
+    text: str,
+    company_id: int,
+    doc_type: str,
+    date_key: str,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    limit: int = SEARCH_LIMIT
+) -> Tuple[Optional[List[Dict[str, Any]]], str]:
+    """
+    Filas que coinciden con `text` (más relevantes primero) y el texto de estado.
+
+    Sin search_documents (p. ej. Firebase) retorna (None, mensaje) y el
+    historial sigue con su listado normal.
+    """
+    if not hasattr(logic, "search_documents"):
+        return None, "Búsqueda no disponible"
+    result = logic.search_documents(text, company_id=company_id, doc_type=doc_type, limit=limit)
+    records = filter_by_date((r['record'] for r in result['results'] if r['record']), date_key, start, end)
+    shown = f"{len(records)} de " if len(records) < result['total'] else ""
+    total = f"más de {result['total'] - 1}" if not result['ranked'] else str(result['total'])
+    order = "" if result['ranked'] else ", los más recientes"
+    return records, f"{shown}{total} resultado(s){order} · {result['elapsed'] * 1000:.0f} ms"
@@ -18,6 +18,8 @@ from PyQt6.QtGui import QKeySequence, QShortcut, QDragEnterEvent, QDropEvent
 from typing import List, Dict, Any, Optional, Callable
 import re
 
+from utils.money import format_cents, from_cents, line_total_cents
+
 
 class EnhancedItemsTable(QTableWidget):
     """
@@ -330,10 +332,8 @@ class EnhancedItemsTable(QTableWidget):
         row = self.rowCount()
         self.insertRow(row)
         
-        # Calcular subtotal con descuento
-        subtotal_before_discount = qty * price
-        discount_amount = subtotal_before_discount * (discount / 100.0)
-        subtotal = subtotal_before_discount - discount_amount
+        # Calcular subtotal con descuento (centavos)
+        cents = line_total_cents(qty, price, discount if self.with_discounts else 0)
         
         # Llenar columnas
         self.setItem(row, self.COL_NUM, QTableWidgetItem(str(row + 1)))
@@ -345,9 +345,7 @@ class EnhancedItemsTable(QTableWidget):
         
         if self.with_discounts:
             self.setItem(row, self.COL_DISCOUNT, QTableWidgetItem(f"{float(discount):.2f}"))
-            self.setItem(row, self.COL_SUBTOTAL, QTableWidgetItem(f"{float(subtotal):,.2f}"))
-        else:
-            self.setItem(row, self.COL_SUBTOTAL - 1, QTableWidgetItem(f"{float(subtotal):,.2f}"))
+        self._set_subtotal_cell(row, cents)
         
         # Hacer columnas no editables excepto cantidad, precio y descuento
         for col in [self.COL_NUM, self.COL_CODE, self.COL_DESC, self.COL_UNIT, self.COL_SUBTOTAL]:
@@ -394,21 +392,32 @@ class EnhancedItemsTable(QTableWidget):
     
     def _recalculate_row_subtotal(self, row: int):
         """Recalcula el subtotal de una fila."""
-        qty = self._get_cell_float(row, self.COL_QTY)
-        price = self._get_cell_float(row, self.COL_PRICE)
-        
-        subtotal_before_discount = qty * price
-        
-        if self.with_discounts:
-            discount = self._get_cell_float(row, self.COL_DISCOUNT)
-            discount_amount = subtotal_before_discount * (discount / 100.0)
-            subtotal = subtotal_before_discount - discount_amount
-            col_subtotal = self.COL_SUBTOTAL
-        else:
-            subtotal = subtotal_before_discount
-            col_subtotal = self.COL_SUBTOTAL - 1
-        
-        self.setItem(row, col_subtotal, QTableWidgetItem(f"{float(subtotal):,.2f}"))
+        qty = self._get_cell_text(row, self.COL_QTY)
+        price = self._get_cell_text(row, self.COL_PRICE)
+        discount = self._get_cell_text(row, self.COL_DISCOUNT) if self.with_discounts else 0
+        self._set_subtotal_cell(row, line_total_cents(qty, price, discount))
+
+    def _set_subtotal_cell(self, row: int, cents: int):
+        """Muestra el subtotal y guarda los centavos en la celda (UserRole) para los totales."""
+        col_subtotal = self.COL_SUBTOTAL if self.with_discounts else self.COL_SUBTOTAL - 1
+        cell = QTableWidgetItem(format_cents(cents))
+        cell.setData(Qt.ItemDataRole.UserRole, cents)
+        cell.setFlags(cell.flags() & ~Qt.ItemFlag.ItemIsEditable)
+        self.setItem(row, col_subtotal, cell)
+
+    def get_total_cents(self) -> int:
+        """Suma de subtotales en centavos (de los valores guardados, sin re-parsear texto)."""
+        col_subtotal = self.COL_SUBTOTAL if self.with_discounts else self.COL_SUBTOTAL - 1
+        total = 0
+        for row in range(self.rowCount()):
+            cell = self.item(row, col_subtotal)
+            cents = cell.data(Qt.ItemDataRole.UserRole) if cell else None
+            total += int(cents or 0)
+        return total
+
+    def get_total(self) -> float:
+        """Suma de subtotales."""
+        return from_cents(self.get_total_cents())
     
     def _on_item_changed(self, item: QTableWidgetItem):
         """Callback cuando cambia un ítem."""